@@ -20,12 +20,12 @@ except ImportError:
     Session = None
     SESSION_AVAILABLE = False
 from config import Config
-from .utils.security import SecurityHeaders
+from .utils.security import SecurityHeaders, rate_limiter
 import os
 import time
 import uuid
 
-from app.user_model_fix import patch_user_model, patch_user_loader
+from app.user_model_fix import patch_user_loader
 
 # Initialize extensions
 db = SQLAlchemy()
@@ -38,7 +38,11 @@ csrf = CSRFProtect()
 cache = Cache() if CACHING_AVAILABLE else None
 session_store = Session() if SESSION_AVAILABLE else None
 
-def create_app(config_class=Config):
+def create_app(config_class=Config, prepare_database=None):
+    """
+    Build the app. ``prepare_database`` overrides PREPARE_DATABASE_ON_STARTUP;
+    pass False from scripts that run against an already prepared database.
+    """
     app = Flask(__name__)
     
     # Handle both string and class inputs for config_class
@@ -69,6 +73,7 @@ def create_app(config_class=Config):
     mail.init_app(app)
     migrate.init_app(app, db)
     csrf.init_app(app)
+    rate_limiter.init_app(app)
     if cache:
         cache.init_app(app)
     if session_store:
@@ -212,100 +217,23 @@ def create_app(config_class=Config):
     app.context_processor(admin_properties)
     app.context_processor(user_theme)
     
-    # Fix PostgreSQL transactions if needed
+    # Login uses the raw-SQL user loader
     with app.app_context():
-        try:
-            # Only run the fix for PostgreSQL databases
-            if app.config['SQLALCHEMY_DATABASE_URI'].startswith('postgresql'):
-                app.logger.info("Checking PostgreSQL transactions and schema...")
-                
-                # Import and run the transaction fix script
-                from sqlalchemy import text
-                
-                # Reset any aborted transactions with autocommit isolation
-                with db.engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
-                    # Find connections in an aborted state
-                    result = conn.execute(text("""
-                        SELECT pid, state 
-                        FROM pg_stat_activity 
-                        WHERE state = 'idle in transaction' OR 
-                              state = 'idle in transaction (aborted)' OR
-                              state = 'active'
-                    """))
-                    
-                    transactions = result.fetchall()
-                    
-                    if transactions:
-                        app.logger.warning(f"Found {len(transactions)} potentially problematic transactions. Resetting them...")
-                        for tx in transactions:
-                            # Don't terminate our own connection
-                            if tx.state != 'active':
-                                try:
-                                    conn.execute(text(f"SELECT pg_terminate_backend({tx.pid})"))
-                                    app.logger.info(f"Terminated connection {tx.pid} in state {tx.state}")
-                                except Exception as e:
-                                    app.logger.warning(f"Could not terminate connection {tx.pid}: {str(e)}")
-                
-                app.logger.info("PostgreSQL transaction check completed")
-        except Exception as e:
-            app.logger.warning(f"Could not check PostgreSQL transactions: {str(e)}")
-    
-    # Initialize site settings and User model
-    with app.app_context():
-        try:
-            from app.models import migrate_site_settings, create_admin_user_from_env, init_app as init_user_model
-            
-            # Initialize User model table name
-            init_user_model(app)
-            
-            # Initialize site settings
-            migrate_site_settings()
-            
-            # Create admin user from environment variables if configured
-            create_admin_user_from_env()
-        except Exception as e:
-            # Handle the case where site_settings table doesn't exist yet
-            app.logger.warning(f"Could not initialize site settings: {str(e)}")
-            app.logger.info("You may need to run 'flask db upgrade' if this is a new installation")
-    
-    # ADDED: Create all tables if they don't exist
-    with app.app_context():
-        try:
-            from sqlalchemy import inspect
-            
-            inspector = inspect(db.engine)
-            existing_tables = inspector.get_table_names()
-            
-            if 'property' not in existing_tables:
-                app.logger.info("Creating database tables...")
-                db.create_all()
-                app.logger.info("Database tables successfully created")
-            
-        except Exception as e:
-            app.logger.error(f"Error creating database tables: {str(e)}")
-    
-    with app.app_context():
-        # Apply database compatibility fixes
-        patch_user_model()
         patch_user_loader()
-        
-        # Validate Twilio configuration
-        try:
-            from app.utils.sms import validate_twilio_config
-            is_valid, message = validate_twilio_config()
-            if not is_valid:
-                app.logger.warning(f"Twilio configuration issue: {message}")
-                app.logger.warning("SMS functionality may not work properly")
-            else:
-                app.logger.info("Twilio configuration validated successfully")
-        except Exception as e:
-            app.logger.warning(f"Could not validate Twilio configuration: {str(e)}")
     
     # Add security headers to all responses
     @app.after_request
     def add_security_headers(response):
         return SecurityHeaders.add_security_headers(response)
     
+    # One-time database preparation: 'flask prepare', or now if configured to prepare on startup
+    from app.startup import init_startup
+    init_startup(app, prepare_database)
+    
+    # Background jobs: 'flask jobs' commands, and the worker thread if enabled
+    from app.jobs import init_job_runner
+    init_job_runner(app)
+    
     return app
 
 
@@ -7,6 +7,10 @@ from app.admin.forms import SiteSettingsForm, RequestReviewForm
 from app.auth.decorators import admin_required
 from app.auth.email import send_email
 from app.admin import bp
+from app.admin.service import (get_user_directory, get_user_counts, decode_user_cursor,
+                               search_users_typeahead, USER_STATUSES)
+from app.jobs import JOB_REGISTRY, enqueue_job, sync_job_definitions
+from app.models_modules.jobs import ScheduledJob, JobRun
 import secrets
 import string
 
@@ -51,10 +55,11 @@ def settings():
 def dashboard():
     """Admin dashboard with simple stats"""
     # Get counts of different user roles
-    user_count = User.query.count()
-    owner_count = User.query.filter_by(role=UserRoles.PROPERTY_OWNER.value).count()
-    manager_count = User.query.filter_by(role=UserRoles.PROPERTY_MANAGER.value).count()
-    staff_count = User.query.filter_by(role=UserRoles.SERVICE_STAFF.value).count()
+    counts = get_user_counts()
+    user_count = counts['total']
+    owner_count = counts['roles'].get(UserRoles.PROPERTY_OWNER.value, 0)
+    manager_count = counts['roles'].get(UserRoles.PROPERTY_MANAGER.value, 0)
+    staff_count = counts['roles'].get(UserRoles.SERVICE_STAFF.value, 0)
     
     # Get pending registration requests count
     pending_registrations = RegistrationRequest.query.filter_by(status=ApprovalStatus.PENDING).count()
@@ -123,6 +128,13 @@ def review_registration(id):
     
     if form.validate_on_submit():
         if form.action.data == 'approve':
+            if User.phone_in_use(reg_request.phone):
+                flash(f'The phone number {reg_request.phone} is already used by another account.', 'danger')
+                return render_template('admin/review_registration.html',
+                                      request=reg_request,
+                                      form=form,
+                                      title='Review Registration Request')
+            
             # Approve the request and create the user
             user = reg_request.approve(current_user)
             
@@ -194,20 +206,80 @@ def send_rejection_email(request, reason):
 @login_required
 @admin_required
 def users():
-    """View and manage users"""
+    """View and manage users, one keyset-paginated page at a time"""
     role_filter = request.args.get('role', 'all')
+    status_filter = request.args.get('status', 'all')
+    search = request.args.get('q', '').strip()
+    before = decode_user_cursor(request.args.get('before'))
     
-    if role_filter != 'all':
-        users = User.query.filter_by(role=role_filter).order_by(User.created_at.desc()).all()
-    else:
-        users = User.query.order_by(User.created_at.desc()).all()
+    users, note_counts, next_cursor = get_user_directory(
+        role=None if role_filter == 'all' else role_filter,
+        status=status_filter,
+        search=search,
+        before=before
+    )
     
     return render_template('admin/users.html',
                           users=users,
+                          note_counts=note_counts,
+                          next_cursor=next_cursor,
+                          counts=get_user_counts(),
+                          statuses=USER_STATUSES,
                           current_role=role_filter,
+                          current_status=status_filter,
+                          search=search,
                           title='User Management')
 
 
+@bp.route('/users/search')
+@login_required
+@admin_required
+def search_users():
+    """Typeahead lookup of users by name or email prefix"""
+    return jsonify({'users': search_users_typeahead(request.args.get('q', ''))})
+
+
+@bp.route('/jobs')
+@login_required
+@admin_required
+def jobs():
+    """Background job schedule with last-run duration and failure counts"""
+    if ScheduledJob.query.count() < len(JOB_REGISTRY):
+        sync_job_definitions()
+    
+    return render_template('admin/jobs.html',
+                          jobs=ScheduledJob.query.order_by(ScheduledJob.name).all(),
+                          recent_runs=JobRun.query.order_by(JobRun.id.desc()).limit(25).all(),
+                          registered=JOB_REGISTRY,
+                          title='Background Jobs')
+
+
+@bp.route('/jobs/<int:job_id>/run', methods=['POST'])
+@login_required
+@admin_required
+def run_job(job_id):
+    """Queue a run of a job right away"""
+    job = ScheduledJob.query.get_or_404(job_id)
+    if job.name not in JOB_REGISTRY:
+        flash(f'{job.name} is no longer registered', 'danger')
+    else:
+        enqueue_job(job.name)
+        flash(f'{job.name} queued', 'success')
+    return redirect(url_for('admin.jobs'))
+
+
+@bp.route('/jobs/<int:job_id>/toggle', methods=['POST'])
+@login_required
+@admin_required
+def toggle_job(job_id):
+    """Enable or disable a job's schedule"""
+    job = ScheduledJob.query.get_or_404(job_id)
+    job.enabled = not job.enabled
+    db.session.commit()
+    flash(f"{job.name} {'enabled' if job.enabled else 'disabled'}", 'success')
+    return redirect(url_for('admin.jobs'))
+
+
 @bp.route('/users/<int:user_id>/details')
 @login_required
 @admin_required
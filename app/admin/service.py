@@ -0,0 +1,132 @@
+from app import db
+from app.models import User, UserNote
+from sqlalchemy import and_, case, func, or_
+from datetime import datetime
+
+USER_PAGE_SIZE = 50
+TYPEAHEAD_LIMIT = 10
+# Matches User.status_text: more failed logins than this shows as locked
+LOCKED_AFTER_FAILED_LOGINS = 3
+USER_STATUSES = ('active', 'disabled', 'suspended', 'locked')
+
+
+def encode_user_cursor(user):
+    """Encode a user's position in the directory as an opaque ``before`` cursor"""
+    return f"{user.created_at.isoformat()}|{user.id}"
+
+
+def decode_user_cursor(cursor):
+    """Decode a ``before`` cursor, returning ``None`` if it is malformed"""
+    try:
+        created_at, user_id = cursor.split('|')
+        return datetime.fromisoformat(created_at), int(user_id)
+    except (AttributeError, ValueError):
+        return None
+
+
+def status_conditions():
+    """SQL condition for each account status, mirroring User.status_text"""
+    enabled = User.is_active.is_(True)
+    not_suspended = User.is_suspended.isnot(True)
+    locked = func.coalesce(User.failed_login_attempts, 0) > LOCKED_AFTER_FAILED_LOGINS
+    return {
+        'active': and_(enabled, not_suspended, ~locked),
+        'disabled': User.is_active.isnot(True),
+        'suspended': and_(enabled, User.is_suspended.is_(True)),
+        'locked': and_(enabled, not_suspended, locked),
+    }
+
+
+def search_condition(term):
+    """Every word of ``term`` must prefix the user's email, first or last name.
+
+    Prefix matches on lower-cased columns can use the
+    ``idx_user_*_lower`` expression indexes.
+    """
+    conditions = []
+    for word in term.lower().split()[:3]:
+        pattern = word.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+        conditions.append(or_(
+            func.lower(User.email).like(pattern, escape='\\'),
+            func.lower(User.first_name).like(pattern, escape='\\'),
+            func.lower(User.last_name).like(pattern, escape='\\'),
+        ))
+    return and_(*conditions)
+
+
+def get_user_directory(role=None, status=None, search=None, before=None, limit=USER_PAGE_SIZE):
+    """
+    One page of the admin user directory, newest accounts first.
+
+    ``before`` is a decoded cursor from the previous page. Returns the
+    users, a dict of admin note counts keyed by user ID (from one grouped
+    query), and the cursor for the next page or ``None`` on the last page.
+    """
+    query = User.query
+    if role:
+        query = query.filter(User.role == role)
+    if status in USER_STATUSES:
+        query = query.filter(status_conditions()[status])
+    if search and search.strip():
+        query = query.filter(search_condition(search))
+    if before:
+        created_at, user_id = before
+        query = query.filter(or_(
+            User.created_at < created_at,
+            and_(User.created_at == created_at, User.id < user_id)
+        ))
+
+    users = query.order_by(User.created_at.desc(), User.id.desc()).limit(limit + 1).all()
+    next_cursor = encode_user_cursor(users[limit - 1]) if len(users) > limit else None
+    users = users[:limit]
+
+    note_counts = {}
+    if users:
+        note_counts = dict(db.session.query(
+            UserNote.user_id, func.count(UserNote.id)
+        ).filter(
+            UserNote.user_id.in_([user.id for user in users])
+        ).group_by(UserNote.user_id).all())
+
+    return users, note_counts, next_cursor
+
+
+def get_user_counts():
+    """Totals per role and per status from a single GROUP BY"""
+    conditions = status_conditions()
+    rows = db.session.query(
+        User.role,
+        func.count(User.id),
+        *[func.sum(case((conditions[status], 1), else_=0)) for status in USER_STATUSES]
+    ).group_by(User.role).all()
+
+    counts = {
+        'total': 0,
+        'roles': {},
+        'statuses': dict.fromkeys(USER_STATUSES, 0),
+    }
+    for role, total, *by_status in rows:
+        counts['total'] += total
+        counts['roles'][role] = total
+        for status, count in zip(USER_STATUSES, by_status):
+            counts['statuses'][status] += count or 0
+    return counts
+
+
+def search_users_typeahead(term, limit=TYPEAHEAD_LIMIT):
+    """Lightweight name/email matches for typeahead, as plain dicts"""
+    if not term or len(term.strip()) < 2:
+        return []
+
+    rows = db.session.query(
+        User.id, User.first_name, User.last_name, User.email, User.role
+    ).filter(
+        search_condition(term)
+    ).order_by(User.email).limit(limit).all()
+
+    return [{
+        'id': row.id,
+        'name': f"{row.first_name or ''} {row.last_name or ''}".strip(),
+        'email': row.email,
+        'role': row.role,
+    } for row in rows]
@@ -30,6 +30,12 @@ class RegistrationForm(FlaskForm):
                          description="Tell us a bit about yourself and why you want to join the platform")
     submit = SubmitField('Request Registration')
     
+    def validate_phone(self, field):
+        # Import here to avoid circular imports
+        from app.models import User
+        if User.phone_in_use(field.data):
+            raise ValidationError('This phone number is already used by another account.')
+    
     def validate_invitation_code(self, field):
         if self.role.data == 'guest':
             if not field.data:
@@ -1,30 +1,26 @@
 from flask import Blueprint, render_template, request, jsonify, redirect, url_for, flash
 from flask_login import login_required, current_user
 from app import db
-from app.models import Property, PropertyCalendar, Task, TaskAssignment, TaskProperty, TaskStatus
+from app.models import Property, PropertyCalendar, PropertyAvailability, Task, TaskAssignment, TaskProperty, TaskStatus
 from app.calendar.forms import CalendarImportForm
+from app.workforce.service import get_worker_property_ids
 from sqlalchemy.orm import aliased
 from datetime import datetime, timedelta, date
+from itertools import groupby
 import json
-try:
-    import icalendar
-    import recurring_ical_events
-    ICALENDAR_AVAILABLE = True
-except ImportError:
-    icalendar = None
-    recurring_ical_events = None
-    ICALENDAR_AVAILABLE = False
 
 def safe_parse_ical_calendar(ical_content):
     """Safely parse iCal content with proper error handling for calendar routes."""
-    if not ICALENDAR_AVAILABLE or icalendar is None:
+    # Imported on first use to keep icalendar out of app startup
+    try:
+        import icalendar
+    except ImportError:
         raise ValueError("iCalendar library not available")
     return icalendar.Calendar.from_ical(ical_content)
-import requests
 from io import StringIO
 import random
 
-bp = Blueprint('calendar', __name__, url_prefix='/calendar')
+from app.calendar import bp
 
 @bp.route('/property/<int:property_id>', methods=['GET'])
 @login_required
@@ -201,6 +197,16 @@ def get_task_color(task):
     
     return priority_colors.get(task.priority.value, '#6c757d')
 
+AVAILABILITY_DEFAULT_DAYS = 90
+AVAILABILITY_MAX_DAYS = 366
+
+def _mock_booked_row(days):
+    """A row of three random stays, for trying the view out without synced calendars"""
+    bits = 0
+    for _ in range(3):
+        bits |= ((1 << random.randint(2, 7)) - 1) << random.randint(0, max(days - 2, 0))
+    return format(bits & ((1 << days) - 1), f'0{days}b')[::-1]
+
 @bp.route('/availability', methods=['GET'])
 @login_required
 def availability_calendar():
@@ -208,126 +214,43 @@ def availability_calendar():
     
     # Get all properties the user has access to
     if current_user.is_admin or current_user.has_admin_role:
-        properties = Property.query.all()
+        properties = Property.query.order_by(Property.name).all()
     elif current_user.is_property_owner:
-        properties = Property.query.filter_by(owner_id=current_user.id).all()
+        properties = Property.query.filter_by(owner_id=current_user.id).order_by(Property.name).all()
     else:
         # For staff, find properties they have tasks assigned to
-        task_assignment_alias = aliased(TaskAssignment)
-        task_property_alias = aliased(TaskProperty)
-        
-        property_ids = db.session.query(task_property_alias.property_id)\
-            .join(Task, Task.id == task_property_alias.task_id)\
-            .join(task_assignment_alias, Task.id == task_assignment_alias.task_id)\
-            .filter(task_assignment_alias.user_id == current_user.id)\
-            .distinct().all()
-        
-        property_ids = [p[0] for p in property_ids]
-        properties = Property.query.filter(Property.id.in_(property_ids)).all()
+        property_ids = get_worker_property_ids(current_user.id)
+        properties = Property.query.filter(Property.id.in_(property_ids)).order_by(Property.name).all()
     
-    # Get booking data for each property
-    bookings_by_property = {}
-    start_dates = []
-    end_dates = []
+    # The displayed range comes from the request, not from the bookings found
+    try:
+        start_date = datetime.strptime(request.args['start'], '%Y-%m-%d').date()
+    except (KeyError, ValueError):
+        start_date = date.today()
+    days = min(max(request.args.get('days', AVAILABILITY_DEFAULT_DAYS, type=int), 1), AVAILABILITY_MAX_DAYS)
     
     # Option to show mock data for testing
     use_mock_data = request.args.get('mock', 'false').lower() == 'true'
     
-    for prop in properties:
-        bookings = []
-        
-        # For testing: if mock parameter is set and no real calendars, generate mock data
-        if use_mock_data and (not prop.calendars or not any(cal.ical_url for cal in prop.calendars)):
-            # Generate some mock bookings for the next 2 months
-            today = datetime.now().date()
-            
-            # Random bookings in next 60 days
-            for _ in range(3):  # 3 mock bookings per property
-                # Random start date 0-45 days from now
-                start_offset = random.randint(0, 45)
-                # Random duration 2-7 days
-                duration = random.randint(2, 7)
-                
-                mock_start = today + timedelta(days=start_offset)
-                mock_end = mock_start + timedelta(days=duration)
-                
-                bookings.append({
-                    'summary': 'Mock Booking',
-                    'start': mock_start,
-                    'end': mock_end
-                })
-                
-                start_dates.append(mock_start)
-                end_dates.append(mock_end)
-        
-        # Process each calendar for the property
-        for calendar in prop.calendars:
-            if calendar.ical_url:
-                try:
-                    # Fetch and process the calendar
-                    response = requests.get(calendar.ical_url)
-                    if response.status_code == 200:
-                        cal_content = response.text
-                        cal = safe_parse_ical_calendar(cal_content)
-                        
-                        # Get a date range for the next 3 months
-                        start_date = datetime.now().date()
-                        end_date = start_date + timedelta(days=90)
-                        
-                        # Get the events, handling recurring events
-                        events = recurring_ical_events.of(cal).between(start_date, end_date)
-                        
-                        for event in events:
-                            summary = str(event.get('summary', 'Booking'))
-                            dtstart = event.get('dtstart').dt
-                            dtend = event.get('dtend').dt
-                            
-                            # Convert datetime to date if necessary
-                            if isinstance(dtstart, datetime):
-                                dtstart = dtstart.date()
-                            if isinstance(dtend, datetime):
-                                dtend = dtend.date()
-                            
-                            bookings.append({
-                                'summary': summary,
-                                'start': dtstart,
-                                'end': dtend
-                            })
-                            
-                            # Track the earliest and latest dates
-                            start_dates.append(dtstart)
-                            end_dates.append(dtend)
-                            
-                except Exception as e:
-                    flash(f"Error processing calendar for {prop.name}: {str(e)}", "warning")
-        
-        # Store bookings with string key for property ID to avoid key access issues in template
-        bookings_by_property[str(prop.id)] = {
-            'name': prop.name,
-            'bookings': bookings
-        }
-    
-    # Determine the date range to display
-    if start_dates and end_dates:
-        start_date = min(start_dates)
-        end_date = max(end_dates)
-    else:
-        # Default to current month plus next month if no bookings
-        start_date = date.today().replace(day=1)
-        end_date = (start_date + timedelta(days=60)).replace(day=1) - timedelta(days=1)
+    # Booked days come from the bitmaps calendar sync maintains: one query, no feed fetches
+    booked = PropertyAvailability.matrix([prop.id for prop in properties], start_date, days)
+    if use_mock_data:
+        for prop in properties:
+            booked.setdefault(prop.id, _mock_booked_row(days))
     
-    # Generate a list of dates for the calendar
-    calendar_dates = []
-    current_date = start_date
-    while current_date <= end_date:
-        calendar_dates.append(current_date)
-        current_date += timedelta(days=1)
+    calendar_dates = [start_date + timedelta(days=offset) for offset in range(days)]
+    months = [(label, len(list(group)))
+              for label, group in groupby(calendar_dates, key=lambda d: d.strftime('%B %Y'))]
     
     return render_template('calendar/availability.html',
                           title='Property Availability Calendar',
                           properties=properties,
-                          bookings_by_property=bookings_by_property,
+                          booked=booked,
                           calendar_dates=calendar_dates,
+                          months=months,
                           start_date=start_date,
-                          end_date=end_date,
+                          end_date=calendar_dates[-1],
+                          days=days,
+                          previous_start=start_date - timedelta(days=days),
+                          next_start=start_date + timedelta(days=days),
                           use_mock_data=use_mock_data) 
\ No newline at end of file
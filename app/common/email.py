@@ -18,4 +18,23 @@ def send_email(subject, sender, recipients, text_body, html_body):
     msg.html = html_body
     # Using _get_current_object() is a common Flask pattern for passing app context to threads.
     Thread(target=send_async_email,
-           args=(current_app._get_current_object(), msg)).start()
\ No newline at end of file
+           args=(current_app._get_current_object(), msg)).start()
+
+def send_async_bulk_email(app, messages):
+    """Send a batch of messages over a single mail connection within the given app context."""
+    with app.app_context():
+        with mail.connect() as conn:
+            for msg in messages:
+                try:
+                    conn.send(msg)
+                except Exception as e:
+                    app.logger.error(f"Failed to send email to {msg.recipients}: {str(e)}")
+
+def send_bulk_email(messages):
+    """Queue a batch of prepared messages for asynchronous sending on one background thread."""
+    if not messages:
+        return None
+    thread = Thread(target=send_async_bulk_email,
+                    args=(current_app._get_current_object(), list(messages)))
+    thread.start()
+    return thread
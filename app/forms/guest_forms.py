@@ -7,6 +7,7 @@ from wtforms import StringField, TextAreaField, DateField, SelectField, BooleanF
 from wtforms.validators import DataRequired, Email, Length, Optional, EqualTo, NumberRange, ValidationError
 from wtforms.widgets import DateInput
 from datetime import datetime, timedelta
+from flask_login import current_user
 from app.models import User, GuestInvitation
 
 
@@ -62,6 +63,11 @@ class GuestRegistrationForm(FlaskForm):
         user = User.query.filter_by(email=field.data).first()
         if user:
             raise ValidationError('An account with this email already exists.')
+    
+    def validate_phone(self, field):
+        """Validate that the phone number does not belong to another account"""
+        if User.phone_in_use(field.data):
+            raise ValidationError('This phone number is already used by another account.')
 
 
 class GuestProfileForm(FlaskForm):
@@ -96,6 +102,11 @@ class GuestProfileForm(FlaskForm):
     marketing_emails_consent = BooleanField('Receive marketing emails')
     booking_reminders_consent = BooleanField('Receive booking reminders')
     email_notifications = BooleanField('Email notifications', default=True)
+    
+    def validate_phone(self, field):
+        """Validate that the phone number does not belong to another account"""
+        if User.phone_in_use(field.data, exclude_user_id=current_user.id):
+            raise ValidationError('This phone number is already used by another account.')
 
 
 class DirectBookingForm(FlaskForm):
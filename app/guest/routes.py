@@ -14,6 +14,8 @@ from app.models import (
     Property, User, GuestInvitation, GuestBooking, UserRoles, db
 )
 from app.auth.decorators import property_owner_required, admin_required
+from app.common.email import send_bulk_email
+from flask_mail import Message
 from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime, timedelta
 import secrets
@@ -419,17 +421,15 @@ def bulk_invitations():
             emails = [email.strip() for email in form.guest_emails.data.split('\n') if email.strip()]
             property_id = form.property_id.data if form.property_id.data != 0 else None
             
-            created_invitations = []
+            created_invitations = GuestInvitation.create_invitations(
+                created_by_id=current_user.id,
+                emails=emails,
+                property_id=property_id,
+                expires_in_days=form.expires_in_days.data,
+                notes=form.notes.data or None
+            )
             
-            for email in emails:
-                invitation = GuestInvitation.create_invitation(
-                    created_by_id=current_user.id,
-                    property_id=property_id,
-                    email=email,
-                    expires_in_days=form.expires_in_days.data,
-                    notes=form.notes.data or None
-                )
-                created_invitations.append(invitation)
+            queue_invitation_emails(created_invitations)
             
             flash(f'Created {len(created_invitations)} guest invitations successfully!', 'success')
             return redirect(url_for('guest.manage_invitations'))
@@ -443,6 +443,31 @@ def bulk_invitations():
                          form=form)
 
 
+def queue_invitation_emails(invitations):
+    """Render invitation emails and hand them to a background sender"""
+    messages = []
+    for invitation in invitations:
+        if not invitation.email:
+            continue
+        context = {
+            'invitation': invitation,
+            'inviter': current_user,
+            'register_url': url_for('guest.register_with_code', invitation_code=invitation.code, _external=True)
+        }
+        msg = Message(
+            subject='You are invited to Short Term Landlord',
+            recipients=[invitation.email],
+            body=render_template('email/guest_invitation.txt', **context),
+            html=render_template('email/guest_invitation.html', **context)
+        )
+        messages.append(msg)
+    
+    try:
+        send_bulk_email(messages)
+    except Exception as e:
+        current_app.logger.error(f"Error queueing invitation emails: {str(e)}")
+
+
 @bp.route('/admin/invitations/<int:invitation_id>/deactivate', methods=['POST'])
 @login_required
 @property_owner_required
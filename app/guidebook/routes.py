@@ -9,7 +9,6 @@ from flask import (
 )
 from flask_login import login_required, current_user
 from werkzeug.utils import secure_filename
-from PIL import Image
 from app import db
 from app.guidebook import bp
 from app.models import Property, GuidebookEntry, GuidebookCategory
@@ -404,6 +403,7 @@ def save_entry_image(entry, image_file, property_id):
         
         # Optimize image using PIL
         try:
+            from PIL import Image
             with Image.open(filepath) as img:
                 # Convert to RGB if necessary
                 if img.mode in ('RGBA', 'P'):
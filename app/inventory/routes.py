@@ -1,11 +1,16 @@
-from flask import render_template, redirect, url_for, flash, request, current_app, abort, jsonify
+from flask import render_template, redirect, url_for, flash, request, current_app, abort, jsonify, send_file
 from flask_login import login_required, current_user
 from app import db
 from app.inventory import bp
 from app.inventory.forms import InventoryItemForm, InventoryTransactionForm, InventoryTransferForm, InventoryFilterForm, InventoryCatalogItemForm, BarcodeSearchForm
 from app.models import Property, InventoryItem, InventoryTransaction, ItemCategory, TransactionType, User, UserRoles, NotificationType, NotificationChannel, InventoryCatalogItem
 from app.notifications.service import create_notification
+from app.inventory.service import (low_stock_query, reorder_scope_for, get_reorder_report, apply_inventory_movements,
+                                   REORDER_LOOKBACK_DAYS, REORDER_HORIZON_DAYS)
+from app.utils.error_handling import AppError
 from datetime import datetime
+import csv
+import io
 import json
 from app.auth.decorators import property_owner_required, admin_required
 
@@ -56,17 +61,7 @@ def index(property_id):
         query = query.join(InventoryCatalogItem).filter(InventoryCatalogItem.category == filter_form.category.data)
     
     if filter_form.low_stock_only.data == 'low':
-        # This is a bit complex as we need to filter items below their threshold
-        # We'll use a subquery approach
-        low_stock_items = []
-        for item in query.all():
-            if item.is_low_stock():
-                low_stock_items.append(item.id)
-        
-        if low_stock_items:
-            query = query.filter(InventoryItem.id.in_(low_stock_items))
-        else:
-            query = query.filter(InventoryItem.id == None)  # No results
+        query = query.filter(InventoryItem.low_stock_condition())
     
     if filter_form.search.data:
         search = f"%{filter_form.search.data}%"
@@ -364,6 +359,26 @@ def delete_item(property_id, item_id):
     flash(f'Inventory item "{item_name}" deleted successfully!', 'success')
     return redirect(url_for('inventory.index', property_id=property_id))
 
+def notify_low_stock(property, items, after_transfer=False):
+    """Notify the property owner about items that are now below threshold"""
+    for item in items:
+        if not item.is_low_stock():
+            continue
+        title = f"Low Inventory Alert: {item.catalog_item.name}"
+        message = f"The inventory level for {item.catalog_item.name} at {property.name} is low"
+        message += " after a transfer.\n" if after_transfer else ".\n"
+        message += f"Current quantity: {item.current_quantity} {item.catalog_item.unit_of_measure}\n"
+        message += f"Reorder threshold: {item.reorder_threshold} {item.catalog_item.unit_of_measure}\n"
+        
+        # Create in-app notification for property owner
+        create_notification(
+            user_id=property.owner_id,
+            notification_type=NotificationType.INVENTORY_LOW,
+            channel=NotificationChannel.IN_APP,
+            title=title,
+            message=message
+        )
+
 @bp.route('/property/<int:property_id>/inventory/<int:item_id>/transaction', methods=['GET', 'POST'])
 @login_required
 def record_transaction(property_id, item_id):
@@ -384,42 +399,21 @@ def record_transaction(property_id, item_id):
     
     if form.validate_on_submit():
         transaction_type = TransactionType(form.transaction_type.data)
-        quantity = form.quantity.data
-        previous_quantity = item.current_quantity
-        
-        # Update item quantity
-        item.update_quantity(quantity, transaction_type)
-        
-        # Create transaction record
-        transaction = InventoryTransaction(
-            item=item,
-            transaction_type=transaction_type,
-            quantity=quantity,
-            previous_quantity=previous_quantity,
-            new_quantity=item.current_quantity,
-            user_id=current_user.id,
-            notes=form.notes.data
-        )
-        db.session.add(transaction)
+        try:
+            apply_inventory_movements([{
+                'item_id': item.id,
+                'transaction_type': transaction_type,
+                'quantity': form.quantity.data,
+                'notes': form.notes.data
+            }], user_id=current_user.id)
+        except AppError as e:
+            flash(e.message, 'danger')
+            return redirect(url_for('inventory.record_transaction', property_id=property_id, item_id=item_id))
         
         # Check if item is now below threshold and notify if needed
-        if item.is_low_stock() and transaction_type in [TransactionType.USAGE, TransactionType.TRANSFER_OUT]:
-            # Notify property owner
-            title = f"Low Inventory Alert: {item.catalog_item.name}"
-            message = f"The inventory level for {item.catalog_item.name} at {property.name} is low.\n"
-            message += f"Current quantity: {item.current_quantity} {item.catalog_item.unit_of_measure}\n"
-            message += f"Reorder threshold: {item.reorder_threshold} {item.catalog_item.unit_of_measure}\n"
-            
-            # Create in-app notification for property owner
-            create_notification(
-                user_id=property.owner_id,
-                notification_type=NotificationType.INVENTORY_LOW,
-                channel=NotificationChannel.IN_APP,
-                title=title,
-                message=message
-            )
+        if transaction_type in [TransactionType.USAGE, TransactionType.TRANSFER_OUT]:
+            notify_low_stock(property, [item])
         
-        db.session.commit()
         flash(f'Transaction recorded successfully!', 'success')
         return redirect(url_for('inventory.index', property_id=property_id))
     
@@ -461,81 +455,21 @@ def transfer_item(property_id, item_id):
         quantity = form.quantity.data
         destination_property = form.destination_property.data
         
-        # Ensure quantity is not more than available
-        if quantity > item.current_quantity:
-            flash(f'Cannot transfer more than the available quantity ({item.current_quantity} {item.catalog_item.unit_of_measure}).', 'danger')
+        try:
+            apply_inventory_movements([{
+                'item_id': item.id,
+                'transaction_type': TransactionType.TRANSFER_OUT,
+                'quantity': quantity,
+                'destination_property_id': destination_property.id,
+                'notes': form.notes.data
+            }], user_id=current_user.id)
+        except AppError as e:
+            flash(e.message, 'danger')
             return redirect(url_for('inventory.transfer_item', property_id=property_id, item_id=item_id))
         
-        # Create outgoing transaction
-        previous_quantity = item.current_quantity
-        item.update_quantity(quantity, TransactionType.TRANSFER_OUT)
-        
-        outgoing_transaction = InventoryTransaction(
-            item=item,
-            transaction_type=TransactionType.TRANSFER_OUT,
-            quantity=quantity,
-            previous_quantity=previous_quantity,
-            new_quantity=item.current_quantity,
-            user_id=current_user.id,
-            source_property_id=property_id,
-            destination_property_id=destination_property.id,
-            notes=form.notes.data
-        )
-        db.session.add(outgoing_transaction)
-        
-        # Check if the same catalog item exists in the destination property
-        dest_item = InventoryItem.query.filter_by(
-            property_id=destination_property.id,
-            catalog_item_id=item.catalog_item_id
-        ).first()
-        
-        if not dest_item:
-            # Create a new item in the destination property
-            dest_item = InventoryItem(
-                property_id=destination_property.id,
-                catalog_item_id=item.catalog_item_id,
-                current_quantity=0,
-                storage_location=item.storage_location,
-                reorder_threshold=item.reorder_threshold
-            )
-            db.session.add(dest_item)
-            db.session.flush()  # Generate ID for the new item
-        
-        # Create incoming transaction
-        previous_dest_quantity = dest_item.current_quantity
-        dest_item.update_quantity(quantity, TransactionType.TRANSFER_IN)
-        
-        incoming_transaction = InventoryTransaction(
-            item=dest_item,
-            transaction_type=TransactionType.TRANSFER_IN,
-            quantity=quantity,
-            previous_quantity=previous_dest_quantity,
-            new_quantity=dest_item.current_quantity,
-            user_id=current_user.id,
-            source_property_id=property_id,
-            destination_property_id=destination_property.id,
-            notes=form.notes.data
-        )
-        db.session.add(incoming_transaction)
-        
         # Check if source item is now below threshold
-        if item.is_low_stock():
-            # Notify property owner
-            title = f"Low Inventory Alert: {item.catalog_item.name}"
-            message = f"The inventory level for {item.catalog_item.name} at {property.name} is low after a transfer.\n"
-            message += f"Current quantity: {item.current_quantity} {item.catalog_item.unit_of_measure}\n"
-            message += f"Reorder threshold: {item.reorder_threshold} {item.catalog_item.unit_of_measure}\n"
-            
-            # Create in-app notification for property owner
-            create_notification(
-                user_id=property.owner_id,
-                notification_type=NotificationType.INVENTORY_LOW,
-                channel=NotificationChannel.IN_APP,
-                title=title,
-                message=message
-            )
+        notify_low_stock(property, [item], after_transfer=True)
         
-        db.session.commit()
         flash(f'Successfully transferred {quantity} {item.catalog_item.unit_of_measure} of {item.catalog_item.name} to {destination_property.name}!', 'success')
         return redirect(url_for('inventory.index', property_id=property_id))
     
@@ -546,6 +480,54 @@ def transfer_item(property_id, item_id):
                           item=item,
                           available_properties=available_properties)
 
+@bp.route('/property/<int:property_id>/inventory/movements', methods=['POST'])
+@login_required
+def record_movements(property_id):
+    """Apply a batch of inventory movements for a property in one transaction.
+    
+    Expects JSON ``{"lines": [{"item_id", "transaction_type", "quantity",
+    "destination_property_id", "notes"}, ...], "notes": "..."}``.
+    """
+    property = Property.query.get_or_404(property_id)
+    
+    if not can_manage_inventory(property_id):
+        return jsonify({'success': False, 'error': 'Access denied'}), 403
+    
+    data = request.get_json(silent=True) or {}
+    lines = data.get('lines')
+    if not isinstance(lines, list) or not lines:
+        return jsonify({'success': False, 'error': 'No movements given'}), 400
+    
+    # Every source item must belong to this property
+    try:
+        item_ids = {int(line['item_id']) for line in lines}
+    except (KeyError, TypeError, ValueError):
+        return jsonify({'success': False, 'error': 'Each movement needs an item_id'}), 400
+    items = InventoryItem.query.filter(InventoryItem.id.in_(item_ids)).all()
+    if len(items) != len(item_ids) or any(item.property_id != property_id for item in items):
+        return jsonify({'success': False, 'error': 'All items must belong to this property'}), 400
+    
+    # Transfers may only go to properties the user can manage
+    destinations = {line.get('destination_property_id') for line in lines if line.get('destination_property_id')}
+    for destination_id in destinations:
+        if not can_manage_inventory(destination_id):
+            return jsonify({'success': False, 'error': f'Cannot transfer to property {destination_id}'}), 403
+    
+    try:
+        quantities = apply_inventory_movements(lines, user_id=current_user.id, notes=data.get('notes'))
+    except AppError as e:
+        return jsonify({'success': False, 'error': e.message}), e.code
+    
+    outgoing = {TransactionType.USAGE, TransactionType.TRANSFER_OUT}
+    depleted_ids = {int(line['item_id']) for line in lines
+                    if TransactionType(line['transaction_type']) in outgoing}
+    notify_low_stock(property, [item for item in items if item.id in depleted_ids])
+    
+    return jsonify({
+        'success': True,
+        'quantities': {str(item_id): quantity for item_id, quantity in quantities.items()}
+    })
+
 @bp.route('/property/<int:property_id>/inventory/<int:item_id>/history')
 @login_required
 def item_history(property_id, item_id):
@@ -580,17 +562,83 @@ def low_stock(property_id):
         flash('Access denied. You can only view inventory for properties you have access to.', 'danger')
         return redirect(url_for('main.index'))
     
-    # Get all inventory items for this property
-    items = InventoryItem.query.filter_by(property_id=property_id).all()
-    
-    # Filter to only low stock items
-    low_stock_items = [item for item in items if item.is_low_stock()]
+    low_stock_items = low_stock_query(property_id).order_by(InventoryItem.id).all()
     
     return render_template('inventory/low_stock.html',
                           title=f'Low Stock Items - {property.name}',
                           property=property,
                           low_stock_items=low_stock_items)
 
+def _reorder_report_args():
+    lookback_days = max(request.args.get('lookback_days', REORDER_LOOKBACK_DAYS, type=int), 1)
+    horizon_days = max(request.args.get('horizon_days', REORDER_HORIZON_DAYS, type=int), 1)
+    return lookback_days, horizon_days
+
+@bp.route('/reorder-report')
+@login_required
+def reorder_report():
+    """Portfolio-wide reorder report aggregated per catalog item"""
+    if not (current_user.is_property_owner or current_user.has_admin_role):
+        flash('Access denied. This page is only available to property owners and administrators.', 'danger')
+        return redirect(url_for('main.index'))
+    
+    lookback_days, horizon_days = _reorder_report_args()
+    report = get_reorder_report(reorder_scope_for(current_user),
+                                lookback_days=lookback_days,
+                                horizon_days=horizon_days)
+    
+    return render_template('inventory/reorder_report.html',
+                          title='Reorder Report',
+                          report=report,
+                          lookback_days=lookback_days,
+                          horizon_days=horizon_days,
+                          total_cost=sum(row['estimated_cost'] for row in report))
+
+@bp.route('/reorder-report/export')
+@login_required
+def export_reorder_report():
+    """Export the reorder report as CSV"""
+    if not (current_user.is_property_owner or current_user.has_admin_role):
+        abort(403)
+    
+    lookback_days, horizon_days = _reorder_report_args()
+    report = get_reorder_report(reorder_scope_for(current_user),
+                                lookback_days=lookback_days,
+                                horizon_days=horizon_days)
+    
+    output = io.StringIO()
+    writer = csv.writer(output)
+    writer.writerow([
+        'Item', 'SKU', 'Category', 'Unit', 'Properties Stocking', 'Properties Low',
+        'On Hand', 'Shortfall', 'Daily Usage', 'Days of Cover', 'Suggested Order',
+        'Unit Price', 'Estimated Cost', 'Purchase Link'
+    ])
+    for row in report:
+        item = row['catalog_item']
+        writer.writerow([
+            item.name,
+            item.sku or '',
+            item.category.value,
+            item.unit,
+            row['property_count'],
+            row['low_stock_count'],
+            f"{row['on_hand']:.2f}",
+            f"{row['shortfall']:.2f}",
+            f"{row['daily_usage']:.2f}",
+            f"{row['days_of_cover']:.1f}" if row['days_of_cover'] is not None else '',
+            f"{row['suggested_order']:.2f}",
+            f"{item.unit_price:.2f}",
+            f"{row['estimated_cost']:.2f}",
+            item.purchase_link or ''
+        ])
+    
+    return send_file(
+        io.BytesIO(output.getvalue().encode()),
+        mimetype='text/csv',
+        as_attachment=True,
+        download_name=f'reorder_report_{datetime.utcnow().strftime("%Y%m%d")}.csv'
+    )
+
 @bp.route('/barcode-search')
 @login_required
 def barcode_search():
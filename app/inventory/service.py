@@ -0,0 +1,299 @@
+from datetime import datetime, timedelta
+from app import db
+from app.models import (InventoryItem, InventoryCatalogItem, InventoryTransaction,
+                        Property, TransactionType)
+from app.utils.error_handling import BusinessLogicError, ValidationError
+from sqlalchemy import case, func, insert, select, update
+from sqlalchemy.orm import joinedload
+
+REORDER_LOOKBACK_DAYS = 30
+REORDER_HORIZON_DAYS = 14
+
+
+def low_stock_query(property_id):
+    """Items at or below their reorder threshold for one property"""
+    return InventoryItem.query.options(
+        joinedload(InventoryItem.catalog_item)
+    ).filter(
+        InventoryItem.property_id == property_id,
+        InventoryItem.low_stock_condition()
+    )
+
+
+def reorder_scope_for(user):
+    """Property IDs the user may include in a reorder report, or ``None`` for all"""
+    if user.has_admin_role:
+        return None
+    return select(Property.id).where(Property.owner_id == user.id)
+
+
+def get_reorder_report(property_scope=None, lookback_days=REORDER_LOOKBACK_DAYS,
+                       horizon_days=REORDER_HORIZON_DAYS):
+    """
+    Aggregate stock levels per catalog item across a set of properties.
+
+    ``property_scope`` is an iterable or sub-select of property IDs, or
+    ``None`` for the whole portfolio. Consumption is the total USAGE
+    recorded over the last ``lookback_days``; it is projected forward over
+    ``horizon_days`` to suggest an order quantity that keeps every property
+    at its threshold. Only items that are low somewhere or projected to
+    run short are returned, largest suggested order first.
+    """
+    since = datetime.utcnow() - timedelta(days=lookback_days)
+    low = InventoryItem.low_stock_condition()
+
+    usage = select(
+        InventoryItem.catalog_item_id.label('catalog_item_id'),
+        func.sum(InventoryTransaction.quantity).label('used')
+    ).join(
+        InventoryItem, InventoryTransaction.item_id == InventoryItem.id
+    ).where(
+        InventoryTransaction.transaction_type == TransactionType.USAGE,
+        InventoryTransaction.created_at >= since
+    )
+    if property_scope is not None:
+        usage = usage.where(InventoryItem.property_id.in_(property_scope))
+    usage = usage.group_by(InventoryItem.catalog_item_id).subquery()
+
+    query = db.session.query(
+        InventoryCatalogItem,
+        func.count(func.distinct(InventoryItem.property_id)).label('property_count'),
+        func.sum(case((low, 1), else_=0)).label('low_stock_count'),
+        func.coalesce(func.sum(InventoryItem.current_quantity), 0).label('on_hand'),
+        func.coalesce(func.sum(InventoryItem.reorder_threshold), 0).label('threshold'),
+        func.coalesce(func.sum(case(
+            (low, InventoryItem.reorder_threshold - InventoryItem.current_quantity), else_=0
+        )), 0).label('shortfall'),
+        func.coalesce(func.max(usage.c.used), 0).label('used')
+    ).join(
+        InventoryItem, InventoryItem.catalog_item_id == InventoryCatalogItem.id
+    ).outerjoin(
+        usage, usage.c.catalog_item_id == InventoryCatalogItem.id
+    )
+    if property_scope is not None:
+        query = query.filter(InventoryItem.property_id.in_(property_scope))
+    rows = query.group_by(InventoryCatalogItem.id).all()
+
+    report = []
+    for catalog_item, property_count, low_stock_count, on_hand, threshold, shortfall, used in rows:
+        daily_usage = float(used) / lookback_days if lookback_days else 0.0
+        projected_usage = daily_usage * horizon_days
+        suggested_order = max(float(shortfall), projected_usage + float(threshold) - float(on_hand), 0.0)
+        if not low_stock_count and suggested_order <= 0:
+            continue
+        report.append({
+            'catalog_item': catalog_item,
+            'property_count': property_count,
+            'low_stock_count': low_stock_count or 0,
+            'on_hand': float(on_hand),
+            'shortfall': float(shortfall),
+            'daily_usage': daily_usage,
+            'days_of_cover': float(on_hand) / daily_usage if daily_usage else None,
+            'suggested_order': suggested_order,
+            'estimated_cost': suggested_order * (catalog_item.unit_price or 0),
+        })
+
+    report.sort(key=lambda row: (-row['suggested_order'], row['catalog_item'].name))
+    return report
+
+
+# Signed effect of each transaction type on an item's quantity
+_QUANTITY_SIGN = {
+    TransactionType.RESTOCK: 1,
+    TransactionType.TRANSFER_IN: 1,
+    TransactionType.USAGE: -1,
+    TransactionType.TRANSFER_OUT: -1,
+}
+
+
+def _normalize_line(line):
+    try:
+        transaction_type = TransactionType(line['transaction_type'])
+        item_id = int(line['item_id'])
+        quantity = float(line['quantity'])
+    except (KeyError, TypeError, ValueError):
+        raise ValidationError('Each line needs an item_id, a transaction_type and a quantity')
+
+    if quantity < 0 or (quantity == 0 and transaction_type != TransactionType.ADJUSTMENT):
+        raise ValidationError(f'Invalid quantity {quantity} for item {item_id}', field='quantity')
+    if transaction_type == TransactionType.TRANSFER_IN:
+        raise ValidationError('Record transfers as transfer_out lines with a destination_property_id')
+
+    destination_property_id = line.get('destination_property_id')
+    if transaction_type == TransactionType.TRANSFER_OUT and not destination_property_id:
+        raise ValidationError(f'Transfer of item {item_id} has no destination_property_id')
+
+    return {
+        'item_id': item_id,
+        'transaction_type': transaction_type,
+        'quantity': quantity,
+        'destination_property_id': int(destination_property_id) if destination_property_id else None,
+        'notes': line.get('notes'),
+    }
+
+
+def _destination_items(source_items, transfers):
+    """Find or create the destination item for each (item_id, destination) transfer pair"""
+    wanted = {(source_items[line['item_id']].catalog_item_id, line['destination_property_id'])
+              for line in transfers}
+    existing = InventoryItem.query.filter(
+        InventoryItem.catalog_item_id.in_({catalog_id for catalog_id, _ in wanted}),
+        InventoryItem.property_id.in_({property_id for _, property_id in wanted})
+    ).order_by(InventoryItem.id).all()
+
+    destinations = {}
+    for item in existing:
+        destinations.setdefault((item.catalog_item_id, item.property_id), item.id)
+
+    missing = []
+    for line in transfers:
+        source = source_items[line['item_id']]
+        key = (source.catalog_item_id, line['destination_property_id'])
+        if key not in destinations and key not in {(m.catalog_item_id, m.property_id) for m in missing}:
+            missing.append(InventoryItem(
+                property_id=line['destination_property_id'],
+                catalog_item_id=source.catalog_item_id,
+                current_quantity=0,
+                storage_location=source.storage_location,
+                reorder_threshold=source.reorder_threshold
+            ))
+    if missing:
+        db.session.add_all(missing)
+        db.session.flush()
+        for item in missing:
+            destinations[(item.catalog_item_id, item.property_id)] = item.id
+    return destinations
+
+
+def apply_inventory_movements(lines, user_id=None, notes=None, commit=True):
+    """
+    Apply a batch of inventory movements in one database transaction.
+
+    Each line is a dict with ``item_id``, ``transaction_type`` (a
+    TransactionType or its value), ``quantity`` and optionally ``notes``.
+    ``transfer_out`` lines also need ``destination_property_id``; the
+    matching ``transfer_in`` is generated, creating the destination item if
+    the property does not stock it yet. ``adjustment`` lines set the
+    quantity to an absolute value.
+
+    The affected items are locked in ID order (``SELECT ... FOR UPDATE``
+    on PostgreSQL) and updated with a single guarded increment, so
+    concurrent batches never lose updates. A batch that would take any item
+    below zero is rejected as a whole with BusinessLogicError. The
+    InventoryTransaction rows are bulk inserted. Returns a dict mapping
+    item ID to its new quantity.
+    """
+    lines = [_normalize_line(line) for line in lines]
+    if not lines:
+        raise ValidationError('No inventory movements given')
+
+    try:
+        quantities = _apply_movements(lines, user_id, notes)
+        if commit:
+            db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    return quantities
+
+
+def _apply_movements(lines, user_id, notes):
+    source_ids = sorted({line['item_id'] for line in lines})
+    source_items = {item.id: item for item in InventoryItem.query.filter(InventoryItem.id.in_(source_ids))}
+    missing_ids = set(source_ids) - set(source_items)
+    if missing_ids:
+        raise ValidationError(f'Unknown inventory items: {sorted(missing_ids)}')
+
+    # Expand transfers into an outgoing and an incoming movement
+    transfers = [line for line in lines if line['transaction_type'] == TransactionType.TRANSFER_OUT]
+    for line in transfers:
+        if line['destination_property_id'] == source_items[line['item_id']].property_id:
+            raise ValidationError(f'Item {line["item_id"]} cannot be transferred to its own property')
+    destinations = _destination_items(source_items, transfers) if transfers else {}
+    movements = []
+    for line in lines:
+        movements.append(line)
+        if line['transaction_type'] == TransactionType.TRANSFER_OUT:
+            source = source_items[line['item_id']]
+            movements.append(dict(
+                line,
+                item_id=destinations[(source.catalog_item_id, line['destination_property_id'])],
+                transaction_type=TransactionType.TRANSFER_IN,
+                source_property_id=source.property_id
+            ))
+            line['source_property_id'] = source.property_id
+
+    # Lock every affected row in a stable order before reading quantities
+    item_ids = sorted({movement['item_id'] for movement in movements})
+    locked = db.session.execute(
+        select(InventoryItem.id, InventoryItem.current_quantity)
+        .where(InventoryItem.id.in_(item_ids))
+        .order_by(InventoryItem.id)
+        .with_for_update()
+    ).all()
+    quantities = {item_id: quantity or 0 for item_id, quantity in locked}
+
+    # Walk the movements in order to build the audit trail and net effect per item
+    deltas = {}
+    absolutes = {}
+    now = datetime.utcnow()
+    transaction_rows = []
+    for movement in movements:
+        item_id = movement['item_id']
+        previous_quantity = quantities[item_id]
+        if movement['transaction_type'] == TransactionType.ADJUSTMENT:
+            new_quantity = movement['quantity']
+            absolutes[item_id] = new_quantity
+            deltas[item_id] = 0
+        else:
+            change = _QUANTITY_SIGN[movement['transaction_type']] * movement['quantity']
+            new_quantity = previous_quantity + change
+            deltas[item_id] = deltas.get(item_id, 0) + change
+        if new_quantity < 0:
+            raise BusinessLogicError(
+                f'Not enough stock for item {item_id}: {previous_quantity:g} available, '
+                f'{movement["quantity"]:g} requested',
+                details={'item_id': item_id, 'available': previous_quantity}
+            )
+        quantities[item_id] = new_quantity
+        transaction_rows.append({
+            'item_id': item_id,
+            'transaction_type': movement['transaction_type'],
+            'quantity': movement['quantity'],
+            'previous_quantity': previous_quantity,
+            'new_quantity': new_quantity,
+            'user_id': user_id,
+            'source_property_id': movement.get('source_property_id'),
+            'destination_property_id': movement['destination_property_id'],
+            'notes': movement['notes'] or notes,
+            'created_at': now,
+            'updated_at': now,
+        })
+
+    # One guarded UPDATE: adjusted items take their absolute value plus any
+    # later movements, everything else is incremented in place
+    delta_by_id = case(deltas, value=InventoryItem.id, else_=0)
+    new_value = InventoryItem.current_quantity + delta_by_id
+    if absolutes:
+        new_value = case(
+            (InventoryItem.id.in_(list(absolutes)),
+             case(absolutes, value=InventoryItem.id) + delta_by_id),
+            else_=new_value
+        )
+    result = db.session.execute(
+        update(InventoryItem)
+        .where(InventoryItem.id.in_(item_ids), new_value >= 0)
+        .values(current_quantity=new_value, updated_at=now)
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount != len(item_ids):
+        raise BusinessLogicError('Not enough stock to apply these movements; nothing was changed')
+
+    db.session.execute(insert(InventoryTransaction.__table__), transaction_rows)
+
+    # The UPDATE bypassed the identity map, so refresh any loaded items
+    for item in source_items.values():
+        db.session.expire(item, ['current_quantity', 'updated_at'])
+
+    return quantities
@@ -7,8 +7,9 @@ from app.invoicing.forms import (
     InvoiceCommentForm, PaymentForm, ReportFilterForm
 )
 from app.models import User, Property, Task, CleaningSession, ServiceType, UserRoles, TaskAssignment
-from app.models_modules.invoicing import TaskPrice, Invoice, InvoiceItem, PricingModel, InvoiceStatus
+from app.models_modules.invoicing import TaskPrice, Invoice, InvoiceBatch, InvoiceItem, PricingModel, InvoiceStatus
 from app.auth.decorators import property_owner_required, admin_required, invoice_access_required
+from app.invoicing.service import generate_invoices, start_invoice_batch
 from datetime import datetime, timedelta, date
 from sqlalchemy import or_, and_, func, extract
 from functools import wraps
@@ -653,93 +654,8 @@ def generate_from_tasks():
             flash('You do not have permission to create invoices for this property.', 'danger')
             return redirect(url_for('invoicing.invoices'))
         
-        # Create new invoice
-        invoice = Invoice(
-            invoice_number=Invoice.generate_invoice_number(),
-            title=f"Invoice for {property.name} - {date_from.strftime('%b %d')} to {date_to.strftime('%b %d, %Y')}",
-            description=f"Services performed at {property.name} from {date_from.strftime('%b %d')} to {date_to.strftime('%b %d, %Y')}",
-            property_id=property.id,
-            date_from=date_from,
-            date_to=date_to,
-            creator_id=current_user.id,
-            status=InvoiceStatus.DRAFT,
-            due_date=(datetime.utcnow() + timedelta(days=30)).date()  # Due in 30 days
-        )
-        
-        db.session.add(invoice)
-        db.session.flush()  # Get the invoice ID without committing
-        
-        # Get completed tasks for this property within the date range
-        tasks = Task.query.join(
-            'properties'
-        ).filter(
-            Task.properties.any(property_id=property.id),
-            Task.status == 'completed',
-            Task.completed_at >= date_from,
-            Task.completed_at <= date_to
-        ).all()
-        
-        # Add tasks to invoice
-        for task in tasks:
-            # Try to find a price for this task's service type
-            service_type = None
-            for assignment in task.assignments:
-                if assignment.service_type:
-                    service_type = assignment.service_type
-                    break
-            
-            if not service_type:
-                # Skip tasks without a service type
-                continue
-            
-            # Look for a price specific to this property first, then fall back to global price
-            price = TaskPrice.query.filter_by(
-                service_type=service_type,
-                property_id=property.id
-            ).first()
-            
-            if not price:
-                price = TaskPrice.query.filter_by(
-                    service_type=service_type,
-                    property_id=None
-                ).first()
-            
-            if not price:
-                # Skip tasks without a price
-                continue
-            
-            # Calculate price based on pricing model
-            amount = 0
-            if price.pricing_model == PricingModel.FIXED:
-                amount = price.fixed_price
-            elif price.pricing_model == PricingModel.HOURLY:
-                # Look for cleaning sessions associated with this task
-                cleaning_session = CleaningSession.query.filter_by(
-                    task_id=task.id
-                ).filter(CleaningSession.end_time.isnot(None)).first()
-                
-                if cleaning_session and cleaning_session.duration_minutes:
-                    amount = price.calculate_price(cleaning_session.duration_minutes)
-                else:
-                    # Skip tasks without a duration
-                    continue
-            
-            # Create invoice item
-            item = InvoiceItem(
-                invoice_id=invoice.id,
-                description=f"{service_type.name.replace('_', ' ').title()}: {task.title}",
-                quantity=1,
-                unit_price=amount,
-                amount=amount,
-                task_id=task.id,
-                service_type=service_type
-            )
-            
-            db.session.add(item)
-        
-        # Calculate invoice totals
-        invoice.calculate_totals()
-        
+        # Create the invoice from a preloaded price map and one task query
+        invoice = generate_invoices([property], date_from, date_to, current_user.id)[0]
         db.session.commit()
         
         flash('Invoice generated successfully!', 'success')
@@ -756,6 +672,58 @@ def generate_from_tasks():
                           title='Generate Invoice from Tasks', 
                           properties=properties)
 
+def _batch_property_ids():
+    """Properties the current user may batch-invoice, or ``None`` for all"""
+    if current_user.is_admin:
+        return None
+    return [property_id for (property_id,) in
+            db.session.query(Property.id).filter(Property.owner_id == current_user.id)]
+
+@bp.route('/invoices/generate_batch', methods=['GET', 'POST'])
+@invoice_access_required
+def generate_batch():
+    """Generate invoices for all properties for a billing period in one job"""
+    if request.method == 'POST':
+        try:
+            date_from = datetime.strptime(request.form.get('date_from', ''), '%Y-%m-%d').date()
+            date_to = datetime.strptime(request.form.get('date_to', ''), '%Y-%m-%d').date()
+        except ValueError:
+            flash('Invalid date format.', 'danger')
+            return redirect(url_for('invoicing.generate_batch'))
+        
+        if date_from > date_to:
+            flash('The start date must be before the end date.', 'danger')
+            return redirect(url_for('invoicing.generate_batch'))
+        
+        job = start_invoice_batch(date_from, date_to, current_user.id, property_ids=_batch_property_ids())
+        return redirect(url_for('invoicing.generate_batch', job_id=job.id))
+    
+    job = None
+    job_id = request.args.get('job_id', type=int)
+    if job_id is not None:
+        job = _visible_batch(job_id)
+        if job is None:
+            abort(404)
+    return render_template('invoicing/generate_batch.html',
+                          title='Generate Invoices for a Billing Period',
+                          job=job)
+
+def _visible_batch(job_id):
+    """The batch invoice run, if the current user started it or is an admin"""
+    job = db.session.get(InvoiceBatch, job_id)
+    if not job or (job.creator_id != current_user.id and not current_user.is_admin):
+        return None
+    return job
+
+@bp.route('/invoices/generate_batch/<int:job_id>/status')
+@invoice_access_required
+def generate_batch_status(job_id):
+    """Progress of a batch invoice job"""
+    job = _visible_batch(job_id)
+    if not job:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job.to_dict())
+
 @bp.route('/invoices/add_task/<int:invoice_id>/<int:task_id>', methods=['GET'])
 @invoice_access_required
 def add_task_to_invoice(invoice_id, task_id):
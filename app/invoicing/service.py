@@ -0,0 +1,281 @@
+import threading
+from datetime import datetime, timedelta
+from flask import current_app
+from app import db
+from app.jobs.runner import enqueue_job
+from app.models import Property, Task, TaskAssignment, TaskProperty, TaskStatus, CleaningSession
+from app.models_modules.invoicing import TaskPrice, Invoice, InvoiceBatch, InvoiceItem, PricingModel, InvoiceStatus
+from sqlalchemy import and_, func, insert, or_, select, update
+
+# A batch still running after this long was interrupted and is run again
+INVOICE_BATCH_TIMEOUT = 30 * 60
+
+
+def load_price_map(property_ids):
+    """Load every price that can apply to the given properties in one query.
+
+    Returns a dict keyed by ``(service_type, property_id)``, with global
+    prices stored under ``property_id=None``.
+    """
+    prices = TaskPrice.query.filter(
+        or_(TaskPrice.property_id.in_(list(property_ids)), TaskPrice.property_id.is_(None))
+    ).order_by(TaskPrice.id).all()
+
+    price_map = {}
+    for price in prices:
+        price_map.setdefault((price.service_type, price.property_id), price)
+    return price_map
+
+
+def resolve_price(price_map, service_type, property_id):
+    """Property-specific price first, then the global price for the service type"""
+    return price_map.get((service_type, property_id)) or price_map.get((service_type, None))
+
+
+def billable_task_rows(property_ids, date_from, date_to):
+    """Completed, not yet invoiced tasks for the properties in one joined query.
+
+    Each row carries the task, the property it is billed to, the service
+    type of its first typed assignment and the duration of its first
+    finished cleaning session. ``date_to`` is inclusive.
+    """
+    first_assignment = select(
+        TaskAssignment.task_id.label('task_id'),
+        TaskAssignment.service_type.label('service_type'),
+        func.row_number().over(
+            partition_by=TaskAssignment.task_id, order_by=TaskAssignment.id
+        ).label('position')
+    ).where(TaskAssignment.service_type.isnot(None)).subquery()
+
+    first_session = select(
+        CleaningSession.task_id.label('task_id'),
+        CleaningSession.duration_minutes.label('duration_minutes'),
+        func.row_number().over(
+            partition_by=CleaningSession.task_id, order_by=CleaningSession.id
+        ).label('position')
+    ).where(
+        CleaningSession.task_id.isnot(None), CleaningSession.end_time.isnot(None)
+    ).subquery()
+
+    already_invoiced = select(InvoiceItem.task_id).join(
+        Invoice, InvoiceItem.invoice_id == Invoice.id
+    ).where(
+        InvoiceItem.task_id.isnot(None),
+        Invoice.property_id == TaskProperty.property_id,
+        Invoice.status != InvoiceStatus.CANCELLED.value
+    )
+
+    return db.session.query(
+        Task.id, Task.title, TaskProperty.property_id,
+        first_assignment.c.service_type, first_session.c.duration_minutes
+    ).join(
+        TaskProperty, TaskProperty.task_id == Task.id
+    ).outerjoin(
+        first_assignment, and_(first_assignment.c.task_id == Task.id, first_assignment.c.position == 1)
+    ).outerjoin(
+        first_session, and_(first_session.c.task_id == Task.id, first_session.c.position == 1)
+    ).filter(
+        TaskProperty.property_id.in_(list(property_ids)),
+        Task.status == TaskStatus.COMPLETED,
+        Task.completed_at >= date_from,
+        Task.completed_at < date_to + timedelta(days=1),
+        Task.id.notin_(already_invoiced)
+    ).order_by(TaskProperty.property_id, Task.completed_at, Task.id).all()
+
+
+def price_task_row(row, price_map):
+    """Build the invoice item values for a task row, or ``None`` if it cannot be priced"""
+    if not row.service_type:
+        # Skip tasks without a service type
+        return None
+
+    price = resolve_price(price_map, row.service_type, row.property_id)
+    if not price:
+        # Skip tasks without a price
+        return None
+
+    if price.pricing_model == PricingModel.HOURLY:
+        if not row.duration_minutes:
+            # Skip tasks without a duration
+            return None
+        amount = price.calculate_price(row.duration_minutes)
+    elif price.pricing_model == PricingModel.FIXED:
+        amount = price.fixed_price
+    else:
+        amount = 0
+
+    return {
+        'description': f"{row.service_type.name.replace('_', ' ').title()}: {row.title}",
+        'quantity': 1,
+        'unit_price': amount,
+        'amount': amount,
+        'task_id': row.id,
+        'cleaning_session_id': None,
+        'service_type': row.service_type,
+    }
+
+
+def _new_invoice(property, date_from, date_to, creator_id, invoice_number, items):
+    invoice = Invoice(
+        invoice_number=invoice_number,
+        title=f"Invoice for {property.name} - {date_from.strftime('%b %d')} to {date_to.strftime('%b %d, %Y')}",
+        description=f"Services performed at {property.name} from {date_from.strftime('%b %d')} to {date_to.strftime('%b %d, %Y')}",
+        property_id=property.id,
+        date_from=date_from,
+        date_to=date_to,
+        creator_id=creator_id,
+        status=InvoiceStatus.DRAFT.value,
+        due_date=(datetime.utcnow() + timedelta(days=30)).date()  # Due in 30 days
+    )
+    # Totals are computed from the pending items rather than re-querying them
+    invoice.subtotal = sum(item['amount'] or 0 for item in items)
+    invoice.tax_amount = invoice.subtotal * (invoice.tax_rate or 0)
+    invoice.total = invoice.subtotal + invoice.tax_amount
+    return invoice
+
+
+def generate_invoices(properties, date_from, date_to, creator_id, skip_empty=False):
+    """Create draft invoices for the properties from their completed tasks.
+
+    Prices, tasks and durations are loaded up front, so the query count
+    does not grow with the number of tasks, and the items are written with
+    one bulk insert. Nothing is committed. Returns the new invoices in the
+    order of ``properties``.
+    """
+    property_ids = [property.id for property in properties]
+    price_map = load_price_map(property_ids)
+
+    items_by_property = {property_id: [] for property_id in property_ids}
+    for row in billable_task_rows(property_ids, date_from, date_to):
+        item = price_task_row(row, price_map)
+        if item is not None:
+            items_by_property[row.property_id].append(item)
+
+    billable = [p for p in properties if items_by_property[p.id] or not skip_empty]
+    numbers = Invoice.generate_invoice_numbers(len(billable)) if billable else []
+
+    invoices = []
+    for property, invoice_number in zip(billable, numbers):
+        items = items_by_property[property.id]
+        invoice = _new_invoice(property, date_from, date_to, creator_id, invoice_number, items)
+        db.session.add(invoice)
+        invoices.append((invoice, items))
+    db.session.flush()
+
+    rows = [dict(item, invoice_id=invoice.id, created_at=datetime.utcnow())
+            for invoice, items in invoices for item in items]
+    if rows:
+        db.session.execute(insert(InvoiceItem.__table__), rows)
+
+    return [invoice for invoice, _ in invoices]
+
+
+def generate_invoices_for_period(date_from, date_to, creator_id, property_ids=None,
+                                 progress=None, chunk_size=50):
+    """Generate invoices for every property with billable work in a period.
+
+    Properties are processed ``chunk_size`` at a time, each chunk in its
+    own transaction, and ``progress(done, total)`` is called after each
+    one. Properties without billable tasks get no invoice. Returns the
+    IDs of the created invoices.
+    """
+    query = Property.query
+    if property_ids is not None:
+        query = query.filter(Property.id.in_(list(property_ids)))
+    properties = query.order_by(Property.id).all()
+
+    total = len(properties)
+    invoice_ids = []
+    if progress:
+        progress(0, total)
+
+    for start in range(0, total, chunk_size):
+        chunk = properties[start:start + chunk_size]
+        invoices = generate_invoices(chunk, date_from, date_to, creator_id, skip_empty=True)
+        db.session.commit()
+        invoice_ids.extend(invoice.id for invoice in invoices)
+        if progress:
+            progress(start + len(chunk), total)
+
+    return invoice_ids
+
+
+def start_invoice_batch(date_from, date_to, creator_id, property_ids=None):
+    """Store a batch invoice run and hand it to the invoice_batches job.
+
+    Without the job runner nothing would pick the batch up, so it runs on
+    a background thread of this process instead. Progress is stored on
+    the InvoiceBatch row either way.
+    """
+    batch = InvoiceBatch(date_from=date_from, date_to=date_to, creator_id=creator_id)
+    batch.property_ids = property_ids
+    db.session.add(batch)
+    db.session.commit()
+
+    if current_app.config.get('JOB_RUNNER_ENABLED'):
+        enqueue_job('invoice_batches')
+    else:
+        app = current_app._get_current_object()
+        threading.Thread(target=_run_pending_invoice_batches_in, args=(app,), daemon=True).start()
+    return batch
+
+
+def _run_pending_invoice_batches_in(app):
+    with app.app_context():
+        try:
+            run_pending_invoice_batches()
+        finally:
+            db.session.remove()
+
+
+def run_pending_invoice_batches():
+    """Run waiting batches, and batches whose run was interrupted; returns how many ran.
+
+    Each batch is claimed with a guarded UPDATE, so it runs once however
+    many workers look at it. Rerunning an interrupted batch is safe
+    because tasks already on an invoice are not billed again.
+    """
+    def runnable():
+        stale = datetime.utcnow() - timedelta(seconds=INVOICE_BATCH_TIMEOUT)
+        return or_(InvoiceBatch.status == 'pending',
+                   and_(InvoiceBatch.status == 'running', InvoiceBatch.started_at < stale))
+
+    batch_ids = [batch_id for (batch_id,) in
+                 db.session.query(InvoiceBatch.id).filter(runnable()).order_by(InvoiceBatch.id)]
+    db.session.commit()
+
+    ran = 0
+    for batch_id in batch_ids:
+        result = db.session.execute(
+            update(InvoiceBatch)
+            .where(InvoiceBatch.id == batch_id, runnable())
+            .values(status='running', started_at=datetime.utcnow(), error=None)
+            .execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+        if result.rowcount != 1:
+            continue
+        run_invoice_batch(db.session.get(InvoiceBatch, batch_id))
+        ran += 1
+    return ran
+
+
+def run_invoice_batch(batch):
+    """Generate a claimed batch's invoices, storing its progress after every chunk"""
+    def progress(done, total):
+        batch.done, batch.total = done, total
+        db.session.commit()
+
+    try:
+        batch.invoice_ids = generate_invoices_for_period(
+            batch.date_from, batch.date_to, batch.creator_id,
+            property_ids=batch.property_ids, progress=progress
+        )
+        batch.status = 'completed'
+    except Exception as e:
+        db.session.rollback()
+        batch.error = str(e)
+        batch.status = 'failed'
+    batch.finished_at = datetime.utcnow()
+    db.session.commit()
+    return batch
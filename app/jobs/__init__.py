@@ -0,0 +1,6 @@
+"""
+Background jobs: the scheduler/worker and the periodic jobs it runs
+"""
+from app.jobs.runner import (JOB_REGISTRY, JobRunner, job, enqueue_job, init_job_runner,
+                             sync_job_definitions)
+from app.jobs import definitions  # noqa: F401  registers the jobs
@@ -0,0 +1,84 @@
+"""
+Periodic maintenance jobs
+
+Each job runs inside an app context on whichever worker claims it. Jobs
+raise on failure so the runner records it and retries.
+"""
+from datetime import datetime, timedelta
+
+from flask import current_app
+
+from app import db
+from app.jobs.runner import job
+
+HOUR = 60 * 60
+
+
+@job('calendar_sync', interval=HOUR, jitter=5 * 60, singleton=True, max_attempts=2, timeout=30 * 60)
+def calendar_sync():
+    """Pull every property's iCal feed"""
+    # Imported lazily: the module sets up its own log file handler
+    from app.tasks.sync_calendars import sync_all_calendars
+    sync_all_calendars()
+
+
+@job('task_reminders', interval=15 * 60, jitter=60)
+def task_reminders():
+    """Remind assignees of tasks due in the next day"""
+    from app.notifications.service import check_upcoming_tasks
+    check_upcoming_tasks()
+
+
+@job('guest_invitation_cleanup', interval=HOUR, jitter=5 * 60)
+def guest_invitation_cleanup():
+    """Deactivate expired guest invitations"""
+    from app.models import GuestInvitation
+    GuestInvitation.cleanup_expired()
+
+
+@job('recurring_expenses', interval=6 * HOUR, jitter=10 * 60, singleton=True)
+def recurring_expenses():
+    """Draft every recurring expense that has fallen due, catching up on missed periods"""
+    from app.models_modules.financial_tracking import RecurringExpense
+    RecurringExpense.generate_due_expenses()
+
+
+@job('cache_warm', interval=15 * 60, jitter=2 * 60)
+def cache_warm():
+    """Pre-load dashboard data for users active in the last day"""
+    from app import cache
+    from app.models import User
+    from app.utils.cache_service import CacheService
+
+    if cache is None:
+        return
+    user_ids = [user_id for (user_id,) in db.session.query(User.id).filter(
+        User.last_login >= datetime.utcnow() - timedelta(days=1)
+    ).order_by(User.last_login.desc()).limit(50)]
+    for user_id in user_ids:
+        CacheService.warm_cache(user_id)
+
+
+@job('database_backup', interval=6 * HOUR, jitter=10 * 60, singleton=True, timeout=30 * 60)
+def database_backup():
+    """Copy the SQLite database to Cloud Storage when backups are enabled"""
+    if str(current_app.config.get('DATABASE_BACKUP_ENABLED', 'false')).lower() != 'true':
+        return
+    from app.utils.database_persistence import DatabasePersistence
+    if not DatabasePersistence(current_app).periodic_backup():
+        raise RuntimeError('Database backup failed')
+
+
+@job('sms_inbox', interval=15, jitter=5, timeout=5 * 60)
+def sms_inbox():
+    """File incoming SMS, reply to commands the webhook deferred and apply delivery status callbacks"""
+    from app.utils.sms import apply_status_callbacks, process_inbound_sms
+    process_inbound_sms()
+    apply_status_callbacks()
+
+
+@job('invoice_batches', interval=60, jitter=10, timeout=30 * 60)
+def invoice_batches():
+    """Generate the invoices of batch runs started from the invoicing pages"""
+    from app.invoicing.service import run_pending_invoice_batches
+    run_pending_invoice_batches()
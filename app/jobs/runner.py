@@ -0,0 +1,468 @@
+"""
+In-app job scheduler and worker
+
+Jobs register with the ``job`` decorator and are queued in the database.
+Every process polls the queue. The process holding the scheduler lease
+(the leader) queues runs for jobs that are due and recovers runs whose
+worker disappeared, on a heartbeat thread of its own; every process
+claims and executes queued runs.
+
+A claim locks the job's ScheduledJob row, checks the job's running count
+against its concurrency limit and then flips the run from queued to
+running with a guarded UPDATE, so each run executes once and a job never
+exceeds its limit. Singleton jobs are only claimed by the leader.
+"""
+import logging
+import os
+import random
+import socket
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy import func, or_, update
+from sqlalchemy.exc import IntegrityError
+
+from app import db
+from app.models_modules.jobs import ScheduledJob, JobRun, JobRunStatus, SchedulerLease
+
+logger = logging.getLogger('jobs')
+
+LEADER_LEASE_NAME = 'scheduler'
+# Seconds a claimed run may take before its lease expires and it is retried
+DEFAULT_RUN_TIMEOUT = 15 * 60
+# Delay before the first retry; doubles with each further attempt
+DEFAULT_RETRY_DELAY = 60
+# Queued runs considered per claim attempt
+CLAIM_CANDIDATES = 20
+# Runs executed per poll before the worker renews its lease again
+MAX_RUNS_PER_TICK = 10
+
+JOB_REGISTRY = {}
+
+
+class JobDefinition:
+    """Schedule and execution options of a registered job"""
+
+    def __init__(self, name, func, interval, jitter=0, max_concurrency=1, max_attempts=3,
+                 retry_delay=DEFAULT_RETRY_DELAY, timeout=DEFAULT_RUN_TIMEOUT, singleton=False):
+        self.name = name
+        self.func = func
+        self.interval = interval
+        self.jitter = jitter
+        self.max_concurrency = max_concurrency
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.timeout = timeout
+        self.singleton = singleton
+
+    def next_run_after(self, now):
+        """One interval from ``now`` plus a random share of the jitter, so instances drift apart"""
+        return now + timedelta(seconds=self.interval + random.uniform(0, self.jitter))
+
+    def retry_after(self, attempt, now):
+        """Exponential backoff after failed ``attempt``, randomized between half and the full delay"""
+        delay = self.retry_delay * 2 ** (attempt - 1)
+        return now + timedelta(seconds=random.uniform(delay / 2, delay))
+
+
+def job(name, interval, **options):
+    """Register the decorated function as a periodic job running every ``interval`` seconds"""
+    def decorator(func):
+        JOB_REGISTRY[name] = JobDefinition(name, func, interval, **options)
+        return func
+    return decorator
+
+
+def make_worker_id():
+    """Identify this process in leases and claims"""
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+def sync_job_definitions(now=None):
+    """
+    Create or update a ScheduledJob row for every registered job.
+
+    Schedule options come from the registry; the enabled flag and run
+    statistics are left alone. First runs are spread over the job's jitter.
+    """
+    now = now or datetime.utcnow()
+    existing = {row.name: row for row in ScheduledJob.query.all()}
+    for definition in JOB_REGISTRY.values():
+        row = existing.get(definition.name)
+        if row is None:
+            row = ScheduledJob(name=definition.name, enabled=True, run_count=0, failure_count=0,
+                               consecutive_failures=0,
+                               next_run_at=now + timedelta(seconds=random.uniform(0, definition.jitter)))
+            db.session.add(row)
+        row.interval_seconds = definition.interval
+        row.jitter_seconds = definition.jitter
+        row.max_concurrency = definition.max_concurrency
+        row.max_attempts = definition.max_attempts
+        row.singleton = definition.singleton
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # Another instance registered the same jobs first
+        db.session.rollback()
+
+
+def acquire_leadership(worker_id, lease_seconds, now=None):
+    """Take or renew the scheduler lease; returns True while this worker is the leader"""
+    now = now or datetime.utcnow()
+    expires_at = now + timedelta(seconds=lease_seconds)
+    result = db.session.execute(
+        update(SchedulerLease)
+        .where(SchedulerLease.name == LEADER_LEASE_NAME,
+               or_(SchedulerLease.holder == worker_id, SchedulerLease.expires_at < now))
+        .values(holder=worker_id, expires_at=expires_at)
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount == 1:
+        db.session.commit()
+        return True
+
+    if db.session.get(SchedulerLease, LEADER_LEASE_NAME) is not None:
+        db.session.commit()
+        return False
+
+    try:
+        db.session.add(SchedulerLease(name=LEADER_LEASE_NAME, holder=worker_id, expires_at=expires_at))
+        db.session.commit()
+        return True
+    except IntegrityError:
+        db.session.rollback()
+        return False
+
+
+def release_leadership(worker_id):
+    """Give up the lease so another instance can take over without waiting for it to expire"""
+    db.session.execute(
+        update(SchedulerLease)
+        .where(SchedulerLease.name == LEADER_LEASE_NAME, SchedulerLease.holder == worker_id)
+        .values(expires_at=datetime.utcnow())
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+
+
+def enqueue_due_jobs(now=None):
+    """Leader only: queue a run for each enabled job whose next run time has passed"""
+    now = now or datetime.utcnow()
+    due = ScheduledJob.query.filter(
+        ScheduledJob.enabled.is_(True),
+        ScheduledJob.next_run_at <= now
+    ).with_for_update(skip_locked=True).all()
+    if not due:
+        db.session.commit()
+        return 0
+
+    # A job that still has a queued run is rescheduled without piling up another
+    already_queued = {name for (name,) in db.session.query(JobRun.job_name).filter(
+        JobRun.job_name.in_([row.name for row in due]),
+        JobRun.status == JobRunStatus.QUEUED.value
+    ).distinct()}
+
+    queued = 0
+    for row in due:
+        definition = JOB_REGISTRY.get(row.name)
+        if definition is None:
+            # Removed or renamed, or only known to a newer release; look again an interval later
+            logger.warning(f"Scheduled job {row.name} is not registered here; not queueing it")
+            row.next_run_at = now + timedelta(seconds=row.interval_seconds)
+            continue
+        if row.name not in already_queued:
+            db.session.add(JobRun(job_name=row.name, status=JobRunStatus.QUEUED.value, attempt=1, run_after=now))
+            queued += 1
+        row.next_run_at = definition.next_run_after(now)
+    db.session.commit()
+    return queued
+
+
+def enqueue_job(name, now=None):
+    """Queue a run of ``name`` to start as soon as a worker is free"""
+    if name not in JOB_REGISTRY:
+        raise KeyError(f"Unknown job: {name}")
+    now = now or datetime.utcnow()
+    run = JobRun(job_name=name, status=JobRunStatus.QUEUED.value, attempt=1, run_after=now)
+    db.session.add(run)
+    db.session.commit()
+    return run
+
+
+def claim_run(run_id, job_name, worker_id, now=None):
+    """
+    Move one queued run to running for ``worker_id``.
+
+    Returns the claimed JobRun, or None if the job is at its concurrency
+    limit or another worker claimed the run first.
+    """
+    definition = JOB_REGISTRY[job_name]
+    now = now or datetime.utcnow()
+
+    # Serialize claims for this job so the running count below stays accurate
+    db.session.query(ScheduledJob.id).filter(ScheduledJob.name == job_name).with_for_update().first()
+    running = db.session.query(func.count(JobRun.id)).filter(
+        JobRun.job_name == job_name,
+        JobRun.status == JobRunStatus.RUNNING.value
+    ).scalar()
+    if running >= definition.max_concurrency:
+        db.session.rollback()
+        return None
+
+    result = db.session.execute(
+        update(JobRun)
+        .where(JobRun.id == run_id, JobRun.status == JobRunStatus.QUEUED.value)
+        .values(status=JobRunStatus.RUNNING.value, worker_id=worker_id, claimed_at=now,
+                lease_expires_at=now + timedelta(seconds=definition.timeout))
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount != 1:
+        db.session.rollback()
+        return None
+    db.session.commit()
+    return db.session.get(JobRun, run_id)
+
+
+def claim_next_run(worker_id, is_leader, now=None):
+    """Claim the oldest runnable queued run; singleton jobs are left to the leader"""
+    now = now or datetime.utcnow()
+    names = [name for name, definition in JOB_REGISTRY.items() if is_leader or not definition.singleton]
+    if not names:
+        return None
+
+    candidates = db.session.query(JobRun.id, JobRun.job_name).filter(
+        JobRun.status == JobRunStatus.QUEUED.value,
+        JobRun.run_after <= now,
+        JobRun.job_name.in_(names)
+    ).order_by(JobRun.run_after, JobRun.id).limit(CLAIM_CANDIDATES).all()
+    db.session.commit()
+
+    saturated = set()
+    for run_id, job_name in candidates:
+        if job_name in saturated:
+            continue
+        run = claim_run(run_id, job_name, worker_id, now)
+        if run is not None:
+            return run
+        saturated.add(job_name)
+    return None
+
+
+def finish_run(run, error, duration_ms, now=None, worker_id=None):
+    """
+    Record the outcome of a running run and roll it into the job statistics.
+
+    With ``worker_id`` only that worker's claim is finished; without it
+    only an expired lease is. A failed run is re-queued with backoff until
+    the job's attempts are used up. Returns False if the run had already
+    been finished elsewhere.
+    """
+    now = now or datetime.utcnow()
+    run_id, job_name, attempt, claimed_at = run.id, run.job_name, run.attempt, run.claimed_at
+    failed = error is not None
+    status = JobRunStatus.FAILED.value if failed else JobRunStatus.SUCCEEDED.value
+
+    owner = JobRun.worker_id == worker_id if worker_id else JobRun.lease_expires_at < now
+    result = db.session.execute(
+        update(JobRun)
+        .where(JobRun.id == run_id, JobRun.status == JobRunStatus.RUNNING.value, owner)
+        .values(status=status, finished_at=now, duration_ms=duration_ms, error=error)
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount != 1:
+        db.session.rollback()
+        return False
+
+    db.session.execute(
+        update(ScheduledJob)
+        .where(ScheduledJob.name == job_name)
+        .values(last_started_at=claimed_at, last_finished_at=now, last_duration_ms=duration_ms,
+                last_status=status, last_error=error,
+                run_count=ScheduledJob.run_count + 1,
+                failure_count=ScheduledJob.failure_count + (1 if failed else 0),
+                consecutive_failures=ScheduledJob.consecutive_failures + 1 if failed else 0)
+        .execution_options(synchronize_session=False)
+    )
+
+    definition = JOB_REGISTRY.get(job_name)
+    if failed and definition and attempt < definition.max_attempts:
+        db.session.add(JobRun(job_name=job_name, status=JobRunStatus.QUEUED.value, attempt=attempt + 1,
+                              run_after=definition.retry_after(attempt, now)))
+    db.session.commit()
+    return True
+
+
+def recover_expired_runs(now=None):
+    """Leader only: fail runs whose worker let the lease lapse, queueing retries where allowed"""
+    now = now or datetime.utcnow()
+    expired = JobRun.query.filter(
+        JobRun.status == JobRunStatus.RUNNING.value,
+        JobRun.lease_expires_at < now
+    ).all()
+    recovered = 0
+    for run in expired:
+        if finish_run(run, 'Lease expired before the run finished', duration_ms=None, now=now):
+            recovered += 1
+    return recovered
+
+
+def execute_run(run, worker_id):
+    """Run a claimed job in the current app context and record the result; returns True on success"""
+    definition = JOB_REGISTRY[run.job_name]
+    started = time.monotonic()
+    error = None
+    try:
+        definition.func()
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        error = f"{type(e).__name__}: {e}"[:2000]
+        logger.exception(f"Job {run.job_name} failed (attempt {run.attempt})")
+    duration_ms = int((time.monotonic() - started) * 1000)
+
+    finish_run(run, error, duration_ms, worker_id=worker_id)
+    return error is None
+
+
+class JobRunner:
+    """
+    Polls the job queue from background threads.
+
+    A scheduler thread renews the leader lease on a heartbeat and, while
+    this worker leads, queues due jobs and recovers lapsed runs. The worker
+    thread executes claimed runs, so a long run never holds up scheduling
+    or lets the lease lapse.
+    """
+
+    def __init__(self, app, worker_id=None):
+        self.app = app
+        self.worker_id = worker_id or make_worker_id()
+        self.poll_interval = app.config.get('JOB_POLL_INTERVAL', 5)
+        self.lease_seconds = app.config.get('JOB_LEADER_LEASE_SECONDS', 30)
+        # Three heartbeats per lease, so one slow renewal does not cost the lease
+        self.heartbeat_interval = self.lease_seconds / 3
+        self.is_leader = False
+        self._stop = threading.Event()
+        self._thread = None
+        self._scheduler_thread = None
+
+    def heartbeat(self):
+        """Renew leadership and, while leader, recover lapsed runs and queue due jobs"""
+        now = datetime.utcnow()
+        self.is_leader = acquire_leadership(self.worker_id, self.lease_seconds, now)
+        if self.is_leader:
+            recover_expired_runs(now)
+            enqueue_due_jobs(now)
+        return self.is_leader
+
+    def work(self):
+        """Execute claimed runs; singleton jobs are only claimed while this worker leads"""
+        executed = 0
+        while executed < MAX_RUNS_PER_TICK and not self._stop.is_set():
+            run = claim_next_run(self.worker_id, self.is_leader)
+            if run is None:
+                break
+            execute_run(run, self.worker_id)
+            executed += 1
+        return executed
+
+    def tick(self):
+        """One heartbeat followed by one round of work, in the calling thread"""
+        self.heartbeat()
+        return self.work()
+
+    def run_scheduler(self):
+        """Heartbeat until stopped, then give up the lease"""
+        while not self._stop.is_set():
+            with self.app.app_context():
+                try:
+                    self.heartbeat()
+                except Exception:
+                    db.session.rollback()
+                    logger.exception("Job scheduler heartbeat failed")
+            self._stop.wait(self.heartbeat_interval)
+
+        with self.app.app_context():
+            release_leadership(self.worker_id)
+
+    def run_forever(self):
+        """Start the scheduler thread and execute runs until stopped, sleeping a jittered interval between polls"""
+        with self.app.app_context():
+            sync_job_definitions()
+
+        self._scheduler_thread = threading.Thread(target=self.run_scheduler, name='job-scheduler', daemon=True)
+        self._scheduler_thread.start()
+
+        while not self._stop.is_set():
+            with self.app.app_context():
+                try:
+                    self.work()
+                except Exception:
+                    db.session.rollback()
+                    logger.exception("Job runner poll failed")
+            self._stop.wait(self.poll_interval * random.uniform(0.8, 1.2))
+
+        self._scheduler_thread.join()
+
+    def start(self):
+        self._thread = threading.Thread(target=self.run_forever, name='job-runner', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+
+
+jobs_cli = AppGroup('jobs', help='Background job scheduler')
+
+
+@jobs_cli.command('worker')
+def worker_command():
+    """Run a job worker in the foreground"""
+    runner = JobRunner(current_app._get_current_object())
+    click.echo(f"Job worker {runner.worker_id} started")
+    try:
+        runner.run_forever()
+    except KeyboardInterrupt:
+        runner.stop()
+
+
+@jobs_cli.command('run')
+@click.argument('name')
+def run_command(name):
+    """Run one job now, in this process"""
+    if name not in JOB_REGISTRY:
+        raise click.BadParameter(f"Unknown job: {name}")
+    sync_job_definitions()
+    worker_id = make_worker_id()
+    run = enqueue_job(name)
+    claimed = claim_run(run.id, name, worker_id)
+    if claimed is None:
+        raise click.ClickException(f"{name} is already running at its concurrency limit; the run stays queued")
+    succeeded = execute_run(claimed, worker_id)
+    click.echo(f"{name}: {'succeeded' if succeeded else 'failed'}")
+
+
+@jobs_cli.command('list')
+def list_command():
+    """Show registered jobs and their last run"""
+    sync_job_definitions()
+    for row in ScheduledJob.query.order_by(ScheduledJob.name):
+        click.echo(f"{row.name:28} {'on ' if row.enabled else 'off'} every {row.interval_seconds}s  "
+                   f"last={row.last_status or '-'} ({row.last_duration_ms or 0} ms)  "
+                   f"failures={row.failure_count}")
+
+
+def init_job_runner(app):
+    """Register the ``flask jobs`` commands and start the worker thread when enabled"""
+    app.cli.add_command(jobs_cli)
+    if app.config.get('JOB_RUNNER_ENABLED') and not app.config.get('TESTING'):
+        runner = JobRunner(app)
+        app.extensions['job_runner'] = runner
+        runner.start()
@@ -3,6 +3,7 @@ from flask_login import login_required, current_user
 from app.main import bp
 from app.models import Property, PropertyCalendar, UserRoles, Booking, BookingTask, db
 from app.utils.cache_service import CacheService
+from app.workforce.service import get_worker_property_ids
 try:
     from app.utils.validation import validate_query_params, SearchSchema
 except ImportError:
@@ -13,11 +14,6 @@ except ImportError:
     class SearchSchema:
         pass
 from datetime import datetime, timedelta
-import requests
-try:
-    from icalendar import Calendar
-except ImportError:
-    Calendar = None
 import json
 from sqlalchemy import or_
 import time
@@ -83,7 +79,7 @@ def dashboard():
         elif current_user.is_property_owner:
             properties = Property.query.filter_by(owner_id=current_user.id).all()
         elif current_user.is_service_staff:
-            properties = [p for p in Property.query.all() if p.is_visible_to(current_user)]
+            properties = Property.query.filter(Property.id.in_(get_worker_property_ids(current_user.id))).all()
         else:
             properties = []
         
@@ -139,7 +135,9 @@ def combined_calendar():
             properties = Property.query.filter_by(owner_id=current_user.id).order_by(Property.name).all()
         # Service staff see properties they have tasks for
         elif current_user.is_service_staff:
-            properties = [p for p in Property.query.order_by(Property.name).all() if p.is_visible_to(current_user)]
+            properties = Property.query.filter(
+                Property.id.in_(get_worker_property_ids(current_user.id))
+            ).order_by(Property.name).all()
         else:
             # Fallback: show all properties for any authenticated user (for demo)
             properties = Property.query.order_by(Property.name).all()
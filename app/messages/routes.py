@@ -1,12 +1,13 @@
 from flask import render_template, request, jsonify, current_app, flash, redirect, url_for
 from flask_login import login_required, current_user
 from app.messages import bp
-from app.utils.sms import handle_incoming_sms, handle_status_callback, send_sms, format_phone_number
+from app.utils.sms import (handle_incoming_sms, handle_status_callback, send_sms, format_phone_number,
+                           find_or_create_thread)
 from app.models import MessageThread, Message, User, Task, TaskAssignment, TaskStatus, Notification
 from app import db
 from datetime import datetime
 import logging
-from app.messages.service import get_unified_messages
+from app.messages.service import get_unified_messages, get_thread_summaries, INBOX_PAGE_SIZE
 from app.forms.message_forms import NewMessageForm
 
 logger = logging.getLogger(__name__)
@@ -38,10 +39,13 @@ def status_callback():
 def threads():
     """Display all message threads for the current user"""
     try:
-        all_messages = get_unified_messages(current_user)
+        all_messages, next_cursor = get_unified_messages(
+            current_user, before=request.args.get('before')
+        )
         return render_template('messages/threads.html',
                               title='Messages',
                               messages=all_messages,
+                              next_cursor=next_cursor,
                               user=current_user)
     except Exception as e:
         current_app.logger.error(f"Error loading messages threads: {str(e)}")
@@ -49,6 +53,7 @@ def threads():
         return render_template('messages/threads.html',
                               title='Messages',
                               messages=[],
+                              next_cursor=None,
                               user=current_user)
 
 @bp.route('/view/<msg_type>/<int:msg_id>', methods=['GET', 'POST'])
@@ -60,7 +65,7 @@ def view_message(msg_type, msg_id):
         msg = Message.query.get_or_404(msg_id)
         thread = MessageThread.query.get_or_404(msg.thread_id)
         # Only allow access if user is participant
-        if not (thread.user_id == current_user.id or thread.participant_phone == current_user.phone):
+        if not (thread.user_id == current_user.id or thread.participant_phone == current_user.phone_e164):
             flash('You do not have access to this conversation', 'error')
             return redirect(url_for('messages.threads'))
         # Get all messages in thread
@@ -94,7 +99,7 @@ def view_thread(thread_id):
         thread = MessageThread.query.get_or_404(thread_id)
         
         # Check if user has access to this thread
-        if (thread.participant_phone != current_user.phone and 
+        if (thread.participant_phone != current_user.phone_e164 and 
             thread.user_id != current_user.id):
             flash('You do not have access to this conversation', 'error')
             return redirect(url_for('messages.threads'))
@@ -122,7 +127,7 @@ def send_message(thread_id):
         thread = MessageThread.query.get_or_404(thread_id)
         
         # Check if user has access to this thread
-        if (thread.participant_phone != current_user.phone and 
+        if (thread.participant_phone != current_user.phone_e164 and 
             thread.user_id != current_user.id):
             return jsonify({'success': False, 'error': 'Access denied'}), 403
         
@@ -168,19 +173,8 @@ def send_to_user(user_id):
                 return redirect(url_for('messages.send_to_user', user_id=user_id))
             
             # Find or create thread
-            thread = MessageThread.query.filter_by(
-                participant_phone=user.phone,
-                system_phone=current_app.config.get('TWILIO_PHONE_NUMBER')
-            ).first()
-            
-            if not thread:
-                thread = MessageThread(
-                    participant_phone=user.phone,
-                    system_phone=current_app.config.get('TWILIO_PHONE_NUMBER'),
-                    user_id=user.id
-                )
-                db.session.add(thread)
-                db.session.commit()
+            thread = find_or_create_thread(user.phone, current_app.config.get('TWILIO_PHONE_NUMBER'),
+                                           user_id=user.id)
             
             # Send SMS
             success, error = send_sms(
@@ -203,26 +197,41 @@ def send_to_user(user_id):
         flash('Error sending message', 'error')
         return redirect(url_for('main.index'))
 
+@bp.route('/api/inbox')
+@login_required
+def api_inbox():
+    """API endpoint to page through the user's unified inbox"""
+    try:
+        limit = min(request.args.get('limit', INBOX_PAGE_SIZE, type=int), 200)
+        messages, next_cursor = get_unified_messages(
+            current_user, limit=max(limit, 1), before=request.args.get('before')
+        )
+        for message in messages:
+            message['timestamp'] = message['timestamp'].isoformat() if message['timestamp'] else None
+        return jsonify({'success': True, 'messages': messages, 'next_cursor': next_cursor})
+    except Exception as e:
+        current_app.logger.error(f"Error in API inbox: {str(e)}")
+        return jsonify({'success': False, 'error': 'Internal server error'}), 500
+
 @bp.route('/api/threads')
 @login_required
 def api_threads():
     """API endpoint to get user's message threads"""
     try:
-        threads = MessageThread.query.filter_by(
-            participant_phone=current_user.phone
-        ).order_by(MessageThread.updated_at.desc()).all()
+        threads_query = MessageThread.query.filter_by(
+            participant_phone=current_user.phone_e164
+        ).order_by(MessageThread.updated_at.desc())
         
         thread_data = []
-        for thread in threads:
-            last_message = thread.last_message
+        for thread, last_message, unread_count in get_thread_summaries(threads_query):
             thread_data.append({
                 'id': thread.id,
                 'participant_phone': thread.participant_phone,
-                'unread_count': thread.unread_count,
+                'unread_count': unread_count,
                 'last_message': {
-                    'content': last_message.content[:100] + '...' if last_message and len(last_message.content) > 100 else last_message.content if last_message else '',
-                    'direction': last_message.direction if last_message else None,
-                    'created_at': last_message.created_at.isoformat() if last_message else None
+                    'content': last_message.content[:100] + '...' if len(last_message.content) > 100 else last_message.content,
+                    'direction': last_message.direction,
+                    'created_at': last_message.created_at.isoformat()
                 } if last_message else None,
                 'updated_at': thread.updated_at.isoformat()
             })
@@ -240,7 +249,7 @@ def api_thread_messages(thread_id):
         thread = MessageThread.query.get_or_404(thread_id)
         
         # Check access
-        if (thread.participant_phone != current_user.phone and 
+        if (thread.participant_phone != current_user.phone_e164 and 
             thread.user_id != current_user.id):
             return jsonify({'success': False, 'error': 'Access denied'}), 403
         
@@ -271,7 +280,7 @@ def api_mark_read(message_id):
         
         # Check access through thread
         thread = message.thread
-        if (thread.participant_phone != current_user.phone and 
+        if (thread.participant_phone != current_user.phone_e164 and 
             thread.user_id != current_user.id):
             return jsonify({'success': False, 'error': 'Access denied'}), 403
         
@@ -295,11 +304,8 @@ def new_message():
         content = form.content.data
         recipient = User.query.get_or_404(recipient_id)
         from app.models import MessageThread, Message
-        thread = MessageThread.query.filter_by(user_id=recipient.id, participant_phone=recipient.phone).first()
-        if not thread:
-            thread = MessageThread(user_id=recipient.id, participant_phone=recipient.phone, system_phone=current_app.config.get('TWILIO_PHONE_NUMBER', ''), status='active')
-            db.session.add(thread)
-            db.session.commit()
+        thread = find_or_create_thread(recipient.phone, current_app.config.get('TWILIO_PHONE_NUMBER', ''),
+                                       user_id=recipient.id)
         msg = Message(thread_id=thread.id, direction='outgoing', phone_number=recipient.phone, content=content, status='sent', read=False)
         db.session.add(msg)
         db.session.commit()
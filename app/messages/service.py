@@ -1,49 +1,131 @@
-from app.models import MessageThread, Message, Notification, User
-from flask_login import current_user
-from sqlalchemy import or_
+from app import db
+from app.models import MessageThread, Message, Notification
+from sqlalchemy import and_, func, literal, null, or_, select, union_all
+from sqlalchemy.orm import aliased
 from datetime import datetime
 
-def get_unified_messages(user):
+INBOX_PAGE_SIZE = 50
+
+
+def encode_cursor(message):
+    """Encode an inbox entry's sort key as an opaque ``before`` cursor"""
+    return f"{message['timestamp'].isoformat()}|{message['type']}|{message['id']}"
+
+
+def decode_cursor(cursor):
+    """Decode a ``before`` cursor, returning ``None`` if it is malformed"""
+    try:
+        timestamp, msg_type, msg_id = cursor.split('|')
+        return datetime.fromisoformat(timestamp), msg_type, int(msg_id)
+    except (AttributeError, ValueError):
+        return None
+
+
+def _inbox_query(user):
+    """UNION ALL of the user's SMS messages and in-app notifications"""
+    sms = select(
+        literal('sms').label('type'),
+        Message.id.label('id'),
+        Message.thread_id.label('thread_id'),
+        Message.phone_number.label('sender'),
+        MessageThread.participant_phone.label('recipient'),
+        Message.content.label('content'),
+        Message.created_at.label('timestamp'),
+        Message.read.label('read'),
+    ).join(
+        MessageThread, Message.thread_id == MessageThread.id
+    ).where(
+        or_(MessageThread.user_id == user.id, MessageThread.participant_phone == user.phone_e164)
+    )
+
+    notifications = select(
+        literal('notification').label('type'),
+        Notification.id,
+        null(),
+        literal('System'),
+        null(),
+        Notification.message,
+        Notification.created_at,
+        Notification.read,
+    ).where(Notification.recipient_id == user.id)
+
+    return union_all(sms, notifications).subquery('inbox')
+
+
+def get_unified_messages(user, limit=INBOX_PAGE_SIZE, before=None):
     """
-    Aggregate and normalize all message types (SMS, notifications, direct) for the current user.
-    Returns a list of dicts sorted by timestamp descending.
+    Aggregate and normalize all message types (SMS, notifications) for the user.
+
+    Messages are merged and ordered by the database, newest first, and paged
+    with a keyset cursor on (timestamp, type, id). Returns ``(messages,
+    next_cursor)`` where ``next_cursor`` is ``None`` on the last page.
     """
-    # SMS Threads
-    sms_threads = MessageThread.query.filter(
-        or_(MessageThread.user_id == user.id, MessageThread.participant_phone == user.phone)
+    inbox = _inbox_query(user)
+    query = select(inbox).order_by(
+        inbox.c.timestamp.desc(), inbox.c.type.desc(), inbox.c.id.desc()
+    ).limit(limit + 1)
+
+    position = decode_cursor(before) if before else None
+    if position:
+        timestamp, msg_type, msg_id = position
+        query = query.where(or_(
+            inbox.c.timestamp < timestamp,
+            and_(inbox.c.timestamp == timestamp, inbox.c.type < msg_type),
+            and_(inbox.c.timestamp == timestamp, inbox.c.type == msg_type, inbox.c.id < msg_id),
+        ))
+
+    rows = db.session.execute(query).mappings().all()
+
+    recipient_name = user.get_full_name() if hasattr(user, 'get_full_name') else user.email
+    messages = []
+    for row in rows[:limit]:
+        message = dict(row)
+        if message['type'] == 'notification':
+            message['recipient'] = recipient_name
+        messages.append(message)
+
+    next_cursor = encode_cursor(messages[-1]) if len(rows) > limit else None
+    return messages, next_cursor
+
+
+def get_thread_summaries(threads_query):
+    """
+    Load threads together with their last message and unread count.
+
+    ``threads_query`` is a ``MessageThread`` query carrying the caller's
+    filters and ordering. Returns a list of ``(thread, last_message,
+    unread_count)`` tuples from a single statement.
+    """
+    thread_ids = threads_query.with_entities(MessageThread.id).order_by(None).scalar_subquery()
+
+    ranked = select(
+        Message.id.label('id'),
+        Message.thread_id.label('thread_id'),
+        func.row_number().over(
+            partition_by=Message.thread_id,
+            order_by=(Message.created_at.desc(), Message.id.desc())
+        ).label('position')
+    ).where(Message.thread_id.in_(thread_ids)).subquery()
+
+    unread = select(
+        Message.thread_id.label('thread_id'),
+        func.count(Message.id).label('unread_count')
+    ).where(
+        Message.thread_id.in_(thread_ids),
+        Message.direction == 'incoming',
+        Message.read == False  # noqa: E712
+    ).group_by(Message.thread_id).subquery()
+
+    last_message = aliased(Message)
+
+    rows = threads_query.outerjoin(
+        ranked, and_(ranked.c.thread_id == MessageThread.id, ranked.c.position == 1)
+    ).outerjoin(
+        last_message, last_message.id == ranked.c.id
+    ).outerjoin(
+        unread, unread.c.thread_id == MessageThread.id
+    ).add_entity(last_message).add_columns(
+        func.coalesce(unread.c.unread_count, 0)
     ).all()
-    sms_messages = []
-    for thread in sms_threads:
-        for msg in thread.messages:
-            sms_messages.append({
-                'type': 'sms',
-                'id': msg.id,
-                'thread_id': thread.id,
-                'sender': msg.phone_number,
-                'recipient': thread.participant_phone,
-                'content': msg.content,
-                'timestamp': msg.created_at,
-                'read': msg.read,
-            })
-
-    # In-app Notifications
-    notifications = Notification.query.filter_by(recipient_id=user.id).all()
-    notification_messages = []
-    for n in notifications:
-        notification_messages.append({
-            'type': 'notification',
-            'id': n.id,
-            'sender': 'System',
-            'recipient': user.get_full_name() if hasattr(user, 'get_full_name') else user.email,
-            'content': n.message,
-            'timestamp': n.created_at,
-            'read': n.read,
-        })
-
-    # TODO: Add direct messages if/when model exists
-    # direct_messages = ...
-
-    # Combine and sort all messages
-    all_messages = sms_messages + notification_messages # + direct_messages
-    all_messages.sort(key=lambda m: m['timestamp'] or datetime.min, reverse=True)
-    return all_messages 
\ No newline at end of file
+
+    return [(thread, message, unread_count) for thread, message, unread_count in rows]
@@ -1,4 +1,5 @@
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, date
+from collections import defaultdict
 import enum
 import secrets
 import os
@@ -6,8 +7,10 @@ from typing import Optional, List, Dict, Any
 from werkzeug.security import generate_password_hash, check_password_hash
 from flask_login import UserMixin
 from app import db, login_manager
-from sqlalchemy import text, Index
+from sqlalchemy import text, Index, event, func
+from sqlalchemy.orm import Session, joinedload, validates
 from flask import url_for, current_app
+from app.utils.phone import to_e164
 import uuid
 import random
 
@@ -268,8 +271,10 @@ class User(UserMixin, db.Model):
     __table_args__ = (
         Index('idx_user_email', 'email'),
         Index('idx_user_phone', 'phone'),
+        Index('idx_user_phone_e164', 'phone_e164', unique=True),
         Index('idx_user_role', 'role'),
         Index('idx_user_created', 'created_at'),
+        Index('idx_user_role_created', 'role', 'created_at', 'id'),
     )
     
     id = db.Column(db.Integer, primary_key=True)
@@ -278,10 +283,12 @@ class User(UserMixin, db.Model):
     last_name = db.Column(db.String(64))
     email = db.Column(db.String(120), unique=True, index=True)
     phone = db.Column(db.String(20), nullable=True)
+    # ``phone`` in E.164, kept in step by _normalize_phone; SMS routing matches on it
+    phone_e164 = db.Column(db.String(20), nullable=True)
     password_hash = db.Column(db.String(256))  # Increased from 128 to 256 to accommodate scrypt hashes
     role = db.Column(db.String(20))
     is_suspended = db.Column(db.Boolean, default=False)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     is_active = db.Column(db.Boolean, default=True)
     last_login = db.Column(db.DateTime)
@@ -344,6 +351,22 @@ class User(UserMixin, db.Model):
     def __repr__(self):
         return f'<User {self.email}>'
     
+    @validates('phone')
+    def _normalize_phone(self, key, phone):
+        self.phone_e164 = to_e164(phone)
+        return phone
+
+    @staticmethod
+    def phone_in_use(phone, exclude_user_id=None):
+        """Whether another account already has ``phone``; numbers are compared in E.164, one account per number"""
+        phone_e164 = to_e164(phone)
+        if not phone_e164:
+            return False
+        query = User.query.filter(User.phone_e164 == phone_e164)
+        if exclude_user_id:
+            query = query.filter(User.id != exclude_user_id)
+        return db.session.query(query.exists()).scalar()
+
     def set_password(self, password: str) -> None:
         """Set user password hash from plaintext password"""
         self.password_hash = generate_password_hash(password)
@@ -559,6 +582,16 @@ class User(UserMixin, db.Model):
         # User must be both active (not disabled by admin) AND not suspended
         return self.is_active and not self.is_suspended
     
+    @property
+    def managed_properties(self):
+        """Properties this user is actively assigned to as a property manager"""
+        assigned = db.session.query(PropertyAssignment.property_id).filter(
+            PropertyAssignment.user_id == self.id,
+            PropertyAssignment.role == UserRoles.PROPERTY_MANAGER.value,
+            PropertyAssignment.is_active.is_(True)
+        )
+        return Property.query.filter(Property.id.in_(assigned)).all()
+    
     @property
     def visible_properties(self):
         """Get properties that this user can see/manage"""
@@ -782,13 +815,15 @@ class User(UserMixin, db.Model):
     
     def get_recent_notes(self, limit=10):
         """Get recent admin notes for this user"""
-        return UserNote.query.filter_by(user_id=self.id)\
+        return UserNote.query.options(joinedload(UserNote.admin))\
+                            .filter_by(user_id=self.id)\
                             .order_by(UserNote.created_at.desc())\
                             .limit(limit).all()
     
     def get_recent_actions(self, limit=10):
         """Get recent admin actions on this user"""
-        return UserAccountAction.query.filter_by(user_id=self.id)\
+        return UserAccountAction.query.options(joinedload(UserAccountAction.admin))\
+                                     .filter_by(user_id=self.id)\
                                      .order_by(UserAccountAction.created_at.desc())\
                                      .limit(limit).all()
     
@@ -831,6 +866,15 @@ class User(UserMixin, db.Model):
             return 'Active'
 
 
+# Case-insensitive prefix search for the admin user directory
+Index('idx_user_email_lower', func.lower(User.email).label('email_lower'),
+      postgresql_ops={'email_lower': 'text_pattern_ops'})
+Index('idx_user_first_name_lower', func.lower(User.first_name).label('first_name_lower'),
+      postgresql_ops={'first_name_lower': 'text_pattern_ops'})
+Index('idx_user_last_name_lower', func.lower(User.last_name).label('last_name_lower'),
+      postgresql_ops={'last_name_lower': 'text_pattern_ops'})
+
+
 class Property(db.Model):
     """
     Property model representing real estate properties in the system.
@@ -947,6 +991,11 @@ class Property(db.Model):
     # New: Color theme for property
     color = db.Column(db.String(16), nullable=True, default=None)
     
+    # Service history totals, maintained by _maintain_property_history_counts
+    task_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    cleaning_session_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    repair_request_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    
     # Relationships
     owner = db.relationship('User', foreign_keys=[owner_id], backref=db.backref('owned_properties', overlaps="owner_user,properties"), overlaps="owner_user,properties")
     property_tasks = db.relationship('Task', backref='property')
@@ -1078,24 +1127,8 @@ class Property(db.Model):
         
         # Service staff can see properties they have tasks for
         if user.is_service_staff:
-            # Check if the user has any assigned tasks for this property
-            from sqlalchemy.orm import aliased
-            from app.models import TaskProperty, TaskAssignment
-            
-            task_property_alias = aliased(TaskProperty)
-            task_assignment_alias = aliased(TaskAssignment)
-            
-            assigned_tasks = db.session.query(Task).join(
-                task_property_alias, Task.id == task_property_alias.task_id
-            ).filter(
-                task_property_alias.property_id == self.id
-            ).join(
-                task_assignment_alias, Task.id == task_assignment_alias.task_id
-            ).filter(
-                task_assignment_alias.user_id == user.id
-            ).first()
-            
-            return assigned_tasks is not None
+            from app.workforce.service import get_worker_property_ids
+            return self.id in get_worker_property_ids(user.id)
         
         return False
 
@@ -1203,6 +1236,10 @@ class PropertyCalendar(db.Model):
     sync_status = db.Column(db.String(50), nullable=True)
     sync_error = db.Column(db.String(255), nullable=True)
     
+    # SHA-256 of the feed body whose events are stored, and how far ahead its recurrences were expanded
+    feed_version = db.Column(db.String(64), nullable=True)
+    expanded_until = db.Column(db.Date, nullable=True)
+    
     # When the calendar was added
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -1225,6 +1262,10 @@ class PropertyCalendar(db.Model):
 class CalendarEvent(db.Model):
     """Individual calendar events parsed from external booking platforms"""
     __tablename__ = 'calendar_events'
+    __table_args__ = (
+        # Overlap checks read only the stays ending after the requested check-in
+        Index('idx_calendar_event_property_stay', 'property_id', 'end_date', 'start_date'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     property_calendar_id = db.Column(db.Integer, db.ForeignKey('property_calendar.id'), nullable=False)
@@ -1238,6 +1279,7 @@ class CalendarEvent(db.Model):
     # External platform information
     source = db.Column(db.String(20), nullable=False)  # airbnb, vrbo, booking, etc.
     external_id = db.Column(db.String(500), nullable=True)  # UID from iCal
+    recurrence_id = db.Column(db.String(32), nullable=True)  # Occurrence start for rows expanded from a recurring event
     
     # Optional booking details
     guest_name = db.Column(db.String(100), nullable=True)
@@ -1341,6 +1383,85 @@ class CalendarEvent(db.Model):
         else:
             return 'fas fa-calendar-alt'
 
+class PropertyAvailability(db.Model):
+    """
+    Booked days of a property as a bitmap, rebuilt from its calendar events
+    on every sync so the availability views never fetch feeds themselves.
+
+    Bit ``i`` (little-endian over ``bitmap``) is set when the night starting
+    ``i`` days after ``start_date`` is booked.
+    """
+    __tablename__ = 'property_availability'
+
+    property_id = db.Column(db.Integer, db.ForeignKey('property.id'), primary_key=True)
+    start_date = db.Column(db.Date, nullable=False)
+    day_count = db.Column(db.Integer, nullable=False, default=0)
+    bitmap = db.Column(db.LargeBinary, nullable=False, default=b'')
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    property = db.relationship('Property', backref=db.backref('availability', uselist=False,
+                                                              cascade='all, delete-orphan'))
+
+    def __repr__(self):
+        return f'<PropertyAvailability {self.property_id} {self.start_date}+{self.day_count}>'
+
+    @staticmethod
+    def build_bitmap(ranges):
+        """
+        Return ``(start_date, day_count, bits)`` covering the ``(start, end)``
+        date ranges. Ends are exclusive (the checkout day stays free); a range
+        that ends on or before its start books its first night only.
+        """
+        ranges = [(start, max(end, start + timedelta(days=1))) for start, end in ranges]
+        if not ranges:
+            return None, 0, 0
+        origin = min(start for start, _ in ranges)
+        bits = 0
+        for start, end in ranges:
+            bits |= ((1 << (end - start).days) - 1) << (start - origin).days
+        return origin, bits.bit_length(), bits
+
+    @classmethod
+    def rebuild(cls, property_ids):
+        """Recompute the bitmaps of ``property_ids`` from their calendar events; does not commit"""
+        from app.property.booking_availability import not_cancelled
+        property_ids = set(property_ids)
+        if not property_ids:
+            return
+        ranges = defaultdict(list)
+        events = db.session.query(CalendarEvent.property_id, CalendarEvent.start_date, CalendarEvent.end_date)\
+            .filter(CalendarEvent.property_id.in_(property_ids), not_cancelled(CalendarEvent.booking_status))
+        for property_id, start, end in events:
+            ranges[property_id].append((start, end))
+
+        existing = {row.property_id: row for row in cls.query.filter(cls.property_id.in_(property_ids))}
+        for property_id in property_ids:
+            origin, day_count, bits = cls.build_bitmap(ranges[property_id])
+            row = existing.get(property_id) or cls(property_id=property_id)
+            row.start_date = origin or date.today()
+            row.day_count = day_count
+            row.bitmap = bits.to_bytes((day_count + 7) // 8, 'little')
+            db.session.add(row)
+
+    def booked_bits(self, start, days):
+        """The ``days`` bits from ``start`` (bit 0 is ``start``); days outside the bitmap are free"""
+        offset = (start - self.start_date).days
+        bits = int.from_bytes(self.bitmap, 'little')
+        bits = bits >> offset if offset >= 0 else bits << -offset
+        return bits & ((1 << days) - 1)
+
+    @classmethod
+    def matrix(cls, property_ids, start, days):
+        """
+        Booked days of ``property_ids`` over ``days`` days from ``start``, loaded in one query.
+
+        Returns ``{property_id: row}`` where ``row[i]`` is ``'1'`` if the night of
+        ``start + i`` days is booked and ``'0'`` otherwise. Properties whose
+        calendars were never synced are left out.
+        """
+        rows = cls.query.filter(cls.property_id.in_(property_ids)).all() if property_ids else []
+        return {row.property_id: format(row.booked_bits(start, days), f'0{days}b')[::-1] for row in rows}
+
 class Room(db.Model):
     """
     Room model representing rooms within a property.
@@ -1563,6 +1684,9 @@ class TaskAssignment(db.Model):
 
 class TaskProperty(db.Model):
     __tablename__ = 'task_property'
+    __table_args__ = (
+        Index('idx_task_property_property_task', 'property_id', 'task_id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     task_id = db.Column(db.Integer, db.ForeignKey('task.id'), nullable=False)
@@ -1577,17 +1701,124 @@ class TaskProperty(db.Model):
     def __repr__(self):
         return f'<TaskProperty task_id={self.task_id} property_id={self.property_id}>'
 
+class WorkerPropertyIndex(db.Model):
+    """Maintained (worker, property) pairs derived from task assignments.
+    
+    Rows are kept in sync with TaskAssignment/TaskProperty changes by the
+    session listeners below, so "which properties does this worker serve"
+    is a single indexed lookup instead of a join over all task history.
+    """
+    __tablename__ = 'worker_property_index'
+    
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    property_id = db.Column(db.Integer, db.ForeignKey('property.id'), primary_key=True, index=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<WorkerPropertyIndex user_id={self.user_id} property_id={self.property_id}>'
+    
+    @staticmethod
+    def sync_tasks(connection, task_ids):
+        """Insert any missing index rows for the given tasks in one statement"""
+        if not task_ids:
+            return
+        connection.execute(text("""
+            INSERT INTO worker_property_index (user_id, property_id, created_at)
+            SELECT DISTINCT ta.user_id, tp.property_id, :now
+            FROM task_assignment ta
+            JOIN task_property tp ON tp.task_id = ta.task_id
+            WHERE ta.task_id IN :task_ids
+              AND ta.user_id IS NOT NULL
+              AND NOT EXISTS (
+                  SELECT 1 FROM worker_property_index w
+                  WHERE w.user_id = ta.user_id AND w.property_id = tp.property_id
+              )
+        """).bindparams(db.bindparam('task_ids', expanding=True)),
+            {'task_ids': list(task_ids), 'now': datetime.utcnow()})
+    
+    @staticmethod
+    def prune(connection, user_ids=(), property_ids=()):
+        """Delete index rows for the given users/properties that no task assignment supports any more"""
+        user_ids, property_ids = list(user_ids), list(property_ids)
+        if not user_ids and not property_ids:
+            return
+        connection.execute(text("""
+            DELETE FROM worker_property_index
+            WHERE (user_id IN :user_ids OR property_id IN :property_ids)
+              AND NOT EXISTS (
+                  SELECT 1 FROM task_assignment ta
+                  JOIN task_property tp ON tp.task_id = ta.task_id
+                  WHERE ta.user_id = worker_property_index.user_id
+                    AND tp.property_id = worker_property_index.property_id
+              )
+        """).bindparams(
+            db.bindparam('user_ids', expanding=True),
+            db.bindparam('property_ids', expanding=True)
+        ), {'user_ids': user_ids or [-1], 'property_ids': property_ids or [-1]})
+    
+    @staticmethod
+    def rebuild():
+        """Rebuild the whole index from task history (used by the backfill migration)"""
+        db.session.execute(text("DELETE FROM worker_property_index"))
+        db.session.execute(text("""
+            INSERT INTO worker_property_index (user_id, property_id, created_at)
+            SELECT DISTINCT ta.user_id, tp.property_id, :now
+            FROM task_assignment ta
+            JOIN task_property tp ON tp.task_id = ta.task_id
+            WHERE ta.user_id IS NOT NULL
+        """), {'now': datetime.utcnow()})
+        db.session.commit()
+
+
+@event.listens_for(Session, 'after_flush')
+def _maintain_worker_property_index(session, flush_context):
+    """Keep WorkerPropertyIndex in step with task assignment changes in the same transaction"""
+    added_task_ids = set()
+    pruned_user_ids = set()
+    pruned_property_ids = set()
+    
+    for obj in list(session.new) + list(session.dirty):
+        if isinstance(obj, (TaskAssignment, TaskProperty)) and obj.task_id:
+            added_task_ids.add(obj.task_id)
+    for obj in session.dirty:
+        if isinstance(obj, TaskAssignment):
+            old_user_ids = db.inspect(obj).attrs.user_id.history.deleted
+            pruned_user_ids.update(uid for uid in old_user_ids if uid)
+        elif isinstance(obj, TaskProperty):
+            old_property_ids = db.inspect(obj).attrs.property_id.history.deleted
+            pruned_property_ids.update(pid for pid in old_property_ids if pid)
+    for obj in session.deleted:
+        if isinstance(obj, TaskAssignment) and obj.user_id:
+            pruned_user_ids.add(obj.user_id)
+        elif isinstance(obj, TaskProperty) and obj.property_id:
+            pruned_property_ids.add(obj.property_id)
+    
+    if not (added_task_ids or pruned_user_ids or pruned_property_ids):
+        return
+    
+    connection = session.connection()
+    WorkerPropertyIndex.sync_tasks(connection, added_task_ids)
+    WorkerPropertyIndex.prune(connection, pruned_user_ids, pruned_property_ids)
+
 class CleaningSession(db.Model):
     __tablename__ = 'cleaning_session'
+    __table_args__ = (
+        Index('idx_cleaning_session_property', 'property_id', 'id'),
+    )
     
+    # The fields counted in CleaningDurationRollup load their previous value when
+    # set, so an edit moves the session out of the bucket it was counted in
     id = db.Column(db.Integer, primary_key=True)
-    property_id = db.Column(db.Integer, db.ForeignKey('property.id'), nullable=False)
-    cleaner_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    property_id = db.column_property(db.Column(db.Integer, db.ForeignKey('property.id'), nullable=False),
+                                     active_history=True)
+    cleaner_id = db.column_property(db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False),
+                                    active_history=True)
     task_id = db.Column(db.Integer, db.ForeignKey('task.id'), nullable=True)
     
-    start_time = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    start_time = db.column_property(db.Column(db.DateTime, nullable=False, default=datetime.utcnow),
+                                    active_history=True)
     end_time = db.Column(db.DateTime, nullable=True)
-    duration_minutes = db.Column(db.Integer, nullable=True)
+    duration_minutes = db.column_property(db.Column(db.Integer, nullable=True), active_history=True)
     
     notes = db.Column(db.Text, nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
@@ -1596,6 +1827,7 @@ class CleaningSession(db.Model):
     # Relationships with clear distinct names
     associated_property = db.relationship('Property', foreign_keys=[property_id], backref='cleaning_sessions')
     associated_task = db.relationship('Task', foreign_keys=[task_id], backref='cleaning_sessions')
+    assigned_cleaner = db.relationship('User', foreign_keys=[cleaner_id])
     
     def __repr__(self):
         if hasattr(self, 'assigned_cleaner') and self.assigned_cleaner:
@@ -1607,7 +1839,12 @@ class CleaningSession(db.Model):
         return f'<CleaningSession {self.id} by {cleaner_name} at {property_name}>'
     
     def complete(self):
-        """Complete the cleaning session and calculate duration"""
+        """
+        Complete the cleaning session and calculate duration.
+
+        The session's CleaningDurationRollup bucket is incremented when
+        the change is flushed.
+        """
         self.end_time = datetime.utcnow()
         if self.start_time:
             # Calculate duration in minutes
@@ -1649,6 +1886,78 @@ class CleaningSession(db.Model):
             is_start_video=False
         ).first() is not None
 
+# Width of a CleaningDurationRollup bucket, in minutes
+CLEANING_DURATION_BUCKET_MINUTES = 5
+# Sessions of 8 hours or more share the last bucket
+MAX_CLEANING_DURATION_BUCKET = 96
+
+
+class CleaningDurationRollup(db.Model):
+    """
+    Completed cleaning sessions counted per property, cleaner, month and
+    duration bucket, maintained by _maintain_cleaning_duration_rollups.
+
+    Duration percentiles for any property, cleaner or period are read
+    from these histograms, whose size does not grow with the number of
+    sessions; ``total_minutes`` keeps averages exact.
+    """
+    __tablename__ = 'cleaning_duration_rollup'
+    __table_args__ = (
+        Index('idx_cleaning_duration_rollup_key', 'property_id', 'cleaner_id', 'month', 'bucket', unique=True),
+        Index('idx_cleaning_duration_rollup_cleaner', 'cleaner_id', 'month'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    property_id = db.Column(db.Integer, db.ForeignKey('property.id'), nullable=False)
+    cleaner_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    month = db.Column(db.Date, nullable=False)  # First day of the month the session started in
+    bucket = db.Column(db.Integer, nullable=False)  # duration_minutes // CLEANING_DURATION_BUCKET_MINUTES, capped
+    session_count = db.Column(db.Integer, nullable=False, default=0)
+    total_minutes = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<CleaningDurationRollup {self.property_id}/{self.cleaner_id} {self.month} #{self.bucket}>'
+
+    @staticmethod
+    def key_for(property_id, cleaner_id, start_time, duration_minutes):
+        """The ``(property_id, cleaner_id, month, bucket)`` a session is counted under, or ``None`` if it is not"""
+        if None in (property_id, cleaner_id, start_time, duration_minutes):
+            return None
+        bucket = min(max(duration_minutes, 0) // CLEANING_DURATION_BUCKET_MINUTES, MAX_CLEANING_DURATION_BUCKET)
+        return property_id, cleaner_id, date(start_time.year, start_time.month, 1), bucket
+
+    @classmethod
+    def rebuild(cls, property_ids=None):
+        """
+        Recount the rollups of ``property_ids`` (all properties by default) from their sessions; does not commit.
+
+        Negative durations count as zero minutes, as in _maintain_cleaning_duration_rollups.
+        """
+        sessions = db.session.query(CleaningSession.property_id, CleaningSession.cleaner_id,
+                                    CleaningSession.start_time, CleaningSession.duration_minutes)\
+            .filter(CleaningSession.duration_minutes.isnot(None))
+        rollups = cls.query
+        if property_ids is not None:
+            property_ids = list(property_ids)
+            sessions = sessions.filter(CleaningSession.property_id.in_(property_ids))
+            rollups = rollups.filter(cls.property_id.in_(property_ids))
+
+        totals = defaultdict(lambda: [0, 0])
+        for property_id, cleaner_id, start_time, duration in sessions.yield_per(1000):
+            key = cls.key_for(property_id, cleaner_id, start_time, duration)
+            if key:
+                totals[key][0] += 1
+                totals[key][1] += max(duration, 0)
+
+        rollups.delete(synchronize_session=False)
+        db.session.add_all([
+            cls(property_id=property_id, cleaner_id=cleaner_id, month=month, bucket=bucket,
+                session_count=count, total_minutes=minutes)
+            for (property_id, cleaner_id, month, bucket), (count, minutes) in totals.items()
+        ])
+        return len(totals)
+
+
 class CleaningFeedback(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     cleaning_session_id = db.Column(db.Integer, db.ForeignKey('cleaning_session.id'), nullable=False, unique=True)
@@ -1726,6 +2035,9 @@ class IssueReport(db.Model):
 
 class RepairRequest(db.Model):
     __tablename__ = 'repair_request'
+    __table_args__ = (
+        Index('idx_repair_request_property', 'property_id', 'id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(100), nullable=False)
@@ -1750,6 +2062,132 @@ class RepairRequest(db.Model):
     def __repr__(self):
         return f'<RepairRequest {self.id}>'
 
+
+# Rows counted in each Property service history total
+PROPERTY_HISTORY_COUNTERS = {
+    TaskProperty: 'task_count',
+    CleaningSession: 'cleaning_session_count',
+    RepairRequest: 'repair_request_count',
+}
+
+
+@event.listens_for(Session, 'after_flush')
+def _maintain_property_history_counts(session, flush_context):
+    """Apply inserts, deletes and moves of history rows to the Property totals in the same transaction"""
+    deltas = defaultdict(lambda: defaultdict(int))
+
+    for obj in session.new:
+        column = PROPERTY_HISTORY_COUNTERS.get(type(obj))
+        if column and obj.property_id:
+            deltas[obj.property_id][column] += 1
+    for obj in session.deleted:
+        column = PROPERTY_HISTORY_COUNTERS.get(type(obj))
+        if column and obj.property_id:
+            deltas[obj.property_id][column] -= 1
+    for obj in session.dirty:
+        column = PROPERTY_HISTORY_COUNTERS.get(type(obj))
+        if not column:
+            continue
+        history = db.inspect(obj).attrs.property_id.history
+        if history.added and history.deleted:
+            for property_id in history.deleted:
+                if property_id:
+                    deltas[property_id][column] -= 1
+            for property_id in history.added:
+                if property_id:
+                    deltas[property_id][column] += 1
+
+    if not deltas:
+        return
+
+    properties = Property.__table__
+    connection = session.connection()
+    for property_id, changes in deltas.items():
+        values = {column: properties.c[column] + delta for column, delta in changes.items() if delta}
+        if values:
+            connection.execute(properties.update().where(properties.c.id == property_id).values(**values))
+
+
+
+CLEANING_DURATION_FIELDS = ('property_id', 'cleaner_id', 'start_time', 'duration_minutes')
+
+
+def _cleaning_duration_values(obj, committed):
+    """The rollup fields of a session, as last committed or as just flushed"""
+    state = db.inspect(obj)
+    values = []
+    for field in CLEANING_DURATION_FIELDS:
+        history = state.attrs[field].history
+        if committed and (history.added or history.deleted):
+            values.append(history.deleted[0] if history.deleted else None)
+        else:
+            values.append(getattr(obj, field))
+    return values
+
+
+def _upsert_cleaning_duration_rollup(connection, key, count, minutes):
+    table = CleaningDurationRollup.__table__
+    property_id, cleaner_id, month, bucket = key
+    values = dict(property_id=property_id, cleaner_id=cleaner_id, month=month, bucket=bucket,
+                  session_count=count, total_minutes=minutes)
+    dialect = connection.dialect.name
+    if count > 0 and dialect in ('postgresql', 'sqlite'):
+        if dialect == 'postgresql':
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        statement = dialect_insert(table).values(**values)
+        connection.execute(statement.on_conflict_do_update(
+            index_elements=['property_id', 'cleaner_id', 'month', 'bucket'],
+            set_={'session_count': table.c.session_count + count,
+                  'total_minutes': table.c.total_minutes + minutes}
+        ))
+        return
+    result = connection.execute(
+        table.update()
+        .where(table.c.property_id == property_id, table.c.cleaner_id == cleaner_id,
+               table.c.month == month, table.c.bucket == bucket)
+        .values(session_count=table.c.session_count + count, total_minutes=table.c.total_minutes + minutes)
+    )
+    # Removing sessions from a bucket without a row leaves nothing to insert
+    if not result.rowcount and count > 0:
+        connection.execute(table.insert().values(**values))
+
+
+@event.listens_for(Session, 'after_flush')
+def _maintain_cleaning_duration_rollups(session, flush_context):
+    """Count completed, edited and deleted cleaning sessions into their rollup buckets in the same transaction"""
+    deltas = defaultdict(lambda: [0, 0])
+
+    def apply(values, sign):
+        key = CleaningDurationRollup.key_for(*values)
+        if key:
+            deltas[key][0] += sign
+            deltas[key][1] += sign * max(values[3], 0)
+
+    for obj in session.new:
+        if isinstance(obj, CleaningSession):
+            apply(_cleaning_duration_values(obj, committed=False), 1)
+    for obj in session.deleted:
+        if isinstance(obj, CleaningSession):
+            apply(_cleaning_duration_values(obj, committed=True), -1)
+    for obj in session.dirty:
+        if not isinstance(obj, CleaningSession):
+            continue
+        before = _cleaning_duration_values(obj, committed=True)
+        after = _cleaning_duration_values(obj, committed=False)
+        if before != after:
+            apply(before, -1)
+            apply(after, 1)
+
+    if not deltas:
+        return
+    connection = session.connection()
+    for key, (count, minutes) in deltas.items():
+        if count or minutes:
+            _upsert_cleaning_duration_rollup(connection, key, count, minutes)
+
+
 class RepairRequestMedia(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     repair_request_id = db.Column(db.Integer, db.ForeignKey('repair_request.id'), nullable=False)
@@ -1793,6 +2231,13 @@ class InventoryItem(db.Model):
     catalog_item = db.relationship('InventoryCatalogItem', backref='inventory_instances')
     item_transactions = db.relationship('InventoryTransaction', backref='item')
     
+    __table_args__ = (
+        # Partial index covering only items at or below their reorder threshold
+        Index('idx_inventory_item_low_stock', 'property_id', 'catalog_item_id',
+              postgresql_where=text('current_quantity <= reorder_threshold'),
+              sqlite_where=text('current_quantity <= reorder_threshold')),
+    )
+    
     def __repr__(self):
         return f'<InventoryItem {self.catalog_item.name if self.catalog_item else "Unknown"}>'
     
@@ -1802,6 +2247,11 @@ class InventoryItem(db.Model):
             return False
         return self.current_quantity <= self.reorder_threshold
     
+    @classmethod
+    def low_stock_condition(cls):
+        """SQL counterpart of is_low_stock(), matching the partial index predicate"""
+        return cls.current_quantity <= cls.reorder_threshold
+    
     def update_quantity(self, quantity, transaction_type):
         """Update the item quantity based on the transaction type"""
         if transaction_type == TransactionType.RESTOCK:
@@ -1866,6 +2316,8 @@ class Notification(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     notification_type = db.Column(db.Enum(NotificationType), nullable=False)
     recipient_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    # The task the notification is about, if any; kept as NULL when the task is deleted
+    task_id = db.Column(db.Integer, db.ForeignKey('task.id', ondelete='SET NULL'), nullable=True)
     message = db.Column(db.Text, nullable=False)
     read = db.Column(db.Boolean, default=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
@@ -1874,6 +2326,10 @@ class Notification(db.Model):
     # Relationships
     recipient = db.relationship('User', foreign_keys=[recipient_id], backref='notifications')
     
+    __table_args__ = (
+        Index('idx_notification_recipient_created', 'recipient_id', 'created_at'),
+    )
+    
     def __repr__(self):
         return f'<Notification {self.message}>'
 
@@ -2197,6 +2653,11 @@ class RecommendationVote(db.Model):
     guest_token = db.Column(db.String(64), nullable=False)  # Unique token per guest stay
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
+    # One vote per guest per recommendation; also serves the (recommendation, token) lookup
+    __table_args__ = (
+        db.UniqueConstraint('recommendation_id', 'guest_token', name='uq_recommendation_votes_guest'),
+    )
+    
     # Relationship
     recommendation = db.relationship('RecommendationBlock', backref='votes')
     
@@ -2266,6 +2727,7 @@ class RecommendationBlock(db.Model):
     priority_order = db.Column(db.Integer, default=0)  # For custom ordering
     is_featured = db.Column(db.Boolean, default=False)  # Featured recommendations
     rating = db.Column(db.Float, nullable=True)  # Average rating (1-5)
+    votes_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')  # Maintained by toggle_vote
     
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -2343,31 +2805,77 @@ class RecommendationBlock(db.Model):
     @property
     def vote_count(self):
         """Get the total number of votes for this recommendation"""
-        return len(self.votes)
+        return self.votes_count or 0
     
     def has_voted(self, guest_token):
-        """Check if a guest has already voted for this recommendation"""
-        return any(vote.guest_token == guest_token for vote in self.votes)
+        """Check if a guest has already voted for this recommendation.
+        
+        For pages listing many recommendations use ``voted_ids_for`` instead.
+        """
+        if not guest_token:
+            return False
+        return self.id in RecommendationBlock.voted_ids_for(guest_token, [self.id])
+    
+    @staticmethod
+    def voted_ids_for(guest_token, recommendation_ids):
+        """Return the set of recommendation IDs a guest token has voted on, in one query"""
+        recommendation_ids = [rid for rid in recommendation_ids if rid is not None]
+        if not guest_token or not recommendation_ids:
+            return set()
+        rows = db.session.query(RecommendationVote.recommendation_id).filter(
+            RecommendationVote.guest_token == guest_token,
+            RecommendationVote.recommendation_id.in_(recommendation_ids)
+        ).all()
+        return {row[0] for row in rows}
     
     def toggle_vote(self, guest_token):
-        """Toggle a vote for this recommendation"""
-        existing_vote = RecommendationVote.query.filter_by(
-            recommendation_id=self.id,
-            guest_token=guest_token
-        ).first()
+        """Toggle a vote for this recommendation.
         
-        if existing_vote:
-            db.session.delete(existing_vote)
-            db.session.commit()
-            return False
-        else:
-            vote = RecommendationVote(
-                recommendation_id=self.id,
-                guest_token=guest_token
+        The vote row and the ``votes_count`` counter are changed in the same
+        transaction using SQL-side increments, so concurrent toggles never
+        lose an update. Returns True if the guest now has a vote recorded.
+        """
+        from sqlalchemy.exc import IntegrityError
+        
+        votes = RecommendationVote.__table__
+        blocks = RecommendationBlock.__table__
+        
+        deleted = db.session.execute(
+            votes.delete().where(
+                votes.c.recommendation_id == self.id,
+                votes.c.guest_token == guest_token
             )
-            db.session.add(vote)
-            db.session.commit()
-            return True
+        ).rowcount
+        
+        if deleted:
+            db.session.execute(
+                blocks.update().where(blocks.c.id == self.id).values(
+                    votes_count=db.case((blocks.c.votes_count > 0, blocks.c.votes_count - 1), else_=0)
+                )
+            )
+            voted = False
+        else:
+            try:
+                # Savepoint so a concurrent insert of the same vote only undoes this statement
+                with db.session.begin_nested():
+                    db.session.execute(votes.insert().values(
+                        recommendation_id=self.id,
+                        guest_token=guest_token,
+                        created_at=datetime.utcnow()
+                    ))
+                db.session.execute(
+                    blocks.update().where(blocks.c.id == self.id).values(
+                        votes_count=blocks.c.votes_count + 1
+                    )
+                )
+            except IntegrityError:
+                # Another request recorded this vote first; it already counted it
+                pass
+            voted = True
+        
+        db.session.commit()
+        db.session.refresh(self, ['votes_count'])
+        return voted
 
     def is_in_guide_book(self, guide_book_id=None):
         """Check if recommendation is in a specific guide book or any guide book"""
@@ -2535,6 +3043,9 @@ worker_calendar_property = db.Table('worker_calendar_property',
 class Booking(db.Model):
     """Model for property bookings/calendar events."""
     __tablename__ = 'booking'
+    __table_args__ = (
+        Index('idx_booking_property_stay', 'property_id', 'end_date', 'start_date'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     property_id = db.Column(db.Integer, db.ForeignKey('property.id'), nullable=False)
@@ -2653,9 +3164,18 @@ class MessageThread(db.Model):
     # Relationships
     user = db.relationship('User', backref='message_threads')
     messages = db.relationship('Message', backref='thread', lazy='dynamic', cascade='all, delete-orphan')
-    
+
+    __table_args__ = (
+        # One thread per number pair; both numbers are stored in E.164 where they parse
+        Index('idx_message_thread_phones', 'participant_phone', 'system_phone', unique=True),
+    )
+
     def __repr__(self):
         return f'<MessageThread {self.participant_phone} -> {self.system_phone}>'
+
+    @validates('participant_phone', 'system_phone')
+    def _normalize_phone(self, key, phone):
+        return to_e164(phone) or phone
     
     @property
     def last_message(self):
@@ -2694,6 +3214,12 @@ class Message(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
+    __table_args__ = (
+        Index('idx_message_thread_created', 'thread_id', 'created_at'),
+        # Status callbacks look messages up by Twilio SID
+        Index('idx_message_external_id', 'external_id'),
+    )
+
     def __repr__(self):
         return f'<Message {self.direction} {self.phone_number}: {self.content[:50]}...>'
     
@@ -2713,6 +3239,41 @@ class Message(db.Model):
             self.read = True
             db.session.commit()
 
+class InboundSms(db.Model):
+    """Raw incoming SMS webhook, stored as received and turned into a Message by the sms_inbox job"""
+    __tablename__ = 'inbound_sms'
+
+    id = db.Column(db.Integer, primary_key=True)
+    # Unique so Twilio's webhook retries are stored once
+    message_sid = db.Column(db.String(100), nullable=False, unique=True)
+    from_number = db.Column(db.String(20), nullable=False)
+    to_number = db.Column(db.String(20), nullable=False)
+    body = db.Column(db.Text, nullable=False, default='')
+    payload = db.Column(db.Text, nullable=True)  # JSON of the webhook form
+    # Set when the webhook already answered in TwiML; otherwise the job replies by SMS
+    reply = db.Column(db.Text, nullable=True)
+    received_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    processed_at = db.Column(db.DateTime, nullable=True)
+
+    __table_args__ = (
+        Index('idx_inbound_sms_pending', 'processed_at', 'id'),
+    )
+
+    def __repr__(self):
+        return f'<InboundSms {self.message_sid} from {self.from_number}>'
+
+class SmsStatusCallback(db.Model):
+    """Delivery status reported by Twilio, applied to messages in batches by the sms_inbox job"""
+    __tablename__ = 'sms_status_callbacks'
+
+    id = db.Column(db.Integer, primary_key=True)
+    message_sid = db.Column(db.String(100), nullable=False)
+    status = db.Column(db.String(20), nullable=False)
+    received_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    def __repr__(self):
+        return f'<SmsStatusCallback {self.message_sid} {self.status}>'
+
 class TaskMedia(db.Model):
     __tablename__ = 'task_media'
     id = db.Column(db.Integer, primary_key=True)
@@ -3004,6 +3565,15 @@ class GuestInvitation(db.Model):
     @classmethod
     def generate_unique_code(cls, length=12):
         """Generate a unique invitation code (5-24 characters, default 12)"""
+        return cls.generate_unique_codes(1, length=length)[0]
+    
+    @classmethod
+    def generate_unique_codes(cls, count, length=12):
+        """Generate ``count`` unique invitation codes.
+        
+        Candidates are checked against existing codes in one query per round,
+        so a batch of any size normally costs a single SELECT.
+        """
         import string
         import secrets
         
@@ -3014,17 +3584,20 @@ class GuestInvitation(db.Model):
         alphabet = string.ascii_uppercase + string.ascii_lowercase + string.digits
         alphabet = alphabet.replace('0', '').replace('O', '').replace('l', '').replace('I', '')
         
+        codes = set()
         max_attempts = 10
         for _ in range(max_attempts):
-            code = ''.join(secrets.choice(alphabet) for _ in range(length))
-            
-            # Check if code already exists
-            if not cls.query.filter_by(code=code).first():
-                return code
-        
-        # Fallback to UUID-based code if random generation fails
-        import uuid
-        return str(uuid.uuid4()).replace('-', '')[:length].upper()
+            needed = count - len(codes)
+            if needed <= 0:
+                break
+            candidates = {''.join(secrets.choice(alphabet) for _ in range(length)) for _ in range(needed)}
+            candidates -= codes
+            taken = {row[0] for row in db.session.query(cls.code).filter(cls.code.in_(candidates))}
+            codes |= candidates - taken
+        
+        if len(codes) < count:
+            raise RuntimeError(f'Could not generate {count} unique invitation codes')
+        return list(codes)[:count]
     
     @classmethod
     def create_invitation(cls, created_by_id, property_id=None, email=None, guest_name=None, 
@@ -3048,6 +3621,60 @@ class GuestInvitation(db.Model):
         db.session.commit()
         return invitation
     
+    @classmethod
+    def create_invitations(cls, created_by_id, emails, property_id=None,
+                           expires_in_days=30, max_uses=1, notes=None):
+        """Create one invitation per email in a single transaction.
+        
+        Codes are generated as a batch and inserted with one bulk INSERT.
+        Duplicate emails (case-insensitive) get a single invitation.
+        Returns the created invitations in the order of ``emails``.
+        """
+        from sqlalchemy import insert
+        from sqlalchemy.exc import IntegrityError
+        
+        unique_emails, seen = [], set()
+        for email in emails:
+            email = (email or '').strip()
+            if email and email.lower() not in seen:
+                seen.add(email.lower())
+                unique_emails.append(email)
+        if not unique_emails:
+            return []
+        
+        now = datetime.utcnow()
+        expires_at = now + timedelta(days=expires_in_days)
+        
+        # Retry the whole batch if another request claimed one of our codes in the meantime
+        for attempt in range(3):
+            codes = cls.generate_unique_codes(len(unique_emails))
+            rows = [{
+                'code': code,
+                'property_id': property_id,
+                'created_by_id': created_by_id,
+                'email': email,
+                'expires_at': expires_at,
+                'max_uses': max_uses,
+                'current_uses': 0,
+                'is_active': True,
+                'notes': notes,
+                'created_at': now,
+                'updated_at': now,
+            } for code, email in zip(codes, unique_emails)]
+            try:
+                invitations = db.session.scalars(insert(cls).returning(cls), rows).all()
+                ids = [invitation.id for invitation in invitations]
+                db.session.commit()
+                break
+            except IntegrityError:
+                db.session.rollback()
+                if attempt == 2:
+                    raise
+        
+        # Reload the committed rows in one query rather than refreshing each object lazily
+        by_email = {invitation.email: invitation for invitation in cls.query.filter(cls.id.in_(ids))}
+        return [by_email[email] for email in unique_emails]
+    
     @classmethod
     def get_by_code(cls, code):
         """Get invitation by code"""
@@ -3065,22 +3692,23 @@ class GuestInvitation(db.Model):
     
     @classmethod
     def cleanup_expired(cls):
-        """Clean up expired invitations"""
-        expired = cls.query.filter(
-            cls.expires_at < datetime.utcnow(),
+        """Deactivate expired invitations with a single UPDATE; returns the number deactivated"""
+        now = datetime.utcnow()
+        count = cls.query.filter(
+            cls.expires_at < now,
             cls.is_active == True
-        ).all()
-        
-        for invitation in expired:
-            invitation.is_active = False
+        ).update({'is_active': False, 'updated_at': now}, synchronize_session=False)
         
         db.session.commit()
-        return len(expired)
+        return count
 
 
 class GuestBooking(db.Model):
     """Model for tracking guest bookings (both external and direct)"""
     __tablename__ = 'guest_bookings'
+    __table_args__ = (
+        Index('idx_guest_booking_property_stay', 'property_id', 'check_out_date', 'check_in_date'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     guest_user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -3341,6 +3969,9 @@ class BookingRequestStatus(enum.Enum):
 class BookingRequest(db.Model):
     """Model for guest booking requests before approval"""
     __tablename__ = 'booking_requests'
+    __table_args__ = (
+        Index('idx_booking_request_property_stay', 'property_id', 'check_out_date', 'check_in_date'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     property_id = db.Column(db.Integer, db.ForeignKey('property.id'), nullable=False)
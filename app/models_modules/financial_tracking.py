@@ -3,10 +3,12 @@ Comprehensive Financial Tracking Models
 Tracks all revenue streams, operating expenses, and provides holistic financial analytics
 """
 
+import calendar
 from datetime import datetime, date
 from decimal import Decimal
 from enum import Enum
-from sqlalchemy import Column, Integer, String, DateTime, Numeric, Boolean, Text, Date, ForeignKey, func
+from sqlalchemy import (Column, Integer, String, DateTime, Numeric, Boolean, Text, Date, ForeignKey, Index,
+                        case, func, insert, or_, tuple_, update)
 from sqlalchemy.orm import relationship
 from app import db
 
@@ -55,6 +57,30 @@ class PaymentMethod(Enum):
     DIGITAL_PAYMENT = "digital_payment"  # Venmo, PayPal, etc.
 
 
+# Months between occurrences for each RecurringExpense.frequency
+RECURRENCE_MONTHS = {
+    'monthly': 1,
+    'quarterly': 3,
+    'annually': 12,
+}
+
+
+def _due_date_in_month(year, month, due_day):
+    """The due day within a month, clamped to its last day (the 31st becomes Feb 28/29)"""
+    return date(year, month, min(due_day or 1, calendar.monthrange(year, month)[1]))
+
+
+def _add_months(day, months, due_day):
+    """Move a due date forward by whole months, keeping the template's due day"""
+    month_index = day.year * 12 + day.month - 1 + months
+    return _due_date_in_month(month_index // 12, month_index % 12 + 1, due_day)
+
+
+def recurrence_period(due):
+    """Idempotency key of an occurrence: the year and month it falls due"""
+    return due.strftime('%Y-%m')
+
+
 class RecurringExpense(db.Model):
     """Template for recurring expenses like utilities, insurance, etc."""
     __tablename__ = 'recurring_expenses'
@@ -72,6 +98,7 @@ class RecurringExpense(db.Model):
     frequency = Column(String(20), nullable=False)  # monthly, quarterly, annually
     amount = Column(Numeric(10, 2), nullable=True)  # Fixed amount (if known)
     due_day = Column(Integer, nullable=True)  # Day of month due (1-31)
+    next_due_date = Column(Date, nullable=True)  # Next occurrence to generate; null = from created_at
 
     # Status and tracking
     is_active = Column(Boolean, default=True)
@@ -89,33 +116,118 @@ class RecurringExpense(db.Model):
     def __repr__(self):
         return f'<RecurringExpense {self.name}>'
 
+    @property
+    def period_months(self):
+        return RECURRENCE_MONTHS.get(self.frequency)
+
+    def first_due_date(self):
+        """First occurrence on or after the day the template was created"""
+        start = (self.created_at or datetime.utcnow()).date()
+        due = _due_date_in_month(start.year, start.month, self.due_day)
+        return due if due >= start else _add_months(due, self.period_months, self.due_day)
+
+    def due_dates(self, through):
+        """Due dates from the next-due pointer up to and including ``through``"""
+        due = self.next_due_date or self.first_due_date()
+        while due <= through:
+            yield due
+            due = _add_months(due, self.period_months, self.due_day)
+
+    def expense_row(self, due, now):
+        """Column values of the draft expense for the occurrence due on ``due``"""
+        return {
+            'property_id': self.property_id,
+            'recurring_expense_id': self.id,
+            'recurrence_period': recurrence_period(due),
+            'category': self.category,
+            'vendor': self.vendor,
+            'description': f"{self.name} - {due.strftime('%B %Y')}",
+            # Variable bills have no fixed amount; the draft is filled in when the bill arrives
+            'amount': self.amount if self.amount is not None else Decimal('0.00'),
+            'tax_deductible': True,
+            'business_percentage': 100,
+            'expense_date': due,
+            'due_date': due,
+            'status': ExpenseStatus.DRAFT.value,
+            'created_by_id': self.created_by_id,
+            'created_at': now,
+            'updated_at': now,
+        }
+
     def generate_next_expense(self):
-        """Generate the next expense entry for this recurring template"""
-
-        # Calculate next due date
-        today = date.today()
-        if self.frequency == 'monthly':
-            next_due = date(today.year, today.month, self.due_day or 1)
-            if next_due <= today:
-                next_month = today.month + 1 if today.month < 12 else 1
-                next_year = today.year if today.month < 12 else today.year + 1
-                next_due = date(next_year, next_month, self.due_day or 1)
-
-        # Create expense entry
-        expense = Expense(
-            property_id=self.property_id,
-            recurring_expense_id=self.id,
-            category=self.category,
-            vendor=self.vendor,
-            description=f"{self.name} - {next_due.strftime('%B %Y')}",
-            amount=self.amount,
-            due_date=next_due,
-            status=ExpenseStatus.DRAFT.value,
-            created_by_id=self.created_by_id
-        )
+        """Generate the next expense entry for this recurring template and advance its pointer"""
+        due = self.next_due_date or self.first_due_date()
+        expense = Expense(**self.expense_row(due, datetime.utcnow()))
         db.session.add(expense)
+        self.next_due_date = _add_months(due, self.period_months, self.due_day)
         return expense
 
+    @classmethod
+    def generate_due_expenses(cls, through=None):
+        """
+        Create draft expenses for every occurrence due up to ``through`` (default today).
+
+        Catches up across all active auto-generating templates in one pass:
+        occurrences are bulk inserted, skipping any (template, period) that
+        already has an expense, and every template's ``next_due_date`` moves
+        past ``through`` in a single UPDATE. The caller commits, so a whole
+        catch-up lands in one transaction. Returns the number of expenses created.
+        """
+        through = through or date.today()
+        templates = cls.query.filter(
+            cls.is_active.is_(True),
+            cls.auto_generate.is_(True),
+            cls.frequency.in_(list(RECURRENCE_MONTHS)),
+            or_(cls.next_due_date.is_(None), cls.next_due_date <= through)
+        ).order_by(cls.id).with_for_update().all()
+        if not templates:
+            return 0
+
+        now = datetime.utcnow()
+        rows, next_due = [], {}
+        for template in templates:
+            due = None
+            for due in template.due_dates(through):
+                rows.append(template.expense_row(due, now))
+            if due is None:
+                due = template.next_due_date or template.first_due_date()
+            else:
+                due = _add_months(due, template.period_months, template.due_day)
+            next_due[template.id] = due
+
+        if rows:
+            existing = set(db.session.query(Expense.recurring_expense_id, Expense.recurrence_period).filter(
+                tuple_(Expense.recurring_expense_id, Expense.recurrence_period).in_(
+                    [(row['recurring_expense_id'], row['recurrence_period']) for row in rows])
+            ).all())
+            rows = [row for row in rows
+                    if (row['recurring_expense_id'], row['recurrence_period']) not in existing]
+        if rows:
+            db.session.execute(_insert_ignoring_duplicates(Expense.__table__), rows)
+
+        db.session.execute(
+            update(cls)
+            .where(cls.id.in_(list(next_due)))
+            .values(next_due_date=case(next_due, value=cls.id))
+            .execution_options(synchronize_session=False)
+        )
+        for template in templates:
+            db.session.expire(template, ['next_due_date'])
+        return len(rows)
+
+
+def _insert_ignoring_duplicates(table):
+    """INSERT that skips rows clashing with the (recurring_expense_id, recurrence_period) unique index"""
+    dialect = db.engine.dialect.name
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    elif dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    else:
+        return insert(table)
+    return dialect_insert(table).on_conflict_do_nothing(
+        index_elements=['recurring_expense_id', 'recurrence_period'])
+
 
 class Expense(db.Model):
     """Individual expense entries - both one-time and recurring"""
@@ -124,6 +236,7 @@ class Expense(db.Model):
     id = Column(Integer, primary_key=True)
     property_id = Column(Integer, ForeignKey('property.id'), nullable=True)  # Null = business expense
     recurring_expense_id = Column(Integer, ForeignKey('recurring_expenses.id'), nullable=True)
+    recurrence_period = Column(String(7), nullable=True)  # YYYY-MM of a generated occurrence
 
     # Expense details
     category = Column(String(50), nullable=False)  # ExpenseCategory enum value
@@ -167,6 +280,11 @@ class Expense(db.Model):
     created_by = relationship('User', foreign_keys=[created_by_id], backref='created_expenses')
     approved_by = relationship('User', foreign_keys=[approved_by_id], backref='approved_expenses')
 
+    __table_args__ = (
+        # One generated expense per template and period
+        Index('uq_expense_recurring_period', 'recurring_expense_id', 'recurrence_period', unique=True),
+    )
+
     def __repr__(self):
         return f'<Expense {self.description}: ${self.amount}>'
 
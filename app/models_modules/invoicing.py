@@ -1,4 +1,5 @@
 import enum
+import json
 from datetime import datetime
 from app import db
 from app.models import User, Task, Property, ServiceType, CleaningSession
@@ -140,6 +141,11 @@ class Invoice(db.Model):
     @classmethod
     def generate_invoice_number(cls):
         """Generate a unique invoice number"""
+        return cls.generate_invoice_numbers(1)[0]
+    
+    @classmethod
+    def generate_invoice_numbers(cls, count):
+        """Generate a block of consecutive invoice numbers with a single lookup"""
         # Format: INV-YYYYMMDD-XXXX where XXXX is a sequential number
         today = datetime.utcnow().strftime('%Y%m%d')
         
@@ -157,7 +163,7 @@ class Invoice(db.Model):
             # First invoice of the day
             next_seq_num = 1
         
-        return f"{prefix}{next_seq_num:04d}"
+        return [f"{prefix}{seq_num:04d}" for seq_num in range(next_seq_num, next_seq_num + count)]
 
 
 class InvoiceItem(db.Model):
@@ -190,4 +196,62 @@ class InvoiceItem(db.Model):
     def calculate_amount(self):
         """Calculate the amount based on quantity and unit price"""
         self.amount = self.quantity * self.unit_price
-        return self.amount
\ No newline at end of file
+        return self.amount
+
+class InvoiceBatch(db.Model):
+    """A batch invoice run for a billing period, executed by the invoice_batches job.
+
+    Progress is stored on the row so any worker or instance can report it.
+    """
+    __tablename__ = 'invoice_batch'
+
+    id = db.Column(db.Integer, primary_key=True)
+    creator_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    date_from = db.Column(db.Date, nullable=False)
+    date_to = db.Column(db.Date, nullable=False)
+    property_ids_json = db.Column(db.Text, nullable=True)  # JSON array; NULL bills every property
+
+    # Progress
+    status = db.Column(db.String(20), nullable=False, default='pending')  # pending, running, completed, failed
+    done = db.Column(db.Integer, nullable=False, default=0)
+    total = db.Column(db.Integer, nullable=False, default=0)
+    invoice_ids_json = db.Column(db.Text, nullable=True)  # JSON array of the created invoices
+    error = db.Column(db.Text, nullable=True)
+
+    # Timestamps
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+    __table_args__ = (
+        db.Index('idx_invoice_batch_status', 'status', 'created_at'),
+    )
+
+    def __repr__(self):
+        return f'<InvoiceBatch #{self.id} {self.date_from} to {self.date_to} {self.status}>'
+
+    @property
+    def property_ids(self):
+        return json.loads(self.property_ids_json) if self.property_ids_json else None
+
+    @property_ids.setter
+    def property_ids(self, value):
+        self.property_ids_json = json.dumps(list(value)) if value is not None else None
+
+    @property
+    def invoice_ids(self):
+        return json.loads(self.invoice_ids_json) if self.invoice_ids_json else []
+
+    @invoice_ids.setter
+    def invoice_ids(self, value):
+        self.invoice_ids_json = json.dumps(list(value))
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'status': self.status,
+            'done': self.done,
+            'total': self.total,
+            'invoice_ids': self.invoice_ids,
+            'error': self.error,
+        }
@@ -0,0 +1,102 @@
+"""
+Background job models
+The database doubles as the job queue: ScheduledJob holds each periodic
+job's schedule and run statistics, JobRun is one queued or executed run,
+and SchedulerLease records which worker currently holds the scheduler
+leadership.
+"""
+
+from datetime import datetime
+from enum import Enum
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, Text, Index
+from app import db
+
+
+class JobRunStatus(Enum):
+    """Lifecycle of a single job run"""
+    QUEUED = "queued"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+
+
+class ScheduledJob(db.Model):
+    """A registered periodic job, its schedule and its run statistics"""
+    __tablename__ = 'scheduled_jobs'
+
+    id = Column(Integer, primary_key=True)
+    name = Column(String(100), nullable=False, unique=True)
+
+    # Schedule, synced from the job registry on startup
+    interval_seconds = Column(Integer, nullable=False)
+    jitter_seconds = Column(Integer, default=0)
+    max_concurrency = Column(Integer, default=1)
+    max_attempts = Column(Integer, default=3)
+    singleton = Column(Boolean, default=False)
+    enabled = Column(Boolean, default=True)
+    next_run_at = Column(DateTime, nullable=True)
+
+    # Last run
+    last_started_at = Column(DateTime, nullable=True)
+    last_finished_at = Column(DateTime, nullable=True)
+    last_duration_ms = Column(Integer, nullable=True)
+    last_status = Column(String(20), nullable=True)
+    last_error = Column(Text, nullable=True)
+
+    # Totals
+    run_count = Column(Integer, default=0)
+    failure_count = Column(Integer, default=0)
+    consecutive_failures = Column(Integer, default=0)
+
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        Index('idx_scheduled_job_due', 'enabled', 'next_run_at'),
+    )
+
+    def __repr__(self):
+        return f'<ScheduledJob {self.name}>'
+
+
+class JobRun(db.Model):
+    """One run of a job; queued rows are claimed by workers"""
+    __tablename__ = 'job_runs'
+
+    id = Column(Integer, primary_key=True)
+    job_name = Column(String(100), nullable=False)
+    status = Column(String(20), nullable=False, default=JobRunStatus.QUEUED.value)
+    attempt = Column(Integer, default=1)
+    run_after = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+    # Claim
+    worker_id = Column(String(100), nullable=True)
+    claimed_at = Column(DateTime, nullable=True)
+    lease_expires_at = Column(DateTime, nullable=True)
+
+    # Outcome
+    finished_at = Column(DateTime, nullable=True)
+    duration_ms = Column(Integer, nullable=True)
+    error = Column(Text, nullable=True)
+
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        Index('idx_job_run_claim', 'status', 'run_after'),
+        Index('idx_job_run_job_status', 'job_name', 'status'),
+    )
+
+    def __repr__(self):
+        return f'<JobRun {self.job_name} #{self.id} {self.status}>'
+
+
+class SchedulerLease(db.Model):
+    """Time-limited leadership lease; only the holder enqueues due jobs"""
+    __tablename__ = 'scheduler_leases'
+
+    name = Column(String(50), primary_key=True)
+    holder = Column(String(100), nullable=False)
+    expires_at = Column(DateTime, nullable=False)
+
+    def __repr__(self):
+        return f'<SchedulerLease {self.name} held by {self.holder}>'
@@ -1,10 +1,10 @@
 from flask import current_app, render_template
 from app import db
-from app.models import Notification, NotificationType, NotificationChannel, User, Task, Property, MessageThread, Message
+from app.models import (Notification, NotificationType, NotificationChannel, User, Task, TaskAssignment, TaskStatus,
+                        Property, MessageThread, Message)
 from app.common.email import send_email
-from app.utils.sms import send_sms, format_phone_number, send_multilingual_sms
+from app.utils.sms import send_sms, format_phone_number, send_multilingual_sms, find_or_create_thread
 from datetime import datetime, timedelta
-import requests
 import logging
 
 def send_task_assignment_notification(task, user):
@@ -113,6 +113,42 @@ def send_task_reminder_notification(task, user):
     
     return True
 
+def check_upcoming_tasks(hours_ahead=24):
+    """
+    Remind assignees of open tasks due within ``hours_ahead`` hours.
+
+    Assignments are loaded in one query. A user who already received a
+    reminder for the same task during the window is skipped, so this can
+    run as often as the scheduler likes. Returns the number of reminders sent.
+    """
+    now = datetime.utcnow()
+    rows = db.session.query(Task, User).join(
+        TaskAssignment, TaskAssignment.task_id == Task.id
+    ).join(
+        User, User.id == TaskAssignment.user_id
+    ).filter(
+        Task.due_date > now,
+        Task.due_date <= now + timedelta(hours=hours_ahead),
+        Task.status != TaskStatus.COMPLETED
+    ).all()
+    if not rows:
+        return 0
+
+    already_reminded = set(db.session.query(Notification.recipient_id, Notification.task_id).filter(
+        Notification.notification_type == NotificationType.TASK_REMINDER,
+        Notification.recipient_id.in_({user.id for _, user in rows}),
+        Notification.task_id.in_({task.id for task, _ in rows}),
+        Notification.created_at >= now - timedelta(hours=hours_ahead)
+    ).all())
+
+    sent = 0
+    for task, user in rows:
+        if (user.id, task.id) in already_reminded:
+            continue
+        if send_task_reminder_notification(task, user):
+            sent += 1
+    return sent
+
 def send_calendar_update_notification(task, user):
     """Send notification when a calendar event affecting a task is updated"""
     if not user or not task:
@@ -347,6 +383,7 @@ def create_notification(user_id, notification_type, channel, title, message, tas
     try:
         notification = Notification(
             recipient_id=user_id,
+            task_id=task_id,
             notification_type=notification_type,
             message=message
         )
@@ -404,25 +441,10 @@ def get_or_create_sms_thread(phone_number):
         
         # Format phone number
         formatted_phone = format_phone_number(phone_number)
+        if not formatted_phone:
+            return None
         
-        # Look for existing thread
-        thread = MessageThread.query.filter_by(
-            participant_phone=formatted_phone,
-            system_phone=system_phone
-        ).first()
-        
-        if not thread:
-            # Create new thread
-            thread = MessageThread(
-                participant_phone=formatted_phone,
-                system_phone=system_phone,
-                status='active'
-            )
-            db.session.add(thread)
-            db.session.commit()
-            current_app.logger.info(f"Created new SMS thread for {formatted_phone}")
-        
-        return thread
+        return find_or_create_thread(formatted_phone, system_phone)
         
     except Exception as e:
         current_app.logger.error(f"Error getting/creating SMS thread: {str(e)}")
@@ -37,10 +37,15 @@ def update_personal_info():
         user = User.query.get(current_user.id)
         current_app.logger.info(f"Before update - Name: {user.first_name} {user.last_name}")
         
+        phone = request.form.get('phone', user.phone)
+        if User.phone_in_use(phone, exclude_user_id=user.id):
+            flash('That phone number is already used by another account.', 'danger')
+            return redirect(url_for('profile.profile'))
+        
         user.first_name = request.form.get('first_name', user.first_name)
         user.last_name = request.form.get('last_name', user.last_name)
         user.email = request.form.get('email', user.email)
-        user.phone = request.form.get('phone', user.phone)
+        user.phone = phone
         user.timezone = request.form.get('timezone', user.timezone)
         user.language = request.form.get('language', user.language)
         
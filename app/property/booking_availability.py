@@ -0,0 +1,99 @@
+"""
+Booking availability checks
+
+A stay ``[check_in, check_out)`` is free when it overlaps none of the
+property's bookings, synced calendar events, guest bookings or pending
+booking requests. All four sources are checked in one UNION ALL query;
+each branch is served by a ``(property_id, end, start)`` index, so only
+stays ending after the requested check-in are read.
+"""
+from collections import namedtuple
+from datetime import datetime
+
+from sqlalchemy import Date, DateTime, Integer, bindparam, func, literal, or_, select, union_all
+
+from app import db
+from app.models import Booking, BookingRequest, BookingRequestStatus, CalendarEvent, GuestBooking, Property
+from app.utils.error_handling import ValidationError
+
+MAX_STAY_NIGHTS = 365
+
+Conflict = namedtuple('Conflict', ['source', 'start', 'end'])
+
+
+def parse_stay(check_in, check_out):
+    """Parse ``YYYY-MM-DD`` check-in/check-out strings into dates, raising ValidationError if unusable"""
+    try:
+        check_in = datetime.strptime(check_in or '', '%Y-%m-%d').date()
+    except ValueError:
+        raise ValidationError('Check-in date must be a date (YYYY-MM-DD)', field='check_in_date')
+    try:
+        check_out = datetime.strptime(check_out or '', '%Y-%m-%d').date()
+    except ValueError:
+        raise ValidationError('Check-out date must be a date (YYYY-MM-DD)', field='check_out_date')
+    if check_out <= check_in:
+        raise ValidationError('Check-out must be after check-in', field='check_out_date')
+    if (check_out - check_in).days > MAX_STAY_NIGHTS:
+        raise ValidationError(f'Stays are limited to {MAX_STAY_NIGHTS} nights', field='check_out_date')
+    return check_in, check_out
+
+
+def not_cancelled(status):
+    """SQL condition for a free-text booking status that is not 'cancelled' in any letter case"""
+    return func.lower(func.coalesce(status, '')) != 'cancelled'
+
+
+def _conflicts_query():
+    """
+    The first stay overlapping ``[:check_in, :check_out)`` at ``:property_id``, one UNION ALL branch per source.
+
+    Built once with bind parameters so every check reuses the compiled statement.
+    """
+    property_id = bindparam('property_id', type_=Integer)
+    check_in, check_out = bindparam('check_in', type_=Date), bindparam('check_out', type_=Date)
+
+    def overlapping(source, property_column, start, end, *criteria):
+        return select(literal(source).label('source'), start.label('start'), end.label('end')).where(
+            property_column == property_id, end > check_in, start < check_out, *criteria
+        )
+
+    return union_all(
+        overlapping('booking', Booking.property_id, Booking.start_date, Booking.end_date,
+                    not_cancelled(Booking.status)),
+        overlapping('calendar', CalendarEvent.property_id, CalendarEvent.start_date, CalendarEvent.end_date,
+                    not_cancelled(CalendarEvent.booking_status)),
+        overlapping('guest_booking', GuestBooking.property_id, GuestBooking.check_in_date,
+                    GuestBooking.check_out_date, not_cancelled(GuestBooking.status)),
+        overlapping('request', BookingRequest.property_id, BookingRequest.check_in_date,
+                    BookingRequest.check_out_date, BookingRequest.status == BookingRequestStatus.PENDING,
+                    or_(BookingRequest.expires_at.is_(None),
+                        BookingRequest.expires_at > bindparam('now', type_=DateTime))),
+    ).limit(1)
+
+
+CONFLICTS_QUERY = _conflicts_query()
+
+
+def find_conflict(property_id, check_in, check_out):
+    """Return the first stay overlapping ``[check_in, check_out)`` at the property as a Conflict, or None"""
+    row = db.session.execute(CONFLICTS_QUERY, {
+        'property_id': property_id, 'check_in': check_in, 'check_out': check_out, 'now': datetime.utcnow()
+    }).first()
+    return Conflict(*row) if row else None
+
+
+def is_available(property_id, check_in, check_out):
+    """Whether ``[check_in, check_out)`` is free at the property; the checkout day of one stay may start the next"""
+    return find_conflict(property_id, check_in, check_out) is None
+
+
+def lock_property_calendar(property_id):
+    """
+    Serialize availability checks that are followed by a write for one property.
+
+    Takes a row lock on the property until the transaction ends, so two
+    requests for the same dates cannot both pass the check. SQLite has no
+    row locks and serializes writers itself, so this is a no-op there.
+    """
+    if db.engine.dialect.name != 'sqlite':
+        db.session.execute(select(Property.id).where(Property.id == property_id).with_for_update())
@@ -0,0 +1,169 @@
+"""
+Property service history
+
+The property page shows the totals and the newest few tasks, cleaning
+sessions and repair requests; everything older is fetched a page at a
+time from the JSON history endpoint. Totals are the counters maintained
+on Property, so no history table is counted on a page view. Pages are
+keyset-paginated on row ID, newest first, served by the
+``(property_id, id)`` indexes on each history table.
+"""
+from collections import defaultdict
+
+from flask import url_for
+from sqlalchemy import func, select
+from sqlalchemy.orm import joinedload
+
+from app import db
+from app.models import CleaningSession, GuestReview, Property, RepairRequest, Task, TaskAssignment, TaskProperty
+
+HISTORY_SUMMARY_SIZE = 10
+HISTORY_PAGE_SIZE = 25
+MAX_HISTORY_PAGE_SIZE = 100
+
+
+def _tasks_query(property_id, assigned_to=None):
+    query = Task.query.join(TaskProperty, TaskProperty.task_id == Task.id).filter(
+        TaskProperty.property_id == property_id
+    )
+    if assigned_to:
+        query = query.filter(Task.assignments.any(TaskAssignment.user_id == assigned_to))
+    return query, Task.id
+
+
+def _cleaning_sessions_query(property_id, assigned_to=None):
+    query = CleaningSession.query.options(joinedload(CleaningSession.assigned_cleaner)).filter(
+        CleaningSession.property_id == property_id
+    )
+    if assigned_to:
+        query = query.filter(CleaningSession.cleaner_id == assigned_to)
+    return query, CleaningSession.id
+
+
+def _repair_requests_query(property_id, assigned_to=None):
+    query = RepairRequest.query.filter(RepairRequest.property_id == property_id)
+    if assigned_to:
+        query = query.filter(RepairRequest.reporter_id == assigned_to)
+    return query, RepairRequest.id
+
+
+# kind -> (query builder, Property counter holding the total)
+HISTORY_KINDS = {
+    'tasks': (_tasks_query, 'task_count'),
+    'cleaning_sessions': (_cleaning_sessions_query, 'cleaning_session_count'),
+    'repair_requests': (_repair_requests_query, 'repair_request_count'),
+}
+
+
+def get_property_with_counts(property_id):
+    """
+    Load a property and its history totals in one query.
+
+    Returns ``(property, counts)`` or ``None`` if there is no such
+    property. The task, cleaning and repair totals are the maintained
+    counters; the guest review total is a scalar subquery.
+    """
+    review_count = select(func.count(GuestReview.id)).where(
+        GuestReview.property_id == Property.id
+    ).scalar_subquery()
+    row = db.session.query(Property, review_count).filter(Property.id == property_id).first()
+    if row is None:
+        return None
+    property, reviews = row
+    counts = {kind: getattr(property, column) or 0 for kind, (_, column) in HISTORY_KINDS.items()}
+    counts['guest_reviews'] = reviews
+    return property, counts
+
+
+def get_history_page(property_id, kind, before=None, limit=HISTORY_PAGE_SIZE, assigned_to=None):
+    """
+    One page of a property's history of ``kind``, newest first.
+
+    ``before`` is the ``next`` cursor of the previous page (a row ID).
+    ``assigned_to`` restricts the page to one user's tasks, sessions or
+    reports. Returns the rows and the cursor for the next page, or
+    ``None`` on the last page.
+    """
+    build_query, _ = HISTORY_KINDS[kind]
+    query, id_column = build_query(property_id, assigned_to)
+    if before:
+        query = query.filter(id_column < before)
+    rows = query.order_by(id_column.desc()).limit(limit + 1).all()
+    next_cursor = rows[limit - 1].id if len(rows) > limit else None
+    return rows[:limit], next_cursor
+
+
+def assignments_by_task(task_ids):
+    """The assignments of each task, with their users, from one query"""
+    assignments = defaultdict(list)
+    if not task_ids:
+        return assignments
+    rows = TaskAssignment.query.options(joinedload(TaskAssignment.user)).filter(
+        TaskAssignment.task_id.in_(task_ids)
+    ).order_by(TaskAssignment.id).all()
+    for assignment in rows:
+        assignments[assignment.task_id].append(assignment)
+    return assignments
+
+
+def get_history_summary(property_id, staff_user_id=None, limit=HISTORY_SUMMARY_SIZE):
+    """
+    The newest ``limit`` rows of each history kind for the property page.
+
+    Returns a dict with a list and a ``next`` cursor per kind, the
+    assignments of the listed tasks keyed by task ID, and, when
+    ``staff_user_id`` is given, that worker's own newest tasks.
+    """
+    summary = {'next': {}}
+    for kind in HISTORY_KINDS:
+        summary[kind], summary['next'][kind] = get_history_page(property_id, kind, limit=limit)
+    summary['other_services'] = []
+
+    staff_tasks = []
+    if staff_user_id:
+        staff_tasks, summary['next']['staff_tasks'] = get_history_page(
+            property_id, 'tasks', limit=limit, assigned_to=staff_user_id
+        )
+    summary['staff_tasks'] = staff_tasks
+    summary['assignments'] = assignments_by_task({task.id for task in summary['tasks'] + staff_tasks})
+    return summary
+
+
+def _person(assignment):
+    if assignment.user:
+        return assignment.user.get_full_name()
+    return assignment.external_name
+
+
+def serialize_history_item(kind, row, assignments=None):
+    """JSON representation of one history row"""
+    if kind == 'tasks':
+        date = row.due_date or row.created_at
+        return {
+            'id': row.id,
+            'title': row.title,
+            'description': row.description,
+            'status': row.status.value if row.status else None,
+            'date': date.isoformat() if date else None,
+            'completed_at': row.completed_at.isoformat() if row.completed_at else None,
+            'assignees': [name for name in map(_person, (assignments or {}).get(row.id, [])) if name],
+            'url': url_for('tasks.view', id=row.id),
+        }
+    if kind == 'cleaning_sessions':
+        return {
+            'id': row.id,
+            'start_time': row.start_time.isoformat() if row.start_time else None,
+            'end_time': row.end_time.isoformat() if row.end_time else None,
+            'duration': row.get_duration_display(),
+            'cleaner': row.assigned_cleaner.get_full_name() if row.assigned_cleaner else None,
+            'url': url_for('tasks.cleaning_report', session_id=row.id),
+        }
+    return {
+        'id': row.id,
+        'title': row.title,
+        'description': row.description,
+        'severity': row.severity.value if row.severity else None,
+        'status': row.status.value if row.status else None,
+        'created_at': row.created_at.isoformat() if row.created_at else None,
+        'url': url_for('tasks.view', id=row.task_id) if row.task_id else None,
+    }
@@ -0,0 +1,226 @@
+"""
+Outbound iCal feeds
+
+Workers and channel managers subscribe to these feeds from their own
+calendar apps, which poll every few minutes. Each request first computes
+a data version from one aggregate query over the rows the feed covers;
+the version is the feed's strong ETag, so an unchanged feed is answered
+with 304 before anything is rendered. Rendered feeds are cached under
+their version and never go stale: any change to the rows produces a new
+version. A feed that is not cached is streamed row by row while it is
+being cached.
+"""
+import hashlib
+from collections import namedtuple
+from datetime import date, datetime, timedelta
+
+from flask import Response, request, stream_with_context
+from sqlalchemy import and_, exists, func, literal, select, union_all
+
+from app import cache, db
+from app.models import Booking, CalendarEvent, Property, PropertyCalendar, Task, TaskProperty, TaskStatus
+from app.property.booking_availability import not_cancelled
+
+# Bump when the rendered output changes, so cached feeds of the old format are not served
+FEED_FORMAT_VERSION = 1
+FEED_PAST_DAYS = 30
+FEED_FUTURE_DAYS = 365
+# Entries are keyed by data version, so the timeout only bounds how long unused feeds hold memory
+FEED_CACHE_TIMEOUT = 24 * 60 * 60
+FEED_YIELD_PER = 500
+
+PRODID = '-//Short Term Landlord//Calendar Export//EN'
+UID_DOMAIN = 'short-term-landlord'
+
+# ``private`` feeds name the properties and include tasks; public feeds only show reserved dates
+Feed = namedtuple('Feed', ['kind', 'property_ids', 'private'])
+
+
+def feed_window(today=None):
+    """The ``[start, end)`` dates a feed covers"""
+    today = today or date.today()
+    return today - timedelta(days=FEED_PAST_DAYS), today + timedelta(days=FEED_FUTURE_DAYS)
+
+
+def _bookings(feed, window):
+    start, end = window
+    return and_(Booking.property_id.in_(feed.property_ids), Booking.end_date >= start,
+                Booking.start_date < end, not_cancelled(Booking.status))
+
+
+def _calendar_events(feed, window):
+    start, end = window
+    # Stays already imported as Booking rows are listed once
+    duplicate = exists().where(Booking.property_id == CalendarEvent.property_id,
+                               Booking.start_date == CalendarEvent.start_date,
+                               Booking.end_date == CalendarEvent.end_date)
+    return and_(CalendarEvent.property_id.in_(feed.property_ids), CalendarEvent.end_date >= start,
+                CalendarEvent.start_date < end, not_cancelled(CalendarEvent.booking_status), ~duplicate)
+
+
+def _tasks(feed, window):
+    start, end = (datetime.combine(day, datetime.min.time()) for day in window)
+    return and_(TaskProperty.property_id.in_(feed.property_ids), Task.due_date >= start, Task.due_date < end)
+
+
+def feed_version(feed, window):
+    """Hash of the count, newest id and newest update of every row set the feed is rendered from"""
+    parts = [
+        select(literal('booking'), func.count(), func.max(Booking.id), func.max(Booking.updated_at))
+        .where(_bookings(feed, window)),
+        select(literal('calendar_event'), func.count(), func.max(CalendarEvent.id),
+               func.max(CalendarEvent.updated_at)).where(_calendar_events(feed, window)),
+    ]
+    if feed.private:
+        parts += [
+            select(literal('property'), func.count(), func.max(Property.id), func.max(Property.updated_at))
+            .where(Property.id.in_(feed.property_ids)),
+            select(literal('task'), func.count(), func.max(TaskProperty.id), func.max(Task.updated_at))
+            .select_from(Task).join(TaskProperty, TaskProperty.task_id == Task.id).where(_tasks(feed, window)),
+        ]
+    rows = sorted(tuple(str(value) for value in row) for row in db.session.execute(union_all(*parts)))
+    key = repr((FEED_FORMAT_VERSION, feed.kind, tuple(feed.property_ids), feed.private, window, rows))
+    return hashlib.sha256(key.encode()).hexdigest()[:32]
+
+
+def _escape(value):
+    return (str(value).replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,')
+            .replace('\r\n', '\\n').replace('\n', '\\n'))
+
+
+def _line(name, value):
+    """One content line, folded at 75 octets as RFC 5545 requires"""
+    line = f'{name}:{value}'
+    if len(line) <= 75 and line.isascii():
+        return line + '\r\n'
+    folded, current, width = [], [], 0
+    for char in line:
+        size = len(char.encode('utf-8'))
+        if width + size > 75:
+            folded.append(''.join(current))
+            current, width = [' '], 1
+        current.append(char)
+        width += size
+    folded.append(''.join(current))
+    return '\r\n'.join(folded) + '\r\n'
+
+
+def _stamp(moment, fallback):
+    return (moment or fallback).strftime('%Y%m%dT%H%M%SZ')
+
+
+def _stay(uid, start, end, stamp, summary, description=None):
+    lines = ['BEGIN:VEVENT\r\n', _line('UID', uid), _line('DTSTAMP', stamp),
+             _line('DTSTART;VALUE=DATE', start.strftime('%Y%m%d')),
+             _line('DTEND;VALUE=DATE', max(end, start + timedelta(days=1)).strftime('%Y%m%d')),
+             _line('SUMMARY', _escape(summary)), _line('TRANSP', 'OPAQUE')]
+    if description:
+        lines.append(_line('DESCRIPTION', _escape(description)))
+    lines.append('END:VEVENT\r\n')
+    return ''.join(lines)
+
+
+def render_feed(feed, window, name):
+    """Yield the feed's iCalendar text in chunks, one event at a time"""
+    fallback_stamp = datetime.combine(window[0], datetime.min.time())
+    yield ''.join(['BEGIN:VCALENDAR\r\n', _line('VERSION', '2.0'), _line('PRODID', PRODID),
+                   _line('CALSCALE', 'GREGORIAN'), _line('METHOD', 'PUBLISH'), _line('X-WR-CALNAME', _escape(name))])
+
+    properties = {}
+    if feed.private:
+        properties = {row.id: row for row in db.session.execute(
+            select(Property.id, Property.name, Property.checkin_time, Property.checkout_time)
+            .where(Property.id.in_(feed.property_ids))
+        )}
+
+    def describe(property_id, source, room=None):
+        prop = properties[property_id]
+        details = [f"Check-in {prop.checkin_time or '3:00 PM'}, check-out {prop.checkout_time or '11:00 AM'}"]
+        if source:
+            details.append(f"Source: {source}")
+        if room:
+            details.append(f"Room: {room}")
+        return f"{prop.name} - Reserved", '\n'.join(details)
+
+    bookings = db.session.execute(
+        select(Booking.id, Booking.property_id, Booking.start_date, Booking.end_date, Booking.updated_at,
+               Booking.is_entire_property, Booking.room_name, PropertyCalendar.service)
+        .outerjoin(PropertyCalendar, PropertyCalendar.id == Booking.calendar_id)
+        .where(_bookings(feed, window)).order_by(Booking.start_date, Booking.id)
+        .execution_options(yield_per=FEED_YIELD_PER)
+    )
+    for row in bookings:
+        summary, description = ('Reserved', None)
+        if feed.private:
+            summary, description = describe(row.property_id, row.service,
+                                            None if row.is_entire_property else row.room_name)
+        yield _stay(f'booking-{row.id}@{UID_DOMAIN}', row.start_date, row.end_date,
+                    _stamp(row.updated_at, fallback_stamp), summary, description)
+
+    events = db.session.execute(
+        select(CalendarEvent.id, CalendarEvent.property_id, CalendarEvent.start_date, CalendarEvent.end_date,
+               CalendarEvent.updated_at, CalendarEvent.source)
+        .where(_calendar_events(feed, window)).order_by(CalendarEvent.start_date, CalendarEvent.id)
+        .execution_options(yield_per=FEED_YIELD_PER)
+    )
+    for row in events:
+        summary, description = ('Reserved', None)
+        if feed.private:
+            summary, description = describe(row.property_id, row.source)
+        yield _stay(f'calendar-event-{row.id}@{UID_DOMAIN}', row.start_date, row.end_date,
+                    _stamp(row.updated_at, fallback_stamp), summary, description)
+
+    if feed.private:
+        tasks = db.session.execute(
+            select(Task.id, TaskProperty.property_id, Task.title, Task.status, Task.due_date, Task.updated_at)
+            .join(TaskProperty, TaskProperty.task_id == Task.id)
+            .where(_tasks(feed, window)).order_by(Task.due_date, Task.id, TaskProperty.property_id)
+            .execution_options(yield_per=FEED_YIELD_PER)
+        )
+        for row in tasks:
+            # Due times are stored without a zone, so they are exported as floating local times
+            title = f"Done: {row.title}" if row.status == TaskStatus.COMPLETED else row.title
+            yield ''.join([
+                'BEGIN:VEVENT\r\n', _line('UID', f'task-{row.id}-{row.property_id}@{UID_DOMAIN}'),
+                _line('DTSTAMP', _stamp(row.updated_at, fallback_stamp)),
+                _line('DTSTART', row.due_date.strftime('%Y%m%dT%H%M%S')), _line('DURATION', 'PT1H'),
+                _line('SUMMARY', _escape(f"{title} ({properties[row.property_id].name})")),
+                _line('TRANSP', 'TRANSPARENT'),
+                'END:VEVENT\r\n',
+            ])
+
+    yield 'END:VCALENDAR\r\n'
+
+
+def ical_response(feed, name, filename):
+    """
+    Serve ``feed`` with a strong ETag: 304 if the client's copy is current,
+    the cached rendering if there is one, or a streamed rendering otherwise.
+    """
+    window = feed_window()
+    version = feed_version(feed, window)
+
+    def respond(body, status=200):
+        response = Response(body, status=status, mimetype='text/calendar')
+        response.set_etag(version)
+        # Clients may keep the feed but must revalidate it on every poll
+        response.headers['Cache-Control'] = 'no-cache'
+        response.headers['Content-Disposition'] = f'inline; filename="{filename}"'
+        return response
+
+    if request.if_none_match.contains(version):
+        return respond(None, 304)
+
+    cache_key = f'ical_feed:{version}'
+    cached = cache.get(cache_key)
+    if cached is not None:
+        return respond(cached)
+
+    def stream():
+        chunks = []
+        for chunk in render_feed(feed, window, name):
+            chunks.append(chunk)
+            yield chunk
+        cache.set(cache_key, ''.join(chunks), timeout=FEED_CACHE_TIMEOUT)
+
+    return respond(stream_with_context(stream()))
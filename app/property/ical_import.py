@@ -0,0 +1,182 @@
+"""
+Inbound iCal feeds
+
+Booking platform feeds are ingested by ingest_feed and nowhere else: the
+scheduled sync job, the manual sync button and the first view of a
+calendar that was never synced all go through it. A feed is parsed and
+its recurring series (RRULE, RDATE, EXDATE and overridden instances)
+expanded once per feed version, the SHA-256 of its body, from
+RECURRENCE_LOOKBACK_DAYS ago up to ICAL_RECURRENCE_HORIZON_DAYS ahead.
+Each occurrence is stored as its own CalendarEvent row, so availability,
+booking conflicts, the combined calendar, exports and the property
+calendar page all read the same expanded events.
+"""
+import hashlib
+from collections import namedtuple
+from datetime import date, datetime, timedelta
+
+from flask import current_app
+
+from app import db
+from app.models import CalendarEvent, PropertyAvailability
+
+DEFAULT_RECURRENCE_HORIZON_DAYS = 365
+# Occurrences of a series that ended longer ago than this are not stored
+RECURRENCE_LOOKBACK_DAYS = 90
+# An unchanged feed is expanded again once its stored horizon is this close
+HORIZON_REFRESH_DAYS = 30
+
+Occurrence = namedtuple('Occurrence', ['uid', 'recurrence_id', 'title', 'start', 'end'])
+
+
+def feed_version(content):
+    """Version of a feed body: its SHA-256"""
+    if isinstance(content, str):
+        content = content.encode('utf-8')
+    return hashlib.sha256(content).hexdigest()
+
+
+def parse_ical(ical_content):
+    """Parse iCal content, importing icalendar on first use"""
+    try:
+        from icalendar import Calendar
+    except ImportError:
+        raise ValueError("iCalendar library not available")
+    return Calendar.from_ical(ical_content)
+
+
+def _as_date(value):
+    return value.date() if isinstance(value, datetime) else value
+
+
+def _dates(component):
+    """The ``(start, end)`` dates of a VEVENT, or ``None`` without a start; no end means one day"""
+    dtstart = component.get('dtstart')
+    if dtstart is None:
+        return None
+    start = _as_date(dtstart.dt)
+    if component.get('dtend') is not None:
+        end = _as_date(component.get('dtend').dt)
+    elif component.get('duration') is not None:
+        end = _as_date(dtstart.dt + component.get('duration').dt)
+    else:
+        end = start + timedelta(days=1)
+    return start, end
+
+
+def _is_recurring(component):
+    return any(component.get(name) is not None for name in ('rrule', 'rdate', 'recurrence-id'))
+
+
+def _expand_series(ical_calendar, components, window_start, horizon_end):
+    """Occurrences of the recurring ``components`` in ``[window_start, horizon_end)``, in one expansion pass"""
+    try:
+        import recurring_ical_events
+    except ImportError:
+        current_app.logger.warning("recurring_ical_events is not installed, storing the first occurrence of each series")
+        masters = [(component, _dates(component)) for component in components
+                   if component.get('recurrence-id') is None]
+        return [Occurrence(str(component.get('uid', '')) or None, None, str(component.get('summary', 'Booking')),
+                           *dates) for component, dates in masters if dates]
+
+    from icalendar import Calendar
+    series = Calendar()
+    for timezone in ical_calendar.walk('VTIMEZONE'):
+        series.add_component(timezone)
+    for component in components:
+        series.add_component(component)
+
+    occurrences = []
+    for component in recurring_ical_events.of(series).between(window_start, horizon_end):
+        dates = _dates(component)
+        if dates:
+            occurrences.append(Occurrence(str(component.get('uid', '')) or None, dates[0].isoformat(),
+                                          str(component.get('summary', 'Booking')), *dates))
+    return occurrences
+
+
+def expand_occurrences(ical_calendar, window_start, horizon_end):
+    """
+    Every stay in a parsed feed.
+
+    Single events are returned as they are, whatever their dates.
+    Recurring series, together with their overridden instances, are
+    expanded over ``[window_start, horizon_end)``.
+    """
+    events = list(ical_calendar.walk('VEVENT'))
+    series_uids = {str(component.get('uid', '')) for component in events if _is_recurring(component)}
+    series_uids.discard('')
+
+    occurrences, series = [], []
+    for component in events:
+        uid = str(component.get('uid', ''))
+        if _is_recurring(component) or uid in series_uids:
+            series.append(component)
+            continue
+        dates = _dates(component)
+        if dates:
+            occurrences.append(Occurrence(uid or None, None, str(component.get('summary', 'Booking')), *dates))
+    if series:
+        occurrences.extend(_expand_series(ical_calendar, series, window_start, horizon_end))
+    return occurrences
+
+
+def ingest_feed(calendar, ical_content, today=None, force=False):
+    """
+    Store the events of ``calendar``'s feed body; does not commit.
+
+    Returns the number of events stored, or ``None`` when no stored event
+    changed: either the body is the version already stored and its
+    expansion still reaches far enough ahead, in which case nothing is
+    parsed, or the new body expands to the events already stored, as when
+    a platform only re-stamps its feed, in which case only the calendar's
+    version is updated.
+    """
+    today = today or date.today()
+    horizon_days = current_app.config.get('ICAL_RECURRENCE_HORIZON_DAYS', DEFAULT_RECURRENCE_HORIZON_DAYS)
+    horizon_end = today + timedelta(days=horizon_days)
+    version = feed_version(ical_content)
+    if (not force and calendar.feed_version == version and calendar.expanded_until
+            and calendar.expanded_until >= horizon_end - timedelta(days=HORIZON_REFRESH_DAYS)):
+        return None
+
+    occurrences = expand_occurrences(parse_ical(ical_content), today - timedelta(days=RECURRENCE_LOOKBACK_DAYS),
+                                     horizon_end)
+    # (title, start, end, external_id, recurrence_id) of each event to store
+    rows = [
+        (occurrence.title, occurrence.start, occurrence.end,
+         occurrence.uid or f"{calendar.id}_{occurrence.start}_{occurrence.end}", occurrence.recurrence_id)
+        for occurrence in occurrences
+    ]
+
+    stored = db.session.query(CalendarEvent.title, CalendarEvent.start_date, CalendarEvent.end_date,
+                              CalendarEvent.external_id, CalendarEvent.recurrence_id)\
+        .filter(CalendarEvent.property_calendar_id == calendar.id)
+    unchanged = not force and sorted(rows) == sorted(tuple(row) for row in stored)
+    calendar.feed_version = version
+    calendar.expanded_until = horizon_end
+    if unchanged:
+        return None
+
+    # Replace this calendar's events with the new expansion
+    CalendarEvent.query.filter_by(property_calendar_id=calendar.id).delete(synchronize_session=False)
+    now = datetime.utcnow()
+    db.session.add_all([
+        CalendarEvent(
+            property_calendar_id=calendar.id,
+            property_id=calendar.property_id,
+            title=title,
+            start_date=start,
+            end_date=end,
+            source=calendar.service,
+            external_id=external_id,
+            recurrence_id=recurrence_id,
+            created_at=now,
+            updated_at=now
+        )
+        for title, start, end, external_id, recurrence_id in rows
+    ])
+
+    # Refresh the property's booked-day bitmap in the same transaction as its events
+    PropertyAvailability.rebuild([calendar.property_id])
+    return len(rows)
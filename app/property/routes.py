@@ -6,25 +6,28 @@ from app.property import bp
 from app.property.forms import PropertyForm, PropertyImageForm, PropertyCalendarForm, RoomForm, GuestAccessForm
 from app.models import (Property, PropertyImage, UserRoles, PropertyCalendar, Room, RoomFurniture, 
                        Task, TaskProperty, CleaningSession, RepairRequest, ServiceType, GuestReview, 
-                       TaskAssignment, BookingRequest, BookingRequestStatus, GuestAccountRequest, User)
+                       TaskAssignment, BookingRequest, BookingRequestStatus, GuestAccountRequest, User,
+                       CalendarEvent)
+from app.property.booking_availability import parse_stay, find_conflict, lock_property_calendar
+from app.property.ical_export import Feed, ical_response
+from app.property.ical_import import ingest_feed
+from app.property.history import (HISTORY_KINDS, HISTORY_PAGE_SIZE, MAX_HISTORY_PAGE_SIZE, assignments_by_task,
+                                  get_history_page, get_history_summary, get_property_with_counts,
+                                  serialize_history_item)
+from app.utils.error_handling import ValidationError
 from datetime import datetime, timedelta
 import os
 import uuid
-import requests
-try:
-    from icalendar import Calendar
-    ICALENDAR_AVAILABLE = True
-except ImportError:
-    Calendar = None
-    ICALENDAR_AVAILABLE = False
 from dateutil import rrule, parser
 import pytz
-from sqlalchemy.orm import aliased
 import secrets
 
 def safe_parse_ical(ical_content):
     """Safely parse iCal content with proper error handling."""
-    if not ICALENDAR_AVAILABLE or Calendar is None:
+    # Imported on first use to keep icalendar out of app startup
+    try:
+        from icalendar import Calendar
+    except ImportError:
         raise ValueError("iCalendar library not available")
     return Calendar.from_ical(ical_content)
 
@@ -55,6 +58,7 @@ def index():
 @bp.route('/create', methods=['GET', 'POST'])
 @property_owner_required
 def create():
+    import requests
     form = PropertyForm()
     if form.validate_on_submit():
         property = Property(
@@ -219,93 +223,59 @@ def create():
 @bp.route('/<int:id>/view')
 @login_required
 def view(id):
-    property = Property.query.get_or_404(id)
-    
-    # Permission check
-    can_view = False
-    
-    # Property owners can view their own properties
-    if current_user.is_property_owner and property.owner_id == current_user.id:
-        can_view = True
-    # Admins can view all properties
-    elif current_user.has_admin_role:
-        can_view = True
-    # Property managers can view all properties
-    elif current_user.is_property_manager:
-        can_view = True
-    # Service staff can view properties they have tasks for
-    elif current_user.is_service_staff:
-        # Use aliases to avoid duplicate table errors
-        task_property_alias = aliased(TaskProperty)
-        task_assignment_alias = aliased(TaskAssignment)
-        
-        # Check if the service staff has any assigned tasks for this property
-        assigned_tasks = db.session.query(Task).join(
-            task_property_alias, Task.id == task_property_alias.task_id
-        ).filter(
-            task_property_alias.property_id == property.id
-        ).join(
-            task_assignment_alias, Task.id == task_assignment_alias.task_id
-        ).filter(
-            task_assignment_alias.user_id == current_user.id
-        ).first()
-        
-        if assigned_tasks:
-            can_view = True
+    loaded = get_property_with_counts(id)
+    if loaded is None:
+        abort(404)
+    property, history_counts = loaded
     
-    if not can_view:
+    if not property.is_visible_to(current_user):
         flash('You do not have permission to view this property.', 'danger')
         return redirect(url_for('main.index'))
     
-    # Get guest review counts
-    reviews_count = GuestReview.query.filter_by(property_id=id).count()
-    
-    # Get service history
-    service_history = {}
-    
-    # Get tasks for this property
-    tasks = db.session.query(Task).join(
-        TaskProperty, TaskProperty.task_id == Task.id
-    ).filter(
-        TaskProperty.property_id == id
-    ).order_by(Task.due_date.asc(), Task.priority.desc()).all()
-    service_history['tasks'] = tasks
-    
-    # Get cleaning sessions for this property
-    cleaning_sessions = CleaningSession.query.filter_by(property_id=id).all()
-    service_history['cleaning_sessions'] = cleaning_sessions
-    
-    # Get repair requests for this property
-    repair_requests = RepairRequest.query.filter_by(property_id=id).all()
-    service_history['repair_requests'] = repair_requests
-    
-    # Get other services for this property
-    other_services = []  # Add query for other services if available
-    service_history['other_services'] = other_services
-    
-    # For service staff, also get their specific assigned tasks
-    service_staff_tasks = []
-    if current_user.is_service_staff:
-        service_staff_tasks = db.session.query(Task).join(
-            TaskProperty, TaskProperty.task_id == Task.id
-        ).join(
-            TaskAssignment, TaskAssignment.task_id == Task.id
-        ).filter(
-            TaskProperty.property_id == id,
-            TaskAssignment.user_id == current_user.id
-        ).order_by(Task.due_date.asc(), Task.priority.desc()).all()
+    # Newest few of each kind; older history is fetched from property.history on demand
+    service_history = get_history_summary(
+        id, staff_user_id=current_user.id if current_user.is_service_staff else None
+    )
     
     return render_template('property/view.html',
                           property=property,
-                          reviews_count=reviews_count,
+                          reviews_count=history_counts['guest_reviews'],
                           service_history=service_history,
-                          service_staff_tasks=service_staff_tasks,
-                          guest_review_count=reviews_count,
-                          rooms_list=property.rooms if hasattr(property, 'rooms') else [])
+                          history_counts=history_counts,
+                          service_staff_tasks=service_history['staff_tasks'],
+                          guest_review_count=history_counts['guest_reviews'],
+                          rooms_list=property.rooms.all())
+
+
+@bp.route('/<int:id>/history/<kind>')
+@login_required
+def history(id, kind):
+    """One page of a property's service history as JSON, newest first"""
+    if kind not in HISTORY_KINDS:
+        abort(404)
+    loaded = get_property_with_counts(id)
+    if loaded is None:
+        abort(404)
+    property, history_counts = loaded
+    if not property.is_visible_to(current_user):
+        return jsonify({'error': 'You do not have permission to view this property.'}), 403
+    
+    limit = max(1, min(request.args.get('limit', HISTORY_PAGE_SIZE, type=int), MAX_HISTORY_PAGE_SIZE))
+    assigned_to = current_user.id if request.args.get('mine') else None
+    rows, next_cursor = get_history_page(id, kind, before=request.args.get('before', type=int),
+                                         limit=limit, assigned_to=assigned_to)
+    assignments = assignments_by_task([row.id for row in rows]) if kind == 'tasks' else None
+    
+    return jsonify({
+        'items': [serialize_history_item(kind, row, assignments) for row in rows],
+        'next': next_cursor,
+        'total': None if assigned_to else history_counts[kind],
+    })
 
 @bp.route('/<int:id>/edit', methods=['GET', 'POST'])
 @property_owner_required
 def edit(id):
+    import requests
     property = Property.query.get_or_404(id)
     # Ensure the current user is the owner
     if property.owner_id != current_user.id:
@@ -759,6 +729,7 @@ def manage_calendars(id):
 @bp.route('/<int:id>/calendar/add', methods=['GET', 'POST'])
 @login_required
 def add_calendar(id):
+    import requests
     property = Property.query.get_or_404(id)
     
     # Check if user is authorized to edit this property
@@ -782,7 +753,7 @@ def add_calendar(id):
             response = requests.get(form.ical_url.data)
             if response.status_code == 200:
                 # Try to parse the iCal data to validate
-                cal = Calendar.from_ical(response.text)
+                cal = safe_parse_ical(response.text)
                 
                 # Set sync status
                 calendar.last_synced = datetime.utcnow()
@@ -805,6 +776,7 @@ def add_calendar(id):
 @bp.route('/<int:property_id>/calendar/<int:calendar_id>/edit', methods=['GET', 'POST'])
 @login_required
 def edit_calendar(property_id, calendar_id):
+    import requests
     property = Property.query.get_or_404(property_id)
     calendar = PropertyCalendar.query.get_or_404(calendar_id)
     
@@ -830,7 +802,7 @@ def edit_calendar(property_id, calendar_id):
             response = requests.get(calendar.ical_url)
             if response.status_code == 200:
                 # Try to parse the iCal data to validate
-                cal = Calendar.from_ical(response.text)
+                cal = safe_parse_ical(response.text)
                 
                 # Set sync status
                 calendar.last_synced = datetime.utcnow()
@@ -873,6 +845,7 @@ def delete_calendar(property_id, calendar_id):
 @bp.route('/<int:property_id>/calendar/<int:calendar_id>/sync', methods=['POST'])
 @login_required
 def sync_calendar(property_id, calendar_id):
+    import requests
     property = Property.query.get_or_404(property_id)
     calendar = PropertyCalendar.query.get_or_404(calendar_id)
     
@@ -886,10 +859,10 @@ def sync_calendar(property_id, calendar_id):
     
     # Try to sync the calendar
     try:
-        response = requests.get(calendar.ical_url)
+        response = requests.get(calendar.ical_url, timeout=15)
         if response.status_code == 200:
-            # Try to parse the iCal data to validate
-            cal = Calendar.from_ical(response.text)
+            # Store the feed's events, expanding recurring ones
+            ingest_feed(calendar, response.text)
             
             # Set sync status
             calendar.last_synced = datetime.utcnow()
@@ -902,6 +875,7 @@ def sync_calendar(property_id, calendar_id):
             calendar.sync_error = f"HTTP error: {response.status_code}"
             flash(f'Failed to sync calendar: HTTP error {response.status_code}', 'danger')
     except Exception as e:
+        db.session.rollback()
         calendar.sync_status = 'Failed'
         calendar.sync_error = str(e)[:255]  # Limit error message length
         flash(f'Failed to sync calendar: {str(e)}', 'danger')
@@ -913,6 +887,7 @@ def sync_calendar(property_id, calendar_id):
 @bp.route('/<int:id>/calendar')
 @login_required
 def view_calendar(id):
+    import requests
     property = Property.query.get_or_404(id)
     
     # Check if user has permission to view this property
@@ -927,159 +902,58 @@ def view_calendar(id):
         flash('No calendars have been added to this property. Add a calendar to see bookings.', 'info')
         return render_template('property/calendar_view.html', property=property, calendars=[], events=[])
     
-    # Prepare events data for the calendar
-    events = []
-    success = False
-    
+    # Calendars are fetched and expanded by the sync job; only one that was
+    # never synced is fetched here, once
     for calendar in calendars:
+        if calendar.feed_version is not None:
+            continue
         try:
-            # Log the attempt to fetch
-            current_app.logger.info(f"Attempting to fetch calendar {calendar.id}: {calendar.name} - URL: {calendar.ical_url}")
-            
-            # Fetch the iCal data with timeout to prevent hanging and custom headers
+            current_app.logger.info(f"Fetching calendar {calendar.id} for the first time: {calendar.ical_url}")
             headers = {
                 'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/58.0.3029.110 Safari/537.36',
                 'Accept': 'text/calendar,application/ics,*/*'
             }
-            
-            # Add debug info 
-            current_app.logger.info(f"Fetching calendar URL: {calendar.ical_url}")
-            
-            response = requests.get(calendar.ical_url, 
-                                   headers=headers, 
-                                   timeout=15,
-                                   verify=True)  # Set to False if SSL issues
-            
-            current_app.logger.info(f"Calendar fetch response: {response.status_code}")
-            
+            response = requests.get(calendar.ical_url, headers=headers, timeout=15)
             if response.status_code == 200:
-                # Log successful fetch
-                current_app.logger.info(f"Successfully fetched calendar data. Content length: {len(response.text)} bytes")
-                
-                # Debug - log the first 100 chars of response
-                content_preview = response.text[:100].replace('\n', '\\n')
-                current_app.logger.info(f"Content preview: {content_preview}")
-                
-                # Parse the iCal data
-                try:
-                    cal = safe_parse_ical(response.text)
-                    
-                    # Log successful parsing
-                    current_app.logger.info(f"Successfully parsed iCal data for calendar {calendar.id}")
-                    
-                    # Count events for logging
-                    event_count = 0
-                    
-                    # Extract events
-                    for component in cal.walk():
-                        if component.name == "VEVENT":
-                            try:
-                                # Get event details with extensive error checking
-                                summary = ''
-                                start_date = None
-                                end_date = None
-                                
-                                # Try to get summary safely
-                                if hasattr(component, 'get') and callable(component.get):
-                                    summary_value = component.get('summary')
-                                    if summary_value:
-                                        summary = str(summary_value)
-                                    else:
-                                        summary = 'Booking'
-                                else:
-                                    summary = 'Booking'
-                                
-                                # Try to get start date safely
-                                dtstart = component.get('dtstart')
-                                if dtstart and hasattr(dtstart, 'dt'):
-                                    start_date = dtstart.dt
-                                else:
-                                    # Skip this event if no start date
-                                    current_app.logger.warning(f"Event missing start date in calendar {calendar.id}")
-                                    continue
-                                
-                                # Try to get end date safely
-                                dtend = component.get('dtend')
-                                if dtend and hasattr(dtend, 'dt'):
-                                    end_date = dtend.dt
-                                else:
-                                    # If no end date, use start date + 1 day
-                                    if isinstance(start_date, datetime):
-                                        end_date = start_date + timedelta(days=1)
-                                    else:
-                                        end_date = start_date + timedelta(days=1)
-                                
-                                # Convert datetime objects to date if necessary
-                                if isinstance(start_date, datetime):
-                                    start_date = start_date.date()
-                                if isinstance(end_date, datetime):
-                                    end_date = end_date.date()
-                                
-                                # Make sure both dates are valid
-                                if not (start_date and end_date):
-                                    continue
-                                
-                                # Add event to the list
-                                event = {
-                                    'title': summary,
-                                    'start': start_date.isoformat(),
-                                    'end': end_date.isoformat(),
-                                    'className': f"{calendar.service.lower()}-event",
-                                    'extendedProps': {
-                                        'service': calendar.get_service_display(),
-                                        'room': None if calendar.is_entire_property else calendar.room_name
-                                    }
-                                }
-                                events.append(event)
-                                event_count += 1
-                                success = True
-                            except (KeyError, AttributeError, ValueError, TypeError) as e:
-                                # Just skip this event if there's a problem with it
-                                current_app.logger.error(f"Error parsing event in calendar {calendar.id}: {str(e)}")
-                                continue
-                    
-                    # Log event count
-                    current_app.logger.info(f"Successfully processed {event_count} events from calendar {calendar.id}")
-                    
-                    # Update last_synced and status
-                    calendar.last_synced = datetime.utcnow()
-                    calendar.sync_status = 'Success'
-                    calendar.sync_error = None
-                    db.session.commit()
-                    
-                except Exception as e:
-                    # Problem parsing the iCal data
-                    calendar.sync_status = 'Failed'
-                    calendar.sync_error = f"Error parsing iCal data: {str(e)[:255]}"
-                    db.session.commit()
-                    current_app.logger.error(f"Error parsing iCal for calendar {calendar.id}: {str(e)}")
-                    current_app.logger.error(f"iCal Content: {response.text[:500]}")
-                    flash(f'Error parsing calendar {calendar.name}: {str(e)}', 'warning')
+                ingest_feed(calendar, response.text)
+                calendar.last_synced = datetime.utcnow()
+                calendar.sync_status = 'Success'
+                calendar.sync_error = None
             else:
-                # Update sync status
                 calendar.sync_status = 'Error'
                 calendar.sync_error = f"HTTP error: {response.status_code}"
-                db.session.commit()
-                current_app.logger.error(f"HTTP error {response.status_code} for calendar {calendar.id}")
                 flash(f'Could not fetch calendar {calendar.name} (HTTP error {response.status_code})', 'warning')
-        except requests.exceptions.RequestException as e:
-            # Network error
-            calendar.sync_status = 'Failed'
-            calendar.sync_error = f"Request error: {str(e)[:255]}"
-            db.session.commit()
-            current_app.logger.error(f"Request error for calendar {calendar.id}: {str(e)}")
-            flash(f'Network error fetching calendar {calendar.name}: {str(e)}', 'warning')
         except Exception as e:
-            # Any other error
+            db.session.rollback()
             calendar.sync_status = 'Failed'
             calendar.sync_error = str(e)[:255]
-            db.session.commit()
-            current_app.logger.error(f"Unexpected error for calendar {calendar.id}: {str(e)}")
+            current_app.logger.error(f"Error syncing calendar {calendar.id}: {str(e)}")
             flash(f'Error syncing calendar {calendar.name}: {str(e)}', 'warning')
+        db.session.commit()
+    
+    # Prepare events data for the calendar from the stored events
+    calendars_by_id = {calendar.id: calendar for calendar in calendars}
+    stored_events = CalendarEvent.query.filter(
+        CalendarEvent.property_calendar_id.in_(calendars_by_id)
+    ).order_by(CalendarEvent.start_date).all()
+    events = []
+    for stored in stored_events:
+        calendar = calendars_by_id[stored.property_calendar_id]
+        events.append({
+            'title': stored.title or 'Booking',
+            'start': stored.start_date.isoformat(),
+            'end': stored.end_date.isoformat(),
+            'className': f"{calendar.service.lower()}-event",
+            'extendedProps': {
+                'service': calendar.get_service_display(),
+                'room': None if calendar.is_entire_property else calendar.room_name
+            }
+        })
+    success = any(calendar.feed_version is not None for calendar in calendars)
     
     # If we couldn't fetch any valid events, inform the user
     if not success and calendars:
-        flash('Could not fetch calendar data from any of the configured sources. Please check your calendar URLs and try again.', 'warning')
+        flash('None of the configured calendars has been synced yet. Please check your calendar URLs and try again.', 'warning')
     
     # Log events data size
     current_app.logger.info(f"Total events collected: {len(events)}")
@@ -1288,48 +1162,24 @@ def worker_calendar(token):
             'label': f"{week_date.strftime('%b %d')} - {week_end.strftime('%b %d, %Y')}"
         })
     
-    # Get events from all property calendars
+    # Get the stored events of all property calendars within our 4-week window
+    calendars_by_id = {calendar.id: calendar for calendar in property.calendars}
     events = []
-    if property.calendars:
-        import requests
-        try:
-            from icalendar import Calendar
-        except ImportError:
-            Calendar = None
-        
-        for calendar in property.calendars:
-            try:
-                response = requests.get(calendar.ical_url, timeout=10)
-                if response.status_code == 200:
-                    cal = safe_parse_ical(response.text)
-                    
-                    for component in cal.walk():
-                        if component.name == "VEVENT":
-                            try:
-                                summary = str(component.get('summary', 'Booking'))
-                                start_date = component.get('dtstart').dt
-                                end_date = component.get('dtend').dt
-                                
-                                # Convert datetime to date if needed
-                                if isinstance(start_date, datetime):
-                                    start_date = start_date.date()
-                                if isinstance(end_date, datetime):
-                                    end_date = end_date.date()
-                                
-                                # Only include events within our 4-week window
-                                if start_date <= weeks[-1]['end'] and end_date >= weeks[0]['start']:
-                                    event = {
-                                        'summary': summary,
-                                        'start': start_date,
-                                        'end': end_date,
-                                        'service': calendar.get_service_display(),
-                                        'room': None if calendar.is_entire_property else calendar.room_name
-                                    }
-                                    events.append(event)
-                            except (KeyError, AttributeError, ValueError, TypeError):
-                                continue
-            except Exception:
-                continue
+    if calendars_by_id:
+        stored_events = CalendarEvent.query.filter(
+            CalendarEvent.property_calendar_id.in_(calendars_by_id),
+            CalendarEvent.start_date <= weeks[-1]['end'],
+            CalendarEvent.end_date >= weeks[0]['start']
+        ).order_by(CalendarEvent.start_date).all()
+        for stored in stored_events:
+            calendar = calendars_by_id[stored.property_calendar_id]
+            events.append({
+                'summary': stored.title or 'Booking',
+                'start': stored.start_date,
+                'end': stored.end_date,
+                'service': calendar.get_service_display(),
+                'room': None if calendar.is_entire_property else calendar.room_name
+            })
     
     return render_template('property/worker_calendar.html',
                           property=property,
@@ -1338,6 +1188,15 @@ def worker_calendar(token):
                           today=today,
                           timedelta=timedelta)
 
+@bp.route('/worker-calendar/<token>/calendar.ics')
+def worker_calendar_feed(token):
+    """iCal feed of a property's stays and tasks, for workers to subscribe to"""
+    property_id = db.session.query(Property.id).filter_by(worker_calendar_token=token).scalar()
+    if property_id is None:
+        abort(404)
+    return ical_response(Feed('worker', (property_id,), private=True),
+                         name='Worker calendar', filename='worker-calendar.ics')
+
 @bp.route('/<int:id>/worker-calendar-settings', methods=['GET', 'POST'])
 @login_required
 def worker_calendar_settings(id):
@@ -1445,6 +1304,22 @@ def combined_worker_calendar(token):
                           today=today,
                           timedelta=timedelta)
 
+@bp.route('/combined-worker-calendar/<token>/calendar.ics')
+def combined_worker_calendar_feed(token):
+    """iCal feed of the stays and tasks of every property in a worker calendar assignment"""
+    from app.models import WorkerCalendarAssignment, worker_calendar_property
+    
+    assignment = db.session.query(WorkerCalendarAssignment.id, WorkerCalendarAssignment.name)\
+        .filter_by(token=token, is_active=True).first()
+    if assignment is None:
+        abort(404)
+    property_ids = tuple(sorted(db.session.scalars(
+        db.select(worker_calendar_property.c.property_id)
+        .where(worker_calendar_property.c.assignment_id == assignment.id)
+    )))
+    return ical_response(Feed('combined', property_ids, private=True),
+                         name=assignment.name, filename='combined-worker-calendar.ics')
+
 @bp.route('/combined-worker-calendar-management', methods=['GET', 'POST'])
 @login_required
 def combined_worker_calendar_management():
@@ -1584,6 +1459,39 @@ def public_booking_calendar(token):
                           title=f'Availability - {property.name}',
                           token=token)
 
+@bp.route('/booking-calendar/<token>/calendar.ics')
+def public_booking_calendar_feed(token):
+    """iCal feed of a property's reserved dates, without any guest or channel details"""
+    property_id = db.session.query(Property.id).filter_by(
+        booking_calendar_token=token, booking_calendar_enabled=True
+    ).scalar()
+    if property_id is None:
+        abort(404)
+    return ical_response(Feed('public', (property_id,), private=False),
+                         name='Availability', filename='availability.ics')
+
+@bp.route('/booking-calendar/<token>/availability')
+def public_booking_availability(token):
+    """Check whether ``check_in``/``check_out`` are free, for pre-validating the booking request form"""
+    property_id = db.session.query(Property.id).filter_by(
+        booking_calendar_token=token, booking_calendar_enabled=True
+    ).scalar()
+    if property_id is None:
+        abort(404)
+    try:
+        check_in, check_out = parse_stay(request.args.get('check_in'), request.args.get('check_out'))
+    except ValidationError as e:
+        return jsonify({'available': False, 'message': e.message, 'field': e.field}), 400
+    
+    conflict = find_conflict(property_id, check_in, check_out)
+    # Public callers learn which dates are taken, not by whom or through which channel
+    return jsonify({
+        'available': conflict is None,
+        'check_in': check_in.isoformat(),
+        'check_out': check_out.isoformat(),
+        'conflict': {'start': conflict.start.isoformat(), 'end': conflict.end.isoformat()} if conflict else None
+    })
+
 @bp.route('/<int:id>/booking-calendar-settings', methods=['GET', 'POST'])
 @login_required
 def booking_calendar_settings(id):
@@ -1629,7 +1537,7 @@ def booking_calendar_settings(id):
 @bp.route('/<int:id>/request-booking', methods=['POST'])
 def request_booking(id):
     """Handle booking request submission from public calendar"""
-    from app.utils.email import send_email
+    from app.auth.email import send_email
     
     property = Property.query.get_or_404(id)
     
@@ -1650,6 +1558,23 @@ def request_booking(id):
     special_requests = request.form.get('special_requests')
     notes = request.form.get('notes')
     
+    def reject_request(message, status_code):
+        if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+            return jsonify({'success': False, 'message': message}), status_code
+        flash(message, 'warning')
+        return redirect(url_for('property.public_booking_calendar', token=property.booking_calendar_token))
+    
+    try:
+        check_in, check_out = parse_stay(check_in_date, check_out_date)
+    except ValidationError as e:
+        return reject_request(e.message, 400)
+    
+    # Held until the request is committed, so overlapping requests cannot both pass
+    lock_property_calendar(id)
+    if find_conflict(id, check_in, check_out):
+        db.session.rollback()
+        return reject_request('Those dates are no longer available. Please choose different dates.', 409)
+    
     try:
         # Check if user with this email already exists
         existing_user = User.query.filter_by(email=guest_email).first()
@@ -1660,8 +1585,8 @@ def request_booking(id):
             guest_name=guest_name,
             guest_email=guest_email,
             guest_phone=guest_phone,
-            check_in_date=datetime.strptime(check_in_date, '%Y-%m-%d').date(),
-            check_out_date=datetime.strptime(check_out_date, '%Y-%m-%d').date(),
+            check_in_date=check_in,
+            check_out_date=check_out,
             number_of_guests=int(number_of_guests),
             previous_stay_property=previous_stay_property,
             previous_stay_dates=previous_stay_dates,
@@ -1708,9 +1633,10 @@ def request_booking(id):
             """
             
             send_email(
-                to=guest_email,
                 subject=f"Booking Request Received - {property.name}",
-                body=email_body
+                recipients=[guest_email],
+                text_body=email_body,
+                html_body=None
             )
         except Exception as e:
             current_app.logger.error(f"Failed to send booking confirmation email: {e}")
@@ -1766,9 +1692,10 @@ def request_booking(id):
                 for recipient in set(recipients):  # Remove duplicates
                     try:
                         send_email(
-                            to=recipient,
                             subject=f"New Booking Request - {property.name}",
-                            body=email_body
+                            recipients=[recipient],
+                            text_body=email_body,
+                            html_body=None
                         )
                     except Exception as e:
                         current_app.logger.error(f"Failed to send notification to {recipient}: {e}")
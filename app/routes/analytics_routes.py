@@ -6,15 +6,20 @@ Provides revenue, occupancy, and performance metrics for property owners
 from flask import Blueprint, render_template, request, jsonify, flash, redirect, url_for
 from flask_login import login_required, current_user
 from datetime import datetime, timedelta, date
-from sqlalchemy import func, extract, and_, or_
+from sqlalchemy import Numeric, cast, func, extract, and_, literal, or_, select, union_all
 import calendar
 from collections import defaultdict
+from decimal import Decimal
 
 from app import db
 from app.models import (
     Property, CalendarEvent, BookingTask, GuestBooking, User, UserRoles
 )
 from app.models_modules.invoicing import Invoice, InvoiceItem
+from app.tasks.cleaning_analytics import (DEFAULT_TREND_MONTHS, MAX_TREND_MONTHS, duration_stats, duration_trend,
+                                          month_start)
+from app.utils.error_handling import handle_errors
+from app.utils.export import export_response, stream_query
 
 bp = Blueprint('analytics', __name__, url_prefix='/analytics')
 
@@ -286,13 +291,148 @@ def api_revenue_chart():
     })
 
 
+def monthly_revenue_rows(year, property_scope=None):
+    """
+    Yield bookings and revenue per property and month for a year.
+
+    Bookings are counted in their check-in month and paid invoices in the
+    month they were created; both come from one grouped query that is
+    streamed from a server-side cursor. Revenue falls back to invoices when
+    a property has no booking amounts, as on the dashboard.
+    """
+    start_date = date(year, 1, 1)
+    end_date = date(year, 12, 31)
+    zero = cast(literal(0), Numeric(12, 2))
+
+    booking_month = extract('month', CalendarEvent.start_date)
+    bookings = select(
+        booking_month.label('month'),
+        CalendarEvent.property_id.label('property_id'),
+        func.count(CalendarEvent.id).label('bookings'),
+        cast(func.coalesce(func.sum(CalendarEvent.booking_amount), 0), Numeric(12, 2)).label('booking_revenue'),
+        zero.label('invoice_revenue')
+    ).where(
+        CalendarEvent.start_date >= start_date,
+        CalendarEvent.start_date <= end_date
+    ).group_by(booking_month, CalendarEvent.property_id)
+
+    invoice_month = extract('month', Invoice.created_at)
+    invoices = select(
+        invoice_month.label('month'),
+        Invoice.property_id.label('property_id'),
+        literal(0).label('bookings'),
+        zero.label('booking_revenue'),
+        cast(func.sum(Invoice.total), Numeric(12, 2)).label('invoice_revenue')
+    ).where(
+        Invoice.created_at >= datetime.combine(start_date, datetime.min.time()),
+        Invoice.created_at < datetime.combine(end_date + timedelta(days=1), datetime.min.time()),
+        Invoice.status == 'paid'
+    ).group_by(invoice_month, Invoice.property_id)
+
+    if property_scope is not None:
+        bookings = bookings.where(CalendarEvent.property_id.in_(property_scope))
+        invoices = invoices.where(Invoice.property_id.in_(property_scope))
+
+    activity = union_all(bookings, invoices).subquery()
+    statement = select(
+        activity.c.month,
+        Property.name,
+        func.sum(activity.c.bookings).label('bookings'),
+        func.sum(activity.c.booking_revenue).label('booking_revenue'),
+        func.sum(activity.c.invoice_revenue).label('invoice_revenue')
+    ).join(
+        Property, Property.id == activity.c.property_id
+    ).group_by(
+        activity.c.month, Property.id, Property.name
+    ).order_by(activity.c.month, Property.name, Property.id)
+
+    for row in stream_query(statement):
+        booking_revenue = Decimal(str(row.booking_revenue or 0)).quantize(Decimal('0.01'))
+        invoice_revenue = Decimal(str(row.invoice_revenue or 0)).quantize(Decimal('0.01'))
+        yield [
+            calendar.month_name[int(row.month)],
+            row.name,
+            int(row.bookings or 0),
+            booking_revenue,
+            invoice_revenue,
+            booking_revenue or invoice_revenue,
+        ]
+
+
 @bp.route('/export')
 @login_required
+@handle_errors
 def export_analytics():
-    """Export analytics data to CSV"""
-    
-    # This would generate a CSV file with analytics data
-    # Implementation depends on specific requirements
-    
-    flash('Export functionality coming soon!', 'info')
-    return redirect(url_for('analytics.business_dashboard'))
\ No newline at end of file
+    """Stream monthly bookings and revenue per property as CSV or XLSX"""
+
+    if current_user.has_admin_role:
+        property_scope = None
+    elif current_user.is_property_owner:
+        property_scope = select(Property.id).where(Property.owner_id == current_user.id)
+    elif current_user.is_property_manager:
+        property_scope = [p.id for p in current_user.managed_properties]
+    else:
+        flash('Access denied. Business analytics is only available to property owners and managers.', 'error')
+        return redirect(url_for('main.dashboard'))
+
+    year = request.args.get('year', datetime.now().year, type=int)
+    header = ['Month', 'Property', 'Bookings', 'Booking Revenue', 'Paid Invoices', 'Revenue']
+    return export_response(f'business_analytics_{year}', header, monthly_revenue_rows(year, property_scope),
+                           request.args.get('format', 'csv'), sheet_name=f'Analytics {year}')
+
+
+def _cleaning_analytics_property_ids():
+    """IDs of the properties whose cleaning analytics the current user may see, or ``None`` if not allowed"""
+    if current_user.has_admin_role:
+        return [property_id for property_id, in db.session.query(Property.id)]
+    if current_user.is_property_owner:
+        return [property_id for property_id, in db.session.query(Property.id).filter_by(owner_id=current_user.id)]
+    if current_user.is_property_manager:
+        return [p.id for p in current_user.managed_properties]
+    return None
+
+
+def cleaning_analytics(property_ids):
+    """Cleaning duration statistics for the request's filters over ``property_ids``"""
+    months = min(max(request.args.get('months', DEFAULT_TREND_MONTHS, type=int), 1), MAX_TREND_MONTHS)
+    property_id = request.args.get('property_id', type=int)
+    cleaner_id = request.args.get('cleaner_id', type=int)
+    if property_id:
+        property_ids = [property_id] if property_id in property_ids else []
+
+    start = month_start(date.today(), months - 1)
+    return {
+        'months': months,
+        'property_id': property_id,
+        'cleaner_id': cleaner_id,
+        'since': start.isoformat(),
+        'by_property': duration_stats(property_ids, 'property', start_month=start, cleaner_id=cleaner_id),
+        'by_cleaner': duration_stats(property_ids, 'cleaner', start_month=start, cleaner_id=cleaner_id),
+        'by_month_of_year': duration_stats(property_ids, 'month_of_year', start_month=start, cleaner_id=cleaner_id),
+        'trend': duration_trend(property_ids, months, cleaner_id=cleaner_id),
+    }
+
+
+@bp.route('/cleaning')
+@login_required
+def cleaning_dashboard():
+    """How long cleanings take per property, cleaner and month"""
+    property_ids = _cleaning_analytics_property_ids()
+    if property_ids is None:
+        flash('Access denied. Business analytics is only available to property owners and managers.', 'error')
+        return redirect(url_for('main.dashboard'))
+
+    properties = Property.query.filter(Property.id.in_(property_ids)).order_by(Property.name).all() \
+        if property_ids else []
+    return render_template('analytics/cleaning.html', properties=properties,
+                           analytics=cleaning_analytics(property_ids), max_months=MAX_TREND_MONTHS)
+
+
+@bp.route('/api/cleaning-durations')
+@login_required
+def api_cleaning_durations():
+    """API endpoint for cleaning duration statistics"""
+    property_ids = _cleaning_analytics_property_ids()
+    if property_ids is None:
+        return jsonify({'error': 'Access denied'}), 403
+    return jsonify(cleaning_analytics(property_ids))
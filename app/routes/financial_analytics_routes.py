@@ -3,14 +3,14 @@ Comprehensive Financial Analytics Routes
 Provides holistic financial tracking including P&L, cash flow, tax reporting
 """
 
-from flask import Blueprint, render_template, request, jsonify, flash, redirect, url_for, send_file
+from flask import Blueprint, render_template, request, jsonify, flash, redirect, url_for
 from flask_login import login_required, current_user
 from datetime import datetime, timedelta, date
-from sqlalchemy import func, or_
+from sqlalchemy import Integer, Numeric, String, and_, case, cast, extract, func, literal, null, or_, select, union_all
 import calendar
+from collections import defaultdict
 from decimal import Decimal
-import csv
-import io
+from itertools import groupby
 
 from app import db
 from app.models import Property, CalendarEvent
@@ -18,9 +18,42 @@ from app.models_modules.invoicing import Invoice
 from app.models_modules.financial_tracking import (
     Expense, ExpenseCategory, ExpenseStatus
 )
+from app.utils.error_handling import ValidationError, handle_errors
+from app.utils.export import export_response, stream_query
 
 bp = Blueprint('financial_analytics', __name__, url_prefix='/financial-analytics')
 
+# Profit and loss line each expense category is reported under
+PNL_EXPENSE_LINES = {
+    'operating_expenses': [
+        ExpenseCategory.UTILITIES,
+        ExpenseCategory.INSURANCE,
+        ExpenseCategory.PROPERTY_TAXES,
+        ExpenseCategory.REPAIRS_MAINTENANCE,
+        ExpenseCategory.SUPPLIES,
+        ExpenseCategory.PROFESSIONAL_SERVICES,
+        ExpenseCategory.MARKETING,
+        ExpenseCategory.TRAVEL,
+        ExpenseCategory.DEPRECIATION,
+    ],
+    'labor_costs': [
+        ExpenseCategory.CONTRACTOR_PAYMENTS,
+        ExpenseCategory.EMPLOYEE_WAGES,
+    ],
+    'cost_of_goods_sold': [
+        ExpenseCategory.AMENITIES,
+        ExpenseCategory.LINENS_REPLACEMENT,
+        ExpenseCategory.FURNITURE_REPLACEMENT,
+    ],
+    'capital_improvements': [
+        ExpenseCategory.IMPROVEMENTS,
+        ExpenseCategory.EQUIPMENT,
+    ],
+}
+PNL_LINE_BY_CATEGORY = {
+    category.value: line for line, categories in PNL_EXPENSE_LINES.items() for category in categories
+}
+
 
 @bp.route('/dashboard')
 @login_required
@@ -133,6 +166,8 @@ def calculate_comprehensive_metrics(properties, start_date, end_date):
             Invoice.created_at <= datetime.combine(end_date, datetime.max.time()),
             Invoice.status == 'paid'
         ).scalar() or Decimal('0.00')
+        # Invoice totals are floats; keep the metrics in Decimal
+        invoice_revenue = _money(invoice_revenue)
 
         metrics['booking_revenue'] = booking_revenue
         metrics['additional_fees'] = invoice_revenue
@@ -147,39 +182,9 @@ def calculate_comprehensive_metrics(properties, start_date, end_date):
         ).all()
 
         for expense in expenses:
-            deductible_amount = expense.deductible_amount
-
-            if expense.category in [
-                ExpenseCategory.UTILITIES.value,
-                ExpenseCategory.INSURANCE.value,
-                ExpenseCategory.PROPERTY_TAXES.value,
-                ExpenseCategory.REPAIRS_MAINTENANCE.value,
-                ExpenseCategory.SUPPLIES.value,
-                ExpenseCategory.PROFESSIONAL_SERVICES.value,
-                ExpenseCategory.MARKETING.value,
-                ExpenseCategory.TRAVEL.value,
-                ExpenseCategory.DEPRECIATION.value,
-            ]:
-                metrics['operating_expenses'] += deductible_amount
-
-            elif expense.category in [
-                ExpenseCategory.CONTRACTOR_PAYMENTS.value,
-                ExpenseCategory.EMPLOYEE_WAGES.value,
-            ]:
-                metrics['labor_costs'] += deductible_amount
-
-            elif expense.category in [
-                ExpenseCategory.AMENITIES.value,
-                ExpenseCategory.LINENS_REPLACEMENT.value,
-                ExpenseCategory.FURNITURE_REPLACEMENT.value,
-            ]:
-                metrics['cost_of_goods_sold'] += deductible_amount
-
-            elif expense.category in [
-                ExpenseCategory.IMPROVEMENTS.value,
-                ExpenseCategory.EQUIPMENT.value,
-            ]:
-                metrics['capital_improvements'] += deductible_amount
+            line = PNL_LINE_BY_CATEGORY.get(expense.category)
+            if line:
+                metrics[line] += expense.deductible_amount
 
         metrics['total_expenses'] = (
             metrics['operating_expenses'] +
@@ -421,126 +426,267 @@ def get_tax_summary(properties, year):
     }
 
 
+def _money(value):
+    """Round a SQL amount (Decimal, float or None) to cents"""
+    return Decimal(str(value or 0)).quantize(Decimal('0.01'))
+
+
+def _year_bounds(year):
+    return date(year, 1, 1), date(year, 12, 31)
+
+
+def _scoped(column, property_scope, property_id):
+    """Conditions restricting a property column to the export scope"""
+    conditions = []
+    if property_scope is not None:
+        conditions.append(column.in_(property_scope))
+    if property_id:
+        conditions.append(column == property_id)
+    return conditions
+
+
+def _expense_totals(year, property_scope=None, property_id=None, by_property=False):
+    """Paid, deductible expense totals grouped by month and category (and property)"""
+    start_date, end_date = _year_bounds(year)
+    month = extract('month', Expense.expense_date)
+    property_column = Expense.property_id if by_property else cast(null(), Integer)
+    deductible = case(
+        (Expense.tax_deductible.is_(True),
+         Expense.amount * func.coalesce(Expense.business_percentage, 100) / 100),
+        else_=0
+    )
+
+    statement = select(
+        month.label('month'),
+        property_column.label('property_id'),
+        Expense.category.label('kind'),
+        cast(func.sum(deductible), Numeric(12, 2)).label('amount')
+    ).where(
+        Expense.expense_date >= start_date,
+        Expense.expense_date <= end_date,
+        Expense.status == ExpenseStatus.PAID.value
+    )
+    scope = _scoped(Expense.property_id, property_scope, property_id)
+    if scope:
+        # Business-wide expenses are shared by every property
+        statement = statement.where(or_(Expense.property_id.is_(None), and_(*scope)))
+
+    group = [month, Expense.category] + ([Expense.property_id] if by_property else [])
+    return statement.group_by(*group)
+
+
+def profit_loss_ledger(year, property_scope=None, property_id=None, by_property=False):
+    """
+    Every monthly revenue and expense total for a year in one grouped query.
+
+    Rows carry ``month``, ``property_id``, ``property_name``, ``kind``
+    (``'revenue'`` or an expense category) and ``amount``, ordered by month
+    and then property. Revenue follows calculate_comprehensive_metrics:
+    bookings that start and end within the month plus paid invoices.
+    """
+    start_date, end_date = _year_bounds(year)
+    revenue_kind = literal('revenue', String)
+
+    booking_month = extract('month', CalendarEvent.start_date)
+    bookings = select(
+        booking_month.label('month'),
+        (CalendarEvent.property_id if by_property else cast(null(), Integer)).label('property_id'),
+        revenue_kind.label('kind'),
+        cast(func.sum(CalendarEvent.booking_amount), Numeric(12, 2)).label('amount')
+    ).where(
+        CalendarEvent.start_date >= start_date,
+        CalendarEvent.end_date <= end_date,
+        booking_month == extract('month', CalendarEvent.end_date),
+        CalendarEvent.booking_amount.isnot(None),
+        *_scoped(CalendarEvent.property_id, property_scope, property_id)
+    ).group_by(booking_month, *([CalendarEvent.property_id] if by_property else []))
+
+    invoice_month = extract('month', Invoice.created_at)
+    invoices = select(
+        invoice_month.label('month'),
+        (Invoice.property_id if by_property else cast(null(), Integer)).label('property_id'),
+        revenue_kind.label('kind'),
+        cast(func.sum(Invoice.total), Numeric(12, 2)).label('amount')
+    ).where(
+        Invoice.created_at >= datetime.combine(start_date, datetime.min.time()),
+        Invoice.created_at < datetime.combine(end_date + timedelta(days=1), datetime.min.time()),
+        Invoice.status == 'paid',
+        *_scoped(Invoice.property_id, property_scope, property_id)
+    ).group_by(invoice_month, *([Invoice.property_id] if by_property else []))
+
+    expenses = _expense_totals(year, property_scope, property_id, by_property)
+
+    ledger = union_all(bookings, invoices, expenses).subquery()
+    return select(
+        ledger.c.month, ledger.c.property_id, Property.name.label('property_name'),
+        ledger.c.kind, ledger.c.amount
+    ).outerjoin(
+        Property, Property.id == ledger.c.property_id
+    ).order_by(ledger.c.month, func.coalesce(ledger.c.property_id, 0))
+
+
+def _profit_loss_values(totals):
+    revenue = totals['revenue']
+    total_expenses = totals['operating_expenses'] + totals['labor_costs'] + totals['cost_of_goods_sold']
+    net_income = revenue - total_expenses
+    margin = round(float(net_income / revenue * 100), 1) if revenue > 0 else 0.0
+    return [
+        _money(revenue),
+        _money(totals['operating_expenses']),
+        _money(totals['labor_costs']),
+        _money(totals['cost_of_goods_sold']),
+        _money(total_expenses),
+        _money(net_income),
+        margin,
+    ]
+
+
+def profit_loss_rows(year, property_scope=None, property_id=None, by_property=False):
+    """
+    Yield monthly profit and loss rows from the streamed ledger.
+
+    Without ``by_property`` every month of the year gets a row; with it,
+    each month has a row per property with activity, and business-wide
+    expenses are reported under "All Properties".
+    """
+    rows = stream_query(profit_loss_ledger(year, property_scope, property_id, by_property))
+    next_month = 1
+    for (month, _), group in groupby(rows, key=lambda row: (int(row.month), row.property_id)):
+        totals = defaultdict(Decimal)
+        property_name = None
+        for row in group:
+            property_name = row.property_name
+            line = 'revenue' if row.kind == 'revenue' else PNL_LINE_BY_CATEGORY.get(row.kind)
+            if line:
+                totals[line] += _money(row.amount)
+
+        if by_property:
+            yield [calendar.month_name[month], property_name or 'All Properties'] + _profit_loss_values(totals)
+            continue
+        for empty_month in range(next_month, month):
+            yield [calendar.month_name[empty_month]] + _profit_loss_values(defaultdict(Decimal))
+        yield [calendar.month_name[month]] + _profit_loss_values(totals)
+        next_month = month + 1
+
+    if not by_property:
+        for empty_month in range(next_month, 13):
+            yield [calendar.month_name[empty_month]] + _profit_loss_values(defaultdict(Decimal))
+
+
+def expense_category_rows(year, property_scope=None, property_id=None):
+    """Yield deductible expense totals per month and category"""
+    totals = _expense_totals(year, property_scope, property_id).subquery()
+    statement = select(totals.c.month, totals.c.kind, totals.c.amount).order_by(totals.c.month, totals.c.kind)
+    for row in stream_query(statement):
+        line = PNL_LINE_BY_CATEGORY.get(row.kind, 'other')
+        yield [
+            calendar.month_name[int(row.month)],
+            row.kind.replace('_', ' ').title(),
+            line.replace('_', ' ').title(),
+            _money(row.amount),
+        ]
+
+
+def tax_report_rows(year, property_scope=None):
+    """Yield every paid, tax-deductible expense of the year, oldest first"""
+    start_date, end_date = _year_bounds(year)
+    statement = select(
+        Expense.expense_date, Expense.category, Expense.description, Expense.vendor,
+        Expense.amount, Expense.business_percentage, Expense.receipt_url,
+        Property.name.label('property_name')
+    ).outerjoin(
+        Property, Property.id == Expense.property_id
+    ).where(
+        Expense.expense_date >= start_date,
+        Expense.expense_date <= end_date,
+        Expense.tax_deductible.is_(True),
+        Expense.status == ExpenseStatus.PAID.value
+    ).order_by(Expense.expense_date, Expense.id)
+    if property_scope is not None:
+        statement = statement.where(or_(Expense.property_id.in_(property_scope), Expense.property_id.is_(None)))
+
+    for row in stream_query(statement):
+        business_percentage = row.business_percentage if row.business_percentage is not None else 100
+        yield [
+            row.expense_date,
+            row.category,
+            row.description,
+            row.vendor or '',
+            _money(row.amount),
+            business_percentage,
+            _money(row.amount * Decimal(business_percentage) / Decimal('100')),
+            row.property_name or 'All Properties',
+            'Yes' if row.receipt_url else 'No',
+        ]
+
+
+PROFIT_LOSS_HEADER = [
+    'Gross Revenue', 'Operating Expenses', 'Labor Costs',
+    'Cost of Goods Sold', 'Total Expenses', 'Net Income', 'Profit Margin %'
+]
+
+
 @bp.route('/export/profit-loss')
 @login_required
+@handle_errors
 def export_profit_loss():
-    """Export profit and loss statement as CSV"""
+    """Stream the monthly profit and loss statement as CSV or XLSX.
+
+    ``breakdown=property`` reports each property per month and
+    ``breakdown=category`` lists expense totals per category.
+    """
 
     year = request.args.get('year', datetime.now().year, type=int)
     property_id = request.args.get('property_id', type=int)
+    breakdown = request.args.get('breakdown')
+    export_format = request.args.get('format', 'csv')
 
-    # Get properties
+    # Get property scope
     if current_user.has_admin_role:
-        properties = Property.query.all()
+        property_scope = None
     elif current_user.is_property_owner:
-        properties = Property.query.filter_by(owner_id=current_user.id).all()
+        property_scope = select(Property.id).where(Property.owner_id == current_user.id)
     elif current_user.is_property_manager:
-        properties = current_user.managed_properties
+        property_scope = [p.id for p in current_user.managed_properties]
     else:
         return jsonify({'error': 'Access denied'}), 403
 
-    if property_id:
-        properties = [p for p in properties if p.id == property_id]
-
-    # Generate monthly P&L for the year
-    output = io.StringIO()
-    writer = csv.writer(output)
-
-    # Headers
-    writer.writerow([
-        'Month', 'Gross Revenue', 'Operating Expenses', 'Labor Costs',
-        'Cost of Goods Sold', 'Total Expenses', 'Net Income', 'Profit Margin %'
-    ])
-
-    for month in range(1, 13):
-        start_date = date(year, month, 1)
-        _, last_day = calendar.monthrange(year, month)
-        end_date = date(year, month, last_day)
-
-        metrics = calculate_comprehensive_metrics(properties, start_date, end_date)
-
-        writer.writerow([
-            calendar.month_name[month],
-            f"{metrics['gross_revenue']:.2f}",
-            f"{metrics['operating_expenses']:.2f}",
-            f"{metrics['labor_costs']:.2f}",
-            f"{metrics['cost_of_goods_sold']:.2f}",
-            f"{metrics['total_expenses']:.2f}",
-            f"{metrics['net_income']:.2f}",
-            f"{metrics['profit_margin']:.1f}%"
-        ])
-
-    output.seek(0)
-
-    # Create response
-    response = send_file(
-        io.BytesIO(output.getvalue().encode()),
-        mimetype='text/csv',
-        as_attachment=True,
-        download_name=f'profit_loss_{year}.csv'
-    )
+    if breakdown == 'property':
+        header = ['Month', 'Property'] + PROFIT_LOSS_HEADER
+        rows = profit_loss_rows(year, property_scope, property_id, by_property=True)
+    elif breakdown == 'category':
+        header = ['Month', 'Category', 'P&L Line', 'Deductible Amount']
+        rows = expense_category_rows(year, property_scope, property_id)
+    elif breakdown:
+        raise ValidationError(f'Unknown breakdown: {breakdown}', field='breakdown')
+    else:
+        header = ['Month'] + PROFIT_LOSS_HEADER
+        rows = profit_loss_rows(year, property_scope, property_id)
 
-    return response
+    filename = f'profit_loss_{year}' + (f'_by_{breakdown}' if breakdown else '')
+    return export_response(filename, header, rows, export_format, sheet_name=f'Profit and Loss {year}')
 
 
 @bp.route('/export/tax-report')
 @login_required
+@handle_errors
 def export_tax_report():
-    """Export tax-ready expense report"""
+    """Stream the tax-ready expense report as CSV or XLSX"""
 
     year = request.args.get('year', datetime.now().year, type=int)
+    export_format = request.args.get('format', 'csv')
 
-    # Get properties
+    # Get property scope
     if current_user.has_admin_role:
-        properties = Property.query.all()
+        property_scope = None
     elif current_user.is_property_owner:
-        properties = Property.query.filter_by(owner_id=current_user.id).all()
+        property_scope = select(Property.id).where(Property.owner_id == current_user.id)
     else:
         return jsonify({'error': 'Access denied'}), 403
 
-    property_ids = [p.id for p in properties]
-
-    start_date = date(year, 1, 1)
-    end_date = date(year, 12, 31)
-
-    # Get all deductible expenses
-    expenses = db.session.query(Expense).filter(
-        or_(Expense.property_id.in_(property_ids), Expense.property_id.is_(None)),
-        Expense.expense_date >= start_date,
-        Expense.expense_date <= end_date,
-        Expense.tax_deductible is True,
-        Expense.status == ExpenseStatus.PAID.value
-    ).order_by(Expense.expense_date).all()
-
-    output = io.StringIO()
-    writer = csv.writer(output)
-
-    # Headers
-    writer.writerow([
+    header = [
         'Date', 'Category', 'Description', 'Vendor', 'Amount',
         'Business %', 'Deductible Amount', 'Property', 'Receipt'
-    ])
-
-    for expense in expenses:
-        writer.writerow([
-            expense.expense_date.strftime('%Y-%m-%d'),
-            expense.category,
-            expense.description,
-            expense.vendor or '',
-            f"{expense.amount:.2f}",
-            f"{expense.business_percentage}%",
-            f"{expense.deductible_amount:.2f}",
-            expense.property.name if expense.property else 'All Properties',
-            'Yes' if expense.receipt_url else 'No'
-        ])
-
-    output.seek(0)
-
-    response = send_file(
-        io.BytesIO(output.getvalue().encode()),
-        mimetype='text/csv',
-        as_attachment=True,
-        download_name=f'tax_report_{year}.csv'
-    )
-
-    return response
+    ]
+    return export_response(f'tax_report_{year}', header, tax_report_rows(year, property_scope),
+                           export_format, sheet_name=f'Tax Report {year}')
@@ -4,13 +4,10 @@ from flask_login import current_user, login_required
 from app import db
 from app.models import Property, RecommendationBlock, GuestInvitation
 from app.forms.guest_forms import GuestInvitationForm, BulkInvitationForm
-from app.services.property_data_service import PropertyDataIntegrationService
 from app.services.manual_entry_helper import ManualEntryHelper
 import logging
-import flask
 
 # Set log level to DEBUG for troubleshooting
-flask.current_app = None  # Avoids issues if not in app context
 logging.basicConfig(level=logging.DEBUG)
 
 bp = Blueprint('property_routes', __name__)
@@ -43,11 +40,14 @@ def public_guide_book(token):
         property_id=property.id
     ).order_by(RecommendationBlock.created_at.desc()).all()
 
+    voted_ids = RecommendationBlock.voted_ids_for(guest_token, [rec.id for rec in recommendations])
+
     response = make_response(render_template(
         'property/public_guide.html',
         property=property,
         recommendations=recommendations,
-        guest_token=guest_token
+        guest_token=guest_token,
+        voted_ids=voted_ids
     ))
 
     # Set cookie if it doesn't exist
@@ -117,7 +117,8 @@ def get_property_suggestions():
                 'error': 'Address or URL is required'
             }), 400
 
-        # Initialize property data service
+        # Initialize property data service; its scrapers pull in bs4 and playwright, so load them on use
+        from app.services.property_data_service import PropertyDataIntegrationService
         property_service = PropertyDataIntegrationService()
 
         # Get property suggestions
@@ -2,12 +2,11 @@ from flask import Blueprint, render_template, redirect, url_for, flash, request,
 from flask_login import login_required, current_user
 import os
 from app import db
-from app.models import RecommendationBlock, Property, MediaType, RecommendationVote, GuideBook, GuideBookSection, GuideBookEntry
+from app.models import RecommendationBlock, Property, MediaType, GuideBook, GuideBookSection, GuideBookEntry
 from app.forms.recommendation_forms import RecommendationBlockForm
 from app.forms.guide_book_forms import GuideBookForm
 from app.forms.guide_book_section_forms import GuideBookSectionForm, GuideBookEntryForm, BulkGuideBookEntryForm
 from app.utils.storage import allowed_file, save_file_to_storage
-from sqlalchemy import func
 
 bp = Blueprint('recommendations', __name__)
 
@@ -46,12 +45,14 @@ def list_recommendations(property_id):
     query = query.order_by(RecommendationBlock.in_guide_book.desc(), RecommendationBlock.title)
     
     recommendations = query.all()
+    voted_ids = RecommendationBlock.voted_ids_for(guest_token, [rec.id for rec in recommendations])
     return render_template('recommendations/list.html', 
                          property=property,
                          recommendations=recommendations,
                          current_category=category,
                          search_query=search,
-                         guest_token=guest_token)
+                         guest_token=guest_token,
+                         voted_ids=voted_ids)
 
 @bp.route('/property/<int:property_id>/guide-books')
 @login_required
@@ -130,11 +131,15 @@ def view_guide_book(id):
             categorized_recommendations[category] = []
         categorized_recommendations[category].append(rec)
     
+    guest_token = request.headers.get('X-Guest-Token') or request.cookies.get('guest_token')
+    voted_ids = RecommendationBlock.voted_ids_for(guest_token, [rec.id for rec in guide_book.recommendations])
+    
     return render_template('recommendations/guide_book.html',
                          guide_book=guide_book,
                          property=property,
                          categorized_recommendations=categorized_recommendations,
-                         guest_token=request.headers.get('X-Guest-Token') or request.cookies.get('guest_token'))
+                         guest_token=guest_token,
+                         voted_ids=voted_ids)
 
 @bp.route('/guide-books/<token>/public')
 def public_guide_book(token):
@@ -150,10 +155,15 @@ def public_guide_book(token):
             categorized_recommendations[category] = []
         categorized_recommendations[category].append(rec)
     
+    guest_token = request.headers.get('X-Guest-Token') or request.cookies.get('guest_token')
+    voted_ids = RecommendationBlock.voted_ids_for(guest_token, [rec.id for rec in guide_book.recommendations])
+    
     return render_template('recommendations/guide_book.html',
                          guide_book=guide_book,
                          property=property,
                          categorized_recommendations=categorized_recommendations,
+                         guest_token=guest_token,
+                         voted_ids=voted_ids,
                          is_public_view=True)
 
 @bp.route('/guide-books/<int:id>/edit', methods=['GET', 'POST'])
@@ -359,18 +369,9 @@ def dashboard():
         # Filter by user's properties if not admin
         query = query.join(Property).filter(Property.owner_id == current_user.id)
     
-    # Use a subquery to count votes
-    vote_count = db.session.query(
-        RecommendationVote.recommendation_id,
-        func.count(RecommendationVote.id).label('vote_count')
-    ).group_by(RecommendationVote.recommendation_id).subquery()
-    
-    # Join with vote counts and order by votes
-    recommendations = query.outerjoin(
-        vote_count,
-        RecommendationBlock.id == vote_count.c.recommendation_id
-    ).order_by(
-        vote_count.c.vote_count.desc().nullslast(),
+    # Order by the maintained vote counter
+    recommendations = query.order_by(
+        RecommendationBlock.votes_count.desc(),
         RecommendationBlock.created_at.desc()
     ).all()
     
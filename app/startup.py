@@ -0,0 +1,106 @@
+"""
+One-time database preparation and integration checks
+
+These steps used to run inside create_app on every process start. They
+touch the database or the network, so they now run once per deploy as a
+release step, ``flask prepare``, before the new revision takes traffic.
+create_app still runs them when PREPARE_DATABASE_ON_STARTUP is set, which
+is the default for local development.
+"""
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import inspect, text
+
+from app import db
+
+
+def reset_stuck_transactions(app):
+    """PostgreSQL only: terminate connections left idle in a transaction by crashed workers"""
+    if not app.config['SQLALCHEMY_DATABASE_URI'].startswith('postgresql'):
+        return
+    app.logger.info("Checking PostgreSQL transactions and schema...")
+    try:
+        # Reset any aborted transactions with autocommit isolation
+        with db.engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            transactions = conn.execute(text("""
+                SELECT pid, state
+                FROM pg_stat_activity
+                WHERE state = 'idle in transaction' OR
+                      state = 'idle in transaction (aborted)'
+            """)).fetchall()
+
+            if transactions:
+                app.logger.warning(f"Found {len(transactions)} potentially problematic transactions. Resetting them...")
+            for tx in transactions:
+                try:
+                    conn.execute(text("SELECT pg_terminate_backend(:pid)"), {'pid': tx.pid})
+                    app.logger.info(f"Terminated connection {tx.pid} in state {tx.state}")
+                except Exception as e:
+                    app.logger.warning(f"Could not terminate connection {tx.pid}: {str(e)}")
+        app.logger.info("PostgreSQL transaction check completed")
+    except Exception as e:
+        app.logger.warning(f"Could not check PostgreSQL transactions: {str(e)}")
+
+
+def create_missing_tables(app):
+    """Create the schema on a fresh database; existing databases are left to migrations"""
+    try:
+        if 'property' not in inspect(db.engine).get_table_names():
+            app.logger.info("Creating database tables...")
+            db.create_all()
+            app.logger.info("Database tables successfully created")
+    except Exception as e:
+        app.logger.error(f"Error creating database tables: {str(e)}")
+
+
+def seed_defaults(app):
+    """Default site settings, and the admin user configured in the environment"""
+    try:
+        from app.models import migrate_site_settings, create_admin_user_from_env
+        migrate_site_settings()
+        create_admin_user_from_env()
+    except Exception as e:
+        db.session.rollback()
+        app.logger.warning(f"Could not initialize site settings: {str(e)}")
+        app.logger.info("You may need to run 'flask db upgrade' if this is a new installation")
+
+
+def check_twilio(app):
+    """Log whether SMS can be sent with the configured Twilio account"""
+    try:
+        from app.utils.sms import validate_twilio_config
+        is_valid, message = validate_twilio_config()
+        if not is_valid:
+            app.logger.warning(f"Twilio configuration issue: {message}")
+            app.logger.warning("SMS functionality may not work properly")
+        else:
+            app.logger.info("Twilio configuration validated successfully")
+    except Exception as e:
+        app.logger.warning(f"Could not validate Twilio configuration: {str(e)}")
+
+
+def prepare_database(app):
+    """Run every one-time preparation step in an app context"""
+    with app.app_context():
+        reset_stuck_transactions(app)
+        create_missing_tables(app)
+        seed_defaults(app)
+        check_twilio(app)
+
+
+@click.command('prepare')
+@with_appcontext
+def prepare_command():
+    """Release step: prepare the database and check integrations"""
+    prepare_database(current_app._get_current_object())
+    click.echo("Database prepared")
+
+
+def init_startup(app, prepare=None):
+    """Register ``flask prepare`` and run it now if the app is configured to prepare on startup"""
+    app.cli.add_command(prepare_command)
+    if prepare is None:
+        prepare = app.config.get('PREPARE_DATABASE_ON_STARTUP', True)
+    if prepare:
+        prepare_database(app)
@@ -0,0 +1,153 @@
+"""
+Cleaning duration analytics
+
+How long turnovers take per property, per cleaner, per time of year and
+month by month. Every figure is read from CleaningDurationRollup, the
+per property, cleaner, month and duration bucket histograms kept current
+as sessions are completed, so a query sums at most a few hundred rows
+per group however many years of sessions there are. Percentiles are
+interpolated within CLEANING_DURATION_BUCKET_MINUTES wide buckets;
+averages are exact.
+"""
+import calendar
+from collections import defaultdict
+from datetime import date
+
+from sqlalchemy import extract, func
+
+from app import db
+from app.models import (CLEANING_DURATION_BUCKET_MINUTES, MAX_CLEANING_DURATION_BUCKET, CleaningDurationRollup,
+                        Property, User)
+
+DEFAULT_TREND_MONTHS = 12
+MAX_TREND_MONTHS = 120
+
+GROUPINGS = ('property', 'cleaner', 'month_of_year')
+
+
+def duration_percentile(histogram, fraction):
+    """
+    The ``fraction`` percentile, in minutes, of a ``{bucket: session_count}`` histogram.
+
+    Interpolates linearly within the bucket holding the rank; sessions in
+    the last, open-ended bucket are taken at its lower bound.
+    """
+    total = sum(histogram.values())
+    if total <= 0:
+        return None
+    rank = fraction * total
+    seen = 0
+    for bucket in sorted(histogram):
+        count = histogram[bucket]
+        if count <= 0:
+            continue
+        if seen + count >= rank:
+            lower = bucket * CLEANING_DURATION_BUCKET_MINUTES
+            if bucket >= MAX_CLEANING_DURATION_BUCKET:
+                return lower
+            return round(lower + CLEANING_DURATION_BUCKET_MINUTES * (rank - seen) / count)
+        seen += count
+    return max(histogram) * CLEANING_DURATION_BUCKET_MINUTES
+
+
+def summarize(histogram, total_minutes):
+    """Session count, average, p50 and p90 of one histogram"""
+    sessions = sum(histogram.values())
+    return {
+        'sessions': sessions,
+        'average_minutes': round(total_minutes / sessions) if sessions > 0 else None,
+        'p50_minutes': duration_percentile(histogram, 0.5),
+        'p90_minutes': duration_percentile(histogram, 0.9),
+    }
+
+
+def month_start(day, months_back=0):
+    """First day of the month ``months_back`` months before ``day``'s"""
+    index = day.year * 12 + day.month - 1 - months_back
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def _histograms(group_column, property_ids, start_month=None, end_month=None, cleaner_id=None):
+    """``{group: (histogram, total_minutes)}`` from one grouped query over the rollups"""
+    query = db.session.query(
+        group_column,
+        CleaningDurationRollup.bucket,
+        func.sum(CleaningDurationRollup.session_count),
+        func.sum(CleaningDurationRollup.total_minutes),
+    ).filter(CleaningDurationRollup.property_id.in_(property_ids))
+    if start_month:
+        query = query.filter(CleaningDurationRollup.month >= start_month)
+    if end_month:
+        query = query.filter(CleaningDurationRollup.month <= end_month)
+    if cleaner_id:
+        query = query.filter(CleaningDurationRollup.cleaner_id == cleaner_id)
+
+    groups = defaultdict(lambda: [{}, 0])
+    for group, bucket, sessions, minutes in query.group_by(group_column, CleaningDurationRollup.bucket):
+        groups[group][0][bucket] = sessions or 0
+        groups[group][1] += minutes or 0
+    return groups
+
+
+def _labels(group_by, keys):
+    if not keys:
+        return {}
+    if group_by == 'property':
+        rows = db.session.query(Property.id, Property.name).filter(Property.id.in_(keys))
+        return dict(rows)
+    if group_by == 'cleaner':
+        rows = db.session.query(User.id, User.first_name, User.last_name).filter(User.id.in_(keys))
+        return {user_id: f"{first_name or ''} {last_name or ''}".strip() for user_id, first_name, last_name in rows}
+    return {month: calendar.month_name[month] for month in keys}
+
+
+def duration_stats(property_ids, group_by='property', start_month=None, end_month=None, cleaner_id=None):
+    """
+    Duration statistics of the properties' cleaning sessions per ``group_by``.
+
+    ``group_by`` is one of GROUPINGS; ``month_of_year`` pools every year's
+    January, February and so on to show seasonal differences. Months are
+    first-of-month dates and both bounds are inclusive. Returns a list of
+    dicts with ``id``, ``label`` and the summarize() figures, busiest first.
+    """
+    if group_by not in GROUPINGS:
+        raise ValueError(f"Unknown grouping: {group_by}")
+    if not property_ids:
+        return []
+    column = {
+        'property': CleaningDurationRollup.property_id,
+        'cleaner': CleaningDurationRollup.cleaner_id,
+        'month_of_year': extract('month', CleaningDurationRollup.month),
+    }[group_by]
+
+    groups = _histograms(column, property_ids, start_month, end_month, cleaner_id)
+    keys = [int(key) for key in groups]
+    labels = _labels(group_by, keys)
+    stats = []
+    for key, (histogram, total_minutes) in groups.items():
+        summary = summarize(histogram, total_minutes)
+        if summary['sessions'] > 0:
+            stats.append(dict(id=int(key), label=labels.get(int(key), f"#{key}"), **summary))
+    if group_by == 'month_of_year':
+        return sorted(stats, key=lambda row: row['id'])
+    return sorted(stats, key=lambda row: (-row['sessions'], row['label']))
+
+
+def duration_trend(property_ids, months=DEFAULT_TREND_MONTHS, today=None, cleaner_id=None):
+    """
+    Month-by-month duration statistics over the last ``months`` months, oldest first.
+
+    Every month in the range is listed; months without sessions have a
+    session count of zero and no averages or percentiles.
+    """
+    today = today or date.today()
+    first = month_start(today, months - 1)
+    groups = _histograms(CleaningDurationRollup.month, property_ids, first, None, cleaner_id) if property_ids else {}
+
+    trend = []
+    for offset in range(months - 1, -1, -1):
+        month = month_start(today, offset)
+        histogram, total_minutes = groups.get(month, ({}, 0))
+        trend.append(dict(month=month.isoformat(), label=month.strftime('%b %Y'),
+                          **summarize(histogram, total_minutes)))
+    return trend
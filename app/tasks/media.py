@@ -1,6 +1,5 @@
 import os
 import uuid
-import boto3
 try:
     import magic
     MAGIC_AVAILABLE = True
@@ -190,7 +189,8 @@ def save_file_to_s3(file_storage, session_id, media_type, filename, is_start_vid
     secret_key = current_app.config.get('S3_SECRET_KEY')
     prefix = current_app.config.get('S3_PREFIX')
     
-    # Create S3 client
+    # Create S3 client; boto3 is slow to import, so only S3 uploads load it
+    import boto3
     s3_client = boto3.client(
         's3',
         region_name=region,
@@ -13,6 +13,7 @@ from app.models import (Task, TaskAssignment, TaskProperty, Property, User,
                        TaskTemplate, TaskMedia)
 from app.tasks.media import save_file_to_storage, allowed_file
 from app.notifications.service import send_task_assignment_notification, send_repair_request_notification
+from app.workforce.service import get_worker_property_ids
 from datetime import datetime, timedelta
 from sqlalchemy import or_
 from functools import wraps
@@ -261,19 +262,21 @@ def edit(id):
             db.session.commit()
             
             # Update properties - handling separately to avoid null property_id issues
-            # First, remove all existing property associations
-            TaskProperty.query.filter_by(task_id=task.id).delete()
+            # First, remove all existing property associations through the ORM, so the
+            # worker/property index and the property history totals follow the change
+            for task_property in list(task.task_properties):
+                db.session.delete(task_property)
+            db.session.flush()
             
             # Then add the new ones
-            if form.properties.data:
-                for property in form.properties.data:
-                    task_property = TaskProperty(
-                        task_id=task.id, 
-                        property_id=property.id
-                    )
-                    db.session.add(task_property)
-                
-                db.session.commit()
+            for property in form.properties.data or []:
+                task_property = TaskProperty(
+                    task_id=task.id, 
+                    property_id=property.id
+                )
+                db.session.add(task_property)
+            
+            db.session.commit()
             
             flash('Task updated successfully!', 'success')
             return redirect(url_for('tasks.view', id=task.id))
@@ -687,24 +690,7 @@ def view_for_property(property_id):
         can_view = True
     # Service staff can view tasks for properties they have tasks for
     elif current_user.is_service_staff:
-        # Use aliases to avoid duplicate table errors
-        from sqlalchemy.orm import aliased
-        task_property_alias = aliased(TaskProperty)
-        task_assignment_alias = aliased(TaskAssignment)
-        
-        # Check if the service staff has any assigned tasks for this property
-        assigned_tasks = db.session.query(Task).join(
-            task_property_alias, Task.id == task_property_alias.task_id
-        ).filter(
-            task_property_alias.property_id == property_id
-        ).join(
-            task_assignment_alias, Task.id == task_assignment_alias.task_id
-        ).filter(
-            task_assignment_alias.user_id == current_user.id
-        ).first()
-        
-        if assigned_tasks:
-            can_view = True
+        can_view = property_id in get_worker_property_ids(current_user.id)
     
     if not can_view:
         flash('You do not have permission to view tasks for this property.', 'danger')
@@ -16,11 +16,23 @@ except ImportError:
     cache = None
     import logging
     logging.getLogger(__name__).warning("Could not import cache from app, caching disabled")
-from app.models import User, Property, Task
-from sqlalchemy.orm import joinedload, selectinload
+from app import db
+from app.models import (User, Property, Room, Task, TaskAssignment, TaskProperty, Booking, CalendarEvent,
+                        GuestBooking)
+from flask import has_app_context
+from sqlalchemy import case, event, func, inspect, select
+from sqlalchemy.orm import Session, joinedload, selectinload
+from app.utils.tagged_cache import TaggedCache, CacheManagerBackend, FlaskCacheBackend, RedisBackend
+from itertools import chain
 import json
 import hashlib
 
+# Entries below are invalidated on commit by the session hooks at the end of
+# this module, so their TTLs only bound how long an unrelated miss can linger
+DEPENDENT_CACHE_TIMEOUT = 6 * 60 * 60
+# Figures relative to "today" still need to roll over with the clock
+DAILY_CACHE_TIMEOUT = 60 * 60
+
 
 def cache_key_generator(*args, **kwargs):
     """Generate a cache key from function arguments"""
@@ -28,33 +40,68 @@ def cache_key_generator(*args, **kwargs):
     return hashlib.md5(key_data.encode()).hexdigest()
 
 
-def cached_query(timeout=300, key_prefix='query'):
-    """Decorator for caching database queries"""
+SYSTEM_TAG = 'system'
+# Carried by every task-derived entry, so all of them can be dropped at once
+TASKS_TAG = 'tasks'
+
+
+def user_tag(user_id):
+    return f"user:{user_id}"
+
+
+def property_tag(property_id):
+    return f"property:{property_id}"
+
+
+def get_tag_cache():
+    """
+    The app's TaggedCache, created on first use.
+
+    Uses the Flask-Caching backend when it is installed, a direct Redis
+    client when CACHE_TYPE is redis without it, and otherwise the
+    in-process CacheManager.
+    """
+    tag_cache = current_app.extensions.get('tag_cache')
+    if tag_cache is not None:
+        return tag_cache
+
+    backend = None
+    if cache is not None:
+        backend = FlaskCacheBackend(cache)
+    elif current_app.config.get('CACHE_TYPE') == 'redis':
+        try:
+            backend = RedisBackend.from_url(current_app.config.get('CACHE_REDIS_URL'))
+        except ImportError:
+            current_app.logger.warning("redis is not installed, using the in-process cache")
+    if backend is None:
+        from app.utils.performance import cache as cache_manager
+        backend = CacheManagerBackend(cache_manager)
+    return current_app.extensions.setdefault('tag_cache', TaggedCache(backend))
+
+
+def cached_query(timeout=300, key_prefix='query', tags=None):
+    """
+    Decorator for caching database queries.
+
+    ``tags`` is called with the function's arguments and returns the tags
+    the result depends on (e.g. ``lambda user_id: [user_tag(user_id)]``);
+    invalidating any of them drops the entry. Without it the entry is
+    tagged with ``key_prefix`` alone.
+    """
     def decorator(f):
         @wraps(f)
         def decorated_function(*args, **kwargs):
-            # If cache is not available, just execute the function
-            if cache is None:
-                current_app.logger.debug("Cache not available, executing function directly")
-                return f(*args, **kwargs)
+            cache_key = f"{key_prefix}:{f.__name__}:{cache_key_generator(*args, **kwargs)}"
+            entry_tags = list(tags(*args, **kwargs)) if tags else [key_prefix]
             
-            # Generate cache key
-            args_str = '_'.join(str(arg) for arg in args)
-            kwargs_str = '_'.join(f"{k}:{v}" for k, v in sorted(kwargs.items()))
-            cache_key = f"{key_prefix}_{f.__name__}_{args_str}_{kwargs_str}"
+            try:
+                tag_cache = get_tag_cache()
+            except Exception as cache_error:
+                current_app.logger.warning(f"Cache unavailable for {cache_key}: {cache_error}")
+                return f(*args, **kwargs)
             
             try:
-                # Try to get from cache
-                result = cache.get(cache_key)
-                if result is not None:
-                    current_app.logger.debug(f"Cache hit: {cache_key}")
-                    return result
-                
-                # Execute function and cache result
-                current_app.logger.debug(f"Cache miss: {cache_key}")
-                result = f(*args, **kwargs)
-                cache.set(cache_key, result, timeout=timeout)
-                return result
+                return tag_cache.get_or_set(cache_key, entry_tags, lambda: f(*args, **kwargs), ttl=timeout)
             except Exception as cache_error:
                 current_app.logger.warning(f"Cache operation failed for {cache_key}: {cache_error}")
                 # Fallback to direct execution if cache fails
@@ -67,19 +114,28 @@ class CacheService:
     """Centralized caching service for the application"""
     
     @staticmethod
-    @cached_query(timeout=600, key_prefix='user_dashboard')
+    @cached_query(timeout=DEPENDENT_CACHE_TIMEOUT, key_prefix='user_dashboard',
+                  tags=lambda user_id: [user_tag(user_id), TASKS_TAG])
     def get_user_dashboard_data(user_id):
         """Get optimized user dashboard data with caching"""
         try:
-            user = User.query.options(
-                joinedload(User.properties).selectinload(Property.rooms),
-                selectinload(User.assigned_tasks).joinedload(Task.property),
-                selectinload(User.created_tasks)
-            ).filter_by(id=user_id).first()
-            
+            user = User.query.get(user_id)
             if not user:
                 return None
             
+            room_counts = select(Room.property_id, func.count(Room.id).label('room_count')).group_by(
+                Room.property_id).subquery()
+            properties = db.session.query(Property, func.coalesce(room_counts.c.room_count, 0)).outerjoin(
+                room_counts, room_counts.c.property_id == Property.id
+            ).filter(Property.owner_id == user_id).order_by(Property.name).all()
+            
+            # Recent tasks, with the property joined in rather than lazy-loaded per task
+            assigned_tasks = Task.query.options(joinedload(Task.property)).join(
+                TaskAssignment, TaskAssignment.task_id == Task.id
+            ).filter(TaskAssignment.user_id == user_id).order_by(Task.created_at.desc()).limit(10).all()
+            created_tasks = Task.query.filter(Task.creator_id == user_id).order_by(
+                Task.created_at.desc()).limit(10).all()
+            
             # Convert to serializable format for caching
             return {
                 'user': {
@@ -93,8 +149,8 @@ class CacheService:
                         'id': prop.id,
                         'name': prop.name,
                         'address': prop.address,
-                        'room_count': len(prop.rooms) if prop.rooms else 0
-                    } for prop in user.properties
+                        'room_count': room_count
+                    } for prop, room_count in properties
                 ],
                 'assigned_tasks': [
                     {
@@ -103,7 +159,7 @@ class CacheService:
                         'status': task.status.value if task.status else None,
                         'due_date': task.due_date.isoformat() if task.due_date else None,
                         'property_name': task.property.name if task.property else None
-                    } for task in user.assigned_tasks[:10]  # Limit to recent tasks
+                    } for task in assigned_tasks
                 ],
                 'created_tasks': [
                     {
@@ -111,7 +167,7 @@ class CacheService:
                         'title': task.title,
                         'status': task.status.value if task.status else None,
                         'due_date': task.due_date.isoformat() if task.due_date else None
-                    } for task in user.created_tasks[:10]  # Limit to recent tasks
+                    } for task in created_tasks
                 ]
             }
         except Exception as e:
@@ -119,18 +175,23 @@ class CacheService:
             return None
     
     @staticmethod
-    @cached_query(timeout=1800, key_prefix='property_stats')
+    @cached_query(timeout=DEPENDENT_CACHE_TIMEOUT, key_prefix='property_stats',
+                  tags=lambda property_id: [property_tag(property_id), TASKS_TAG])
     def get_property_statistics(property_id):
         """Get property statistics with caching"""
         try:
+            from app.models import TaskStatus
+            
             property = Property.query.get(property_id)
             if not property:
                 return None
             
-            # Calculate statistics
-            total_tasks = property.property_tasks.count()
-            completed_tasks = property.property_tasks.filter_by(status='completed').count()
-            pending_tasks = property.property_tasks.filter_by(status='pending').count()
+            # Calculate statistics in one aggregate query
+            total_tasks, completed_tasks, pending_tasks = db.session.query(
+                func.count(Task.id),
+                func.coalesce(func.sum(case((Task.status == TaskStatus.COMPLETED, 1), else_=0)), 0),
+                func.coalesce(func.sum(case((Task.status == TaskStatus.PENDING, 1), else_=0)), 0)
+            ).filter(Task.property_id == property_id).one()
             
             return {
                 'property_id': property_id,
@@ -138,14 +199,15 @@ class CacheService:
                 'completed_tasks': completed_tasks,
                 'pending_tasks': pending_tasks,
                 'completion_rate': (completed_tasks / total_tasks * 100) if total_tasks > 0 else 0,
-                'room_count': len(property.rooms) if property.rooms else 0
+                'room_count': property.rooms.count()
             }
         except Exception as e:
             current_app.logger.error(f"Error getting property statistics: {e}")
             return None
     
     @staticmethod
-    @cached_query(timeout=900, key_prefix='task_summary')
+    @cached_query(timeout=DAILY_CACHE_TIMEOUT, key_prefix='task_summary',
+                  tags=lambda user_id: [user_tag(user_id), TASKS_TAG])
     def get_user_task_summary(user_id):
         """Get user task summary with caching"""
         try:
@@ -196,7 +258,7 @@ class CacheService:
             }
     
     @staticmethod
-    @cached_query(timeout=3600, key_prefix='system_stats')
+    @cached_query(timeout=3600, key_prefix='system_stats', tags=lambda: [SYSTEM_TAG])
     def get_system_statistics():
         """Get system-wide statistics with caching"""
         try:
@@ -223,72 +285,32 @@ class CacheService:
             }
     
     @staticmethod
-    def invalidate_user_cache(user_id):
-        """Invalidate all cache entries for a specific user"""
-        if cache is None:
+    def invalidate_tags(tags):
+        """Invalidate every entry carrying any of ``tags``, ignoring backend failures"""
+        if not tags:
             return
-            
-        cache_patterns = [
-            f"user_dashboard_get_user_dashboard_data_{user_id}",
-            f"task_summary_get_user_task_summary_{user_id}"
-        ]
-        
-        for pattern in cache_patterns:
-            try:
-                cache.delete(pattern)
-            except Exception as e:
-                current_app.logger.warning(f"Failed to delete cache pattern {pattern}: {e}")
-        
-        # Also invalidate system stats as they include user counts
         try:
-            cache.delete_many("system_stats_*")
+            get_tag_cache().invalidate_tags(tags)
         except Exception as e:
-            current_app.logger.warning(f"Failed to delete system stats cache: {e}")
+            current_app.logger.warning(f"Failed to invalidate cache tags {sorted(tags)}: {e}")
+    
+    @staticmethod
+    def invalidate_user_cache(user_id):
+        """Invalidate all cache entries for a specific user"""
+        # System stats include user counts
+        CacheService.invalidate_tags({user_tag(user_id), SYSTEM_TAG})
         current_app.logger.debug(f"Invalidated cache for user {user_id}")
     
     @staticmethod
     def invalidate_property_cache(property_id):
         """Invalidate all cache entries for a specific property"""
-        if cache is None:
-            return
-            
-        cache_patterns = [
-            f"property_stats_get_property_statistics_{property_id}"
-        ]
-        
-        for pattern in cache_patterns:
-            try:
-                cache.delete(pattern)
-            except Exception as e:
-                current_app.logger.warning(f"Failed to delete cache pattern {pattern}: {e}")
-        
+        CacheService.invalidate_tags({property_tag(property_id)})
         current_app.logger.debug(f"Invalidated cache for property {property_id}")
     
     @staticmethod
     def invalidate_task_cache(user_id=None):
         """Invalidate task-related cache entries"""
-        if cache is None:
-            return
-            
-        if user_id:
-            cache_patterns = [
-                f"task_summary_get_user_task_summary_{user_id}",
-                f"user_dashboard_get_user_dashboard_data_{user_id}"
-            ]
-            
-            for pattern in cache_patterns:
-                try:
-                    cache.delete(pattern)
-                except Exception as e:
-                    current_app.logger.warning(f"Failed to delete cache pattern {pattern}: {e}")
-        else:
-            # Invalidate all task-related caches
-            try:
-                cache.delete_many("task_summary_*")
-                cache.delete_many("user_dashboard_*")
-            except Exception as e:
-                current_app.logger.warning(f"Failed to delete task-related caches: {e}")
-        
+        CacheService.invalidate_tags({user_tag(user_id) if user_id else TASKS_TAG})
         current_app.logger.debug(f"Invalidated task cache for user {user_id}")
     
     @staticmethod
@@ -313,10 +335,12 @@ class CacheService:
     
     @staticmethod
     def get_cache_stats():
-        """Get cache performance statistics"""
+        """Get cache performance statistics, including hit rates per tag in this process"""
+        stats = {}
         try:
-            # This would depend on the cache backend
-            # For Redis, we could get memory usage, hit rates, etc.
+            stats['tags'] = get_tag_cache().stats()
+            
+            # For Redis, the server also reports memory usage and overall hit rates
             if current_app.config.get('CACHE_TYPE') == 'redis':
                 import redis
                 redis_url = current_app.config.get('REDIS_URL')
@@ -324,32 +348,103 @@ class CacheService:
                     r = redis.from_url(redis_url)
                     info = r.info()
                     
-                    return {
+                    stats.update({
                         'memory_usage': info.get('used_memory_human', 'unknown'),
                         'keyspace_hits': info.get('keyspace_hits', 0),
                         'keyspace_misses': info.get('keyspace_misses', 0),
                         'connected_clients': info.get('connected_clients', 0),
                         'hit_rate': (info.get('keyspace_hits', 0) / 
                                    (info.get('keyspace_hits', 0) + info.get('keyspace_misses', 1)) * 100)
-                    }
+                    })
             
-            return {'message': 'Cache statistics not available for current backend'}
+            return stats
         except Exception as e:
             current_app.logger.error(f"Error getting cache stats: {e}")
-            return {'error': str(e)}
-
-
-# Cache invalidation decorators for models
-def invalidate_cache_on_save(cache_service_method):
-    """Decorator to invalidate cache when model is saved"""
-    def decorator(model_class):
-        original_save = getattr(model_class, 'save', None)
-        
-        def new_save(self, *args, **kwargs):
-            result = original_save(self, *args, **kwargs) if original_save else None
-            cache_service_method(self.id)
-            return result
-        
-        model_class.save = new_save
-        return model_class
-    return decorator 
\ No newline at end of file
+            return {**stats, 'error': str(e)}
+
+
+# Commit-driven invalidation
+#
+# after_flush maps every inserted, updated or deleted row to the cache tags
+# that depend on it and collects them on the session; after_commit
+# invalidates them in one batch. A rollback discards the batch, so nothing
+# is dropped for writes that never happened.
+
+_PENDING_INVALIDATIONS = 'cache_invalidations'
+
+
+def _column_values(obj, attribute):
+    """Current and pre-flush values of a column, so moving a row invalidates both sides"""
+    history = inspect(obj).attrs[attribute].history
+    return {value for value in chain(history.added, history.unchanged, history.deleted) if value is not None}
+
+
+def _dependent_cache_tags(session):
+    tags = set()
+    user_ids, property_ids, task_ids = set(), set(), set()
+
+    for obj in chain(session.new, session.dirty, session.deleted):
+        if obj in session.dirty and not session.is_modified(obj, include_collections=False):
+            continue
+        added_or_removed = obj in session.new or obj in session.deleted
+
+        if isinstance(obj, Task):
+            user_ids |= _column_values(obj, 'creator_id')
+            property_ids |= _column_values(obj, 'property_id')
+            if obj.id is not None:
+                task_ids.add(obj.id)
+        elif isinstance(obj, TaskAssignment):
+            user_ids |= _column_values(obj, 'user_id')
+        elif isinstance(obj, TaskProperty):
+            # Linking a task to a property changes which properties its assignees serve
+            property_ids |= _column_values(obj, 'property_id')
+            task_ids |= _column_values(obj, 'task_id')
+        elif isinstance(obj, Property):
+            user_ids |= _column_values(obj, 'owner_id')
+            if obj.id is not None:
+                property_ids.add(obj.id)
+        elif isinstance(obj, (Booking, CalendarEvent, GuestBooking)):
+            property_ids |= _column_values(obj, 'property_id')
+        elif isinstance(obj, User):
+            if obj.id is not None:
+                user_ids.add(obj.id)
+        else:
+            continue
+
+        if added_or_removed and isinstance(obj, (User, Property, Task)):
+            tags.add(SYSTEM_TAG)
+
+    # Assignees see a task on their dashboard, so a changed task invalidates them too
+    if task_ids:
+        with session.no_autoflush:
+            user_ids |= set(session.execute(
+                select(TaskAssignment.user_id).where(
+                    TaskAssignment.task_id.in_(task_ids),
+                    TaskAssignment.user_id.isnot(None)
+                )
+            ).scalars())
+
+    tags.update(user_tag(user_id) for user_id in user_ids)
+    tags.update(property_tag(property_id) for property_id in property_ids)
+    return tags
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_cache_invalidations(session, flush_context):
+    tags = _dependent_cache_tags(session)
+    if tags:
+        session.info.setdefault(_PENDING_INVALIDATIONS, set()).update(tags)
+
+
+@event.listens_for(Session, 'after_commit')
+def _apply_cache_invalidations(session):
+    tags = session.info.pop(_PENDING_INVALIDATIONS, None)
+    if tags and has_app_context():
+        CacheService.invalidate_tags(tags)
+
+
+@event.listens_for(Session, 'after_transaction_end')
+def _discard_cache_invalidations(session, transaction):
+    # Anything still pending when the outermost transaction ends was rolled back
+    if transaction.parent is None:
+        session.info.pop(_PENDING_INVALIDATIONS, None)
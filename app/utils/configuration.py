@@ -6,12 +6,24 @@ This module provides a centralized configuration management system that:
 2. Falls back to database settings if not in environment
 3. Provides default values as last resort
 4. Allows admin configuration via web UI for non-sensitive settings
+
+Database settings are served from an immutable snapshot of the whole
+site_settings table. Every write to a setting replaces a version stamp row
+in the same transaction; each process compares its snapshot against that
+stamp at most every CONFIG_VERSION_CHECK_INTERVAL seconds and reloads all
+settings in one query when it has moved, so changes reach every worker
+within seconds.
 """
 
 import os
 import json
-from typing import Any, Optional, Dict, List
+import threading
+import time
+import uuid
+from types import MappingProxyType
+from typing import Any, Optional, Dict, List, Mapping
 from flask import current_app, has_app_context
+from sqlalchemy import event, select
 from app import db
 from app.models import SiteSetting
 from datetime import datetime
@@ -19,6 +31,12 @@ import logging
 
 logger = logging.getLogger(__name__)
 
+# site_settings row whose value changes whenever any other setting does
+CONFIG_VERSION_KEY = '_config_version'
+# Seconds between version checks when CONFIG_VERSION_CHECK_INTERVAL is not configured
+DEFAULT_VERSION_CHECK_INTERVAL = 2
+_SNAPSHOT_EXTENSION = 'configuration_snapshot'
+
 
 class ConfigurationCategory:
     """Configuration categories for organizing settings"""
@@ -329,12 +347,66 @@ CONFIGURATION_REGISTRY = [
 ]
 
 
+class ConfigurationSnapshot:
+    """All database settings at one version, loaded in a single query"""
+
+    __slots__ = ('version', 'settings', 'values', 'checked_at', 'stale')
+
+    def __init__(self, version: Optional[str], settings: Dict[str, Optional[str]]):
+        self.version = version
+        self.settings: Mapping[str, Optional[str]] = MappingProxyType(settings)
+        self.values = {}  # Converted values, filled on first use
+        self.checked_at = time.monotonic()
+        self.stale = False
+
+
 class ConfigurationService:
     """Service for managing application configuration"""
     
     def __init__(self):
-        self._cache = {}
         self._registry = {item.key: item for item in CONFIGURATION_REGISTRY}
+        self._lock = threading.Lock()
+    
+    def snapshot(self) -> Optional[ConfigurationSnapshot]:
+        """
+        Get the settings snapshot for the current app.
+        
+        The version stamp is read at most once per check interval; the
+        snapshot is only reloaded when the stamp has moved, when this
+        process changed a setting, or when no stamp exists yet. Returns
+        ``None`` outside an app context or if settings cannot be loaded.
+        """
+        if not has_app_context():
+            return None
+        
+        current = current_app.extensions.get(_SNAPSHOT_EXTENSION)
+        interval = current_app.config.get('CONFIG_VERSION_CHECK_INTERVAL', DEFAULT_VERSION_CHECK_INTERVAL)
+        if current is not None and not current.stale and time.monotonic() - current.checked_at < interval:
+            return current
+        
+        with self._lock:
+            try:
+                version = db.session.execute(
+                    select(SiteSetting.value).where(SiteSetting.key == CONFIG_VERSION_KEY)
+                ).scalar()
+                if current is None or current.stale or version is None or version != current.version:
+                    rows = db.session.execute(
+                        select(SiteSetting.key, SiteSetting.value).where(SiteSetting.key != CONFIG_VERSION_KEY)
+                    ).all()
+                    current = ConfigurationSnapshot(version, dict(rows))
+                    current_app.extensions[_SNAPSHOT_EXTENSION] = current
+                else:
+                    current.checked_at = time.monotonic()
+            except Exception as e:
+                logger.debug(f"Could not load database settings: {e}")
+        return current
+    
+    def invalidate(self):
+        """Reload the current app's snapshot on next use"""
+        if has_app_context():
+            current = current_app.extensions.get(_SNAPSHOT_EXTENSION)
+            if current is not None:
+                current.stale = True
     
     def get(self, key: str, default: Any = None) -> Any:
         """
@@ -346,10 +418,6 @@ class ConfigurationService:
         3. Default value from registry
         4. Provided default value
         """
-        # Check cache first
-        if key in self._cache:
-            return self._cache[key]
-        
         # Get configuration item from registry
         config_item = self._registry.get(key)
         
@@ -357,24 +425,22 @@ class ConfigurationService:
         env_var = config_item.env_var if config_item else key.upper()
         env_value = os.environ.get(env_var)
         if env_value is not None:
-            value = self._convert_value(env_value, config_item.config_type if config_item else None)
-            self._cache[key] = value
-            return value
+            return self._convert_value(env_value, config_item.config_type if config_item else None)
         
         # 2. Check database setting (only for non-sensitive items and when in app context)
-        if config_item and not config_item.sensitive and has_app_context():
-            try:
-                db_value = SiteSetting.get_setting(key)
+        if config_item and not config_item.sensitive:
+            snapshot = self.snapshot()
+            if snapshot is not None:
+                if key in snapshot.values:
+                    return snapshot.values[key]
+                db_value = snapshot.settings.get(key)
                 if db_value is not None:
                     value = self._convert_value(db_value, config_item.config_type)
-                    self._cache[key] = value
+                    snapshot.values[key] = value
                     return value
-            except Exception as e:
-                logger.debug(f"Could not get database setting for {key}: {e}")
         
         # 3. Use default from registry
         if config_item and config_item.default_value is not None:
-            self._cache[key] = config_item.default_value
             return config_item.default_value
         
         # 4. Use provided default
@@ -415,10 +481,6 @@ class ConfigurationService:
             )
             db.session.commit()
             
-            # Clear cache
-            if key in self._cache:
-                del self._cache[key]
-            
             # Log the change
             self._log_configuration_change(key, value, user_id)
             
@@ -534,4 +596,27 @@ class ConfigurationService:
 
 
 # Global configuration service instance
-config_service = ConfigurationService()
\ No newline at end of file
+config_service = ConfigurationService()
+
+
+def _bump_configuration_version(mapper, connection, target):
+    """Replace the version stamp in the same transaction as a settings change"""
+    if target.key == CONFIG_VERSION_KEY:
+        return
+    
+    table = SiteSetting.__table__
+    now = datetime.utcnow()
+    version = uuid.uuid4().hex
+    result = connection.execute(
+        table.update().where(table.c.key == CONFIG_VERSION_KEY).values(value=version, updated_at=now)
+    )
+    if result.rowcount == 0:
+        connection.execute(table.insert().values(
+            key=CONFIG_VERSION_KEY, value=version, visible=False,
+            description='Configuration version stamp', created_at=now, updated_at=now
+        ))
+    config_service.invalidate()
+
+
+for _event_name in ('after_insert', 'after_update', 'after_delete'):
+    event.listen(SiteSetting, _event_name, _bump_configuration_version)
\ No newline at end of file
@@ -0,0 +1,84 @@
+"""
+Phone number normalization
+
+Users type phone numbers in any format, while Twilio always reports
+E.164 (``+15551234567``). Numbers are normalized to E.164 once, when they
+are stored, so SMS routing can match them with an indexed equality lookup.
+"""
+import re
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+
+try:
+    import phonenumbers
+    PHONENUMBERS_AVAILABLE = True
+except ImportError:
+    phonenumbers = None
+    PHONENUMBERS_AVAILABLE = False
+
+# Distinct numbers remembered by to_e164 and by each PhoneIndex
+PHONE_CACHE_SIZE = 4096
+
+
+@lru_cache(maxsize=PHONE_CACHE_SIZE)
+def to_e164(phone, default_country='US'):
+    """Normalize ``phone`` to E.164, or None if it is not a usable number. Defaults to US if no country code."""
+    if not phone:
+        return None
+    if not PHONENUMBERS_AVAILABLE:
+        # Basic fallback: a '+' number as given, or a NANP number with or without its leading 1
+        digits = re.sub(r'\D', '', phone)
+        if phone.strip().startswith('+'):
+            return f'+{digits}' if 8 <= len(digits) <= 15 else None
+        if default_country == 'US' and len(digits) == 10:
+            return f'+1{digits}'
+        if default_country == 'US' and len(digits) == 11 and digits.startswith('1'):
+            return f'+{digits}'
+        return None
+    try:
+        parsed = phonenumbers.parse(phone, default_country)
+        if not phonenumbers.is_valid_number(parsed):
+            return None
+        return phonenumbers.format_number(parsed, phonenumbers.PhoneNumberFormat.E164)
+    except Exception:
+        return None
+
+
+class PhoneIndex:
+    """
+    Bounded, thread-safe LRU map from normalized phone keys to row ids.
+
+    Only ids are kept, so a hit still loads the row by primary key and the
+    caller must check that the row still has the number before trusting it.
+    """
+
+    def __init__(self, maxsize=PHONE_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._ids = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            row_id = self._ids.get(key)
+            if row_id is not None:
+                self._ids.move_to_end(key)
+            return row_id
+
+    def put(self, key, row_id):
+        with self._lock:
+            self._ids[key] = row_id
+            self._ids.move_to_end(key)
+            if len(self._ids) > self.maxsize:
+                self._ids.popitem(last=False)
+
+    def discard(self, key):
+        with self._lock:
+            self._ids.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._ids.clear()
+
+    def __len__(self):
+        return len(self._ids)
@@ -5,6 +5,7 @@ import secrets
 import hashlib
 import hmac
 import time
+import threading
 from datetime import datetime, timedelta
 from typing import Optional, Dict, Any, Tuple
 from functools import wraps
@@ -12,26 +13,119 @@ from flask import request, current_app, session, abort, g, flash, redirect, url_
 from werkzeug.exceptions import TooManyRequests
 
 
-class RateLimiter:
+class InMemoryRateLimitBackend:
     """
-    Simple in-memory rate limiter
-    In production, consider using Redis for distributed rate limiting
+    Process-local sliding-window counter storage.
+    
+    Each key holds a fixed-size record (window start, current count, previous
+    count, window length), so memory per key is constant regardless of traffic.
     """
     
+    SWEEP_EVERY = 1000  # checks between sweeps of idle keys
+    
     def __init__(self):
-        self._requests = {}
-        self._last_cleanup = time.time()
-    
-    def _cleanup_old_entries(self):
-        """Clean up old entries to prevent memory leaks"""
-        current_time = time.time()
-        if current_time - self._last_cleanup > 3600:  # Cleanup every hour
-            cutoff = current_time - 3600  # Remove entries older than 1 hour
-            self._requests = {
-                key: timestamps for key, timestamps in self._requests.items()
-                if any(ts > cutoff for ts in timestamps)
-            }
-            self._last_cleanup = current_time
+        self._windows = {}
+        self._lock = threading.Lock()
+        self._checks = 0
+    
+    def hit(self, key: str, window: int, now: float) -> Tuple[int, int, float]:
+        """
+        Count a hit for key and return (previous_count, current_count, elapsed)
+        where elapsed is the time since the current window started.
+        """
+        window_start = now - (now % window)
+        with self._lock:
+            self._checks += 1
+            if self._checks % self.SWEEP_EVERY == 0:
+                self._sweep(now)
+            
+            record = self._windows.get(key)
+            if record is None or record[0] < window_start - window:
+                # No usable history: start fresh
+                record = [window_start, 0, 0, window]
+            elif record[0] < window_start:
+                # Roll the window forward by one step
+                record = [window_start, 0, record[1], window]
+            record[1] += 1
+            self._windows[key] = record
+            return record[2], record[1], now - window_start
+    
+    def undo(self, key: str, window: int, now: float):
+        """Remove the hit just recorded for key (used when the hit was rejected)"""
+        with self._lock:
+            record = self._windows.get(key)
+            if record and record[1] > 0:
+                record[1] -= 1
+    
+    def reset(self, key: str):
+        with self._lock:
+            self._windows.pop(key, None)
+    
+    def _sweep(self, now: float):
+        """Drop keys idle long enough that neither of their windows still counts"""
+        self._windows = {
+            key: record for key, record in self._windows.items()
+            if record[0] >= now - 2 * record[3]
+        }
+
+
+class RedisRateLimitBackend:
+    """
+    Sliding-window counter storage in Redis, shared by every worker and
+    instance. Uses one counter per key per window, expired by Redis.
+    """
+    
+    def __init__(self, client, prefix: str = 'ratelimit:'):
+        self.client = client
+        self.prefix = prefix
+    
+    def _window_key(self, key: str, window: int, index: int) -> str:
+        return f"{self.prefix}{key}:{window}:{index}"
+    
+    def hit(self, key: str, window: int, now: float) -> Tuple[int, int, float]:
+        index = int(now // window)
+        current_key = self._window_key(key, window, index)
+        pipe = self.client.pipeline()
+        pipe.incr(current_key)
+        pipe.expire(current_key, window * 2)
+        pipe.get(self._window_key(key, window, index - 1))
+        current, _, previous = pipe.execute()
+        return int(previous or 0), int(current), now - index * window
+    
+    def undo(self, key: str, window: int, now: float):
+        self.client.decr(self._window_key(key, window, int(now // window)))
+    
+    def reset(self, key: str):
+        for stale in self.client.scan_iter(f"{self.prefix}{key}:*"):
+            self.client.delete(stale)
+
+
+class RateLimiter:
+    """
+    Sliding-window counter rate limiter with a pluggable storage backend.
+    
+    The request count is estimated as the current window's count plus the
+    previous window's count weighted by how much of it still overlaps the
+    sliding window. Backends are in-process (default) or Redis, which shares
+    limits across gunicorn workers and Cloud Run instances.
+    """
+    
+    def __init__(self, backend=None, clock=time.time):
+        self.backend = backend or InMemoryRateLimitBackend()
+        self.clock = clock
+    
+    def init_app(self, app):
+        """Select the storage backend from RATELIMIT_BACKEND / RATELIMIT_STORAGE_URL"""
+        self.backend = InMemoryRateLimitBackend()
+        if app.config.get('RATELIMIT_BACKEND', 'memory') != 'redis':
+            return
+        try:
+            import redis
+            client = redis.from_url(app.config['RATELIMIT_STORAGE_URL'])
+            client.ping()
+            self.backend = RedisRateLimitBackend(client)
+        except Exception as e:
+            app.logger.warning(f"Redis rate limit storage unavailable, using in-process limits: {e}")
     
     def is_allowed(self, key: str, limit: int, window: int) -> bool:
         """
@@ -45,29 +139,20 @@ class RateLimiter:
         Returns:
             True if allowed, False if rate limited
         """
-        current_time = time.time()
-        cutoff = current_time - window
+        now = self.clock()
+        previous, current, elapsed = self.backend.hit(key, window, now)
+        estimated = previous * (window - elapsed) / window + current
         
-        # Clean up old entries periodically
-        self._cleanup_old_entries()
-        
-        if key not in self._requests:
-            self._requests[key] = []
-        
-        # Remove old timestamps
-        self._requests[key] = [ts for ts in self._requests[key] if ts > cutoff]
-        
-        # Check if under limit
-        if len(self._requests[key]) < limit:
-            self._requests[key].append(current_time)
+        if estimated <= limit:
             return True
         
+        # Rejected requests do not consume quota
+        self.backend.undo(key, window, now)
         return False
     
     def reset(self, key: str):
         """Reset rate limit for a key"""
-        if key in self._requests:
-            del self._requests[key]
+        self.backend.reset(key)
 
 
 # Global rate limiter instance
@@ -88,6 +173,9 @@ def rate_limit(limit: int = 100, window: int = 3600, per: str = 'ip',
     def decorator(f):
         @wraps(f)
         def decorated_function(*args, **kwargs):
+            if not current_app.config.get('RATELIMIT_ENABLED', True):
+                return f(*args, **kwargs)
+            
             # Determine rate limiting key
             if per == 'ip':
                 key = f"ip:{request.remote_addr}"
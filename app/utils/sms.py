@@ -1,30 +1,42 @@
-from twilio.rest import Client
-from twilio.twiml.messaging_response import MessagingResponse
 from app.models import (
     Notification, NotificationChannel, NotificationType, 
     MessageThread, Message, User, Task, TaskAssignment, 
-    TaskStatus, RepairRequest, RepairRequestSeverity
+    TaskStatus, RepairRequest, RepairRequestSeverity, InboundSms, SmsStatusCallback
 )
 from app import db
+import json
 import logging
 from flask import current_app, has_app_context, request
 import re
 from datetime import datetime
-try:
-    import phonenumbers
-    PHONENUMBERS_AVAILABLE = True
-except ImportError:
-    phonenumbers = None
-    PHONENUMBERS_AVAILABLE = False
+from sqlalchemy import and_, case, delete, update
+from sqlalchemy.exc import IntegrityError
 from .security import rate_limit, log_security_event, verify_twilio_signature
 try:
     from .validation import validate_phone_number, sanitize_text_input
 except ImportError:
     def validate_phone_number(phone):
         return True
-    def sanitize_text_input(text):
-        return text
+    def sanitize_text_input(text, max_length=None):
+        return text[:max_length] if max_length else text
 from .error_handling import safe_execute
+from .phone import PhoneIndex, to_e164
+
+DEFAULT_REPLY = "Thanks for your message! Reply 'HELP' for available commands or contact support for assistance."
+
+# Incoming messages and status callbacks handled per sms_inbox run
+INBOUND_BATCH_SIZE = 100
+STATUS_BATCH_SIZE = 1000
+
+# How far along delivery each Twilio status is; a message's status only moves forward
+STATUS_PROGRESS = {
+    'accepted': 0, 'scheduled': 0, 'queued': 1, 'sending': 2, 'sent': 3,
+    'delivered': 4, 'undelivered': 4, 'failed': 4, 'canceled': 4, 'read': 5,
+}
+
+# Phone number (and number pair) to user and thread ids, so repeat senders cost one primary key lookup
+_user_ids_by_phone = PhoneIndex()
+_thread_ids_by_phones = PhoneIndex()
 
 LANGUAGE_TEMPLATES = {
     'task_assignment': {
@@ -93,6 +105,7 @@ def send_sms(to_number, message, create_notification=False, thread_id=None):
         
         # Initialize Twilio client with error handling
         try:
+            from twilio.rest import Client
             client = Client(twilio_account_sid, twilio_auth_token)
             logger.info(f"Twilio client initialized successfully")
         except Exception as client_error:
@@ -214,21 +227,7 @@ def is_valid_phone_number(phone_number):
 
 def format_phone_number(phone, default_country='US'):
     """Format a phone number to E.164 for Twilio. Default to US if no country code."""
-    if not phone:
-        return None
-    if not PHONENUMBERS_AVAILABLE:
-        # Basic fallback formatting
-        phone = re.sub(r'[^\d+]', '', phone)
-        if not phone.startswith('+'):
-            phone = '+1' + phone
-        return phone
-    try:
-        parsed = phonenumbers.parse(phone, default_country)
-        if not phonenumbers.is_valid_number(parsed):
-            return None
-        return phonenumbers.format_number(parsed, phonenumbers.PhoneNumberFormat.E164)
-    except Exception:
-        return None
+    return to_e164(phone, default_country)
 
 def validate_twilio_config():
     """Validate Twilio configuration and provide helpful error messages"""
@@ -265,6 +264,7 @@ def validate_twilio_config():
     
     # Try to initialize Twilio client
     try:
+        from twilio.rest import Client
         client = Client(twilio_account_sid, twilio_auth_token)
         # Try to fetch the phone number to validate it exists in the account
         try:
@@ -281,7 +281,16 @@ def validate_twilio_config():
         return False, f"Failed to initialize Twilio client: {str(e)}"
 
 def handle_incoming_sms():
-    """Handle incoming SMS webhook from Twilio"""
+    """
+    Handle incoming SMS webhook from Twilio.
+
+    The webhook only stores the raw message, in one insert, and answers
+    commands that need no lookups in TwiML straight away. The sms_inbox
+    job files the message in its thread and replies to everything else;
+    when the job runner is disabled the webhook does that itself.
+    """
+    # Imported here, like the REST client, to keep twilio out of app startup
+    from twilio.twiml.messaging_response import MessagingResponse
     try:
         # Verify Twilio signature for security
         if not current_app.debug:  # Skip verification in debug mode
@@ -303,14 +312,27 @@ def handle_incoming_sms():
         logger = current_app.logger
         logger.info(f"Received SMS from {from_number} to {to_number}: {message_body}")
         
-        # Find or create message thread
-        thread = find_or_create_thread(from_number, to_number)
-        
-        # Store incoming message
-        store_incoming_message(thread.id, from_number, message_body, message_sid)
+        response_message = immediate_reply(message_body)
+        inbound = InboundSms(
+            message_sid=message_sid,
+            from_number=from_number,
+            to_number=to_number,
+            body=message_body,
+            payload=json.dumps(request.form.to_dict()),
+            reply=response_message
+        )
+        try:
+            db.session.add(inbound)
+            db.session.commit()
+        except IntegrityError:
+            # Twilio retried a webhook that was already stored
+            db.session.rollback()
+            inbound = None
+            logger.info(f"Ignoring repeated SMS webhook: {message_sid}")
         
-        # Process message based on content
-        response_message = process_incoming_message(thread, message_body, from_number)
+        if inbound is not None and not current_app.config.get('JOB_RUNNER_ENABLED'):
+            # Without the job runner no sms_inbox job files or answers the message; do it now
+            response_message = file_inbound_sms(inbound, reply_by_sms=False) or response_message
         
         # Create TwiML response
         twiml = MessagingResponse()
@@ -321,29 +343,130 @@ def handle_incoming_sms():
         
     except Exception as e:
         current_app.logger.error(f"Error handling incoming SMS: {str(e)}")
+        db.session.rollback()
         # Return empty TwiML response to avoid Twilio errors
         return str(MessagingResponse())
 
-def find_or_create_thread(from_number, to_number):
+def immediate_reply(message_body):
+    """
+    Reply for messages that can be answered without touching the database,
+    or None if the message has to wait for process_inbound_sms.
+    """
+    message_lower = message_body.lower().strip()
+    if message_lower in ['help', 'h', '?']:
+        return get_help_message()
+    if message_lower in ['status', 's'] or message_lower.startswith(('task', 'repair')):
+        return None
+    return DEFAULT_REPLY
+
+def process_inbound_sms(limit=INBOUND_BATCH_SIZE):
+    """
+    File stored incoming messages in their threads and reply to the ones
+    the webhook left unanswered. Returns the number of messages processed.
+    """
+    pending = InboundSms.query.filter(
+        InboundSms.processed_at.is_(None)
+    ).order_by(InboundSms.id).limit(limit).with_for_update(skip_locked=True).all()
+    
+    for inbound in pending:
+        file_inbound_sms(inbound)
+    
+    return len(pending)
+
+def file_inbound_sms(inbound, reply_by_sms=True):
+    """
+    File one stored incoming message in its thread and answer it if the
+    webhook did not. Returns the answer, or None if there is none.
+
+    The message is marked processed in the same commit that stores it, so
+    a failed reply is not retried: a command is never run twice. The reply
+    is sent by SMS unless ``reply_by_sms`` is false, when the webhook
+    returns it in TwiML instead.
+    """
+    try:
+        thread = find_or_create_thread(inbound.from_number, inbound.to_number)
+    except Exception as e:
+        # It would fail the same way on every run; keep the raw message and move on
+        current_app.logger.error(f"Could not file SMS {inbound.message_sid} in a thread, skipping it: {str(e)}")
+        inbound.processed_at = datetime.utcnow()
+        db.session.commit()
+        return None
+    
+    db.session.add(Message(
+        thread_id=thread.id,
+        direction='incoming',
+        phone_number=inbound.from_number,
+        content=inbound.body,
+        external_id=inbound.message_sid,
+        status='received',
+        created_at=inbound.received_at
+    ))
+    inbound.processed_at = datetime.utcnow()
+    db.session.commit()
+    
+    if inbound.reply is not None:
+        return None
+    response_message = process_incoming_message(thread, inbound.body, inbound.from_number)
+    if response_message:
+        if reply_by_sms:
+            send_reply(inbound.from_number, response_message, thread.id)
+        inbound.reply = response_message
+        db.session.commit()
+    return response_message
+
+def send_reply(to_number, message, thread_id):
+    """Send a reply from the sms_inbox job"""
+    # The per-IP rate limit on send_sms guards web requests; the job runs outside of one
+    return send_sms.__wrapped__(to_number, message, thread_id=thread_id)
+
+def find_user_by_phone(phone):
+    """The user whose phone number is ``phone`` in any format, or None"""
+    phone = to_e164(phone)
+    if not phone:
+        return None
+    user_id = _user_ids_by_phone.get(phone)
+    if user_id is not None:
+        user = db.session.get(User, user_id)
+        # The number may have moved to another account since it was cached
+        if user is not None and user.phone_e164 == phone:
+            return user
+        _user_ids_by_phone.discard(phone)
+    user = User.query.filter_by(phone_e164=phone).first()
+    if user:
+        _user_ids_by_phone.put(phone, user.id)
+    return user
+
+def find_or_create_thread(from_number, to_number, user_id=None):
     """Find existing thread or create new one for phone number pair"""
+    key = (to_e164(from_number) or from_number, to_e164(to_number) or to_number)
     try:
-        # Look for existing thread
-        thread = MessageThread.query.filter_by(
-            participant_phone=from_number,
-            system_phone=to_number
-        ).first()
+        thread_id = _thread_ids_by_phones.get(key)
+        thread = db.session.get(MessageThread, thread_id) if thread_id is not None else None
+        if thread is None or (thread.participant_phone, thread.system_phone) != key:
+            # Look for existing thread
+            thread = MessageThread.query.filter_by(participant_phone=key[0], system_phone=key[1]).first()
         
         if not thread:
-            # Create new thread
+            # Create new thread, linked to the account with the number if there is one
+            if user_id is None:
+                user = find_user_by_phone(key[0])
+                user_id = user.id if user else None
             thread = MessageThread(
-                participant_phone=from_number,
-                system_phone=to_number,
+                participant_phone=key[0],
+                system_phone=key[1],
+                user_id=user_id,
                 status='active'
             )
             db.session.add(thread)
-            db.session.commit()
-            current_app.logger.info(f"Created new message thread for {from_number}")
+            try:
+                db.session.commit()
+                current_app.logger.info(f"Created new message thread for {from_number}")
+            except IntegrityError:
+                # Created concurrently for the same pair
+                db.session.rollback()
+                thread = MessageThread.query.filter_by(participant_phone=key[0], system_phone=key[1]).one()
         
+        _thread_ids_by_phones.put(key, thread.id)
         return thread
         
     except Exception as e:
@@ -413,7 +536,7 @@ def process_incoming_message(thread, message_body, from_number):
             return process_repair_command(thread, message_body)
         
         # Default response for unrecognized messages
-        return "Thanks for your message! Reply 'HELP' for available commands or contact support for assistance."
+        return DEFAULT_REPLY
         
     except Exception as e:
         current_app.logger.error(f"Error processing incoming message: {str(e)}")
@@ -432,7 +555,7 @@ def get_status_message(thread):
     """Get status of user's tasks and assignments"""
     try:
         # Find user by phone number
-        user = User.query.filter_by(phone=thread.participant_phone).first()
+        user = find_user_by_phone(thread.participant_phone)
         
         if not user:
             return "Phone number not registered. Please contact support to link your phone number to your account."
@@ -476,7 +599,7 @@ def process_task_command(thread, message_body):
             return f"Task {task_id} not found."
         
         # Check if user has access to this task
-        user = User.query.filter_by(phone=thread.participant_phone).first()
+        user = find_user_by_phone(thread.participant_phone)
         if not user:
             return "Phone number not registered. Please contact support."
         
@@ -514,7 +637,7 @@ def process_repair_command(thread, message_body):
         description = parts[1]
         
         # Find user by phone number
-        user = User.query.filter_by(phone=thread.participant_phone).first()
+        user = find_user_by_phone(thread.participant_phone)
         if not user:
             return "Phone number not registered. Please contact support to link your phone number to your account."
         
@@ -545,23 +668,68 @@ def process_repair_command(thread, message_body):
         return "Sorry, I couldn't submit your repair request. Please try again or contact support."
 
 def handle_status_callback():
-    """Handle SMS status callback from Twilio"""
+    """
+    Handle SMS status callback from Twilio.
+
+    Callbacks arrive in bursts after bulk sends, so each one is only
+    recorded; apply_status_callbacks updates the messages in batches.
+    """
     try:
         message_sid = request.form.get('MessageSid')
         message_status = request.form.get('MessageStatus')
         
         current_app.logger.info(f"SMS status callback: {message_sid} - {message_status}")
         
-        # Update message status in database
-        message = Message.query.filter_by(external_id=message_sid).first()
-        if message:
-            message.status = message_status
-            message.updated_at = datetime.utcnow()
+        if message_sid and message_status:
+            db.session.add(SmsStatusCallback(message_sid=message_sid[:100], status=message_status[:20]))
             db.session.commit()
-            current_app.logger.info(f"Updated message status: {message_sid} -> {message_status}")
+            if not current_app.config.get('JOB_RUNNER_ENABLED'):
+                # Without the job runner nothing else applies the callback
+                apply_status_callbacks()
         
         return '', 200
         
     except Exception as e:
         current_app.logger.error(f"Error handling status callback: {str(e)}")
-        return '', 500 
\ No newline at end of file
+        db.session.rollback()
+        return '', 500
+
+def apply_status_callbacks(limit=STATUS_BATCH_SIZE):
+    """
+    Apply recorded status callbacks to their messages with one UPDATE and
+    delete them. Returns the number of callbacks applied.
+
+    Twilio does not guarantee callback order, so of several callbacks for
+    a message the furthest along wins, and a message never moves back to
+    an earlier status.
+    """
+    callbacks = db.session.query(
+        SmsStatusCallback.id, SmsStatusCallback.message_sid, SmsStatusCallback.status
+    ).order_by(SmsStatusCallback.id).limit(limit).with_for_update(skip_locked=True).all()
+    if not callbacks:
+        db.session.commit()
+        return 0
+    
+    latest = {}
+    for _, message_sid, status in callbacks:
+        if STATUS_PROGRESS.get(status, 0) >= STATUS_PROGRESS.get(latest.get(message_sid), -1):
+            latest[message_sid] = status
+    
+    cases = [
+        (and_(Message.external_id == message_sid,
+              Message.status.notin_([later for later, rank in STATUS_PROGRESS.items()
+                                     if rank > STATUS_PROGRESS.get(status, 0)])), status)
+        for message_sid, status in latest.items()
+    ]
+    db.session.execute(
+        update(Message)
+        .where(Message.external_id.in_(latest))
+        .values(status=case(*cases, else_=Message.status), updated_at=datetime.utcnow())
+        .execution_options(synchronize_session=False)
+    )
+    db.session.execute(
+        delete(SmsStatusCallback).where(SmsStatusCallback.id.in_([row.id for row in callbacks]))
+    )
+    db.session.commit()
+    current_app.logger.info(f"Applied {len(callbacks)} SMS status callbacks to {len(latest)} messages")
+    return len(callbacks)
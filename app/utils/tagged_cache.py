@@ -0,0 +1,175 @@
+"""
+Tag-based cache with generation counters
+
+Every entry is stored under one key together with the generation of each
+of its tags (such as ``user:42`` or ``property:7``) at the time it was
+written. Reading fetches the entry and the tags' current generations in
+one round trip; if any tag has moved on the entry is a miss. Invalidating
+a tag is a single increment, however many entries carry it.
+
+A generation key that was evicted is re-created with a fresh random
+value rather than zero, so entries written under an older generation can
+never match again.
+"""
+import pickle
+import random
+import threading
+from collections import defaultdict
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+GENERATION_PREFIX = 'tag_gen:'
+
+
+def _new_generation():
+    return random.getrandbits(48)
+
+
+class CacheManagerBackend:
+    """In-process backend over performance.CacheManager"""
+
+    def __init__(self, manager):
+        self.manager = manager
+        self._lock = threading.Lock()
+
+    def read(self, key: str, generation_keys: Sequence[str]) -> Tuple[Any, List[Optional[int]]]:
+        return self.manager.get(key), [self.manager.get(k) for k in generation_keys]
+
+    def write(self, key: str, value: Any, ttl: int):
+        self.manager.set(key, value, ttl_seconds=ttl)
+
+    def init_generation(self, key: str) -> int:
+        with self._lock:
+            current = self.manager.get(key)
+            if current is None:
+                current = _new_generation()
+                self.manager.set(key, current, ttl_seconds=0)
+            return current
+
+    def bump(self, key: str):
+        with self._lock:
+            current = self.manager.get(key)
+            self.manager.set(key, (current if current is not None else _new_generation()) + 1, ttl_seconds=0)
+
+
+class FlaskCacheBackend:
+    """Backend over a Flask-Caching ``Cache`` (simple, Redis, Memcached...)"""
+
+    def __init__(self, cache):
+        self.cache = cache
+
+    def read(self, key, generation_keys):
+        values = self.cache.get_many(key, *generation_keys)
+        return values[0], list(values[1:])
+
+    def write(self, key, value, ttl):
+        self.cache.set(key, value, timeout=ttl)
+
+    def init_generation(self, key):
+        # add() only writes if the key is absent, so concurrent writers agree
+        self.cache.add(key, _new_generation(), timeout=0)
+        return self.cache.get(key)
+
+    def bump(self, key):
+        # A missing generation gets a fresh random value; INCR would restart from 1
+        if not self.cache.add(key, _new_generation(), timeout=0):
+            # Cache does not proxy inc(); the backend's is atomic where the store allows.
+            # The generic inc() re-sets with the default timeout, which is safe: an
+            # expired generation comes back as a fresh random value
+            self.cache.cache.inc(key)
+
+
+class RedisBackend:
+    """
+    Backend over a redis-py style client (``mget``, ``set``, ``incr``).
+
+    Generations are plain integers so INCR works on them; entries are pickled.
+    """
+
+    def __init__(self, client):
+        self.client = client
+
+    @classmethod
+    def from_url(cls, url):
+        import redis
+        return cls(redis.from_url(url))
+
+    def read(self, key, generation_keys):
+        values = self.client.mget([key, *generation_keys])
+        entry = pickle.loads(values[0]) if values[0] is not None else None
+        return entry, [int(value) if value is not None else None for value in values[1:]]
+
+    def write(self, key, value, ttl):
+        self.client.set(key, pickle.dumps(value), ex=ttl or None)
+
+    def init_generation(self, key):
+        self.client.set(key, _new_generation(), nx=True)
+        return int(self.client.get(key))
+
+    def bump(self, key):
+        if not self.client.set(key, _new_generation(), nx=True):
+            self.client.incr(key)
+
+
+class TaggedCache:
+    """Cache whose entries are invalidated by tag; also counts hits and misses per tag"""
+
+    def __init__(self, backend):
+        self.backend = backend
+        self._stats = defaultdict(lambda: [0, 0])
+        self._stats_lock = threading.Lock()
+
+    @staticmethod
+    def generation_key(tag: str) -> str:
+        return f"{GENERATION_PREFIX}{tag}"
+
+    def _read(self, key, tags):
+        entry, generations = self.backend.read(key, [self.generation_key(tag) for tag in tags])
+        current = dict(zip(tags, generations))
+        hit = entry is not None and None not in generations and entry['generations'] == current
+        self._record(tags, hit)
+        return hit, entry, current
+
+    def get(self, key: str, tags: Sequence[str]) -> Any:
+        """Return the cached value, or None if it is missing or any of its tags was invalidated"""
+        hit, entry, _ = self._read(key, list(tags))
+        return entry['value'] if hit else None
+
+    def get_or_set(self, key: str, tags: Sequence[str], producer: Callable[[], Any], ttl: int = 300) -> Any:
+        """
+        Return the cached value, computing and storing it with ``producer`` on a miss.
+
+        The entry is stamped with the generations read before ``producer``
+        ran, so an invalidation that lands while it computes still wins.
+        ``None`` results are not stored.
+        """
+        tags = list(tags)
+        hit, entry, generations = self._read(key, tags)
+        if hit:
+            return entry['value']
+
+        for tag, generation in generations.items():
+            if generation is None:
+                generations[tag] = self.backend.init_generation(self.generation_key(tag))
+        value = producer()
+        if value is not None:
+            self.backend.write(key, {'generations': generations, 'value': value}, ttl)
+        return value
+
+    def invalidate_tags(self, tags: Iterable[str]):
+        """Invalidate every entry carrying any of ``tags``: one increment per tag"""
+        for tag in set(tags):
+            self.backend.bump(self.generation_key(tag))
+
+    def _record(self, tags, hit):
+        with self._stats_lock:
+            for tag in tags:
+                self._stats[tag][0 if hit else 1] += 1
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Hits, misses and hit rate (percent) per tag since this cache was created"""
+        with self._stats_lock:
+            snapshot = {tag: tuple(counts) for tag, counts in self._stats.items()}
+        return {
+            tag: {'hits': hits, 'misses': misses, 'hit_rate': round(hits / (hits + misses) * 100, 1)}
+            for tag, (hits, misses) in sorted(snapshot.items())
+        }
@@ -45,6 +45,10 @@ class WorkerInvitationForm(FlaskForm):
         user = User.query.filter_by(email=email.data).first()
         if user:
             raise ValidationError('This email address is already registered. Please use a different email.')
+    
+    def validate_phone(self, phone):
+        if User.phone_in_use(phone.data):
+            raise ValidationError('This phone number is already used by another account.')
             
     def validate(self, extra_validators=None):
         if not super().validate(extra_validators=extra_validators):
@@ -3,10 +3,11 @@ from flask_login import login_required, current_user
 from app import db
 from app.workforce import bp
 from app.workforce.forms import WorkerInvitationForm, WorkerPropertyAssignmentForm, WorkerFilterForm, COUNTRY_CODES
-from app.models import User, Property, Task, TaskAssignment, TaskProperty, UserRoles, ServiceType, TaskStatus, AdminAction, Notification
+from app.models import User, Property, Task, TaskAssignment, TaskProperty, UserRoles, ServiceType, TaskStatus, AdminAction, Notification, WorkerPropertyIndex
 from app.auth.decorators import admin_required, property_manager_required, workforce_management_required
 from app.auth.email import send_email, send_password_reset_email
 from app.notifications.service import create_notification, NotificationType, NotificationChannel
+from app.workforce.service import worker_query, get_worker_roster, get_worker_property_ids, is_worker_assigned, get_worker_task_buckets
 from app.utils.error_handling import handle_errors, ValidationError, BusinessLogicError
 try:
     from app.utils.validation import InputValidator
@@ -24,47 +25,23 @@ from app.decorators import log_admin_action
 
 # Helper function to check if a worker is assigned to a property
 def is_worker_assigned_to_property(worker_id, property_id):
-    """Check if a worker is assigned to a property by looking at task assignments"""
-    # Look for any task assignment where the worker is assigned to a task for this property
-    assignment = db.session.query(TaskAssignment).join(
-        Task, TaskAssignment.task_id == Task.id
-    ).join(
-        TaskProperty, TaskProperty.task_id == Task.id
-    ).filter(
-        TaskAssignment.user_id == worker_id,
-        TaskProperty.property_id == property_id
-    ).first()
-    
-    return assignment is not None
+    """Check if a worker is assigned to a property"""
+    return is_worker_assigned(worker_id, property_id)
 
 # Helper function to get all properties a worker is assigned to
 def get_worker_properties(worker_id):
     """Get all properties a worker is assigned to"""
-    property_ids = db.session.query(Property.id).join(
-        TaskProperty, Property.id == TaskProperty.property_id
-    ).join(
-        Task, TaskProperty.task_id == Task.id
-    ).join(
-        TaskAssignment, Task.id == TaskAssignment.task_id
-    ).filter(
-        TaskAssignment.user_id == worker_id
-    ).distinct().all()
-    
-    return [id[0] for id in property_ids]
+    return get_worker_property_ids(worker_id)
 
 # Helper function to get all workers assigned to a property
 def get_property_workers(property_id):
     """Get all workers assigned to a property"""
     worker_ids = db.session.query(User.id).join(
-        TaskAssignment, User.id == TaskAssignment.user_id
-    ).join(
-        Task, TaskAssignment.task_id == Task.id
-    ).join(
-        TaskProperty, Task.id == TaskProperty.task_id
+        WorkerPropertyIndex, WorkerPropertyIndex.user_id == User.id
     ).filter(
-        TaskProperty.property_id == property_id,
+        WorkerPropertyIndex.property_id == property_id,
         User.role == UserRoles.SERVICE_STAFF.value
-    ).distinct().all()
+    ).all()
     
     return [id[0] for id in worker_ids]
 
@@ -92,86 +69,38 @@ def index():
             
         form.property_id.choices = [(-1, 'All Properties')] + [(p.id, p.name) for p in properties]
         
-        # Base query for service staff
-        query = User.query.filter(User.role == UserRoles.SERVICE_STAFF.value)
-        
-        # Apply filters if form is submitted
+        # Base query for service staff, with filters applied if form is submitted
         if request.args.get('submit'):
-            # Filter by service type if provided
-            service_type = request.args.get('service_type')
-            if service_type:
-                # This is more complex - we need to look at task assignments
-                worker_ids = db.session.query(TaskAssignment.user_id).filter(
-                    TaskAssignment.service_type == service_type
-                ).distinct().all()
-                worker_ids = [id[0] for id in worker_ids]
-                if worker_ids:
-                    query = query.filter(User.id.in_(worker_ids))
-                else:
-                    # No workers match this service type
-                    query = query.filter(User.id == -1)  # This will return no results
-            
-            # Filter by property if provided
             property_id = request.args.get('property_id')
-            if property_id and property_id != '-1':
-                # Get workers assigned to this property
-                worker_ids = get_property_workers(int(property_id))
-                if worker_ids:
-                    query = query.filter(User.id.in_(worker_ids))
-                else:
-                    # No workers assigned to this property
-                    query = query.filter(User.id == -1)  # This will return no results
-            
-            # Filter by search term if provided
-            search = request.args.get('search')
-            if search:
-                query = query.filter(or_(
-                    User.first_name.ilike(f'%{search}%'),
-                    User.last_name.ilike(f'%{search}%'),
-                    User.email.ilike(f'%{search}%')
-                ))
-        
-        # Get workers with pagination
-        page = request.args.get('page', 1, type=int)
-        workers = query.paginate(page=page, per_page=10)
+            query = worker_query(
+                service_type=request.args.get('service_type') or None,
+                property_id=int(property_id) if property_id and property_id != '-1' else None,
+                search=request.args.get('search') or None
+            )
+        else:
+            query = worker_query()
         
-        # For each worker, get their assigned properties
-        worker_properties = {}
-        for worker in workers.items:
-            worker_properties[worker.id] = get_worker_properties(worker.id)
+        # Get workers with pagination, along with their assigned properties and open tasks
+        page = request.args.get('page', 1, type=int)
+        workers, worker_summaries = get_worker_roster(query, page=page, per_page=10)
+        worker_properties = {
+            worker_id: summary['property_ids'] for worker_id, summary in worker_summaries.items()
+        }
         
         return render_template('workforce/admin_dashboard.html',
                               title='Workforce Management',
                               workers=workers,
                               worker_properties=worker_properties,
+                              worker_summaries=worker_summaries,
                               form=form,
                               TaskAssignment=TaskAssignment)
     
     elif current_user.is_service_staff:
         # Service staff view - show their tasks and assigned properties
-        # Get tasks assigned to this worker
-        pending_tasks = db.session.query(Task).join(
-            TaskAssignment, TaskAssignment.task_id == Task.id
-        ).outerjoin(
-            TaskProperty, Task.id == TaskProperty.task_id
-        ).filter(
-            TaskAssignment.user_id == current_user.id,
-            Task.status == TaskStatus.PENDING
-        ).order_by(Task.due_date.asc()).all()
-        
-        in_progress_tasks = db.session.query(Task).join(
-            TaskAssignment, TaskAssignment.task_id == Task.id
-        ).filter(
-            TaskAssignment.user_id == current_user.id,
-            Task.status == TaskStatus.IN_PROGRESS
-        ).all()
-        
-        completed_tasks = db.session.query(Task).join(
-            TaskAssignment, TaskAssignment.task_id == Task.id
-        ).filter(
-            TaskAssignment.user_id == current_user.id,
-            Task.status == TaskStatus.COMPLETED
-        ).order_by(Task.completed_at.desc()).limit(10).all()
+        tasks = get_worker_task_buckets(current_user.id)
+        pending_tasks = tasks['pending']
+        in_progress_tasks = tasks['in_progress']
+        completed_tasks = tasks['completed']
         
         # Get properties this worker is assigned to
         property_ids = get_worker_properties(current_user.id)
@@ -439,28 +368,10 @@ def worker_detail(id):
     assigned_properties = Property.query.filter(Property.id.in_(property_ids)).all() if property_ids else []
     
     # Get tasks assigned to this worker
-    pending_tasks = db.session.query(Task).join(
-        TaskAssignment, TaskAssignment.task_id == Task.id
-    ).outerjoin(
-        TaskProperty, Task.id == TaskProperty.task_id
-    ).filter(
-        TaskAssignment.user_id == worker.id,
-        Task.status == TaskStatus.PENDING
-    ).order_by(Task.due_date.asc()).all()
-    
-    in_progress_tasks = db.session.query(Task).join(
-        TaskAssignment, TaskAssignment.task_id == Task.id
-    ).filter(
-        TaskAssignment.user_id == worker.id,
-        Task.status == TaskStatus.IN_PROGRESS
-    ).all()
-    
-    completed_tasks = db.session.query(Task).join(
-        TaskAssignment, TaskAssignment.task_id == Task.id
-    ).filter(
-        TaskAssignment.user_id == worker.id,
-        Task.status == TaskStatus.COMPLETED
-    ).order_by(Task.completed_at.desc()).limit(10).all()
+    tasks = get_worker_task_buckets(worker.id)
+    pending_tasks = tasks['pending']
+    in_progress_tasks = tasks['in_progress']
+    completed_tasks = tasks['completed']
     
     # Get service types this worker provides
     service_types = db.session.query(TaskAssignment.service_type).filter(
@@ -578,6 +489,7 @@ def delete_staff(user_id):
         
         # Delete related records first
         TaskAssignment.query.filter_by(user_id=user.id).delete()
+        WorkerPropertyIndex.query.filter_by(user_id=user.id).delete()
         Notification.query.filter_by(recipient_id=user.id).delete()
         
         # Delete the user
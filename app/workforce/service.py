@@ -0,0 +1,146 @@
+from datetime import datetime
+from app import db
+from app.models import User, Task, TaskAssignment, TaskStatus, UserRoles, WorkerPropertyIndex
+from app.utils.cache_service import DEPENDENT_CACHE_TIMEOUT, TASKS_TAG, cached_query, user_tag
+from sqlalchemy import cast, func, or_, select, String
+
+OPEN_TASK_STATUSES = (TaskStatus.PENDING, TaskStatus.IN_PROGRESS)
+
+
+def _aggregate_ids(column):
+    """Aggregate integer IDs into a comma-separated string for the active dialect"""
+    if db.engine.dialect.name == 'postgresql':
+        return func.string_agg(cast(column, String), ',')
+    return func.group_concat(column)
+
+
+def _split_ids(value):
+    if not value:
+        return []
+    return sorted({int(part) for part in str(value).split(',') if part})
+
+
+def worker_query(service_type=None, property_id=None, search=None):
+    """Build the filtered service-staff query used by the workforce dashboard.
+
+    Filters are expressed as sub-selects so no ID lists are materialized in Python.
+    """
+    query = User.query.filter(User.role == UserRoles.SERVICE_STAFF.value)
+
+    if service_type:
+        query = query.filter(User.id.in_(
+            select(TaskAssignment.user_id).where(TaskAssignment.service_type == service_type)
+        ))
+
+    if property_id:
+        query = query.filter(User.id.in_(
+            select(WorkerPropertyIndex.user_id).where(WorkerPropertyIndex.property_id == property_id)
+        ))
+
+    if search:
+        query = query.filter(or_(
+            User.first_name.ilike(f'%{search}%'),
+            User.last_name.ilike(f'%{search}%'),
+            User.email.ilike(f'%{search}%')
+        ))
+
+    return query
+
+
+def get_worker_roster(query, page=1, per_page=10):
+    """Paginate workers together with their property IDs and open-task counts.
+
+    Returns ``(pagination, summaries)`` where ``pagination.items`` are User
+    objects and ``summaries`` maps worker ID to a dict with ``property_ids``
+    and ``open_task_count``. The page is loaded with one grouped query.
+    """
+    open_tasks = db.session.query(
+        TaskAssignment.user_id.label('user_id'),
+        func.count(func.distinct(Task.id)).label('open_task_count')
+    ).join(
+        Task, TaskAssignment.task_id == Task.id
+    ).filter(
+        Task.status.in_(OPEN_TASK_STATUSES)
+    ).group_by(TaskAssignment.user_id).subquery()
+
+    roster = db.session.query(
+        User,
+        _aggregate_ids(WorkerPropertyIndex.property_id).label('property_ids'),
+        func.coalesce(func.max(open_tasks.c.open_task_count), 0).label('open_task_count')
+    ).outerjoin(
+        WorkerPropertyIndex, WorkerPropertyIndex.user_id == User.id
+    ).outerjoin(
+        open_tasks, open_tasks.c.user_id == User.id
+    ).filter(
+        User.id.in_(query.with_entities(User.id).scalar_subquery())
+    ).group_by(User.id).order_by(User.last_name, User.first_name, User.id)
+
+    pagination = roster.paginate(page=page, per_page=per_page, error_out=False)
+
+    summaries = {}
+    workers = []
+    for worker, property_ids, open_task_count in pagination.items:
+        workers.append(worker)
+        summaries[worker.id] = {
+            'property_ids': _split_ids(property_ids),
+            'open_task_count': open_task_count or 0,
+        }
+    pagination.items = workers
+
+    return pagination, summaries
+
+
+@cached_query(timeout=DEPENDENT_CACHE_TIMEOUT, key_prefix='worker_property_ids',
+              tags=lambda worker_id: [user_tag(worker_id), TASKS_TAG])
+def get_worker_property_ids(worker_id):
+    """
+    The IDs of all properties a worker is assigned to, as a frozenset.
+
+    Read from WorkerPropertyIndex and cached under the worker's user tag,
+    which the session hooks in cache_service invalidate whenever one of
+    their assignments, or a task's property, changes.
+    """
+    rows = db.session.query(WorkerPropertyIndex.property_id).filter(
+        WorkerPropertyIndex.user_id == worker_id
+    ).all()
+    return frozenset(row[0] for row in rows)
+
+
+def is_worker_assigned(worker_id, property_id):
+    """Check if a worker is assigned to a property"""
+    return property_id in get_worker_property_ids(worker_id)
+
+
+def get_worker_task_buckets(worker_id, completed_limit=10):
+    """Load a worker's pending, in-progress and recently completed tasks in one query.
+
+    Returns a dict with ``pending``, ``in_progress`` and ``completed`` lists
+    ordered the same way the dashboards display them.
+    """
+    recent_completed = select(Task.id).join(
+        TaskAssignment, TaskAssignment.task_id == Task.id
+    ).where(
+        TaskAssignment.user_id == worker_id,
+        Task.status == TaskStatus.COMPLETED
+    ).order_by(Task.completed_at.desc()).limit(completed_limit)
+
+    tasks = Task.query.filter(
+        Task.id.in_(select(TaskAssignment.task_id).where(TaskAssignment.user_id == worker_id)),
+        or_(
+            Task.status.in_(OPEN_TASK_STATUSES),
+            Task.id.in_(recent_completed.scalar_subquery())
+        )
+    ).all()
+
+    buckets = {'pending': [], 'in_progress': [], 'completed': []}
+    for task in tasks:
+        if task.status == TaskStatus.PENDING:
+            buckets['pending'].append(task)
+        elif task.status == TaskStatus.IN_PROGRESS:
+            buckets['in_progress'].append(task)
+        else:
+            buckets['completed'].append(task)
+
+    buckets['pending'].sort(key=lambda t: (t.due_date is None, t.due_date or datetime.min))
+    buckets['completed'].sort(key=lambda t: t.completed_at or datetime.min, reverse=True)
+    return buckets
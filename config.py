@@ -32,6 +32,20 @@ class Config:
     CACHE_TYPE = os.environ.get('CACHE_TYPE', 'simple')  # 'redis' for production
     CACHE_REDIS_URL = REDIS_URL
     CACHE_DEFAULT_TIMEOUT = int(os.environ.get('CACHE_DEFAULT_TIMEOUT', 300))
+    # Seconds between checks of the site settings version stamp in each worker
+    CONFIG_VERSION_CHECK_INTERVAL = float(os.environ.get('CONFIG_VERSION_CHECK_INTERVAL', 2))
+    
+    # Background job runner: start a worker thread in each app process
+    JOB_RUNNER_ENABLED = os.environ.get('JOB_RUNNER_ENABLED', 'false').lower() == 'true'
+    JOB_POLL_INTERVAL = float(os.environ.get('JOB_POLL_INTERVAL', 5))
+    JOB_LEADER_LEASE_SECONDS = int(os.environ.get('JOB_LEADER_LEASE_SECONDS', 30))
+    
+    # Run 'flask prepare' (table creation, default settings, Twilio check) inside create_app.
+    # Deployments turn this off and run 'flask prepare' once as a release step instead.
+    PREPARE_DATABASE_ON_STARTUP = os.environ.get('PREPARE_DATABASE_ON_STARTUP', 'true').lower() == 'true'
+    
+    # Recurring events in imported calendar feeds are stored this many days ahead
+    ICAL_RECURRENCE_HORIZON_DAYS = int(os.environ.get('ICAL_RECURRENCE_HORIZON_DAYS', 365))
     
     # Session configuration
     SESSION_TYPE = os.environ.get('SESSION_TYPE', 'filesystem')  # 'redis' for production
@@ -90,6 +104,7 @@ class Config:
     
     # Rate limiting
     RATELIMIT_STORAGE_URL = REDIS_URL
+    RATELIMIT_BACKEND = os.environ.get('RATELIMIT_BACKEND', 'memory')  # 'redis' to share limits across instances
     RATELIMIT_STRATEGY = os.environ.get('RATELIMIT_STRATEGY', 'fixed-window')
     RATELIMIT_ENABLED = os.environ.get('RATELIMIT_ENABLED', 'true').lower() == 'true'
     
@@ -148,6 +163,8 @@ class TestConfig(Config):
     NOTIFICATION_EMAIL_ENABLED = False
     NOTIFICATION_SMS_ENABLED = False
     USER_TABLE_NAME = 'user'  # For testing with the legacy schema
+    # Test fixtures create the schema themselves
+    PREPARE_DATABASE_ON_STARTUP = False
     
     # Override SQLAlchemy engine options for SQLite (no connection pooling)
     SQLALCHEMY_ENGINE_OPTIONS = {}
@@ -181,6 +198,7 @@ class ProductionConfig(Config):
     # Enable Redis for production
     CACHE_TYPE = 'redis'
     SESSION_TYPE = 'redis'
+    RATELIMIT_BACKEND = os.environ.get('RATELIMIT_BACKEND', 'redis')
     
     # Enhanced database pooling for production
     SQLALCHEMY_ENGINE_OPTIONS = {
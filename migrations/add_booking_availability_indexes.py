@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Add the indexes behind booking conflict checks: one (property, end, start)
+index per booking source. On PostgreSQL, also add an exclusion constraint
+so two guest bookings that are not cancelled can never overlap.
+"""
+import os
+import sys
+from sqlalchemy import text
+
+# Add the parent directory to sys.path
+sys.path.insert(0, os.path.abspath(os.path.dirname(os.path.dirname(__file__))))
+
+from app import create_app, db
+
+INDEXES = {
+    'idx_booking_property_stay': ('booking', 'property_id, end_date, start_date'),
+    'idx_calendar_event_property_stay': ('calendar_events', 'property_id, end_date, start_date'),
+    'idx_guest_booking_property_stay': ('guest_bookings', 'property_id, check_out_date, check_in_date'),
+    'idx_booking_request_property_stay': ('booking_requests', 'property_id, check_out_date, check_in_date'),
+}
+
+def add_booking_availability_indexes():
+    """Create the stay indexes, then the PostgreSQL exclusion constraint"""
+    app = create_app()
+
+    with app.app_context():
+        print("Checking booking availability indexes...")
+
+        try:
+            for name, (table, columns) in INDEXES.items():
+                db.session.execute(text(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({columns})"))
+                print(f"✓ Created index {name}")
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            print(f"✗ Error during migration: {str(e)}")
+            return False
+
+        if db.engine.dialect.name != 'postgresql':
+            print("✓ Skipped exclusion constraint (PostgreSQL only)")
+            return True
+
+        try:
+            exists = db.session.execute(text(
+                "SELECT 1 FROM pg_constraint WHERE conname = 'excl_guest_booking_overlap'"
+            )).scalar()
+            if exists:
+                print("✓ excl_guest_booking_overlap already exists")
+                return True
+            db.session.execute(text("CREATE EXTENSION IF NOT EXISTS btree_gist"))
+            db.session.execute(text("""
+                ALTER TABLE guest_bookings ADD CONSTRAINT excl_guest_booking_overlap
+                EXCLUDE USING gist (property_id WITH =, daterange(check_in_date, check_out_date) WITH &&)
+                WHERE (lower(status) <> 'cancelled')
+            """))
+            db.session.commit()
+            print("✓ Added exclusion constraint excl_guest_booking_overlap")
+            return True
+        except Exception as e:
+            db.session.rollback()
+            # Usually existing overlapping bookings; they have to be resolved by hand first
+            print(f"✗ Could not add excl_guest_booking_overlap: {str(e)}")
+            return False
+
+if __name__ == "__main__":
+    success = add_booking_availability_indexes()
+    sys.exit(0 if success else 1)
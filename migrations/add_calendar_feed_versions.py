@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+Add the stored feed version and expansion horizon to property_calendar and
+the occurrence start of expanded recurring events to calendar_events.
+
+Existing calendars keep a NULL feed version, so the next sync expands
+their feeds again, recurring events included.
+"""
+import os
+import sys
+from sqlalchemy import text
+
+# Add the parent directory to sys.path
+sys.path.insert(0, os.path.abspath(os.path.dirname(os.path.dirname(__file__))))
+
+from app import create_app, db
+
+# Table -> columns to add
+COLUMNS = {
+    'property_calendar': {
+        'feed_version': 'VARCHAR(64)',
+        'expanded_until': 'DATE',
+    },
+    'calendar_events': {
+        'recurrence_id': 'VARCHAR(32)',
+    },
+}
+
+def add_calendar_feed_versions():
+    """Add the feed version, expansion horizon and recurrence ID columns"""
+    app = create_app()
+
+    with app.app_context():
+        print("Checking calendar feed version columns...")
+
+        inspector = db.inspect(db.engine)
+
+        try:
+            for table, definitions in COLUMNS.items():
+                columns = [col['name'] for col in inspector.get_columns(table)]
+                for column, column_type in definitions.items():
+                    if column not in columns:
+                        db.session.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {column_type}"))
+                        print(f"✓ Added {table}.{column} column")
+                    else:
+                        print(f"✓ {table}.{column} column already exists")
+
+            db.session.commit()
+            print("✓ Migration completed successfully")
+            return True
+        except Exception as e:
+            db.session.rollback()
+            print(f"✗ Error during migration: {str(e)}")
+            return False
+
+if __name__ == "__main__":
+    success = add_calendar_feed_versions()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+"""
+Add the cleaning_duration_rollup table (completed cleaning sessions per
+property, cleaner, month and duration bucket) and count the sessions
+already completed, so cleaning analytics cover the full history.
+"""
+import os
+import sys
+
+# Add the parent directory to sys.path
+sys.path.insert(0, os.path.abspath(os.path.dirname(os.path.dirname(__file__))))
+
+from app import create_app, db
+from app.models import CleaningDurationRollup
+
+def add_cleaning_duration_rollups():
+    """Create the table if needed and rebuild every rollup from the sessions"""
+    app = create_app()
+
+    with app.app_context():
+        print("Checking cleaning_duration_rollup table...")
+
+        try:
+            CleaningDurationRollup.__table__.create(db.engine, checkfirst=True)
+            print("✓ Created table cleaning_duration_rollup")
+
+            rollups = CleaningDurationRollup.rebuild()
+            db.session.commit()
+            print(f"✓ Built {rollups} cleaning duration rollups")
+            return True
+        except Exception as e:
+            db.session.rollback()
+            print(f"✗ Error during migration: {str(e)}")
+            return False
+
+if __name__ == "__main__":
+    success = add_cleaning_duration_rollups()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+"""
+Add the composite indexes backing the unified inbox: messages by
+(thread_id, created_at) and notifications by (recipient_id, created_at).
+"""
+import os
+import sys
+from sqlalchemy import text
+
+# Add the parent directory to sys.path
+sys.path.insert(0, os.path.abspath(os.path.dirname(os.path.dirname(__file__))))
+
+from app import create_app, db
+
+INDEXES = [
+    ("idx_message_thread_created", "messages", "thread_id, created_at"),
+    ("idx_notification_recipient_created", "notification", "recipient_id, created_at"),
+]
+
+def add_inbox_indexes():
+    """Create the inbox indexes if they do not already exist"""
+    app = create_app()
+
+    with app.app_context():
+        print("Checking inbox indexes...")
+
+        try:
+            for name, table, columns in INDEXES:
+                db.session.execute(text(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({columns})"))
+                print(f"✓ Created index {name} on {table} ({columns})")
+
+            db.session.commit()
+            print("✓ Migration completed successfully")
+            return True
+        except Exception as e:
+            db.session.rollback()
+            print(f"✗ Error during migration: {str(e)}")
+            return False
+
+if __name__ == "__main__":
+    success = add_inbox_indexes()
+    sys.exit(0 if success else 1)
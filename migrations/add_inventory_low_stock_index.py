@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+"""
+Add a partial index on inventory_item covering only rows at or below their
+reorder threshold, used by low-stock filtering and the reorder report.
+"""
+import os
+import sys
+from sqlalchemy import text
+
+# Add the parent directory to sys.path
+sys.path.insert(0, os.path.abspath(os.path.dirname(os.path.dirname(__file__))))
+
+from app import create_app, db
+
+def add_inventory_low_stock_index():
+    """Create the partial low-stock index if it does not already exist"""
+    app = create_app()
+
+    with app.app_context():
+        print("Checking inventory low-stock index...")
+
+        try:
+            db.session.execute(text(
+                "CREATE INDEX IF NOT EXISTS idx_inventory_item_low_stock "
+                "ON inventory_item (property_id, catalog_item_id) "
+                "WHERE current_quantity <= reorder_threshold"
+            ))
+            db.session.commit()
+            print("✓ Created partial index idx_inventory_item_low_stock")
+            return True
+        except Exception as e:
+            db.session.rollback()
+            print(f"✗ Error during migration: {str(e)}")
+            return False
+
+if __name__ == "__main__":
+    success = add_inventory_low_stock_index()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,33 @@
+#!/usr/bin/env python3
+"""
+Add the invoice_batch table, which stores batch invoice runs and their
+progress so any worker can report on them and the job runner can execute
+them.
+"""
+import os
+import sys
+
+# Add the parent directory to sys.path
+sys.path.insert(0, os.path.abspath(os.path.dirname(os.path.dirname(__file__))))
+
+from app import create_app, db
+from app.models_modules.invoicing import InvoiceBatch
+
+def add_invoice_batches():
+    """Create the invoice_batch table and its index if they do not already exist"""
+    app = create_app()
+
+    with app.app_context():
+        print("Checking invoice batch table...")
+
+        try:
+            InvoiceBatch.__table__.create(db.engine, checkfirst=True)
+            print(f"✓ Created table {InvoiceBatch.__tablename__}")
+            return True
+        except Exception as e:
+            print(f"✗ Error during migration: {str(e)}")
+            return False
+
+if __name__ == "__main__":
+    success = add_invoice_batches()
+    sys.exit(0 if success else 1)
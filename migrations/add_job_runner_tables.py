@@ -0,0 +1,33 @@
+#!/usr/bin/env python3
+"""
+Add the background job tables: scheduled_jobs (schedule and run
+statistics), job_runs (the queue) and scheduler_leases (leader election).
+"""
+import os
+import sys
+
+# Add the parent directory to sys.path
+sys.path.insert(0, os.path.abspath(os.path.dirname(os.path.dirname(__file__))))
+
+from app import create_app, db
+from app.models_modules.jobs import ScheduledJob, JobRun, SchedulerLease
+
+def add_job_runner_tables():
+    """Create the job runner tables and their indexes if they do not already exist"""
+    app = create_app()
+
+    with app.app_context():
+        print("Checking job runner tables...")
+
+        try:
+            for model in (ScheduledJob, JobRun, SchedulerLease):
+                model.__table__.create(db.engine, checkfirst=True)
+                print(f"✓ Created table {model.__tablename__}")
+            return True
+        except Exception as e:
+            print(f"✗ Error during migration: {str(e)}")
+            return False
+
+if __name__ == "__main__":
+    success = add_job_runner_tables()
+    sys.exit(0 if success else 1)
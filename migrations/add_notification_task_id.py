@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+"""
+Add the task a notification is about to the notification table, so task
+reminders are deduplicated per task rather than by their message text.
+
+Existing notifications keep a NULL task_id.
+"""
+import os
+import sys
+from sqlalchemy import text
+
+# Add the parent directory to sys.path
+sys.path.insert(0, os.path.abspath(os.path.dirname(os.path.dirname(__file__))))
+
+from app import create_app, db
+
+def add_notification_task_id():
+    """Add notification.task_id if it does not already exist"""
+    app = create_app()
+
+    with app.app_context():
+        print("Checking notification task_id column...")
+
+        inspector = db.inspect(db.engine)
+        columns = [col['name'] for col in inspector.get_columns('notification')]
+
+        try:
+            if 'task_id' not in columns:
+                db.session.execute(text(
+                    "ALTER TABLE notification ADD COLUMN task_id INTEGER REFERENCES task(id) ON DELETE SET NULL"
+                ))
+                print("✓ Added notification.task_id column")
+            else:
+                print("✓ notification.task_id column already exists")
+
+            db.session.commit()
+            print("✓ Migration completed successfully")
+            return True
+        except Exception as e:
+            db.session.rollback()
+            print(f"✗ Error during migration: {str(e)}")
+            return False
+
+if __name__ == "__main__":
+    success = add_notification_task_id()
+    sys.exit(0 if success else 1)
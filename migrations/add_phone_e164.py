@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Normalize phone numbers to E.164 for SMS routing.
+
+Adds users.phone_e164 and fills it from users.phone. A number shared by
+several accounts stays with the oldest one; the others are listed so an
+admin can sort them out. Message threads get their numbers normalized
+in place, threads that turn out to be for the same number pair are
+merged into the oldest one, and both tables get unique indexes.
+"""
+import os
+import sys
+
+# Add the parent directory to sys.path
+sys.path.insert(0, os.path.abspath(os.path.dirname(os.path.dirname(__file__))))
+
+from sqlalchemy import delete, text, update
+
+from app import create_app, db
+from app.models import Message, MessageThread, User
+from app.utils.phone import to_e164
+
+def backfill_users():
+    """Fill phone_e164 for every user with a phone number; returns (filled, skipped duplicates)"""
+    owners = {}
+    duplicates = []
+    for user_id, email, phone in db.session.query(User.id, User.email, User.phone).filter(
+        User.phone.isnot(None)
+    ).order_by(User.id):
+        phone_e164 = to_e164(phone)
+        if not phone_e164:
+            continue
+        if phone_e164 in owners:
+            duplicates.append((email, phone_e164))
+            phone_e164 = None
+        else:
+            owners[phone_e164] = user_id
+        db.session.execute(
+            update(User).where(User.id == user_id).values(phone_e164=phone_e164)
+            .execution_options(synchronize_session=False)
+        )
+    return len(owners), duplicates
+
+def normalize_threads():
+    """Normalize thread numbers and merge threads for the same pair; returns the number merged"""
+    kept = {}
+    merged = 0
+    threads = db.session.query(
+        MessageThread.id, MessageThread.participant_phone, MessageThread.system_phone, MessageThread.user_id
+    ).order_by(MessageThread.id).all()
+    for thread_id, participant_phone, system_phone, user_id in threads:
+        key = (to_e164(participant_phone) or participant_phone, to_e164(system_phone) or system_phone)
+        if key in kept:
+            keep_id = kept[key]
+            db.session.execute(
+                update(Message).where(Message.thread_id == thread_id).values(thread_id=keep_id)
+                .execution_options(synchronize_session=False)
+            )
+            if user_id is not None:
+                db.session.execute(
+                    update(MessageThread)
+                    .where(MessageThread.id == keep_id, MessageThread.user_id.is_(None))
+                    .values(user_id=user_id)
+                    .execution_options(synchronize_session=False)
+                )
+            db.session.execute(delete(MessageThread).where(MessageThread.id == thread_id))
+            merged += 1
+            continue
+        kept[key] = thread_id
+        if key != (participant_phone, system_phone):
+            db.session.execute(
+                update(MessageThread).where(MessageThread.id == thread_id)
+                .values(participant_phone=key[0], system_phone=key[1])
+                .execution_options(synchronize_session=False)
+            )
+    return merged
+
+def add_phone_e164():
+    """Add and backfill the column, normalize threads, then create the unique indexes"""
+    app = create_app()
+
+    with app.app_context():
+        print("Checking E.164 phone numbers...")
+
+        try:
+            columns = [col['name'] for col in db.inspect(db.engine).get_columns('users')]
+            if 'phone_e164' not in columns:
+                db.session.execute(text("ALTER TABLE users ADD COLUMN phone_e164 VARCHAR(20)"))
+                print("✓ Added users.phone_e164")
+            else:
+                print("• users.phone_e164 already exists")
+
+            filled, duplicates = backfill_users()
+            print(f"✓ Normalized {filled} user phone numbers")
+            for email, phone_e164 in duplicates:
+                print(f"  ! {email} shares {phone_e164} with an older account; left without an SMS number")
+
+            merged = normalize_threads()
+            print(f"✓ Normalized message threads ({merged} duplicates merged)")
+
+            db.session.execute(text(
+                "CREATE UNIQUE INDEX IF NOT EXISTS idx_user_phone_e164 ON users (phone_e164)"
+            ))
+            db.session.execute(text(
+                "CREATE UNIQUE INDEX IF NOT EXISTS idx_message_thread_phones "
+                "ON message_threads (participant_phone, system_phone)"
+            ))
+            db.session.commit()
+            print("✓ Created unique indexes idx_user_phone_e164 and idx_message_thread_phones")
+            return True
+        except Exception as e:
+            db.session.rollback()
+            print(f"✗ Error during migration: {str(e)}")
+            return False
+
+if __name__ == "__main__":
+    success = add_phone_e164()
+    sys.exit(0 if success else 1)
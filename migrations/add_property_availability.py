@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+"""
+Add the property_availability table (a booked-day bitmap per property)
+and build it from the calendar events already synced, so the
+availability view has data before the next calendar sync.
+"""
+import os
+import sys
+
+# Add the parent directory to sys.path
+sys.path.insert(0, os.path.abspath(os.path.dirname(os.path.dirname(__file__))))
+
+from app import create_app, db
+from app.models import PropertyAvailability, Property
+
+def add_property_availability():
+    """Create the table if needed and rebuild every property's bitmap"""
+    app = create_app()
+
+    with app.app_context():
+        print("Checking property_availability table...")
+
+        try:
+            PropertyAvailability.__table__.create(db.engine, checkfirst=True)
+            print("✓ Created table property_availability")
+
+            property_ids = [property_id for property_id, in db.session.query(Property.id)]
+            PropertyAvailability.rebuild(property_ids)
+            db.session.commit()
+            print(f"✓ Built availability for {len(property_ids)} properties")
+            return True
+        except Exception as e:
+            db.session.rollback()
+            print(f"✗ Error during migration: {str(e)}")
+            return False
+
+if __name__ == "__main__":
+    success = add_property_availability()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Add the maintained service history totals to property and the
+(property_id, id) indexes that serve the paginated history endpoint.
+"""
+import os
+import sys
+from sqlalchemy import text
+
+# Add the parent directory to sys.path
+sys.path.insert(0, os.path.abspath(os.path.dirname(os.path.dirname(__file__))))
+
+from app import create_app, db
+
+# Counter column -> table whose rows it counts
+COUNTERS = {
+    'task_count': 'task_property',
+    'cleaning_session_count': 'cleaning_session',
+    'repair_request_count': 'repair_request',
+}
+
+INDEXES = {
+    'idx_task_property_property_task': 'task_property (property_id, task_id)',
+    'idx_cleaning_session_property': 'cleaning_session (property_id, id)',
+    'idx_repair_request_property': 'repair_request (property_id, id)',
+}
+
+def add_property_history_counts():
+    """Add the counter columns and indexes, then backfill the counters"""
+    app = create_app()
+
+    with app.app_context():
+        print("Checking property service history counters...")
+
+        inspector = db.inspect(db.engine)
+        columns = [col['name'] for col in inspector.get_columns('property')]
+
+        try:
+            for column in COUNTERS:
+                if column not in columns:
+                    db.session.execute(text(
+                        f"ALTER TABLE property ADD COLUMN {column} INTEGER NOT NULL DEFAULT 0"
+                    ))
+                    print(f"✓ Added {column} column")
+
+            for name, definition in INDEXES.items():
+                db.session.execute(text(f"CREATE INDEX IF NOT EXISTS {name} ON {definition}"))
+                print(f"✓ Created index {name}")
+
+            # Backfill every counter in one statement
+            assignments = ",\n".join(
+                f"{column} = (SELECT COUNT(*) FROM {table} WHERE {table}.property_id = property.id)"
+                for column, table in COUNTERS.items()
+            )
+            db.session.execute(text(f"UPDATE property SET {assignments}"))
+            print("✓ Backfilled service history counters")
+
+            db.session.commit()
+            print("✓ Migration completed successfully")
+            return True
+        except Exception as e:
+            db.session.rollback()
+            print(f"✗ Error during migration: {str(e)}")
+            return False
+
+if __name__ == "__main__":
+    success = add_property_history_counts()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Add the maintained votes_count column to recommendation_blocks and a unique
+(recommendation_id, guest_token) constraint to recommendation_votes.
+"""
+import os
+import sys
+from sqlalchemy import text
+
+# Add the parent directory to sys.path
+sys.path.insert(0, os.path.abspath(os.path.dirname(os.path.dirname(__file__))))
+
+from app import create_app, db
+
+def add_recommendation_vote_counters():
+    """Add votes_count, de-duplicate votes, add the unique index and backfill counts"""
+    app = create_app()
+
+    with app.app_context():
+        print("Checking recommendation vote counters...")
+
+        inspector = db.inspect(db.engine)
+        columns = [col['name'] for col in inspector.get_columns('recommendation_blocks')]
+
+        try:
+            if 'votes_count' not in columns:
+                db.session.execute(text(
+                    "ALTER TABLE recommendation_blocks ADD COLUMN votes_count INTEGER NOT NULL DEFAULT 0"
+                ))
+                print("✓ Added votes_count column")
+
+            # Remove duplicate votes so the unique index can be created
+            db.session.execute(text("""
+                DELETE FROM recommendation_votes
+                WHERE id NOT IN (
+                    SELECT MIN(id) FROM recommendation_votes
+                    GROUP BY recommendation_id, guest_token
+                )
+            """))
+            print("✓ Removed duplicate votes")
+
+            db.session.execute(text(
+                "CREATE UNIQUE INDEX IF NOT EXISTS uq_recommendation_votes_guest "
+                "ON recommendation_votes (recommendation_id, guest_token)"
+            ))
+            print("✓ Created unique index on (recommendation_id, guest_token)")
+
+            # Backfill counters from the vote rows in one statement
+            db.session.execute(text("""
+                UPDATE recommendation_blocks
+                SET votes_count = (
+                    SELECT COUNT(*) FROM recommendation_votes
+                    WHERE recommendation_votes.recommendation_id = recommendation_blocks.id
+                )
+            """))
+            print("✓ Backfilled votes_count")
+
+            db.session.commit()
+            print("✓ Migration completed successfully")
+            return True
+        except Exception as e:
+            db.session.rollback()
+            print(f"✗ Error during migration: {str(e)}")
+            return False
+
+if __name__ == "__main__":
+    success = add_recommendation_vote_counters()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+Add the columns used by the recurring expense generator: a next-due
+pointer on recurring_expenses and a period key on expenses, unique per
+template so catch-up runs never generate the same occurrence twice.
+"""
+import os
+import sys
+from sqlalchemy import text, inspect
+
+# Add the parent directory to sys.path
+sys.path.insert(0, os.path.abspath(os.path.dirname(os.path.dirname(__file__))))
+
+from app import create_app, db
+
+def add_recurring_expense_periods():
+    """Add the columns and index, and backfill periods of already generated expenses"""
+    app = create_app()
+
+    with app.app_context():
+        print("Checking recurring expense columns...")
+
+        try:
+            inspector = inspect(db.engine)
+            columns = {
+                'recurring_expenses': ('next_due_date', 'DATE'),
+                'expenses': ('recurrence_period', 'VARCHAR(7)'),
+            }
+            for table, (column, column_type) in columns.items():
+                if column in [c['name'] for c in inspector.get_columns(table)]:
+                    print(f"✓ {table}.{column} already exists")
+                    continue
+                db.session.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {column_type}"))
+                print(f"✓ Added {table}.{column}")
+
+            # Earlier expenses generated from a template get the period they fall due in;
+            # if a template produced duplicates, only the first one is keyed
+            if db.engine.dialect.name == 'postgresql':
+                period = "to_char(due_date, 'YYYY-MM')"
+            else:
+                period = "strftime('%Y-%m', due_date)"
+            result = db.session.execute(text(f"""
+                UPDATE expenses SET recurrence_period = {period}
+                WHERE id IN (
+                    SELECT MIN(id) FROM expenses
+                    WHERE recurring_expense_id IS NOT NULL AND due_date IS NOT NULL
+                    GROUP BY recurring_expense_id, {period}
+                ) AND recurrence_period IS NULL
+            """))
+            print(f"✓ Backfilled {result.rowcount} expense periods")
+
+            db.session.execute(text(
+                "CREATE UNIQUE INDEX IF NOT EXISTS uq_expense_recurring_period "
+                "ON expenses (recurring_expense_id, recurrence_period)"
+            ))
+            print("✓ Created index uq_expense_recurring_period")
+
+            db.session.commit()
+            return True
+        except Exception as e:
+            db.session.rollback()
+            print(f"✗ Error during migration: {str(e)}")
+            return False
+
+if __name__ == "__main__":
+    success = add_recurring_expense_periods()
+    sys.exit(0 if success else 1)
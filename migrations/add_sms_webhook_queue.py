@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+"""
+Add the inbound_sms and sms_status_callbacks tables the Twilio webhooks
+write to, and the index status updates use to find messages by SID.
+"""
+import os
+import sys
+
+from sqlalchemy import text
+
+# Add the parent directory to sys.path
+sys.path.insert(0, os.path.abspath(os.path.dirname(os.path.dirname(__file__))))
+
+from app import create_app, db
+from app.models import InboundSms, SmsStatusCallback
+
+def add_sms_webhook_queue():
+    """Create the tables and the messages.external_id index if needed"""
+    app = create_app()
+
+    with app.app_context():
+        print("Checking SMS webhook tables...")
+
+        try:
+            for model in (InboundSms, SmsStatusCallback):
+                model.__table__.create(db.engine, checkfirst=True)
+                print(f"✓ Created table {model.__tablename__}")
+
+            db.session.execute(text(
+                "CREATE INDEX IF NOT EXISTS idx_message_external_id ON messages (external_id)"
+            ))
+            db.session.commit()
+            print("✓ Created index idx_message_external_id")
+            return True
+        except Exception as e:
+            db.session.rollback()
+            print(f"✗ Error during migration: {str(e)}")
+            return False
+
+if __name__ == "__main__":
+    success = add_sms_webhook_queue()
+    sys.exit(0 if success else 1)
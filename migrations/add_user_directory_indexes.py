@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+Add indexes used by the admin user directory: lower-cased name and email
+expression indexes for prefix search, and (role, created_at, id) for
+keyset pagination within a role.
+
+Keyset pagination needs every user to have a created_at, so legacy rows
+without one are backfilled and the column is made NOT NULL.
+"""
+import os
+import sys
+from sqlalchemy import text
+
+# Add the parent directory to sys.path
+sys.path.insert(0, os.path.abspath(os.path.dirname(os.path.dirname(__file__))))
+
+from app import create_app, db
+
+def add_user_directory_indexes():
+    """Create the user directory indexes if they do not already exist"""
+    app = create_app()
+
+    with app.app_context():
+        print("Checking user directory indexes...")
+
+        # LIKE 'prefix%' needs text_pattern_ops on PostgreSQL unless the collation is C
+        ops = ' text_pattern_ops' if db.engine.dialect.name == 'postgresql' else ''
+        indexes = {
+            'idx_user_email_lower': f"users (lower(email){ops})",
+            'idx_user_first_name_lower': f"users (lower(first_name){ops})",
+            'idx_user_last_name_lower': f"users (lower(last_name){ops})",
+            'idx_user_role_created': "users (role, created_at, id)",
+        }
+
+        try:
+            # Best guess for legacy accounts: their last update or login, else the oldest known account
+            result = db.session.execute(text(
+                "UPDATE users SET created_at = COALESCE(updated_at, last_login, "
+                "(SELECT MIN(created_at) FROM users), CURRENT_TIMESTAMP) WHERE created_at IS NULL"
+            ))
+            print(f"✓ Backfilled created_at for {result.rowcount} users")
+            if db.engine.dialect.name == 'postgresql':
+                db.session.execute(text("ALTER TABLE users ALTER COLUMN created_at SET NOT NULL"))
+                print("✓ Made users.created_at NOT NULL")
+
+            for name, definition in indexes.items():
+                db.session.execute(text(f"CREATE INDEX IF NOT EXISTS {name} ON {definition}"))
+                print(f"✓ Created index {name}")
+            db.session.commit()
+            return True
+        except Exception as e:
+            db.session.rollback()
+            print(f"✗ Error during migration: {str(e)}")
+            return False
+
+if __name__ == "__main__":
+    success = add_user_directory_indexes()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,37 @@
+#!/usr/bin/env python3
+"""
+Create the worker_property_index table and backfill it from task history.
+"""
+import os
+import sys
+
+# Add the parent directory to sys.path
+sys.path.insert(0, os.path.abspath(os.path.dirname(os.path.dirname(__file__))))
+
+from app import create_app, db
+
+def add_worker_property_index():
+    """Create and backfill the maintained worker-to-property index"""
+    app = create_app()
+
+    with app.app_context():
+        from app.models import WorkerPropertyIndex
+
+        try:
+            print("Creating worker_property_index table...")
+            WorkerPropertyIndex.__table__.create(db.engine, checkfirst=True)
+
+            print("Backfilling worker_property_index from task assignments...")
+            WorkerPropertyIndex.rebuild()
+
+            count = WorkerPropertyIndex.query.count()
+            print(f"✓ Indexed {count} worker/property pairs")
+            return True
+        except Exception as e:
+            db.session.rollback()
+            print(f"✗ Error during migration: {str(e)}")
+            return False
+
+if __name__ == "__main__":
+    success = add_worker_property_index()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Benchmark inbound iCal ingestion: full expansion against an unchanged-feed sync.
+
+Usage:
+    python scripts/benchmark_ical_ingest.py [--series N] [--bookings N] [--runs N]
+
+Builds a synthetic feed with N daily recurring series, each with an
+EXDATE and an overridden instance, plus N single bookings, and ingests it
+into a throwaway SQLite database. The first ingest parses and expands the
+feed; later ingests of the same body are skipped on the feed version,
+which is what the scheduled sync does for the common unchanged feed.
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.abspath(os.path.dirname(os.path.dirname(__file__))))
+os.environ.setdefault('SECRET_KEY', 'ical-benchmark')
+
+from app import create_app, db
+from app.models import Property, PropertyCalendar, User, UserRoles
+from app.property.ical_import import ingest_feed
+from config import TestConfig
+
+
+def synthetic_feed(series, bookings, today):
+    lines = ['BEGIN:VCALENDAR', 'VERSION:2.0', 'PRODID:-//Benchmark//EN']
+    for i in range(series):
+        start = today + timedelta(days=i % 7)
+        lines += ['BEGIN:VEVENT', f'UID:series-{i}@example.com', f'SUMMARY:Block {i}',
+                  f'DTSTART;VALUE=DATE:{start:%Y%m%d}', f'DTEND;VALUE=DATE:{start + timedelta(days=1):%Y%m%d}',
+                  'RRULE:FREQ=DAILY;INTERVAL=7', f'EXDATE;VALUE=DATE:{start + timedelta(days=14):%Y%m%d}',
+                  'END:VEVENT',
+                  'BEGIN:VEVENT', f'UID:series-{i}@example.com',
+                  f'RECURRENCE-ID;VALUE=DATE:{start + timedelta(days=7):%Y%m%d}', f'SUMMARY:Block {i} (moved)',
+                  f'DTSTART;VALUE=DATE:{start + timedelta(days=8):%Y%m%d}',
+                  f'DTEND;VALUE=DATE:{start + timedelta(days=9):%Y%m%d}', 'END:VEVENT']
+    for i in range(bookings):
+        start = today + timedelta(days=i * 3)
+        lines += ['BEGIN:VEVENT', f'UID:booking-{i}@example.com', 'SUMMARY:Reserved',
+                  f'DTSTART;VALUE=DATE:{start:%Y%m%d}', f'DTEND;VALUE=DATE:{start + timedelta(days=2):%Y%m%d}',
+                  'END:VEVENT']
+    lines.append('END:VCALENDAR')
+    return '\r\n'.join(lines) + '\r\n'
+
+
+def timed(calendar, feed, today, force):
+    start = time.perf_counter()
+    stored = ingest_feed(calendar, feed, today=today, force=force)
+    db.session.commit()
+    return time.perf_counter() - start, stored
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--series', type=int, default=20)
+    parser.add_argument('--bookings', type=int, default=100)
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    app = create_app(TestConfig)
+    with app.app_context():
+        db.create_all()
+        owner = User(first_name='Bench', last_name='Owner', email='bench@example.com', role=UserRoles.PROPERTY_OWNER.value)
+        owner.set_password('password')
+        db.session.add(owner)
+        db.session.flush()
+        prop = Property(name='Benchmark', address='1 Bench St', owner_id=owner.id)
+        db.session.add(prop)
+        db.session.flush()
+        calendar = PropertyCalendar(property_id=prop.id, name='Airbnb', ical_url='https://example.com/feed.ics',
+                                    service='airbnb')
+        db.session.add(calendar)
+        db.session.commit()
+
+        today = date.today()
+        feed = synthetic_feed(args.series, args.bookings, today)
+        expand = [timed(calendar, feed, today, force=True) for _ in range(args.runs)]
+        skip = [timed(calendar, feed, today, force=False) for _ in range(args.runs)]
+
+    expand_median = statistics.median(seconds for seconds, _ in expand)
+    skip_median = statistics.median(seconds for seconds, _ in skip)
+    print(f"feed: {len(feed) / 1024:.0f} KiB, {args.series} series, {args.bookings} bookings, "
+          f"{expand[-1][1]} events stored")
+    print(f"parse + expand + store  {expand_median * 1000:8.1f} ms")
+    print(f"unchanged feed          {skip_median * 1000:8.1f} ms  ({expand_median / skip_median:.0f}x faster)")
+
+
+if __name__ == '__main__':
+    main()
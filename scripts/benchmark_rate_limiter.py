@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+"""
+Benchmark the per-check overhead of the rate limiter backends.
+
+Usage:
+    python scripts/benchmark_rate_limiter.py [--checks N] [--keys K] [--redis-url URL]
+
+Without --redis-url the Redis backend is measured against the in-process fake
+used by the test suite, which isolates the limiter's own overhead from
+network round trips.
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.dirname(os.path.dirname(__file__))))
+
+from app.utils.security import RateLimiter, InMemoryRateLimitBackend, RedisRateLimitBackend
+
+
+def run(limiter, checks, keys):
+    start = time.perf_counter()
+    for i in range(checks):
+        limiter.is_allowed(f"ip:10.0.{i % keys // 256}.{i % 256}", limit=100, window=3600)
+    elapsed = time.perf_counter() - start
+    return elapsed / checks * 1_000_000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--checks', type=int, default=200_000)
+    parser.add_argument('--keys', type=int, default=5_000)
+    parser.add_argument('--redis-url', default=None)
+    args = parser.parse_args()
+
+    backends = {'memory': InMemoryRateLimitBackend()}
+    if args.redis_url:
+        import redis
+        backends['redis'] = RedisRateLimitBackend(redis.from_url(args.redis_url), prefix='ratelimit-bench:')
+    else:
+        from tests.utils import FakeRedis
+        backends['redis (fake)'] = RedisRateLimitBackend(FakeRedis())
+
+    print(f"{args.checks} checks over {args.keys} keys")
+    for name, backend in backends.items():
+        per_check = run(RateLimiter(backend), args.checks, args.keys)
+        print(f"  {name:<14} {per_check:8.2f} us/check")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Benchmark cold start: import time, create_app and time to first request.
+
+Usage:
+    python scripts/benchmark_startup.py [--runs N] [--path PATH] [--database-url URL] [--budget SECONDS]
+
+Each run starts a fresh interpreter, so nothing is shared between runs,
+and measures both startup modes: lean (PREPARE_DATABASE_ON_STARTUP off,
+as in deployments that run 'flask prepare' as a release step) and
+preparing on startup. It also lists the heavy optional modules that were
+imported before the first request, which should be none. With --budget
+the script exits non-zero if the lean median exceeds it, so it can run in CI.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.abspath(os.path.dirname(os.path.dirname(__file__)))
+
+# Optional dependencies that must only load when a feature uses them
+HEAVY_MODULES = ['boto3', 'PIL', 'icalendar', 'twilio', 'bs4', 'playwright', 'requests']
+
+PROBE = """
+import json, sys, time
+started = time.perf_counter()
+from app import create_app
+imported = time.perf_counter()
+from config import Config
+app = create_app(Config)
+created = time.perf_counter()
+response = app.test_client().get(sys.argv[1])
+served = time.perf_counter()
+print(json.dumps({
+    'import': imported - started, 'create_app': created - imported, 'first_request': served - created,
+    'status': response.status_code, 'loaded': [m for m in json.loads(sys.argv[2]) if m in sys.modules],
+}))
+"""
+
+
+def probe(path, database_url, prepare):
+    env = dict(os.environ, PYTHONPATH=ROOT, DATABASE_URL=database_url,
+               PREPARE_DATABASE_ON_STARTUP='true' if prepare else 'false')
+    env.setdefault('SECRET_KEY', 'startup-benchmark')
+    result = subprocess.run([sys.executable, '-c', PROBE, path, json.dumps(HEAVY_MODULES)], cwd=ROOT, env=env,
+                            capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--path', default='/auth/login')
+    parser.add_argument('--database-url', default=None)
+    parser.add_argument('--budget', type=float, default=None,
+                        help='fail if the lean median time to first request exceeds this many seconds')
+    args = parser.parse_args()
+
+    database_file = None
+    if args.database_url is None:
+        database_file = tempfile.NamedTemporaryFile(suffix='.db', delete=False).name
+    url = args.database_url or f'sqlite:///{database_file}'
+
+    try:
+        # Prepare once first, as the release step would, so both modes start from a ready database
+        probe(args.path, url, prepare=True)
+
+        totals = {}
+        for mode, prepare in (('lean', False), ('prepare on startup', True)):
+            runs = [probe(args.path, url, prepare) for _ in range(args.runs)]
+            medians = {key: statistics.median(run[key] for run in runs)
+                       for key in ('import', 'create_app', 'first_request')}
+            totals[mode] = sum(medians.values())
+            print(f"{mode:20} import {medians['import'] * 1000:6.0f} ms  "
+                  f"create_app {medians['create_app'] * 1000:6.0f} ms  "
+                  f"first request {medians['first_request'] * 1000:5.0f} ms  "
+                  f"total {totals[mode] * 1000:6.0f} ms  (HTTP {runs[-1]['status']})")
+            if runs[-1]['loaded']:
+                print(f"{'':20} heavy modules loaded: {', '.join(runs[-1]['loaded'])}")
+    finally:
+        if database_file:
+            os.unlink(database_file)
+
+    if args.budget is not None and totals['lean'] > args.budget:
+        print(f"Lean startup {totals['lean']:.2f}s exceeds the {args.budget:.2f}s budget")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Load test the public booking availability endpoint.
+
+Usage:
+    python scripts/load_test_booking_availability.py [--checks N] [--threads T]
+        [--properties P] [--stays S] [--database-url URL]
+
+Seeds P properties with S stays each, spread over every booking source,
+then fires N availability checks for random dates from T threads through
+the Flask test client and reports throughput and latency percentiles.
+Without --database-url a throwaway SQLite file is used.
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+
+sys.path.insert(0, os.path.abspath(os.path.dirname(os.path.dirname(__file__))))
+
+from sqlalchemy import insert
+
+from app import create_app, db
+from app.models import (Booking, BookingRequest, BookingRequestStatus, CalendarEvent, GuestBooking, Property,
+                        PropertyCalendar, User, UserRoles)
+from config import TestConfig
+
+EPOCH = date(2020, 1, 1)
+
+
+def seed(properties, stays):
+    owner = User(email='loadtest-owner@example.com', first_name='Load', last_name='Test',
+                 role=UserRoles.PROPERTY_OWNER.value)
+    owner.set_password('password')
+    db.session.add(owner)
+    db.session.flush()
+
+    tokens = []
+    for n in range(properties):
+        prop = Property(name=f'Load test {n}', address=f'{n} Bench St', owner_id=owner.id,
+                        booking_calendar_enabled=True, booking_calendar_token=f'loadtest-{n}')
+        db.session.add(prop)
+        db.session.flush()
+        calendar = PropertyCalendar(property_id=prop.id, name='Feed', ical_url='https://example.com/feed.ics',
+                                    service='airbnb')
+        db.session.add(calendar)
+        db.session.flush()
+        tokens.append(prop.booking_calendar_token)
+
+        # Back-to-back stays of 1-6 nights, dealt round-robin to the four sources
+        rows = {Booking: [], CalendarEvent: [], GuestBooking: [], BookingRequest: []}
+        day = EPOCH
+        for i in range(stays):
+            start, day = day, day + timedelta(days=random.randint(1, 6))
+            if i % 4 == 0:
+                rows[Booking].append(dict(property_id=prop.id, calendar_id=calendar.id, title='Stay',
+                                          start_date=start, end_date=day, status='Confirmed'))
+            elif i % 4 == 1:
+                rows[CalendarEvent].append(dict(property_calendar_id=calendar.id, property_id=prop.id,
+                                                title='Reserved', start_date=start, end_date=day, source='airbnb'))
+            elif i % 4 == 2:
+                rows[GuestBooking].append(dict(guest_user_id=owner.id, property_id=prop.id, booking_source='direct',
+                                               check_in_date=start, check_out_date=day, guest_count=1,
+                                               currency='USD', status='confirmed', created_at=datetime.utcnow(),
+                                               updated_at=datetime.utcnow()))
+            else:
+                rows[BookingRequest].append(dict(property_id=prop.id, guest_name='Guest',
+                                                 guest_email='guest@example.com', check_in_date=start,
+                                                 check_out_date=day, number_of_guests=1,
+                                                 status=BookingRequestStatus.PENDING,
+                                                 request_token=f'loadtest-{n}-{i}', created_at=datetime.utcnow(),
+                                                 updated_at=datetime.utcnow()))
+        for model, values in rows.items():
+            if values:
+                db.session.execute(insert(model), values)
+    db.session.commit()
+    return tokens, day
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--checks', type=int, default=5_000)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--properties', type=int, default=50)
+    parser.add_argument('--stays', type=int, default=1_000)
+    parser.add_argument('--database-url', default=None)
+    args = parser.parse_args()
+
+    database_file = None
+    if args.database_url is None:
+        database_file = tempfile.NamedTemporaryFile(suffix='.db', delete=False).name
+    url = args.database_url or f'sqlite:///{database_file}'
+
+    class LoadTestConfig(TestConfig):
+        SQLALCHEMY_DATABASE_URI = url
+
+    app = create_app(LoadTestConfig)
+    try:
+        with app.app_context():
+            db.create_all()
+            tokens, last_day = seed(args.properties, args.stays)
+            print(f"Seeded {args.properties} properties x {args.stays} stays ({EPOCH} to {last_day})")
+
+        span = (last_day - EPOCH).days
+
+        def check(_):
+            check_in = EPOCH + timedelta(days=random.randrange(span))
+            check_out = check_in + timedelta(days=random.randint(1, 7))
+            started = time.perf_counter()
+            response = app.test_client().get(
+                f'/property/booking-calendar/{random.choice(tokens)}/availability',
+                query_string={'check_in': check_in.isoformat(), 'check_out': check_out.isoformat()}
+            )
+            assert response.status_code == 200, response.status_code
+            return time.perf_counter() - started
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.threads) as pool:
+            latencies = sorted(pool.map(check, range(args.checks)))
+        elapsed = time.perf_counter() - started
+
+        def percentile(p):
+            return latencies[min(int(len(latencies) * p), len(latencies) - 1)] * 1000
+
+        print(f"{args.checks} checks on {args.threads} threads in {elapsed:.2f}s: "
+              f"{args.checks / elapsed:,.0f} checks/s")
+        print(f"  p50 {percentile(0.50):.2f} ms  p95 {percentile(0.95):.2f} ms  p99 {percentile(0.99):.2f} ms")
+    finally:
+        if database_file:
+            os.unlink(database_file)
+
+
+if __name__ == '__main__':
+    main()
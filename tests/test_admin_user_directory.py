@@ -0,0 +1,92 @@
+"""
+Tests for the keyset-paginated admin user directory.
+"""
+from datetime import datetime, timedelta
+from sqlalchemy import event
+from app.models import User, UserNote, UserRoles
+from app.admin.service import (get_user_directory, get_user_counts, decode_user_cursor,
+                               search_users_typeahead)
+from tests.utils import login
+
+
+def make_guests(_db, count=25):
+    # Several accounts share a timestamp so the id tie-breaker is exercised
+    start = datetime(2024, 1, 1)
+    guests = [User(first_name=f'Guest{i:02d}', last_name='Traveller', email=f'guest{i:02d}@example.com',
+                   role=UserRoles.PROPERTY_GUEST.value, created_at=start + timedelta(hours=i // 3))
+              for i in range(count)]
+    guests[0].is_active = False
+    guests[1].is_suspended = True
+    guests[2].failed_login_attempts = 5
+    _db.session.add_all(guests)
+    _db.session.commit()
+    return guests
+
+
+def test_keyset_pages_cover_every_user_once(_db, users):
+    make_guests(_db)
+
+    seen, before = [], None
+    while True:
+        page, _, cursor = get_user_directory(before=before, limit=7)
+        seen.extend(page)
+        if cursor is None:
+            break
+        before = decode_user_cursor(cursor)
+
+    assert len(seen) == User.query.count() == 29
+    assert len({user.id for user in seen}) == 29
+    assert [(u.created_at, u.id) for u in seen] == sorted(((u.created_at, u.id) for u in seen), reverse=True)
+
+
+def test_filters_search_and_note_counts(_db, users):
+    guests = make_guests(_db)
+    admin = users['admin']
+    _db.session.add_all([UserNote(user_id=guests[3].id, admin_id=admin.id, content='VIP'),
+                         UserNote(user_id=guests[3].id, admin_id=admin.id, content='Late checkout')])
+    _db.session.commit()
+
+    page, note_counts, _ = get_user_directory(role=UserRoles.PROPERTY_GUEST.value, search='guest0')
+    assert {user.email for user in page} == {f'guest0{i}@example.com' for i in range(10)}
+    assert note_counts == {guests[3].id: 2}
+
+    assert [u.id for u in get_user_directory(status='disabled')[0]] == [guests[0].id]
+    assert [u.id for u in get_user_directory(status='suspended')[0]] == [guests[1].id]
+    assert [u.id for u in get_user_directory(status='locked')[0]] == [guests[2].id]
+    assert [u.email for u in get_user_directory(search='test own')[0]] == ['owner@example.com']
+    # LIKE wildcards in the search term are matched literally
+    assert get_user_directory(search='%')[0] == []
+
+
+def test_counts_come_from_one_query(_db, users):
+    make_guests(_db)
+
+    statements = []
+    record = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(_db.engine, 'before_cursor_execute', record)
+    counts = get_user_counts()
+    event.remove(_db.engine, 'before_cursor_execute', record)
+
+    assert len(statements) == 1
+    assert counts['total'] == 29
+    assert counts['roles'][UserRoles.PROPERTY_GUEST.value] == 25
+    assert counts['roles'][UserRoles.ADMIN.value] == 1
+    assert counts['statuses'] == {'active': 26, 'disabled': 1, 'suspended': 1, 'locked': 1}
+
+
+def test_directory_pages_and_typeahead_api(client, _db, users):
+    make_guests(_db, count=60)
+    login(client, 'admin@example.com', 'password')
+
+    response = client.get('/admin/users?role=property_guest')
+    assert response.status_code == 200
+    assert b'guest59@example.com' in response.data
+    assert b'guest09@example.com' not in response.data
+    assert b'Next page' in response.data
+
+    assert search_users_typeahead('g') == []
+    response = client.get('/admin/users/search?q=guest5')
+    assert response.status_code == 200
+    results = response.get_json()['users']
+    assert [r['email'] for r in results] == [f'guest5{i}@example.com' for i in range(10)]
+    assert results[0]['name'] == 'Guest50 Traveller'
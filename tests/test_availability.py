@@ -0,0 +1,87 @@
+"""
+Tests for the booked-day bitmaps behind the availability calendar.
+"""
+import re
+from datetime import date
+from sqlalchemy import event
+from app.models import Property, PropertyCalendar, CalendarEvent, PropertyAvailability
+from tests.utils import login
+
+
+def add_stay(_db, calendar, start, end, booking_status=None):
+    _db.session.add(CalendarEvent(property_calendar_id=calendar.id, property_id=calendar.property_id,
+                                  title='Reserved', start_date=start, end_date=end, source='airbnb',
+                                  booking_status=booking_status))
+
+
+def make_calendar(_db, prop, name='Airbnb'):
+    calendar = PropertyCalendar(property_id=prop.id, name=name, ical_url='https://example.com/feed.ics',
+                                service='airbnb')
+    _db.session.add(calendar)
+    _db.session.flush()
+    return calendar
+
+
+def test_rebuild_merges_calendars_and_slices_any_range(_db, property_fixture):
+    airbnb = make_calendar(_db, property_fixture)
+    vrbo = make_calendar(_db, property_fixture, 'VRBO')
+    add_stay(_db, airbnb, date(2025, 3, 1), date(2025, 3, 4))
+    add_stay(_db, vrbo, date(2025, 3, 4), date(2025, 3, 6))
+    add_stay(_db, vrbo, date(2025, 3, 10), date(2025, 3, 10))
+    PropertyAvailability.rebuild([property_fixture.id])
+    _db.session.commit()
+
+    availability = property_fixture.availability
+    assert (availability.start_date, availability.day_count) == (date(2025, 3, 1), 10)
+
+    matrix = PropertyAvailability.matrix([property_fixture.id], date(2025, 2, 27), 14)
+    # Checkout days stay free; a zero-length event books its first night
+    assert matrix == {property_fixture.id: '00111110000100'}
+    assert PropertyAvailability.matrix([property_fixture.id], date(2025, 4, 1), 5) == {property_fixture.id: '00000'}
+
+    # A resync that drops the stays clears the bitmap
+    CalendarEvent.query.delete()
+    PropertyAvailability.rebuild([property_fixture.id])
+    _db.session.commit()
+    assert PropertyAvailability.matrix([property_fixture.id], date(2025, 3, 1), 3) == {property_fixture.id: '000'}
+
+
+def test_cancelled_bookings_leave_their_days_free(_db, property_fixture):
+    airbnb = make_calendar(_db, property_fixture)
+    add_stay(_db, airbnb, date(2025, 3, 1), date(2025, 3, 3), 'confirmed')
+    add_stay(_db, airbnb, date(2025, 3, 3), date(2025, 3, 6), 'Cancelled')
+    PropertyAvailability.rebuild([property_fixture.id])
+    _db.session.commit()
+
+    assert PropertyAvailability.matrix([property_fixture.id], date(2025, 3, 1), 6) == {property_fixture.id: '110000'}
+
+
+def test_availability_view_renders_from_one_query(client, _db, users, property_fixture, monkeypatch):
+    owner = users['owner']
+    other = Property(name='Loft', address='9 High St', owner_id=owner.id)
+    never_synced = Property(name='Cabin', address='1 Lake Rd', owner_id=owner.id)
+    _db.session.add_all([other, never_synced])
+    _db.session.flush()
+    add_stay(_db, make_calendar(_db, property_fixture), date(2025, 6, 2), date(2025, 6, 5))
+    add_stay(_db, make_calendar(_db, other), date(2025, 5, 20), date(2025, 6, 2))
+    PropertyAvailability.rebuild([property_fixture.id, other.id])
+    _db.session.commit()
+
+    def no_fetching(*args, **kwargs):
+        raise AssertionError('the availability view must not fetch calendar feeds')
+    monkeypatch.setattr('requests.get', no_fetching)
+
+    login(client, owner.email, 'password')
+    statements = []
+    record = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(_db.engine, 'before_cursor_execute', record)
+    response = client.get('/calendar/availability?start=2025-05-30&days=7')
+    event.remove(_db.engine, 'before_cursor_execute', record)
+
+    assert response.status_code == 200
+    html = response.data.decode('utf-8')
+    rows = re.findall(r'<tr>\s*<td class="listing-name">(.*?)</tr>', html, re.S)
+    assert [re.findall(r'class="(booked|available)"', row).count('booked') for row in rows] == [0, 3, 3]
+    assert 'Not synced yet' in rows[0]
+    assert 'colspan="2" class="month-header">May 2025' in html
+    assert len([s for s in statements if 'property_availability' in s]) == 1
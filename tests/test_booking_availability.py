@@ -0,0 +1,105 @@
+"""
+Tests for booking conflict detection across all booking sources.
+"""
+from datetime import date, datetime, timedelta
+from unittest.mock import patch
+from sqlalchemy import event
+from app.models import (Booking, BookingRequest, BookingRequestStatus, CalendarEvent, GuestBooking,
+                        PropertyCalendar)
+from app.property.booking_availability import find_conflict, is_available
+
+
+def seed_stays(_db, users, prop):
+    calendar = PropertyCalendar(property_id=prop.id, name='Airbnb', ical_url='https://example.com/a.ics',
+                                service='airbnb')
+    _db.session.add(calendar)
+    _db.session.flush()
+    _db.session.add_all([
+        Booking(property_id=prop.id, calendar_id=calendar.id, title='Direct', start_date=date(2025, 7, 1),
+                end_date=date(2025, 7, 4)),
+        Booking(property_id=prop.id, calendar_id=calendar.id, title='Called off', status='Cancelled',
+                start_date=date(2025, 7, 10), end_date=date(2025, 7, 12)),
+        CalendarEvent(property_calendar_id=calendar.id, property_id=prop.id, title='Reserved',
+                      start_date=date(2025, 7, 20), end_date=date(2025, 7, 22), source='airbnb'),
+        GuestBooking(guest_user_id=users['owner'].id, property_id=prop.id, booking_source='direct',
+                     check_in_date=date(2025, 8, 1), check_out_date=date(2025, 8, 5)),
+        BookingRequest(property_id=prop.id, guest_name='Pending', guest_email='p@example.com',
+                       check_in_date=date(2025, 8, 10), check_out_date=date(2025, 8, 12),
+                       expires_at=datetime.utcnow() + timedelta(days=7)),
+        BookingRequest(property_id=prop.id, guest_name='Lapsed', guest_email='l@example.com',
+                       check_in_date=date(2025, 8, 20), check_out_date=date(2025, 8, 22),
+                       expires_at=datetime.utcnow() - timedelta(days=1)),
+        BookingRequest(property_id=prop.id, guest_name='Declined', guest_email='d@example.com',
+                       status=BookingRequestStatus.REJECTED,
+                       check_in_date=date(2025, 8, 25), check_out_date=date(2025, 8, 27)),
+    ])
+    _db.session.commit()
+
+
+def test_every_source_blocks_overlapping_stays(_db, users, property_fixture):
+    seed_stays(_db, users, property_fixture)
+    pid = property_fixture.id
+
+    assert find_conflict(pid, date(2025, 7, 3), date(2025, 7, 5)).source == 'booking'
+    assert find_conflict(pid, date(2025, 7, 15), date(2025, 7, 25)).source == 'calendar'
+    assert find_conflict(pid, date(2025, 7, 30), date(2025, 8, 2)).source == 'guest_booking'
+    assert find_conflict(pid, date(2025, 8, 11), date(2025, 8, 12)) == ('request', date(2025, 8, 10),
+                                                                        date(2025, 8, 12))
+    # Back-to-back stays, cancelled bookings and lapsed or declined requests leave the dates free
+    assert is_available(pid, date(2025, 7, 4), date(2025, 7, 10))
+    assert is_available(pid, date(2025, 7, 10), date(2025, 7, 12))
+    assert is_available(pid, date(2025, 8, 20), date(2025, 8, 28))
+
+
+def test_check_is_a_single_statement(_db, users, property_fixture):
+    pid = property_fixture.id
+    seed_stays(_db, users, property_fixture)
+    statements = []
+    record = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(_db.engine, 'before_cursor_execute', record)
+    find_conflict(pid, date(2025, 6, 1), date(2025, 9, 1))
+    event.remove(_db.engine, 'before_cursor_execute', record)
+
+    assert len(statements) == 1
+    assert statements[0].count('UNION ALL') == 3
+
+
+def test_public_availability_endpoint(client, _db, users, property_fixture):
+    property_fixture.booking_calendar_enabled = True
+    property_fixture.booking_calendar_token = 'public-token'
+    seed_stays(_db, users, property_fixture)
+    url = '/property/booking-calendar/public-token/availability'
+
+    taken = client.get(f'{url}?check_in=2025-07-02&check_out=2025-07-06').get_json()
+    assert taken == {'available': False, 'check_in': '2025-07-02', 'check_out': '2025-07-06',
+                     'conflict': {'start': '2025-07-01', 'end': '2025-07-04'}}
+    assert client.get(f'{url}?check_in=2025-07-04&check_out=2025-07-06').get_json()['available'] is True
+
+    invalid = client.get(f'{url}?check_in=2025-07-06&check_out=2025-07-06')
+    assert invalid.status_code == 400
+    assert invalid.get_json()['field'] == 'check_out_date'
+    assert client.get('/property/booking-calendar/wrong-token/availability').status_code == 404
+
+
+def test_booking_request_for_taken_dates_is_refused(client, _db, users, property_fixture):
+    seed_stays(_db, users, property_fixture)
+    form = {'guest_name': 'Sam', 'guest_email': 'sam@example.com', 'number_of_guests': '2'}
+    headers = {'X-Requested-With': 'XMLHttpRequest'}
+    url = f'/property/{property_fixture.id}/request-booking'
+
+    with patch('app.auth.email.send_email'):
+        refused = client.post(url, data={**form, 'check_in_date': '2025-07-02', 'check_out_date': '2025-07-05'},
+                              headers=headers)
+        assert refused.status_code == 409
+        assert refused.get_json()['success'] is False
+
+        accepted = client.post(url, data={**form, 'check_in_date': '2025-07-04', 'check_out_date': '2025-07-08'},
+                               headers=headers)
+        assert accepted.get_json()['success'] is True
+
+        # The new pending request now holds its dates
+        again = client.post(url, data={**form, 'check_in_date': '2025-07-06', 'check_out_date': '2025-07-09'},
+                            headers=headers)
+        assert again.status_code == 409
+
+    assert BookingRequest.query.filter_by(guest_email='sam@example.com').count() == 1
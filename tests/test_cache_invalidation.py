@@ -0,0 +1,74 @@
+"""
+Tests for commit-driven invalidation of CacheService entries.
+"""
+from datetime import date
+from app.models import Booking, PropertyCalendar, Task, TaskAssignment, TaskStatus, Property
+from app.utils.cache_service import CacheService, SYSTEM_TAG, user_tag, property_tag
+
+
+def test_completing_a_task_refreshes_summaries_after_commit(_db, users, property_fixture):
+    owner, staff = users['owner'], users['staff']
+    task = Task(title='Clean', creator_id=owner.id, property_id=property_fixture.id, status=TaskStatus.PENDING)
+    _db.session.add(task)
+    _db.session.flush()
+    _db.session.add(TaskAssignment(task_id=task.id, user_id=staff.id))
+    _db.session.commit()
+
+    assert CacheService.get_user_task_summary(owner.id)['pending'] == 1
+    assert CacheService.get_property_statistics(property_fixture.id)['total_tasks'] == 1
+    assert CacheService.get_user_dashboard_data(staff.id)['assigned_tasks'][0]['status'] == 'pending'
+
+    task.status = TaskStatus.COMPLETED
+    _db.session.flush()
+    # Flushed but not committed: the cached entries stay until the commit
+    assert CacheService.get_user_task_summary(owner.id)['pending'] == 1
+    _db.session.commit()
+
+    summary = CacheService.get_user_task_summary(owner.id)
+    assert summary['pending'] == 0
+    assert CacheService.get_property_statistics(property_fixture.id)['completed_tasks'] == 1
+    # The assignee's dashboard depends on the task as well
+    assert CacheService.get_user_dashboard_data(staff.id)['assigned_tasks'][0]['status'] == 'completed'
+
+
+def test_rolled_back_writes_invalidate_nothing(_db, users, property_fixture, monkeypatch):
+    calls = []
+    monkeypatch.setattr(CacheService, 'invalidate_tags', staticmethod(lambda tags: calls.append(set(tags))))
+
+    _db.session.add(Task(title='Draft', creator_id=users['owner'].id, property_id=property_fixture.id))
+    _db.session.flush()
+    _db.session.rollback()
+    _db.session.commit()
+
+    assert calls == []
+
+
+def test_invalidations_are_batched_per_commit(_db, users, property_fixture, monkeypatch):
+    owner = users['owner']
+    calls = []
+    monkeypatch.setattr(CacheService, 'invalidate_tags', staticmethod(lambda tags: calls.append(set(tags))))
+
+    moved = Property(name='Annex', address='2 Side St', owner_id=owner.id)
+    _db.session.add(moved)
+    _db.session.flush()
+    _db.session.add_all([Task(title=f'Task {n}', creator_id=owner.id, property_id=moved.id) for n in range(5)])
+    _db.session.flush()
+    moved.owner_id = users['manager'].id
+    _db.session.commit()
+
+    assert calls == [{user_tag(owner.id), user_tag(users['manager'].id), property_tag(moved.id), SYSTEM_TAG}]
+
+
+def test_bookings_invalidate_their_property(_db, property_fixture, monkeypatch):
+    calendar = PropertyCalendar(property_id=property_fixture.id, name='Direct', ical_url='https://example.com/feed.ics',
+                                service='other')
+    _db.session.add(calendar)
+    _db.session.commit()
+    calls = []
+    monkeypatch.setattr(CacheService, 'invalidate_tags', staticmethod(lambda tags: calls.append(set(tags))))
+
+    _db.session.add(Booking(property_id=property_fixture.id, calendar_id=calendar.id, title='Smith',
+                            start_date=date(2025, 3, 1), end_date=date(2025, 3, 4)))
+    _db.session.commit()
+
+    assert calls == [{property_tag(property_fixture.id)}]
@@ -0,0 +1,122 @@
+"""
+Tests for inbound iCal ingestion and its recurring event expansion.
+"""
+from datetime import date
+from sqlalchemy import event
+from app.models import PropertyCalendar, CalendarEvent, PropertyAvailability
+from app.property.ical_import import ingest_feed
+from tests.utils import login
+
+TODAY = date(2025, 3, 1)
+
+# A weekly two-night block with one week cancelled (EXDATE), one extra
+# date (RDATE) and one week moved a day later, plus a single booking
+FEED = """BEGIN:VCALENDAR
+VERSION:2.0
+PRODID:-//Test//EN
+BEGIN:VEVENT
+UID:weekly@example.com
+SUMMARY:Owner block
+DTSTART;VALUE=DATE:20250303
+DTEND;VALUE=DATE:20250305
+RRULE:FREQ=WEEKLY;COUNT=4
+EXDATE;VALUE=DATE:20250310
+RDATE;VALUE=DATE:20250401
+END:VEVENT
+BEGIN:VEVENT
+UID:weekly@example.com
+RECURRENCE-ID;VALUE=DATE:20250317
+SUMMARY:Owner block (moved)
+DTSTART;VALUE=DATE:20250318
+DTEND;VALUE=DATE:20250320
+END:VEVENT
+BEGIN:VEVENT
+UID:stay@example.com
+SUMMARY:Reserved
+DTSTART;VALUE=DATE:20250306
+DTEND;VALUE=DATE:20250308
+END:VEVENT
+END:VCALENDAR
+"""
+
+
+def make_calendar(_db, prop):
+    calendar = PropertyCalendar(property_id=prop.id, name='Airbnb', ical_url='https://example.com/feed.ics',
+                                service='airbnb')
+    _db.session.add(calendar)
+    _db.session.flush()
+    return calendar
+
+
+def stored_stays(calendar):
+    events = CalendarEvent.query.filter_by(property_calendar_id=calendar.id).order_by(CalendarEvent.start_date).all()
+    return [(event.title, event.start_date, event.end_date) for event in events]
+
+
+def test_ingest_expands_recurring_events(_db, property_fixture):
+    calendar = make_calendar(_db, property_fixture)
+    assert ingest_feed(calendar, FEED, today=TODAY) == 5
+    _db.session.commit()
+
+    assert stored_stays(calendar) == [
+        ('Owner block', date(2025, 3, 3), date(2025, 3, 5)),
+        ('Reserved', date(2025, 3, 6), date(2025, 3, 8)),
+        ('Owner block (moved)', date(2025, 3, 18), date(2025, 3, 20)),
+        ('Owner block', date(2025, 3, 24), date(2025, 3, 26)),
+        ('Owner block', date(2025, 4, 1), date(2025, 4, 3)),
+    ]
+    assert calendar.feed_version and calendar.expanded_until > TODAY
+    # The booked-day bitmap is rebuilt from the expanded occurrences
+    matrix = PropertyAvailability.matrix([property_fixture.id], date(2025, 3, 3), 7)
+    assert matrix == {property_fixture.id: '1101100'}
+
+
+def test_unchanged_feed_is_not_expanded_again(_db, property_fixture):
+    calendar = make_calendar(_db, property_fixture)
+    ingest_feed(calendar, FEED, today=TODAY)
+    _db.session.commit()
+
+    statements = []
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(_db.engine, 'before_cursor_execute', listener)
+    try:
+        assert ingest_feed(calendar, FEED, today=TODAY) is None
+        _db.session.commit()
+    finally:
+        event.remove(_db.engine, 'before_cursor_execute', listener)
+    assert not [s for s in statements if s.lstrip().upper().startswith(('INSERT', 'DELETE', 'UPDATE'))]
+
+    # A changed body replaces the stored events
+    assert ingest_feed(calendar, FEED.replace('DTSTART;VALUE=DATE:20250306', 'DTSTART;VALUE=DATE:20250307'),
+                       today=TODAY) == 5
+    _db.session.commit()
+    assert ('Reserved', date(2025, 3, 7), date(2025, 3, 8)) in stored_stays(calendar)
+
+
+def test_calendar_view_reads_stored_events(client, _db, users, property_fixture, monkeypatch):
+    calendar = make_calendar(_db, property_fixture)
+    ingest_feed(calendar, FEED, today=TODAY)
+    _db.session.commit()
+
+    def no_fetching(*args, **kwargs):
+        raise AssertionError('a synced calendar must not be fetched on view')
+    monkeypatch.setattr('requests.get', no_fetching)
+
+    login(client, users['owner'].email, 'password')
+    response = client.get(f'/property/{property_fixture.id}/calendar')
+    assert response.status_code == 200
+    assert b'Owner block (moved)' in response.data
+    assert b'2025-04-01' in response.data
+
+
+def test_restamped_feed_with_same_events_is_unchanged(_db, property_fixture):
+    calendar = make_calendar(_db, property_fixture)
+    ingest_feed(calendar, FEED, today=TODAY)
+    _db.session.commit()
+
+    restamped = FEED.replace('PRODID:-//Test//EN', 'PRODID:-//Test//EN\nX-WR-CALNAME:Bookings')
+    assert ingest_feed(calendar, restamped, today=TODAY) is None
+    _db.session.commit()
+    assert len(stored_stays(calendar)) == 5
+    # The new version is remembered, so the next sync skips parsing
+    assert ingest_feed(calendar, restamped, today=TODAY) is None
@@ -0,0 +1,63 @@
+"""
+Tests for the scheduled calendar sync and the notifications it sends.
+"""
+import importlib
+import pytest
+from app.models import PropertyCalendar, Task, TaskAssignment, TaskProperty, TaskStatus
+from tests.test_calendar_ingest import FEED
+
+
+class FakeResponse:
+    status_code = 200
+
+    def __init__(self, text):
+        self.text = text
+
+
+@pytest.fixture
+def sync(monkeypatch, tmp_path):
+    """The sync module with feeds served from ``feeds`` and notifications recorded in ``notified``"""
+    # The module opens its log file in the working directory on import
+    monkeypatch.chdir(tmp_path)
+    module = importlib.import_module('app.tasks.sync_calendars')
+    module.feeds = {}
+    module.notified = []
+    monkeypatch.setattr(module.requests, 'get', lambda url, **kwargs: FakeResponse(module.feeds[url]))
+    monkeypatch.setattr(module, 'notify_calendar_changes', lambda task_ids: module.notified.append(sorted(task_ids)))
+    return module
+
+
+def add_task(_db, creator, worker, property, status):
+    task = Task(title='Clean', status=status, creator_id=creator.id)
+    _db.session.add(task)
+    _db.session.flush()
+    _db.session.add(TaskProperty(task_id=task.id, property_id=property.id))
+    _db.session.add(TaskAssignment(task_id=task.id, user_id=worker.id))
+    _db.session.commit()
+    return task
+
+
+def test_sync_notifies_open_tasks_only(sync, _db, users, property_fixture):
+    calendar = PropertyCalendar(property_id=property_fixture.id, name='Airbnb', service='airbnb',
+                                ical_url='https://example.com/feed.ics')
+    _db.session.add(calendar)
+    _db.session.commit()
+    sync.feeds[calendar.ical_url] = FEED
+    pending = add_task(_db, users['owner'], users['staff'], property_fixture, TaskStatus.PENDING)
+    add_task(_db, users['owner'], users['staff'], property_fixture, TaskStatus.COMPLETED)
+
+    assert sync.sync_all_calendars() == (1, 0)
+    assert sync.notified == [[pending.id]]
+
+
+def test_sync_skips_notifications_for_unchanged_calendars(sync, _db, users, property_fixture):
+    calendar = PropertyCalendar(property_id=property_fixture.id, name='Airbnb', service='airbnb',
+                                ical_url='https://example.com/feed.ics')
+    _db.session.add(calendar)
+    _db.session.commit()
+    sync.feeds[calendar.ical_url] = FEED
+    task = add_task(_db, users['owner'], users['staff'], property_fixture, TaskStatus.PENDING)
+
+    sync.sync_all_calendars()
+    sync.sync_all_calendars()
+    assert sync.notified == [[task.id]]
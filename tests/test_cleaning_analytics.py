@@ -0,0 +1,170 @@
+"""
+Tests for the cleaning duration rollups and the analytics built on them.
+"""
+from datetime import date, datetime, timedelta
+from sqlalchemy import event
+from app.models import CleaningSession, CleaningDurationRollup, Property, PropertyAssignment, User, UserRoles
+from app.tasks.cleaning_analytics import duration_percentile, duration_stats, duration_trend
+from tests.utils import login
+
+
+def add_session(_db, prop, cleaner, start, minutes):
+    session = CleaningSession(property_id=prop.id, cleaner_id=cleaner.id, start_time=start)
+    _db.session.add(session)
+    _db.session.commit()
+    session.end_time = start + timedelta(minutes=minutes)
+    session.duration_minutes = minutes
+    _db.session.commit()
+    return session
+
+
+def rollups():
+    return sorted((r.property_id, r.cleaner_id, r.month, r.bucket, r.session_count, r.total_minutes)
+                  for r in CleaningDurationRollup.query if r.session_count)
+
+
+def test_rollups_follow_completion_edits_and_deletes(_db, users, property_fixture):
+    staff = users['staff']
+    session = CleaningSession(property_id=property_fixture.id, cleaner_id=staff.id,
+                              start_time=datetime.utcnow() - timedelta(minutes=93))
+    _db.session.add(session)
+    _db.session.commit()
+    assert rollups() == []
+
+    session.complete()
+    _db.session.commit()
+    month = date(session.start_time.year, session.start_time.month, 1)
+    assert rollups() == [(property_fixture.id, staff.id, month, 18, 1, 93)]
+
+    session.duration_minutes = 41
+    session.start_time = datetime(2024, 7, 3, 10)
+    _db.session.commit()
+    assert rollups() == [(property_fixture.id, staff.id, date(2024, 7, 1), 8, 1, 41)]
+
+    _db.session.delete(session)
+    _db.session.commit()
+    assert rollups() == []
+
+    # A rebuild from the sessions gives the same counts as the maintained rollups
+    add_session(_db, property_fixture, staff, datetime(2024, 7, 3, 10), 600)
+    add_session(_db, property_fixture, staff, datetime(2024, 8, 3, 10), 62)
+    maintained = rollups()
+    CleaningDurationRollup.rebuild()
+    _db.session.commit()
+    assert rollups() == maintained == [
+        (property_fixture.id, staff.id, date(2024, 7, 1), 96, 1, 600),
+        (property_fixture.id, staff.id, date(2024, 8, 1), 12, 1, 62),
+    ]
+
+
+def test_negative_durations_and_missing_rows_stay_consistent(_db, users, property_fixture):
+    staff = users['staff']
+    # Clock skew on the device gave an end before the start
+    skewed = add_session(_db, property_fixture, staff, datetime(2024, 7, 3, 10), -7)
+    add_session(_db, property_fixture, staff, datetime(2024, 7, 4, 10), 3)
+    maintained = rollups()
+    CleaningDurationRollup.rebuild()
+    _db.session.commit()
+    assert rollups() == maintained == [(property_fixture.id, staff.id, date(2024, 7, 1), 0, 2, 3)]
+
+    # Deleting a session whose bucket has no row does not create one with a negative count
+    CleaningDurationRollup.query.delete()
+    _db.session.delete(skewed)
+    _db.session.commit()
+    assert CleaningDurationRollup.query.count() == 0
+
+
+def test_duration_percentile_interpolates_within_buckets():
+    assert duration_percentile({}, 0.5) is None
+    # Ten sessions in the 60-65 minute bucket, ten in the 120-125 minute bucket
+    histogram = {12: 10, 24: 10}
+    assert duration_percentile(histogram, 0.5) == 65
+    assert duration_percentile(histogram, 0.9) == 124
+    assert duration_percentile({96: 3}, 0.9) == 480
+
+
+def test_stats_group_by_property_cleaner_and_season(_db, users, property_fixture):
+    staff, owner = users['staff'], users['owner']
+    loft = Property(name='Loft', address='9 High St', owner_id=owner.id)
+    _db.session.add(loft)
+    _db.session.commit()
+    for minutes in (60, 70, 80, 90, 100):
+        add_session(_db, property_fixture, staff, datetime(2024, 1, 10, 10), minutes)
+    add_session(_db, loft, owner, datetime(2024, 7, 10, 10), 45)
+    add_session(_db, loft, staff, datetime(2025, 7, 10, 10), 55)
+
+    property_ids = [property_fixture.id, loft.id]
+    by_property = duration_stats(property_ids, 'property')
+    assert [(row['label'], row['sessions'], row['average_minutes']) for row in by_property] == [
+        ('Test Property', 5, 80), ('Loft', 2, 50)]
+    assert 80 <= by_property[0]['p50_minutes'] <= 85
+
+    by_cleaner = {row['label']: row['sessions'] for row in duration_stats(property_ids, 'cleaner')}
+    assert by_cleaner == {'Test Staff': 6, 'Test Owner': 1}
+
+    seasons = duration_stats(property_ids, 'month_of_year')
+    assert [(row['label'], row['sessions']) for row in seasons] == [('January', 5), ('July', 2)]
+
+    recent = duration_stats(property_ids, 'property', start_month=date(2025, 1, 1), cleaner_id=staff.id)
+    assert [(row['label'], row['sessions']) for row in recent] == [('Loft', 1)]
+
+    trend = duration_trend(property_ids, months=3, today=date(2025, 8, 15))
+    assert [(row['month'], row['sessions'], row['average_minutes']) for row in trend] == [
+        ('2025-06-01', 0, None), ('2025-07-01', 1, 55), ('2025-08-01', 0, None)]
+
+
+def test_dashboard_and_api_read_only_rollups(client, _db, users, property_fixture):
+    staff = users['staff']
+    today = datetime.utcnow()
+    for minutes in (50, 90):
+        add_session(_db, property_fixture, staff, today - timedelta(hours=3), minutes)
+
+    statements = []
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)
+    login(client, users['owner'].email, 'password')
+    event.listen(_db.engine, 'before_cursor_execute', listener)
+    try:
+        response = client.get('/analytics/api/cleaning-durations?months=3')
+    finally:
+        event.remove(_db.engine, 'before_cursor_execute', listener)
+    assert response.status_code == 200
+    data = response.get_json()
+    assert [(row['label'], row['sessions'], row['average_minutes']) for row in data['by_property']] == [
+        ('Test Property', 2, 70)]
+    assert data['trend'][-1]['sessions'] == 2
+    assert not [s for s in statements if 'FROM cleaning_session' in s]
+
+    response = client.get('/analytics/cleaning')
+    assert response.status_code == 200
+    assert b'Test Property' in response.data
+
+    client.get('/auth/logout')
+    login(client, staff.email, 'password')
+    assert client.get('/analytics/api/cleaning-durations').status_code == 403
+
+
+def test_managers_see_only_the_properties_they_manage(client, _db, users, property_fixture):
+    manager, owner = users['manager'], users['owner']
+    other_manager = User(first_name='Other', last_name='Manager', email='other.manager@example.com',
+                         role=UserRoles.PROPERTY_MANAGER.value)
+    other_manager.set_password('password')
+    loft = Property(name='Loft', address='9 High St', owner_id=owner.id)
+    _db.session.add_all([other_manager, loft])
+    _db.session.flush()
+    _db.session.add_all([
+        PropertyAssignment(user_id=manager.id, property_id=property_fixture.id, assigned_by=users['admin'].id,
+                           role=UserRoles.PROPERTY_MANAGER.value),
+        PropertyAssignment(user_id=other_manager.id, property_id=loft.id, assigned_by=users['admin'].id,
+                           role=UserRoles.PROPERTY_MANAGER.value),
+    ])
+    _db.session.commit()
+    start = datetime.utcnow() - timedelta(hours=3)
+    add_session(_db, property_fixture, users['staff'], start, 60)
+    add_session(_db, loft, users['staff'], start, 90)
+
+    login(client, manager.email, 'password')
+    data = client.get('/analytics/api/cleaning-durations').get_json()
+    assert [row['label'] for row in data['by_property']] == ['Test Property']
+    assert [row['sessions'] for row in data['by_cleaner']] == [1]
+    data = client.get(f'/analytics/api/cleaning-durations?property_id={loft.id}').get_json()
+    assert data['by_property'] == [] and data['trend'][-1]['sessions'] == 0
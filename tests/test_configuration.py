@@ -6,7 +6,8 @@ import unittest
 import os
 from app import create_app, db
 from app.models import User, SiteSetting, ConfigurationAudit
-from app.utils.configuration import config_service, ConfigurationCategory, ConfigurationType
+from app.utils.configuration import config_service, ConfigurationCategory, ConfigurationType, CONFIG_VERSION_KEY
+from sqlalchemy import event, text
 from config import TestConfig
 
 
@@ -186,6 +187,37 @@ class ConfigurationTestCase(unittest.TestCase):
         value3 = config_service.get('APP_NAME')
         self.assertEqual(value3, 'Updated Name')
     
+    def test_configuration_snapshot_is_shared_across_workers(self):
+        """Test that a change made by another worker is picked up via the version stamp"""
+        config_service.set('APP_NAME', 'Local Name', self.admin_user.id)
+        config_service.set('MAX_PROPERTIES_PER_USER', 20, self.admin_user.id)
+        self.assertEqual(config_service.get('APP_NAME'), 'Local Name')
+        
+        # Another worker commits a change; its flush also replaces the version stamp
+        db.session.execute(text("UPDATE site_settings SET value = 'Remote Name' WHERE key = 'APP_NAME'"))
+        db.session.execute(text("UPDATE site_settings SET value = 'remote' WHERE key = :key"),
+                           {'key': CONFIG_VERSION_KEY})
+        db.session.commit()
+        
+        # Between checks values come from the snapshot without touching the database
+        self.app.config['CONFIG_VERSION_CHECK_INTERVAL'] = 60
+        statements = []
+        record = lambda conn, cursor, statement, *args: statements.append(statement)
+        event.listen(db.engine, 'before_cursor_execute', record)
+        self.assertEqual(config_service.get('APP_NAME'), 'Local Name')
+        self.assertEqual(config_service.get('MAX_PROPERTIES_PER_USER'), 20)
+        self.assertEqual(statements, [])
+        
+        # Once the interval passes, the moved stamp reloads every setting in one query
+        self.app.config['CONFIG_VERSION_CHECK_INTERVAL'] = 0
+        self.assertEqual(config_service.get('APP_NAME'), 'Remote Name')
+        self.assertEqual(config_service.get('MAX_PROPERTIES_PER_USER'), 20)
+        event.remove(db.engine, 'before_cursor_execute', record)
+        self.assertEqual(len(statements), 3)  # A stamp check per lookup, plus one reload
+        
+        # The stamp itself is never exposed as a setting
+        self.assertNotIn(CONFIG_VERSION_KEY, config_service.snapshot().settings)
+    
     def test_boolean_feature_flags(self):
         """Test boolean feature flags work correctly"""
         # Test enabling a feature
@@ -0,0 +1,77 @@
+"""
+Tests for batch guest invitation creation and expiry cleanup.
+"""
+from datetime import datetime, timedelta
+from flask import render_template
+from sqlalchemy import event
+from app.models import GuestInvitation
+
+
+def count_statements(_db):
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(_db.engine, 'before_cursor_execute', record)
+    return statements, lambda: event.remove(_db.engine, 'before_cursor_execute', record)
+
+
+def test_create_invitations_is_batched(_db, users, property_fixture):
+    emails = [f'guest{i}@example.com' for i in range(100)] + ['GUEST1@example.com', '  ']
+    owner_id, property_id = users['owner'].id, property_fixture.id
+
+    statements, stop = count_statements(_db)
+    invitations = GuestInvitation.create_invitations(
+        created_by_id=owner_id,
+        emails=emails,
+        property_id=property_id,
+        expires_in_days=14
+    )
+    stop()
+
+    assert len(invitations) == 100
+    assert [inv.email for inv in invitations] == emails[:100]
+    assert len({inv.code for inv in invitations}) == 100
+    assert all(inv.is_available for inv in invitations)
+    # One collision check and one bulk insert, not one round trip per email
+    assert len([s for s in statements if 'guest_invitations' in s]) <= 3
+    assert GuestInvitation.query.count() == 100
+
+
+def test_generate_unique_codes_skips_existing(_db, users):
+    existing = GuestInvitation.create_invitation(created_by_id=users['owner'].id)
+    codes = GuestInvitation.generate_unique_codes(50)
+    assert len(set(codes)) == 50
+    assert existing.code not in codes
+
+
+def test_cleanup_expired_is_a_single_update(_db, users):
+    owner_id = users['owner'].id
+    fresh = GuestInvitation.create_invitation(created_by_id=owner_id)
+    stale = GuestInvitation.create_invitations(owner_id, ['a@example.com', 'b@example.com'])
+    for invitation in stale:
+        invitation.expires_at = datetime.utcnow() - timedelta(days=1)
+    _db.session.commit()
+
+    assert GuestInvitation.cleanup_expired() == 2
+    assert GuestInvitation.cleanup_expired() == 0
+
+    _db.session.expire_all()
+    assert fresh.is_active
+    assert not any(invitation.is_active for invitation in stale)
+
+
+def test_invitation_email_names_the_property(app, _db, users, property_fixture):
+    invitation = GuestInvitation.create_invitations(
+        created_by_id=users['owner'].id,
+        emails=['guest@example.com'],
+        property_id=property_fixture.id,
+        expires_in_days=14
+    )[0]
+    _db.session.commit()
+
+    context = {'invitation': invitation, 'inviter': users['owner'], 'register_url': 'https://example.com/join'}
+    with app.test_request_context():
+        for template in ('email/guest_invitation.txt', 'email/guest_invitation.html'):
+            assert 'for Test Property' in render_template(template, **context)
@@ -0,0 +1,131 @@
+"""
+Tests for the outbound iCal feeds.
+"""
+from datetime import date, datetime, timedelta
+from sqlalchemy import event
+from app import cache
+from app.models import (Booking, CalendarEvent, Property, PropertyCalendar, Task, TaskProperty, TaskStatus,
+                        WorkerCalendarAssignment)
+
+
+def seed_property(_db, prop, start):
+    calendar = PropertyCalendar(property_id=prop.id, name='Airbnb', ical_url='https://example.com/a.ics',
+                                service='airbnb')
+    _db.session.add(calendar)
+    _db.session.flush()
+    _db.session.add_all([
+        Booking(property_id=prop.id, calendar_id=calendar.id, title='Guest', guest_name='Jo Private',
+                start_date=start, end_date=start + timedelta(days=3)),
+        # Same stay as the booking, imported again by calendar sync
+        CalendarEvent(property_calendar_id=calendar.id, property_id=prop.id, title='Reserved',
+                      start_date=start, end_date=start + timedelta(days=3), source='airbnb'),
+        CalendarEvent(property_calendar_id=calendar.id, property_id=prop.id, title='Reserved',
+                      start_date=start + timedelta(days=10), end_date=start + timedelta(days=12), source='vrbo'),
+        CalendarEvent(property_calendar_id=calendar.id, property_id=prop.id, title='Old',
+                      start_date=start - timedelta(days=400), end_date=start - timedelta(days=398), source='vrbo'),
+    ])
+    return calendar
+
+
+def add_task(_db, prop, creator, title, due, **kwargs):
+    task = Task(title=title, creator_id=creator.id, property_id=prop.id, due_date=due, **kwargs)
+    _db.session.add(task)
+    _db.session.flush()
+    _db.session.add(TaskProperty(task_id=task.id, property_id=prop.id))
+    return task
+
+
+def unfold(body):
+    return body.replace('\r\n ', '')
+
+
+def test_worker_feed_lists_stays_and_tasks_and_revalidates(client, _db, users, property_fixture):
+    cache.clear()
+    start = date.today() + timedelta(days=5)
+    property_fixture.worker_calendar_token = 'worker-token'
+    property_fixture.name = 'Sea View; Unit 2, Upper'
+    seed_property(_db, property_fixture, start)
+    add_task(_db, property_fixture, users['owner'], 'Turnover clean with a long description of every step to take',
+             datetime.combine(start + timedelta(days=3), datetime.min.time()) + timedelta(hours=11))
+    add_task(_db, property_fixture, users['owner'], 'Restock', datetime.now() + timedelta(days=1),
+             status=TaskStatus.COMPLETED)
+    _db.session.commit()
+    url = '/property/worker-calendar/worker-token/calendar.ics'
+
+    response = client.get(url)
+    assert response.status_code == 200
+    # Rendered while streaming, so the length is not known up front
+    assert 'Content-Length' not in response.headers
+    assert response.mimetype == 'text/calendar'
+    body = response.get_data(as_text=True)
+    assert all(len(line.encode()) <= 75 for line in body.split('\r\n'))
+    body = unfold(body)
+
+    assert body.startswith('BEGIN:VCALENDAR\r\n') and body.endswith('END:VCALENDAR\r\n')
+    assert body.count('BEGIN:VEVENT') == 4
+    assert f"DTSTART;VALUE=DATE:{start:%Y%m%d}" in body
+    assert 'SUMMARY:Sea View\\; Unit 2\\, Upper - Reserved' in body
+    assert 'Turnover clean with a long description of every step to take (Sea View' in body
+    assert 'SUMMARY:Done: Restock' in body
+    assert 'Jo Private' not in body
+
+    etag = response.headers['ETag']
+    assert client.get(url, headers={'If-None-Match': etag}).status_code == 304
+
+    Booking.query.first().end_date = start + timedelta(days=4)
+    _db.session.commit()
+    changed = client.get(url, headers={'If-None-Match': etag})
+    assert changed.status_code == 200
+    assert changed.headers['ETag'] != etag
+    assert f"DTEND;VALUE=DATE:{start + timedelta(days=4):%Y%m%d}" in changed.get_data(as_text=True)
+
+
+def test_public_feed_shows_only_reserved_dates(client, _db, users, property_fixture):
+    cache.clear()
+    property_fixture.booking_calendar_token = 'public-token'
+    property_fixture.booking_calendar_enabled = True
+    seed_property(_db, property_fixture, date.today())
+    add_task(_db, property_fixture, users['owner'], 'Clean', datetime.now() + timedelta(days=1))
+    _db.session.commit()
+
+    body = unfold(client.get('/property/booking-calendar/public-token/calendar.ics').get_data(as_text=True))
+    assert body.count('BEGIN:VEVENT') == 2
+    assert body.count('SUMMARY:Reserved') == 2
+    assert 'Test Property' not in body and 'airbnb' not in body and 'Clean' not in body
+
+    property_fixture.booking_calendar_enabled = False
+    _db.session.commit()
+    assert client.get('/property/booking-calendar/public-token/calendar.ics').status_code == 404
+
+
+def test_combined_feed_is_served_from_cache_until_data_changes(client, _db, users, property_fixture):
+    cache.clear()
+    other = Property(name='Loft', address='9 High St', owner_id=users['owner'].id)
+    _db.session.add(other)
+    _db.session.flush()
+    seed_property(_db, property_fixture, date.today())
+    seed_property(_db, other, date.today() + timedelta(days=2))
+    assignment = WorkerCalendarAssignment(name='North team', token='team-token', created_by=users['owner'].id)
+    assignment.properties = [property_fixture, other]
+    _db.session.add(assignment)
+    _db.session.commit()
+    url = '/property/combined-worker-calendar/team-token/calendar.ics'
+
+    first = client.get(url).get_data(as_text=True)
+    assert first.count('BEGIN:VEVENT') == 4
+    assert 'X-WR-CALNAME:North team' in first
+
+    statements = []
+    record = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(_db.engine, 'before_cursor_execute', record)
+    second = client.get(url)
+    event.remove(_db.engine, 'before_cursor_execute', record)
+
+    assert 'Content-Length' in second.headers
+    assert second.get_data(as_text=True) == first
+    # Token lookup, property ids and the version query; nothing is rendered
+    assert len([s for s in statements if 'calendar_event' in s or 'booking' in s]) == 1
+
+    assignment.is_active = False
+    _db.session.commit()
+    assert client.get(url).status_code == 404
@@ -0,0 +1,162 @@
+"""
+Tests for atomic, batched inventory movements.
+"""
+import threading
+import pytest
+from sqlalchemy import event
+from sqlalchemy.exc import OperationalError
+from app import create_app, db
+from app.models import (InventoryCatalogItem, InventoryItem, InventoryTransaction, Property,
+                        TransactionType, User, UserRoles)
+from app.inventory.service import apply_inventory_movements
+from app.utils.error_handling import BusinessLogicError, ValidationError
+from config import TestConfig
+from tests.utils import login
+
+
+def make_items(session, owner_id, property_id, count=3, quantity=10):
+    catalog = [InventoryCatalogItem(creator_id=owner_id, name=f'Item {i}', unit='piece', unit_price=1.0)
+               for i in range(count)]
+    session.add_all(catalog)
+    session.flush()
+    items = [InventoryItem(catalog_item_id=c.id, property_id=property_id,
+                           current_quantity=quantity, reorder_threshold=2) for c in catalog]
+    session.add_all(items)
+    session.commit()
+    return items
+
+
+def test_batch_applies_all_lines_with_one_bulk_insert(_db, users, property_fixture):
+    owner = users['owner']
+    second = Property(name='Second', address='1 Other St', owner_id=owner.id)
+    _db.session.add(second)
+    _db.session.commit()
+    towels, soap, coffee = make_items(_db.session, owner.id, property_fixture.id)
+
+    inserts = []
+    record = lambda conn, cursor, statement, *args: inserts.append(statement) \
+        if statement.startswith('INSERT INTO inventory_transaction') else None
+    event.listen(_db.engine, 'before_cursor_execute', record)
+    quantities = apply_inventory_movements([
+        {'item_id': towels.id, 'transaction_type': 'restock', 'quantity': 5},
+        {'item_id': towels.id, 'transaction_type': 'usage', 'quantity': 3},
+        {'item_id': soap.id, 'transaction_type': TransactionType.TRANSFER_OUT, 'quantity': 4,
+         'destination_property_id': second.id},
+        {'item_id': coffee.id, 'transaction_type': 'adjustment', 'quantity': 7},
+        {'item_id': coffee.id, 'transaction_type': 'usage', 'quantity': 1},
+    ], user_id=owner.id, notes='Supply run')
+    event.remove(_db.engine, 'before_cursor_execute', record)
+
+    assert len(inserts) == 1
+    assert towels.current_quantity == 12
+    assert soap.current_quantity == 6
+    assert coffee.current_quantity == 6
+    destination = InventoryItem.query.filter_by(property_id=second.id).one()
+    assert destination.current_quantity == 4
+    assert destination.reorder_threshold == soap.reorder_threshold
+    assert quantities[destination.id] == 4
+
+    transactions = InventoryTransaction.query.order_by(InventoryTransaction.id).all()
+    assert [(t.transaction_type, t.previous_quantity, t.new_quantity) for t in transactions] == [
+        (TransactionType.RESTOCK, 10, 15),
+        (TransactionType.USAGE, 15, 12),
+        (TransactionType.TRANSFER_OUT, 10, 6),
+        (TransactionType.TRANSFER_IN, 0, 4),
+        (TransactionType.ADJUSTMENT, 10, 7),
+        (TransactionType.USAGE, 7, 6),
+    ]
+    assert all(t.notes == 'Supply run' and t.user_id == owner.id for t in transactions)
+    assert transactions[2].destination_property_id == second.id
+
+
+def test_batch_is_rejected_as_a_whole(_db, users, property_fixture):
+    towels, soap, _ = make_items(_db.session, users['owner'].id, property_fixture.id)
+
+    with pytest.raises(BusinessLogicError):
+        apply_inventory_movements([
+            {'item_id': towels.id, 'transaction_type': 'restock', 'quantity': 5},
+            {'item_id': soap.id, 'transaction_type': 'usage', 'quantity': 11},
+        ])
+    with pytest.raises(ValidationError):
+        apply_inventory_movements([{'item_id': towels.id, 'transaction_type': 'usage', 'quantity': -1}])
+
+    assert towels.current_quantity == 10
+    assert soap.current_quantity == 10
+    assert InventoryTransaction.query.count() == 0
+
+
+def test_movements_api(client, _db, users, property_fixture):
+    towels, soap, _ = make_items(_db.session, users['owner'].id, property_fixture.id)
+    login(client, 'owner@example.com', 'password')
+    url = f'/inventory/property/{property_fixture.id}/inventory/movements'
+
+    response = client.post(url, json={'lines': [
+        {'item_id': towels.id, 'transaction_type': 'usage', 'quantity': 9},
+        {'item_id': soap.id, 'transaction_type': 'restock', 'quantity': 1},
+    ]})
+    assert response.status_code == 200
+    assert response.get_json()['quantities'] == {str(towels.id): 1, str(soap.id): 11}
+
+    response = client.post(url, json={'lines': [
+        {'item_id': towels.id, 'transaction_type': 'usage', 'quantity': 5},
+    ]})
+    assert response.status_code == 422
+
+
+class FileConfig(TestConfig):
+    SQLALCHEMY_ENGINE_OPTIONS = {'connect_args': {'timeout': 30}}
+
+
+def test_concurrent_batches_never_drift(tmp_path):
+    FileConfig.SQLALCHEMY_DATABASE_URI = f"sqlite:///{tmp_path / 'inventory.db'}"
+    app = create_app(FileConfig)
+    with app.app_context():
+        db.create_all()
+        owner = User(first_name='Test', last_name='Owner', email='owner@example.com',
+                     role=UserRoles.PROPERTY_OWNER.value)
+        owner.set_password('password')
+        db.session.add(owner)
+        db.session.commit()
+        property = Property(name='Unit', address='1 Main St', owner_id=owner.id)
+        db.session.add(property)
+        db.session.commit()
+        item_ids = [item.id for item in make_items(db.session, owner.id, property.id, count=2, quantity=100)]
+
+    # 200 batches race for 100 units of the second item: exactly half can apply
+    workers, rounds = 8, 25
+    applied, rejected = [], []
+
+    def worker(n):
+        with app.app_context():
+            for i in range(rounds):
+                lines = [
+                    {'item_id': item_ids[0], 'transaction_type': 'restock', 'quantity': 2},
+                    {'item_id': item_ids[1], 'transaction_type': 'usage', 'quantity': 1},
+                ]
+                while True:
+                    try:
+                        apply_inventory_movements(lines)
+                        applied.append(n)
+                        break
+                    except BusinessLogicError:
+                        rejected.append(n)
+                        break
+                    except OperationalError:
+                        continue  # SQLite writer contention; the batch was rolled back
+            db.session.remove()
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(workers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    with app.app_context():
+        assert len(applied) == 100
+        assert len(rejected) == workers * rounds - 100
+        first, second = (db.session.get(InventoryItem, item_id) for item_id in item_ids)
+        assert first.current_quantity == 100 + 2 * len(applied)
+        assert second.current_quantity == 100 - len(applied)
+        assert InventoryTransaction.query.count() == 2 * len(applied)
+        db.session.remove()
+        db.drop_all()
@@ -0,0 +1,86 @@
+"""
+Tests for SQL-side low-stock filtering and the portfolio reorder report.
+"""
+from datetime import datetime, timedelta
+from app.models import (InventoryCatalogItem, InventoryItem, InventoryTransaction, Property,
+                        ItemCategory, TransactionType)
+from app.inventory.service import low_stock_query, get_reorder_report, reorder_scope_for
+from tests.utils import login
+
+
+def make_stock(_db, users, property_fixture):
+    owner = users['owner']
+    second = Property(name='Second', address='1 Other St', owner_id=owner.id)
+    towels = InventoryCatalogItem(creator_id=owner.id, name='Towels', unit='piece', unit_price=5.0,
+                                  category=ItemCategory.GENERAL)
+    soap = InventoryCatalogItem(creator_id=owner.id, name='Soap', unit='bar', unit_price=1.0)
+    coffee = InventoryCatalogItem(creator_id=owner.id, name='Coffee', unit='bag', unit_price=8.0)
+    _db.session.add_all([second, towels, soap, coffee])
+    _db.session.flush()
+
+    items = {
+        'towels_a': InventoryItem(catalog_item_id=towels.id, property_id=property_fixture.id,
+                                  current_quantity=2, reorder_threshold=10),
+        'towels_b': InventoryItem(catalog_item_id=towels.id, property_id=second.id,
+                                  current_quantity=4, reorder_threshold=6),
+        'soap_a': InventoryItem(catalog_item_id=soap.id, property_id=property_fixture.id,
+                                current_quantity=50, reorder_threshold=5),
+        'coffee_a': InventoryItem(catalog_item_id=coffee.id, property_id=property_fixture.id,
+                                  current_quantity=6, reorder_threshold=2),
+        'untracked': InventoryItem(catalog_item_id=soap.id, property_id=second.id,
+                                   current_quantity=0, reorder_threshold=None),
+    }
+    _db.session.add_all(items.values())
+    _db.session.flush()
+
+    # Coffee is above threshold but consumed at one bag a day
+    _db.session.add(InventoryTransaction(item_id=items['coffee_a'].id, quantity=30,
+                                         transaction_type=TransactionType.USAGE,
+                                         created_at=datetime.utcnow() - timedelta(days=3)))
+    _db.session.commit()
+    return second, items
+
+
+def test_low_stock_query_matches_python_check(_db, users, property_fixture):
+    second, items = make_stock(_db, users, property_fixture)
+
+    for property_id in (property_fixture.id, second.id):
+        expected = {i.id for i in InventoryItem.query.filter_by(property_id=property_id) if i.is_low_stock()}
+        assert {i.id for i in low_stock_query(property_id)} == expected
+    assert {i.id for i in low_stock_query(property_fixture.id)} == {items['towels_a'].id}
+
+
+def test_reorder_report_aggregates_across_properties(_db, users, property_fixture):
+    make_stock(_db, users, property_fixture)
+
+    report = get_reorder_report(reorder_scope_for(users['owner']), lookback_days=30, horizon_days=14)
+    by_name = {row['catalog_item'].name: row for row in report}
+
+    assert set(by_name) == {'Towels', 'Coffee'}
+    towels = by_name['Towels']
+    assert towels['low_stock_count'] == 2 and towels['property_count'] == 2
+    assert towels['shortfall'] == 10
+    assert towels['suggested_order'] == 10
+    assert towels['estimated_cost'] == 50
+
+    coffee = by_name['Coffee']
+    assert coffee['low_stock_count'] == 0
+    assert coffee['daily_usage'] == 1
+    assert coffee['days_of_cover'] == 6
+    assert coffee['suggested_order'] == 14 + 2 - 6
+
+    # Another owner's scope sees none of it
+    assert get_reorder_report(reorder_scope_for(users['staff'])) == []
+
+
+def test_reorder_report_csv_export(client, _db, users, property_fixture):
+    make_stock(_db, users, property_fixture)
+    login(client, 'owner@example.com', 'password')
+
+    response = client.get('/inventory/reorder-report/export')
+    assert response.status_code == 200
+    assert response.mimetype == 'text/csv'
+    lines = response.get_data(as_text=True).strip().splitlines()
+    assert lines[0].startswith('Item,SKU,Category')
+    # Equal suggested orders fall back to name order
+    assert [line.split(',')[0] for line in lines[1:]] == ['Coffee', 'Towels']
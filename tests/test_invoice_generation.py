@@ -0,0 +1,130 @@
+"""
+Tests for set-based invoice generation from completed tasks.
+"""
+from datetime import datetime, date, timedelta
+from sqlalchemy import event
+from app.models import (Task, TaskAssignment, TaskProperty, TaskStatus, Property, ServiceType,
+                        CleaningSession)
+from app.models_modules.invoicing import TaskPrice, Invoice, InvoiceBatch, PricingModel
+from app.models_modules.jobs import JobRun
+from app.invoicing.service import (generate_invoices, generate_invoices_for_period, run_invoice_batch,
+                                   run_pending_invoice_batches)
+from tests.utils import login, logout
+
+PERIOD = (date(2024, 3, 1), date(2024, 3, 31))
+
+
+def add_completed_task(_db, owner, worker, property, service_type, completed_at, minutes=None, title='Task'):
+    task = Task(title=title, status=TaskStatus.COMPLETED, creator_id=owner.id, completed_at=completed_at)
+    _db.session.add(task)
+    _db.session.flush()
+    _db.session.add(TaskProperty(task_id=task.id, property_id=property.id))
+    _db.session.add(TaskAssignment(task_id=task.id, user_id=worker.id, service_type=service_type))
+    if minutes:
+        _db.session.add(CleaningSession(property_id=property.id, cleaner_id=worker.id, task_id=task.id,
+                                        start_time=completed_at - timedelta(minutes=minutes),
+                                        end_time=completed_at, duration_minutes=minutes))
+    return task
+
+
+def make_portfolio(_db, users, property_fixture, tasks_per_property=5):
+    owner, staff = users['owner'], users['staff']
+    second = Property(name='Second', address='1 Other St', owner_id=owner.id)
+    idle = Property(name='Idle', address='2 Other St', owner_id=owner.id)
+    _db.session.add_all([second, idle])
+    _db.session.flush()
+
+    _db.session.add_all([
+        TaskPrice(service_type=ServiceType.CLEANING, pricing_model=PricingModel.FIXED,
+                  fixed_price=80, creator_id=owner.id),
+        TaskPrice(service_type=ServiceType.CLEANING, pricing_model=PricingModel.FIXED,
+                  fixed_price=120, property_id=second.id, creator_id=owner.id),
+        TaskPrice(service_type=ServiceType.HANDYMAN, pricing_model=PricingModel.HOURLY,
+                  hourly_rate=60, creator_id=owner.id),
+    ])
+    when = datetime(2024, 3, 31, 18, 0)  # late on the last day still counts
+    for property in (property_fixture, second):
+        for i in range(tasks_per_property):
+            add_completed_task(_db, owner, staff, property, ServiceType.CLEANING, when, title=f'Clean {i}')
+        add_completed_task(_db, owner, staff, property, ServiceType.HANDYMAN, when, minutes=90, title='Fix')
+        # Hourly work without a finished session and work outside the period are skipped
+        add_completed_task(_db, owner, staff, property, ServiceType.HANDYMAN, when, title='Unlogged')
+        add_completed_task(_db, owner, staff, property, ServiceType.CLEANING, datetime(2024, 4, 1, 9), title='Late')
+    _db.session.commit()
+    return second, idle
+
+
+def test_invoice_amounts_use_price_resolution(_db, users, property_fixture):
+    second, _ = make_portfolio(_db, users, property_fixture)
+
+    first_invoice, second_invoice = generate_invoices([property_fixture, second], *PERIOD, users['owner'].id)
+    _db.session.commit()
+
+    assert first_invoice.items.count() == 6
+    assert first_invoice.total == 5 * 80 + 90
+    assert second_invoice.total == 5 * 120 + 90
+    assert first_invoice.invoice_number != second_invoice.invoice_number
+
+
+def test_query_count_does_not_grow_with_tasks(_db, users, property_fixture):
+    make_portfolio(_db, users, property_fixture, tasks_per_property=30)
+    owner_id = users['owner'].id
+    properties = Property.query.order_by(Property.id).all()
+
+    statements = []
+    record = lambda conn, cursor, statement, *args: statements.append(statement.split()[0].upper())
+    event.listen(_db.engine, 'before_cursor_execute', record)
+    invoices = generate_invoices(properties, *PERIOD, owner_id, skip_empty=True)
+    event.remove(_db.engine, 'before_cursor_execute', record)
+
+    assert len(invoices) == 2
+    # Prices, task rows and the invoice-number lookup, then the invoices and one bulk item insert
+    assert statements.count('SELECT') == 3
+    assert statements.count('INSERT') <= 3
+
+
+def test_batch_generation_reports_progress_and_is_idempotent(_db, users, property_fixture):
+    second, idle = make_portfolio(_db, users, property_fixture)
+    owner_id = users['owner'].id
+
+    progress = []
+    invoice_ids = generate_invoices_for_period(*PERIOD, owner_id, progress=lambda done, total: progress.append((done, total)),
+                                               chunk_size=2)
+    assert progress == [(0, 3), (2, 3), (3, 3)]
+    assert len(invoice_ids) == 2
+    assert {invoice.property_id for invoice in Invoice.query} == {property_fixture.id, second.id}
+
+    # Tasks already on an invoice are not billed twice
+    assert generate_invoices_for_period(*PERIOD, owner_id) == []
+
+    batch = InvoiceBatch(date_from=PERIOD[0], date_to=PERIOD[1], creator_id=owner_id, status='running')
+    batch.property_ids = [idle.id]
+    _db.session.add(batch)
+    _db.session.commit()
+    run_invoice_batch(batch)
+    assert batch.to_dict()['status'] == 'completed'
+    assert (batch.done, batch.total, batch.invoice_ids) == (1, 1, [])
+
+
+def test_batches_are_stored_run_by_the_job_and_private(app, client, _db, users, property_fixture):
+    make_portfolio(_db, users, property_fixture)
+    app.config['JOB_RUNNER_ENABLED'] = True
+    login(client, users['owner'].email, 'password')
+
+    response = client.post('/invoicing/invoices/generate_batch', data={'date_from': '2024-03-01', 'date_to': '2024-03-31'})
+    batch = InvoiceBatch.query.one()
+    assert response.headers['Location'].endswith(f'job_id={batch.id}')
+    assert JobRun.query.filter_by(job_name='invoice_batches').count() == 1
+    assert client.get(f'/invoicing/invoices/generate_batch/{batch.id}/status').get_json()['status'] == 'pending'
+
+    # Any worker can run it and report its progress
+    assert run_pending_invoice_batches() == 1
+    assert run_pending_invoice_batches() == 0
+    status = client.get(f'/invoicing/invoices/generate_batch/{batch.id}/status').get_json()
+    assert (status['status'], status['done'], status['total']) == ('completed', 3, 3)
+    assert len(status['invoice_ids']) == 2
+
+    logout(client)
+    login(client, users['manager'].email, 'password')
+    assert client.get(f'/invoicing/invoices/generate_batch?job_id={batch.id}').status_code == 404
+    assert client.get(f'/invoicing/invoices/generate_batch/{batch.id}/status').status_code == 404
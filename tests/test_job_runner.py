@@ -0,0 +1,174 @@
+"""
+Tests for the database-backed job scheduler and worker.
+"""
+from datetime import datetime, timedelta
+import pytest
+from app.jobs import runner
+from app.jobs.runner import (JobDefinition, JobRunner, acquire_leadership, claim_next_run, enqueue_due_jobs,
+                             enqueue_job, execute_run, recover_expired_runs, sync_job_definitions)
+from app.models_modules.jobs import ScheduledJob, JobRun, JobRunStatus
+from tests.utils import login
+
+
+@pytest.fixture
+def registry(monkeypatch, app):
+    """Replace the registry with test jobs that record their calls"""
+    calls = []
+
+    def ok():
+        calls.append('ok')
+
+    def broken():
+        calls.append('broken')
+        raise RuntimeError('feed unavailable')
+
+    jobs = {
+        'ok': JobDefinition('ok', ok, interval=600, jitter=60),
+        'broken': JobDefinition('broken', broken, interval=600, max_attempts=2, retry_delay=30),
+        'solo': JobDefinition('solo', ok, interval=600, singleton=True),
+    }
+    for name in list(runner.JOB_REGISTRY):
+        monkeypatch.delitem(runner.JOB_REGISTRY, name)
+    for name, definition in jobs.items():
+        monkeypatch.setitem(runner.JOB_REGISTRY, name, definition)
+    sync_job_definitions()
+    return calls
+
+
+def test_leadership_lease(_db):
+    now = datetime(2024, 1, 1, 12, 0)
+    assert acquire_leadership('a', 30, now)
+    assert not acquire_leadership('b', 30, now + timedelta(seconds=10))
+    assert acquire_leadership('a', 30, now + timedelta(seconds=20))
+    # 'a' stopped renewing
+    assert acquire_leadership('b', 30, now + timedelta(seconds=51))
+    assert not acquire_leadership('a', 30, now + timedelta(seconds=52))
+
+
+def test_due_jobs_are_queued_once_with_jittered_reschedule(_db, registry):
+    now = datetime.utcnow() + timedelta(minutes=2)
+    assert enqueue_due_jobs(now) == 3
+    # Due again, but the earlier runs are still queued
+    ScheduledJob.query.update({'next_run_at': now})
+    assert enqueue_due_jobs(now) == 0
+    assert JobRun.query.count() == 3
+
+    ok = ScheduledJob.query.filter_by(name='ok').one()
+    assert now + timedelta(seconds=600) <= ok.next_run_at <= now + timedelta(seconds=660)
+
+
+def test_unregistered_jobs_are_skipped_until_their_next_interval(_db, registry, monkeypatch, caplog):
+    monkeypatch.delitem(runner.JOB_REGISTRY, 'broken')
+    now = datetime.utcnow() + timedelta(minutes=2)
+    assert enqueue_due_jobs(now) == 2
+    assert 'broken is not registered' in caplog.text
+
+    broken = ScheduledJob.query.filter_by(name='broken').one()
+    assert broken.next_run_at == now + timedelta(seconds=600)
+    assert not JobRun.query.filter_by(job_name='broken').count()
+
+
+def test_claims_respect_concurrency_and_singletons(_db, registry):
+    enqueue_job('solo')
+    first = enqueue_job('ok')
+    enqueue_job('ok')
+
+    assert claim_next_run('follower', is_leader=False).id == first.id
+    # 'ok' is at its limit of one and 'solo' needs the leader
+    assert claim_next_run('follower', is_leader=False) is None
+    assert claim_next_run('leader', is_leader=True).job_name == 'solo'
+
+    assert execute_run(first, 'follower')
+    assert claim_next_run('follower', is_leader=False).job_name == 'ok'
+    assert registry == ['ok']
+
+
+def test_failures_retry_with_backoff_then_give_up(_db, registry):
+    enqueue_job('broken')
+    run = claim_next_run('w', is_leader=False)
+    assert not execute_run(run, 'w')
+
+    job = ScheduledJob.query.filter_by(name='broken').one()
+    assert (job.run_count, job.failure_count, job.consecutive_failures) == (1, 1, 1)
+    assert job.last_status == 'failed'
+    assert job.last_error == 'RuntimeError: feed unavailable'
+    assert job.last_duration_ms is not None
+
+    retry = JobRun.query.filter_by(status=JobRunStatus.QUEUED.value).one()
+    assert retry.attempt == 2
+    assert retry.run_after > datetime.utcnow() + timedelta(seconds=14)
+    assert claim_next_run('w', is_leader=False) is None
+
+    retried = claim_next_run('w', is_leader=False, now=retry.run_after)
+    assert not execute_run(retried, 'w')
+    # max_attempts reached
+    assert JobRun.query.filter_by(status=JobRunStatus.QUEUED.value).count() == 0
+    assert ScheduledJob.query.filter_by(name='broken').one().consecutive_failures == 2
+
+
+def test_expired_leases_are_recovered(_db, registry):
+    enqueue_job('ok')
+    run = claim_next_run('dead-worker', is_leader=False)
+    later = datetime.utcnow() + timedelta(seconds=runner.DEFAULT_RUN_TIMEOUT + 1)
+
+    assert recover_expired_runs(later) == 1
+    assert _db.session.get(JobRun, run.id).status == JobRunStatus.FAILED.value
+    # The dead worker cannot finish a run it no longer owns
+    assert not runner.finish_run(run, None, 5, worker_id='dead-worker')
+    assert JobRun.query.filter_by(status=JobRunStatus.QUEUED.value, attempt=2).count() == 1
+
+
+def test_runner_tick_runs_due_jobs(app, _db, registry):
+    ScheduledJob.query.update({'next_run_at': datetime.utcnow() - timedelta(seconds=1)})
+    _db.session.commit()
+
+    job_runner = JobRunner(app, worker_id='only')
+    assert job_runner.tick() == 3
+    assert job_runner.is_leader
+    assert registry == ['ok', 'broken', 'ok']
+
+
+def test_scheduling_continues_during_a_long_singleton_run(app, _db, registry, monkeypatch):
+    clock = [datetime.utcnow()]
+    monkeypatch.setattr(runner, 'datetime', type('Clock', (), {'utcnow': staticmethod(lambda: clock[0])}))
+    monkeypatch.setitem(runner.JOB_REGISTRY, 'inbox', JobDefinition('inbox', lambda: registry.append('inbox'),
+                                                                    interval=15))
+    sync_job_definitions()
+    ScheduledJob.query.update({'next_run_at': clock[0] + timedelta(days=1)})
+    _db.session.commit()
+    job_runner = JobRunner(app, worker_id='leader')
+
+    def long_job():
+        registry.append('long')
+        # The scheduler thread keeps beating while the run goes on for minutes
+        for _ in range(10):
+            clock[0] += timedelta(seconds=job_runner.heartbeat_interval)
+            ScheduledJob.query.filter_by(name='inbox').update({'next_run_at': clock[0]})
+            assert job_runner.heartbeat()
+            assert not acquire_leadership('follower', 30, clock[0])
+    monkeypatch.setitem(runner.JOB_REGISTRY, 'solo', JobDefinition('solo', long_job, interval=600, singleton=True))
+    enqueue_job('solo', now=clock[0])
+
+    assert job_runner.heartbeat()
+    assert job_runner.work() == 2
+    # The 15 second job was queued while the singleton ran, then executed
+    assert registry == ['long', 'inbox']
+
+    # The lease is never held longer than the usual 30 seconds
+    assert acquire_leadership('follower', 30, clock[0] + timedelta(seconds=31))
+
+
+def test_admin_jobs_page(client, _db, users, registry):
+    login(client, 'admin@example.com', 'password')
+    job = ScheduledJob.query.filter_by(name='ok').one()
+    job.run_count, job.failure_count, job.last_duration_ms, job.last_status = 7, 2, 1234, 'succeeded'
+    _db.session.commit()
+
+    response = client.get('/admin/jobs')
+    assert response.status_code == 200
+    assert b'1234 ms' in response.data
+
+    client.post(f'/admin/jobs/{job.id}/run')
+    assert JobRun.query.filter_by(job_name='ok', status=JobRunStatus.QUEUED.value).count() == 1
+    client.post(f'/admin/jobs/{job.id}/toggle')
+    assert _db.session.get(ScheduledJob, job.id).enabled is False
@@ -0,0 +1,111 @@
+"""
+Tests for E.164 phone normalization and phone-to-user/thread resolution.
+"""
+from sqlalchemy import event
+from app.messages.service import get_unified_messages
+from app.models import Message, MessageThread, RegistrationRequest, User
+from app.utils.phone import PhoneIndex, to_e164
+from app.utils.sms import find_or_create_thread, find_user_by_phone
+from tests.utils import login
+
+
+def count_statements(_db, func, *args):
+    statements = []
+    record = lambda conn, cursor, statement, *a: statements.append(statement)
+    event.listen(_db.engine, 'before_cursor_execute', record)
+    try:
+        result = func(*args)
+    finally:
+        event.remove(_db.engine, 'before_cursor_execute', record)
+    return result, statements
+
+
+def test_numbers_are_normalized_to_e164():
+    assert to_e164('(415) 867-5309') == '+14158675309'
+    assert to_e164('1-415-867-5309') == '+14158675309'
+    assert to_e164('+44 20 7946 0958') == '+442079460958'
+    assert to_e164('call me') is None
+    assert to_e164('') is None
+
+
+def test_phone_index_evicts_least_recently_used():
+    index = PhoneIndex(maxsize=2)
+    index.put('+1', 1)
+    index.put('+2', 2)
+    index.get('+1')
+    index.put('+3', 3)
+    assert (index.get('+1'), index.get('+2'), index.get('+3')) == (1, None, 3)
+
+
+def test_users_are_found_by_any_format_of_their_number(_db, users):
+    staff = users['staff']
+    staff.phone = '(415) 867-5309'
+    _db.session.commit()
+    assert staff.phone_e164 == '+14158675309'
+
+    user, statements = count_statements(_db, find_user_by_phone, '+1 415 867 5309')
+    assert user.id == staff.id
+    assert len(statements) <= 1
+    # Cached: the user is loaded by primary key, here straight from the session
+    _db.session.expire_all()
+    user, statements = count_statements(_db, find_user_by_phone, '4158675309')
+    assert user.id == staff.id
+    assert len(statements) == 1 and 'phone_e164' not in statements[0].split('WHERE')[1]
+
+    staff.phone = '415-000-0000'
+    _db.session.commit()
+    assert find_user_by_phone('4158675309') is None
+
+
+def test_threads_are_shared_across_number_formats(_db, users):
+    users['staff'].phone = '415.867.5309'
+    _db.session.commit()
+
+    thread = find_or_create_thread('(415) 867-5309', '+1 650 253 0000')
+    assert (thread.participant_phone, thread.system_phone) == ('+14158675309', '+16502530000')
+    assert thread.user_id == users['staff'].id
+
+    again, statements = count_statements(_db, find_or_create_thread, '+14158675309', '650-253-0000')
+    assert again.id == thread.id
+    assert len(statements) <= 1
+    assert MessageThread.query.count() == 1
+
+    # Threads created before the number was linked to the account still show in the inbox
+    thread.user_id = None
+    _db.session.add(Message(thread_id=thread.id, direction='incoming', phone_number='+14158675309',
+                            content='Running late'))
+    _db.session.commit()
+    messages, _ = get_unified_messages(users['staff'])
+    assert [m['content'] for m in messages if m['type'] == 'sms'] == ['Running late']
+
+
+def test_a_number_already_on_another_account_is_a_form_error(client, _db, users):
+    staff, owner = users['staff'], users['owner']
+    staff.phone = '(415) 867-5309'
+    owner.phone = '415-000-0000'
+    _db.session.commit()
+    assert User.phone_in_use('+1 415 867 5309')
+    assert not User.phone_in_use('415-867-5309', exclude_user_id=staff.id)
+
+    message = b'This phone number is already used by another account.'
+    response = client.post('/auth/register', data={
+        'email': 'new@example.com', 'phone': '415 867 5309', 'password': 'secret123', 'password2': 'secret123',
+        'first_name': 'New', 'last_name': 'Cleaner', 'role': 'service_staff', 'message': 'Hello',
+    })
+    assert response.status_code == 200 and message in response.data
+    assert RegistrationRequest.query.count() == 0
+
+    login(client, owner.email, 'password')
+    response = client.post('/workforce/invite', data={
+        'first_name': 'New', 'last_name': 'Cleaner', 'email': 'new@example.com', 'country_code': 'US',
+        'phone': '4158675309', 'send_email': 'y', 'service_type': 'cleaning',
+    })
+    assert response.status_code == 200 and message in response.data
+    assert User.query.filter_by(email='new@example.com').first() is None
+
+    response = client.post('/profile/update/personal', data={
+        'first_name': 'Test', 'last_name': 'Owner', 'email': owner.email, 'phone': '+14158675309',
+    }, follow_redirects=True)
+    assert b'already used by another account' in response.data
+    _db.session.expire_all()
+    assert _db.session.get(User, owner.id).phone == '415-000-0000'
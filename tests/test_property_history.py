@@ -0,0 +1,120 @@
+"""
+Tests for the property page service history summary, its maintained totals and the paginated history endpoint.
+"""
+from sqlalchemy import event
+from app.models import (CleaningSession, Property, RepairRequest, Task, TaskAssignment, TaskProperty,
+                        TaskStatus)
+from tests.utils import login
+
+
+def add_tasks(_db, property, creator, count, assignee=None):
+    tasks = []
+    for n in range(count):
+        task = Task(title=f'Service {n}', creator_id=creator.id, status=TaskStatus.PENDING)
+        _db.session.add(task)
+        _db.session.flush()
+        _db.session.add(TaskProperty(task_id=task.id, property_id=property.id))
+        if assignee:
+            _db.session.add(TaskAssignment(task_id=task.id, user_id=assignee.id))
+        tasks.append(task)
+    _db.session.commit()
+    return tasks
+
+
+def counts(_db, property_id):
+    _db.session.expire_all()
+    property = _db.session.get(Property, property_id)
+    return property.task_count, property.cleaning_session_count, property.repair_request_count
+
+
+def test_history_totals_follow_inserts_moves_and_deletes(_db, users, property_fixture):
+    other = Property(name='Other', address='1 Other St', owner_id=users['owner'].id)
+    _db.session.add(other)
+    _db.session.commit()
+
+    tasks = add_tasks(_db, property_fixture, users['owner'], 3)
+    _db.session.add_all([
+        CleaningSession(property_id=property_fixture.id, cleaner_id=users['staff'].id),
+        RepairRequest(title='Leak', description='Sink leaks', property_id=property_fixture.id,
+                      reporter_id=users['staff'].id),
+    ])
+    _db.session.commit()
+    assert counts(_db, property_fixture.id) == (3, 1, 1)
+
+    repair = RepairRequest.query.one()
+    repair.property_id = other.id
+    _db.session.delete(tasks[0])  # Its TaskProperty row is deleted with it
+    _db.session.commit()
+    assert counts(_db, property_fixture.id) == (2, 1, 0)
+    assert counts(_db, other.id) == (0, 0, 1)
+
+
+def test_property_page_loads_a_bounded_summary(client, _db, users, property_fixture):
+    add_tasks(_db, property_fixture, users['owner'], 15, assignee=users['staff'])
+    _db.session.add_all([CleaningSession(property_id=property_fixture.id, cleaner_id=users['staff'].id)
+                         for _ in range(12)])
+    _db.session.commit()
+    login(client, 'owner@example.com', 'password')
+
+    statements = []
+    record = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(_db.engine, 'before_cursor_execute', record)
+    try:
+        response = client.get(f'/property/{property_fixture.id}/view')
+    finally:
+        event.remove(_db.engine, 'before_cursor_execute', record)
+
+    assert response.status_code == 200
+    html = response.get_data(as_text=True)
+    assert html.count('Service 14') == 1 and 'Service 4<' not in html
+    assert 'Test Staff' in html
+    assert 'Show older' in html
+    # Not one query per task assignment or cleaner
+    assert len(statements) < 15
+
+
+def test_history_endpoint_pages_newest_first(client, _db, users, property_fixture):
+    add_tasks(_db, property_fixture, users['owner'], 5, assignee=users['staff'])
+    add_tasks(_db, property_fixture, users['owner'], 2)
+    login(client, 'owner@example.com', 'password')
+
+    url = f'/property/{property_fixture.id}/history/tasks'
+    first = client.get(f'{url}?limit=4').get_json()
+    assert [item['title'] for item in first['items']] == ['Service 1', 'Service 0', 'Service 4', 'Service 3']
+    assert first['total'] == 7
+    assert first['items'][2]['assignees'] == ['Test Staff']
+    second = client.get(f"{url}?limit=4&before={first['next']}").get_json()
+    assert [item['title'] for item in second['items']] == ['Service 2', 'Service 1', 'Service 0']
+    assert second['next'] is None
+    assert client.get(f'/property/{property_fixture.id}/history/invoices').status_code == 404
+
+
+def test_staff_history_is_limited_to_properties_they_serve(client, _db, users, property_fixture):
+    login(client, 'staff@example.com', 'password')
+    url = f'/property/{property_fixture.id}/history/tasks'
+    assert client.get(url).status_code == 403
+
+    add_tasks(_db, property_fixture, users['owner'], 2, assignee=users['staff'])
+    add_tasks(_db, property_fixture, users['owner'], 1)
+    mine = client.get(f'{url}?mine=1').get_json()
+    assert len(mine['items']) == 2 and mine['total'] is None
+    assert client.get(f'/property/{property_fixture.id}/view').status_code == 200
+
+
+def test_task_edit_keeps_history_totals(client, _db, users, property_fixture):
+    other = Property(name='Other', address='1 Other St', owner_id=users['owner'].id)
+    _db.session.add(other)
+    _db.session.commit()
+    task = add_tasks(_db, property_fixture, users['owner'], 1)[0]
+
+    login(client, users['owner'].email, 'password')
+    form = {'title': 'Clean', 'description': 'Turnover clean', 'status': 'pending', 'priority': 'medium',
+            'recurrence_pattern': 'none', 'calendar_id': -1, 'properties': [property_fixture.id]}
+    for _ in range(3):
+        assert client.post(f'/tasks/{task.id}/edit', data=form).status_code == 302
+    assert counts(_db, property_fixture.id) == (1, 0, 0)
+
+    form['properties'] = [other.id]
+    assert client.post(f'/tasks/{task.id}/edit', data=form).status_code == 302
+    assert counts(_db, property_fixture.id) == (0, 0, 0)
+    assert counts(_db, other.id) == (1, 0, 0)
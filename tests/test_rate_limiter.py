@@ -0,0 +1,91 @@
+"""
+Tests for the sliding-window rate limiter and its storage backends.
+"""
+import pytest
+from app.utils.security import RateLimiter, InMemoryRateLimitBackend, RedisRateLimitBackend
+from tests.utils import FakeRedis
+
+
+class Clock:
+    def __init__(self, now=1_000_000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def make_limiters(clock):
+    return [
+        RateLimiter(InMemoryRateLimitBackend(), clock=clock),
+        RateLimiter(RedisRateLimitBackend(FakeRedis(clock=clock)), clock=clock),
+    ]
+
+
+@pytest.mark.parametrize('index', [0, 1], ids=['memory', 'redis'])
+def test_limit_is_enforced_within_window(index):
+    clock = Clock()
+    limiter = make_limiters(clock)[index]
+
+    assert all(limiter.is_allowed('ip:1', limit=5, window=60) for _ in range(5))
+    assert not limiter.is_allowed('ip:1', limit=5, window=60)
+    # Other keys are independent
+    assert limiter.is_allowed('ip:2', limit=5, window=60)
+
+
+@pytest.mark.parametrize('index', [0, 1], ids=['memory', 'redis'])
+def test_previous_window_is_weighted_by_overlap(index):
+    clock = Clock(now=6000.0)  # aligned to a 60 second window
+    limiter = make_limiters(clock)[index]
+
+    for _ in range(10):
+        assert limiter.is_allowed('k', limit=10, window=60)
+
+    # Halfway into the next window, half of the previous traffic still counts
+    clock.now += 90
+    allowed = sum(limiter.is_allowed('k', limit=10, window=60) for _ in range(10))
+    assert allowed == 5
+
+    # Two full windows later the key is clear again
+    clock.now += 120
+    assert limiter.is_allowed('k', limit=10, window=60)
+
+
+@pytest.mark.parametrize('index', [0, 1], ids=['memory', 'redis'])
+def test_rejected_requests_do_not_consume_quota_and_reset(index):
+    clock = Clock()
+    limiter = make_limiters(clock)[index]
+
+    for _ in range(3):
+        limiter.is_allowed('k', limit=3, window=60)
+    for _ in range(50):
+        assert not limiter.is_allowed('k', limit=3, window=60)
+
+    limiter.reset('k')
+    assert limiter.is_allowed('k', limit=3, window=60)
+
+
+def test_memory_backend_keeps_constant_state_per_key():
+    clock = Clock()
+    backend = InMemoryRateLimitBackend()
+    limiter = RateLimiter(backend, clock=clock)
+
+    for _ in range(1000):
+        limiter.is_allowed('busy', limit=10_000, window=60)
+
+    assert len(backend._windows) == 1
+    assert len(backend._windows['busy']) == 4
+
+
+def test_memory_sweep_keeps_keys_whose_window_is_still_open():
+    clock = Clock(now=7200.0)  # aligned to an hour
+    backend = InMemoryRateLimitBackend()
+    limiter = RateLimiter(backend, clock=clock)
+    for _ in range(100):
+        assert limiter.is_allowed('hourly', limit=100, window=3600)
+    limiter.is_allowed('minutely', limit=100, window=60)
+
+    # Ninety minutes on, half of the hourly key's previous window still counts
+    clock.now += 5400
+    backend._sweep(clock.now)
+    assert list(backend._windows) == ['hourly']
+    assert sum(limiter.is_allowed('hourly', limit=100, window=3600) for _ in range(100)) == 50
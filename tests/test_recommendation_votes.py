@@ -0,0 +1,60 @@
+"""
+Tests for the maintained recommendation vote counter and batch vote lookup.
+"""
+from app.models import RecommendationBlock, RecommendationVote
+
+
+def make_recommendation(_db, property_fixture, title='Cafe'):
+    rec = RecommendationBlock(
+        property_id=property_fixture.id,
+        title=title,
+        description='Good coffee',
+        category='cafe'
+    )
+    _db.session.add(rec)
+    _db.session.commit()
+    return rec
+
+
+def test_toggle_vote_maintains_counter(_db, property_fixture):
+    rec = make_recommendation(_db, property_fixture)
+    assert rec.vote_count == 0
+
+    assert rec.toggle_vote('guest-a') is True
+    assert rec.toggle_vote('guest-b') is True
+    assert rec.vote_count == 2
+    assert rec.has_voted('guest-a')
+
+    assert rec.toggle_vote('guest-a') is False
+    assert rec.vote_count == 1
+    assert not rec.has_voted('guest-a')
+    assert RecommendationVote.query.filter_by(recommendation_id=rec.id).count() == 1
+
+
+def test_duplicate_vote_is_not_double_counted(_db, property_fixture):
+    rec = make_recommendation(_db, property_fixture)
+    rec.toggle_vote('guest-a')
+
+    # Simulate a concurrent insert that raced past the delete check
+    _db.session.add(RecommendationVote(recommendation_id=rec.id, guest_token='guest-a'))
+    try:
+        _db.session.commit()
+        raised = False
+    except Exception:
+        _db.session.rollback()
+        raised = True
+
+    assert raised
+    assert rec.vote_count == 1
+
+
+def test_voted_ids_for_returns_page_votes_in_one_lookup(_db, property_fixture):
+    recs = [make_recommendation(_db, property_fixture, title=f'Place {i}') for i in range(3)]
+    recs[0].toggle_vote('guest-a')
+    recs[2].toggle_vote('guest-a')
+    recs[1].toggle_vote('guest-b')
+
+    voted = RecommendationBlock.voted_ids_for('guest-a', [rec.id for rec in recs])
+    assert voted == {recs[0].id, recs[2].id}
+    assert RecommendationBlock.voted_ids_for(None, [rec.id for rec in recs]) == set()
+    assert RecommendationBlock.voted_ids_for('guest-a', []) == set()
@@ -0,0 +1,85 @@
+"""
+Tests for the recurring expense catch-up generator.
+"""
+from datetime import date, datetime
+from decimal import Decimal
+from sqlalchemy import event
+from app.models_modules.financial_tracking import RecurringExpense, Expense, ExpenseStatus
+
+
+def make_template(_db, owner, name, frequency='monthly', due_day=1, created=datetime(2024, 1, 15), **kwargs):
+    template = RecurringExpense(name=name, category='utilities', frequency=frequency, due_day=due_day,
+                                amount=kwargs.pop('amount', Decimal('120.00')), created_at=created,
+                                created_by_id=owner.id, **kwargs)
+    _db.session.add(template)
+    _db.session.commit()
+    return template
+
+
+def generated(template):
+    return [(e.due_date, e.recurrence_period) for e in
+            Expense.query.filter_by(recurring_expense_id=template.id).order_by(Expense.due_date)]
+
+
+def test_catch_up_generates_every_missed_period(_db, users):
+    owner = users['owner']
+    mortgage = make_template(_db, owner, 'Mortgage', due_day=31)
+    insurance = make_template(_db, owner, 'Insurance', frequency='quarterly', due_day=1,
+                              created=datetime(2024, 1, 1), amount=None)
+    make_template(_db, owner, 'Old lease', is_active=False)
+    make_template(_db, owner, 'Manual', auto_generate=False)
+
+    assert RecurringExpense.generate_due_expenses(through=date(2024, 4, 30)) == 6
+    _db.session.commit()
+
+    assert generated(mortgage) == [(date(2024, 1, 31), '2024-01'), (date(2024, 2, 29), '2024-02'),
+                                   (date(2024, 3, 31), '2024-03'), (date(2024, 4, 30), '2024-04')]
+    assert generated(insurance) == [(date(2024, 1, 1), '2024-01'), (date(2024, 4, 1), '2024-04')]
+    assert mortgage.next_due_date == date(2024, 5, 31)
+    assert insurance.next_due_date == date(2024, 7, 1)
+
+    expense = Expense.query.filter_by(recurring_expense_id=insurance.id).first()
+    assert expense.amount == Decimal('0.00')
+    assert expense.status == ExpenseStatus.DRAFT.value
+    assert expense.description == 'Insurance - January 2024'
+    assert Expense.query.count() == 6
+
+    # Nothing more is due until the pointers come round again
+    assert RecurringExpense.generate_due_expenses(through=date(2024, 5, 30)) == 0
+    assert RecurringExpense.generate_due_expenses(through=date(2024, 5, 31)) == 1
+
+
+def test_existing_periods_are_not_duplicated(_db, users):
+    owner = users['owner']
+    utilities = make_template(_db, owner, 'Utilities', due_day=5)
+    assert utilities.generate_next_expense().due_date == date(2024, 2, 5)
+    _db.session.commit()
+
+    # A lost pointer makes the generator revisit periods it already created
+    utilities.next_due_date = None
+    _db.session.commit()
+
+    assert RecurringExpense.generate_due_expenses(through=date(2024, 3, 10)) == 1
+    _db.session.commit()
+    assert generated(utilities) == [(date(2024, 2, 5), '2024-02'), (date(2024, 3, 5), '2024-03')]
+    assert utilities.next_due_date == date(2024, 4, 5)
+
+
+def test_catch_up_statement_count_is_independent_of_template_count(_db, users):
+    owner = users['owner']
+    _db.session.add_all([RecurringExpense(name=f'Line {n}', category='utilities', frequency='monthly',
+                                          due_day=n % 28 + 1, amount=Decimal('10.00'),
+                                          created_at=datetime(2024, 1, 1), created_by_id=owner.id)
+                         for n in range(300)])
+    _db.session.commit()
+
+    statements = []
+    record = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(_db.engine, 'before_cursor_execute', record)
+    created = RecurringExpense.generate_due_expenses(through=date(2024, 6, 30))
+    _db.session.commit()
+    event.remove(_db.engine, 'before_cursor_execute', record)
+
+    assert created == 300 * 6
+    assert Expense.query.count() == 1800
+    assert len([s for s in statements if s.strip().upper().startswith(('SELECT', 'INSERT', 'UPDATE'))]) == 4
@@ -0,0 +1,140 @@
+"""
+Tests for the Twilio webhooks and the sms_inbox job that processes what they store.
+"""
+from unittest.mock import patch
+import pytest
+from sqlalchemy import event
+from app.models import InboundSms, Message, MessageThread, SmsStatusCallback, Task, TaskAssignment
+from app.utils.sms import apply_status_callbacks, find_or_create_thread, process_inbound_sms
+
+
+@pytest.fixture
+def job_runner(app):
+    """The deployment these webhooks are built for: the jobs process what they store"""
+    app.config['JOB_RUNNER_ENABLED'] = True
+    yield
+    app.config['JOB_RUNNER_ENABLED'] = False
+
+
+def post_sms(client, body, sid):
+    with patch('app.utils.sms.verify_twilio_signature', return_value=True):
+        return client.post('/messages/webhook', data={
+            'From': '+14158675309', 'To': '+16502530000', 'Body': body, 'MessageSid': sid
+        })
+
+
+def record_statements(_db):
+    statements = []
+    record = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(_db.engine, 'before_cursor_execute', record)
+    return statements, lambda: event.remove(_db.engine, 'before_cursor_execute', record)
+
+
+def test_help_is_answered_by_the_webhook_with_one_insert(client, _db, job_runner):
+    statements, stop = record_statements(_db)
+    response = post_sms(client, 'help', 'SM1')
+    stop()
+
+    assert response.status_code == 200
+    assert 'Available commands' in response.get_data(as_text=True)
+    assert [s.split()[0] for s in statements] == ['INSERT']
+    assert MessageThread.query.count() == 0
+
+    # A retried webhook is stored once
+    post_sms(client, 'help', 'SM1')
+    assert InboundSms.query.count() == 1
+
+    with patch('app.utils.sms.send_reply') as send_reply:
+        assert process_inbound_sms() == 1
+    send_reply.assert_not_called()
+    message = Message.query.one()
+    assert (message.direction, message.content, message.external_id) == ('incoming', 'help', 'SM1')
+    assert InboundSms.query.one().processed_at is not None
+    assert process_inbound_sms() == 0
+
+
+def test_status_command_is_replied_to_by_the_job(client, _db, users, job_runner):
+    users['staff'].phone = '+14158675309'
+    task = Task(title='Clean the loft', creator_id=users['owner'].id)
+    _db.session.add(task)
+    _db.session.flush()
+    _db.session.add(TaskAssignment(task_id=task.id, user_id=users['staff'].id))
+    _db.session.commit()
+
+    response = post_sms(client, 'STATUS', 'SM2')
+    assert '<Message>' not in response.get_data(as_text=True)
+
+    with patch('app.utils.sms.send_reply') as send_reply:
+        process_inbound_sms()
+    to_number, reply, thread_id = send_reply.call_args.args
+    assert to_number == '+14158675309'
+    assert 'Clean the loft' in reply
+    assert thread_id == MessageThread.query.one().id
+    assert InboundSms.query.one().reply == reply
+
+
+def test_without_the_job_runner_the_webhook_files_and_answers(client, _db, users):
+    users['staff'].phone = '+14158675309'
+    task = Task(title='Clean the loft', creator_id=users['owner'].id)
+    _db.session.add(task)
+    _db.session.flush()
+    _db.session.add(TaskAssignment(task_id=task.id, user_id=users['staff'].id))
+    _db.session.commit()
+
+    with patch('app.utils.sms.send_reply') as send_reply:
+        response = post_sms(client, 'STATUS', 'SM3')
+    send_reply.assert_not_called()
+    assert 'Clean the loft' in response.get_data(as_text=True)
+    inbound = InboundSms.query.one()
+    assert inbound.processed_at is not None
+    assert 'Clean the loft' in inbound.reply
+    assert Message.query.one().external_id == 'SM3'
+    assert process_inbound_sms() == 0
+
+
+def test_message_without_a_thread_is_marked_processed(client, _db, job_runner):
+    post_sms(client, 'hello', 'SM4')
+    post_sms(client, 'help', 'SM5')
+
+    real_find_or_create_thread = find_or_create_thread
+    def fail_for_hello(from_number, to_number, *args):
+        if InboundSms.query.filter_by(message_sid='SM4', processed_at=None).count():
+            raise RuntimeError('thread lookup failed')
+        return real_find_or_create_thread(from_number, to_number, *args)
+
+    with patch('app.utils.sms.find_or_create_thread', side_effect=fail_for_hello):
+        assert process_inbound_sms() == 2
+    assert all(inbound.processed_at is not None for inbound in InboundSms.query)
+    assert Message.query.one().external_id == 'SM5'
+    assert process_inbound_sms() == 0
+
+
+def test_status_callbacks_are_applied_in_one_update(client, _db, job_runner):
+    thread = MessageThread(participant_phone='+14158675309', system_phone='+16502530000')
+    _db.session.add(thread)
+    _db.session.flush()
+    _db.session.add_all([
+        Message(thread_id=thread.id, direction='outgoing', phone_number='+14158675309', content='a',
+                external_id='SMa', status='sent'),
+        Message(thread_id=thread.id, direction='outgoing', phone_number='+14158675309', content='b',
+                external_id='SMb', status='sent'),
+        Message(thread_id=thread.id, direction='outgoing', phone_number='+14158675309', content='c',
+                external_id='SMc', status='delivered'),
+    ])
+    _db.session.commit()
+
+    # Delivered arrives before the late 'sending' for SMa; SMc must not move back
+    for sid, status in [('SMa', 'delivered'), ('SMa', 'sending'), ('SMb', 'failed'), ('SMc', 'sent')]:
+        assert client.post('/messages/status-callback',
+                           data={'MessageSid': sid, 'MessageStatus': status}).status_code == 200
+    assert Message.query.filter_by(external_id='SMb').one().status == 'sent'
+
+    statements, stop = record_statements(_db)
+    assert apply_status_callbacks() == 4
+    stop()
+
+    assert len([s for s in statements if s.startswith('UPDATE messages')]) == 1
+    assert {m.external_id: m.status for m in Message.query} == {'SMa': 'delivered', 'SMb': 'failed',
+                                                                 'SMc': 'delivered'}
+    assert SmsStatusCallback.query.count() == 0
+    assert apply_status_callbacks() == 0
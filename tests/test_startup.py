@@ -0,0 +1,28 @@
+"""
+Tests for startup: create_app stays off the database and 'flask prepare' does the one-time work.
+"""
+from sqlalchemy import event, inspect
+from app import create_app, db
+from config import TestConfig
+
+
+def test_create_app_does_not_touch_the_database():
+    statements = []
+    record = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(db.Engine, 'before_cursor_execute', record)
+    try:
+        app = create_app(TestConfig)
+    finally:
+        event.remove(db.Engine, 'before_cursor_execute', record)
+    assert statements == []
+    assert 'prepare' in app.cli.commands
+
+
+def test_prepare_command_creates_the_schema():
+    app = create_app(TestConfig)
+    result = app.test_cli_runner().invoke(args=['prepare'])
+    assert result.exit_code == 0, result.output
+    assert 'Database prepared' in result.output
+    with app.app_context():
+        assert 'property' in inspect(db.engine).get_table_names()
+        db.drop_all()
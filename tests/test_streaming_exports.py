@@ -0,0 +1,177 @@
+"""
+Tests for the streaming CSV/XLSX export engine and the financial exports built on it.
+"""
+import calendar
+import csv
+import io
+import re
+import zipfile
+from datetime import date, datetime
+from decimal import Decimal
+from sqlalchemy import event, select
+from app.models import CalendarEvent, Property, PropertyCalendar
+from app.models_modules.invoicing import Invoice
+from app.models_modules.financial_tracking import Expense, ExpenseStatus
+from app.routes.financial_analytics_routes import calculate_comprehensive_metrics, profit_loss_rows
+from app.utils.export import iter_xlsx
+from tests.utils import login
+
+
+def add_booking(_db, property, start, end, amount):
+    calendar = PropertyCalendar(property_id=property.id, name='Airbnb', ical_url='https://example.com/ical')
+    _db.session.add(calendar)
+    _db.session.flush()
+    _db.session.add(CalendarEvent(property_calendar_id=calendar.id, property_id=property.id, title='Booked',
+                                  start_date=start, end_date=end, source='airbnb', booking_amount=amount))
+
+
+def add_expense(_db, owner, property, category, amount, when, **kwargs):
+    _db.session.add(Expense(property_id=property.id if property else None, category=category,
+                            description=f'{category} bill', amount=amount, expense_date=when,
+                            status=kwargs.pop('status', ExpenseStatus.PAID.value),
+                            created_by_id=owner.id, **kwargs))
+
+
+def make_books(_db, users, property_fixture):
+    owner = users['owner']
+    second = Property(name='Second', address='1 Other St', owner_id=owner.id)
+    foreign = Property(name='Foreign', address='9 Far St', owner_id=users['staff'].id)
+    _db.session.add_all([second, foreign])
+    _db.session.flush()
+
+    add_booking(_db, property_fixture, date(2024, 1, 5), date(2024, 1, 9), Decimal('800.00'))
+    add_booking(_db, second, date(2024, 3, 10), date(2024, 3, 12), Decimal('450.00'))
+    # Spans two months, so the monthly P&L leaves it out
+    add_booking(_db, second, date(2024, 3, 30), date(2024, 4, 2), Decimal('300.00'))
+    add_booking(_db, foreign, date(2024, 1, 5), date(2024, 1, 9), Decimal('9999.00'))
+    _db.session.add(Invoice(invoice_number='INV-1', title='Paid', property_id=second.id, creator_id=owner.id,
+                            status='paid', total=120.5, created_at=datetime(2024, 3, 31, 23, 30)))
+
+    add_expense(_db, owner, property_fixture, 'utilities', Decimal('100.00'), date(2024, 1, 15))
+    add_expense(_db, owner, property_fixture, 'employee_wages', Decimal('300.00'), date(2024, 1, 20),
+                business_percentage=50)
+    add_expense(_db, owner, second, 'amenities', Decimal('40.00'), date(2024, 3, 2), receipt_url='https://r/1')
+    add_expense(_db, owner, None, 'insurance', Decimal('60.00'), date(2024, 3, 1))
+    add_expense(_db, owner, second, 'equipment', Decimal('900.00'), date(2024, 3, 3))
+    add_expense(_db, owner, second, 'marketing', Decimal('75.00'), date(2024, 3, 4), tax_deductible=False)
+    add_expense(_db, owner, second, 'supplies', Decimal('25.00'), date(2024, 3, 5), status=ExpenseStatus.DRAFT.value)
+    add_expense(_db, users['staff'], foreign, 'utilities', Decimal('5000.00'), date(2024, 1, 15))
+    _db.session.commit()
+    return second, foreign
+
+
+def read_csv(response):
+    return list(csv.reader(io.StringIO(response.get_data(as_text=True))))
+
+
+def read_xlsx(data):
+    with zipfile.ZipFile(io.BytesIO(data)) as archive:
+        assert '[Content_Types].xml' in archive.namelist()
+        sheet = archive.read('xl/worksheets/sheet1.xml').decode()
+    return [re.findall(r'<v>(.*?)</v>|<t xml:space="preserve">(.*?)</t>|<c/>', row)
+            for row in re.findall(r'<row r="\d+">(.*?)</row>', sheet)]
+
+
+def test_profit_loss_matches_monthly_metrics_in_one_query(_db, users, property_fixture):
+    make_books(_db, users, property_fixture)
+    owner = users['owner']
+    properties = Property.query.filter_by(owner_id=owner.id).all()
+    scope = select(Property.id).where(Property.owner_id == owner.id)
+
+    statements = []
+    record = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(_db.engine, 'before_cursor_execute', record)
+    rows = list(profit_loss_rows(2024, scope))
+    event.remove(_db.engine, 'before_cursor_execute', record)
+
+    assert len(statements) == 1
+    assert [row[0] for row in rows] == ['January', 'February', 'March', 'April', 'May', 'June', 'July',
+                                        'August', 'September', 'October', 'November', 'December']
+    for month, row in enumerate(rows, 1):
+        _, last_day = calendar.monthrange(2024, month)
+        metrics = calculate_comprehensive_metrics(properties, date(2024, month, 1), date(2024, month, last_day))
+        assert row[1:7] == [Decimal(f"{metrics[key]:.2f}") for key in (
+            'gross_revenue', 'operating_expenses', 'labor_costs', 'cost_of_goods_sold',
+            'total_expenses', 'net_income')]
+        assert row[7] == round(metrics['profit_margin'], 1)
+
+    assert rows[0][1:7] == [Decimal('800.00'), Decimal('100.00'), Decimal('150.00'), Decimal('0.00'),
+                            Decimal('250.00'), Decimal('550.00')]
+    assert rows[2][1] == Decimal('570.50')
+
+
+def test_profit_loss_breakdowns(client, _db, users, property_fixture):
+    second, _ = make_books(_db, users, property_fixture)
+    login(client, 'owner@example.com', 'password')
+
+    response = client.get('/financial-analytics/export/profit-loss?year=2024&breakdown=property')
+    assert response.status_code == 200
+    assert response.mimetype == 'text/csv'
+    assert 'profit_loss_2024_by_property.csv' in response.headers['Content-Disposition']
+    rows = read_csv(response)
+    assert rows[0][:2] == ['Month', 'Property']
+    assert [row[:3] for row in rows[1:]] == [
+        ['January', property_fixture.name, '800.00'],
+        ['March', 'All Properties', '0.00'],
+        ['March', 'Second', '570.50'],
+    ]
+    assert rows[2][2:4] == ['0.00', '60.00']
+
+    response = client.get('/financial-analytics/export/profit-loss?year=2024&breakdown=category'
+                          f'&property_id={second.id}')
+    assert read_csv(response)[1:] == [
+        ['March', 'Amenities', 'Cost Of Goods Sold', '40.00'],
+        ['March', 'Equipment', 'Capital Improvements', '900.00'],
+        ['March', 'Insurance', 'Operating Expenses', '60.00'],
+        ['March', 'Marketing', 'Operating Expenses', '0.00'],
+    ]
+
+    response = client.get('/financial-analytics/export/profit-loss?year=2024&breakdown=vendor')
+    assert response.status_code == 400
+
+
+def test_tax_report_streams_deductible_expenses_as_xlsx(client, _db, users, property_fixture):
+    make_books(_db, users, property_fixture)
+    login(client, 'owner@example.com', 'password')
+
+    response = client.get('/financial-analytics/export/tax-report?year=2024&format=xlsx')
+    assert response.status_code == 200
+    assert response.mimetype.endswith('spreadsheetml.sheet')
+    assert response.is_streamed
+    rows = read_xlsx(response.get_data())
+
+    assert [cell for cell in rows[0][0] if cell] == ['Date']
+    dates_and_deductions = [(row[0][1], row[6][0], row[7][1]) for row in rows[1:]]
+    assert dates_and_deductions == [
+        ('2024-01-15', '100.00', property_fixture.name),
+        ('2024-01-20', '150.00', property_fixture.name),
+        ('2024-03-01', '60.00', 'All Properties'),
+        ('2024-03-02', '40.00', 'Second'),
+        ('2024-03-03', '900.00', 'Second'),
+    ]
+
+    response = client.get('/financial-analytics/export/tax-report?year=2024&format=pdf')
+    assert response.status_code == 400
+
+
+def test_xlsx_writer_streams_in_chunks():
+    rows = ([n, f'Row <{n * 7919 % 10007}>', None, date(2024, 1, 1)] for n in range(20000))
+    chunks = list(iter_xlsx(['Number', 'Label', 'Empty', 'Day'], rows, sheet_name='Big: report'))
+
+    assert len(chunks) > 2
+    sheet_rows = read_xlsx(b''.join(chunks))
+    assert len(sheet_rows) == 20001
+    assert sheet_rows[-1] == [('19999', ''), ('', f'Row &lt;{19999 * 7919 % 10007}&gt;'), ('', ''),
+                              ('', '2024-01-01')]
+
+
+def test_analytics_export(client, _db, users, property_fixture):
+    make_books(_db, users, property_fixture)
+    login(client, 'owner@example.com', 'password')
+
+    response = client.get('/analytics/export?year=2024')
+    assert response.status_code == 200
+    assert read_csv(response)[1:] == [
+        ['January', property_fixture.name, '1', '800.00', '0.00', '800.00'],
+        ['March', 'Second', '2', '750.00', '120.50', '750.00'],
+    ]
@@ -0,0 +1,83 @@
+"""
+Tests for the tag-based cache and its backends.
+"""
+import pytest
+from app import cache
+from app.utils.performance import CacheManager
+from app.utils.tagged_cache import TaggedCache, CacheManagerBackend, FlaskCacheBackend, RedisBackend
+from app.utils.cache_service import CacheService, SYSTEM_TAG
+from tests.utils import FakeRedis
+
+
+@pytest.fixture(params=['cache_manager', 'redis', 'flask_caching'])
+def tag_cache(request, app):
+    if request.param == 'cache_manager':
+        backend = CacheManagerBackend(CacheManager())
+    elif request.param == 'redis':
+        backend = RedisBackend(FakeRedis())
+    else:
+        cache.clear()
+        backend = FlaskCacheBackend(cache)
+    return TaggedCache(backend)
+
+
+def test_invalidating_a_tag_drops_only_its_entries(tag_cache):
+    for n in range(3):
+        tag_cache.get_or_set(f'stats:{n}', ['property:7', f'user:{n}'], lambda: {'n': n})
+    tag_cache.get_or_set('dashboard', ['user:1'], lambda: 'dashboard')
+
+    tag_cache.invalidate_tags(['property:7'])
+
+    assert [tag_cache.get(f'stats:{n}', ['property:7', f'user:{n}']) for n in range(3)] == [None, None, None]
+    assert tag_cache.get('dashboard', ['user:1']) == 'dashboard'
+    assert tag_cache.get_or_set('stats:0', ['property:7', 'user:0'], lambda: 'fresh') == 'fresh'
+    assert tag_cache.get('stats:0', ['property:7', 'user:0']) == 'fresh'
+
+
+def test_invalidation_during_computation_wins(tag_cache):
+    def produce():
+        tag_cache.invalidate_tags(['user:1'])
+        return 'computed from old rows'
+
+    assert tag_cache.get_or_set('summary', ['user:1'], produce) == 'computed from old rows'
+    assert tag_cache.get('summary', ['user:1']) is None
+
+
+def test_redis_invalidation_writes_one_key_and_survives_eviction():
+    redis = FakeRedis()
+    tag_cache = TaggedCache(RedisBackend(redis))
+    for n in range(50):
+        tag_cache.get_or_set(f'entry:{n}', ['property:7'], lambda: n)
+
+    before = dict(redis._data)
+    tag_cache.invalidate_tags(['property:7'])
+    # Only the generation counter is written, whatever the number of entries
+    assert {key for key, value in redis._data.items() if before.get(key) != value} == \
+        {TaggedCache.generation_key('property:7')}
+
+    tag_cache.get_or_set('entry:0', ['property:7'], lambda: 'again')
+    # Losing the generation must not bring back entries written under an older one
+    del redis._data[TaggedCache.generation_key('property:7')]
+    tag_cache.invalidate_tags(['property:7'])
+    assert tag_cache.get('entry:0', ['property:7']) is None
+    assert tag_cache.get('entry:1', ['property:7']) is None
+
+
+def test_hit_rates_per_tag(tag_cache):
+    for _ in range(3):
+        tag_cache.get_or_set('a', ['user:1', 'property:7'], lambda: 'a')
+    tag_cache.get_or_set('b', ['user:2'], lambda: 'b')
+
+    assert tag_cache.stats() == {
+        'property:7': {'hits': 2, 'misses': 1, 'hit_rate': 66.7},
+        'user:1': {'hits': 2, 'misses': 1, 'hit_rate': 66.7},
+        'user:2': {'hits': 0, 'misses': 1, 'hit_rate': 0.0},
+    }
+
+
+def test_cache_service_reports_tag_stats(_db, users):
+    cache.clear()
+    assert CacheService.get_system_statistics()['total_users'] == 4
+    assert CacheService.get_system_statistics()['total_users'] == 4
+
+    assert CacheService.get_cache_stats()['tags'][SYSTEM_TAG] == {'hits': 1, 'misses': 1, 'hit_rate': 50.0}
@@ -0,0 +1,33 @@
+"""
+Tests for the task_reminders job's due-soon reminders.
+"""
+from datetime import datetime, timedelta
+from unittest.mock import patch
+from app.models import Notification, NotificationType, Task, TaskAssignment
+from app.notifications.service import check_upcoming_tasks
+
+
+def add_task(_db, users, property_fixture, hours):
+    task = Task(title='Turnover clean', creator_id=users['owner'].id, property_id=property_fixture.id,
+                due_date=datetime.utcnow() + timedelta(hours=hours))
+    _db.session.add(task)
+    _db.session.flush()
+    _db.session.add(TaskAssignment(task_id=task.id, user_id=users['staff'].id))
+    _db.session.commit()
+    return task
+
+
+def test_reminders_are_sent_once_per_task(app, _db, users, property_fixture):
+    app.config['NOTIFICATION_SMS_ENABLED'] = False
+    first = add_task(_db, users, property_fixture, hours=3)
+
+    with patch('app.notifications.service.send_email_notification'):
+        assert check_upcoming_tasks() == 1
+        assert check_upcoming_tasks() == 0
+
+        # A recurring task with the same title still gets its own reminder
+        second = add_task(_db, users, property_fixture, hours=20)
+        assert check_upcoming_tasks() == 1
+
+    reminders = Notification.query.filter_by(notification_type=NotificationType.TASK_REMINDER)
+    assert sorted(n.task_id for n in reminders) == sorted([first.id, second.id])
@@ -0,0 +1,73 @@
+"""
+Tests for the unified inbox query and thread summaries.
+"""
+from datetime import datetime, timedelta
+from app.models import MessageThread, Message, Notification, NotificationType
+from app.messages.service import get_unified_messages, get_thread_summaries
+from tests.utils import login
+
+
+def make_inbox(_db, user, count=5):
+    start = datetime(2024, 1, 1, 12, 0)
+    thread = MessageThread(participant_phone='+15550000001', system_phone='+15550000000', user_id=user.id)
+    _db.session.add(thread)
+    _db.session.flush()
+    for i in range(count):
+        _db.session.add(Message(thread_id=thread.id, direction='incoming', phone_number='+15550000001',
+                                content=f'sms {i}', read=i % 2 == 0,
+                                created_at=start + timedelta(minutes=2 * i)))
+        _db.session.add(Notification(notification_type=NotificationType.TASK_REMINDER, recipient_id=user.id,
+                                     message=f'note {i}', created_at=start + timedelta(minutes=2 * i + 1)))
+    # Same timestamp as an SMS, so the cursor has to break ties on type and id
+    _db.session.add(Notification(notification_type=NotificationType.TASK_REMINDER, recipient_id=user.id,
+                                 message='tie', created_at=start))
+    _db.session.commit()
+    return thread
+
+
+def test_inbox_is_merged_and_paged_newest_first(_db, users):
+    staff = users['staff']
+    make_inbox(_db, staff)
+
+    seen = []
+    cursor = None
+    while True:
+        page, cursor = get_unified_messages(staff, limit=3, before=cursor)
+        seen.extend(page)
+        if cursor is None:
+            break
+
+    assert len(seen) == 11
+    assert len({(m['type'], m['id']) for m in seen}) == 11
+    assert [m['content'] for m in seen[:3]] == ['note 4', 'sms 4', 'note 3']
+    keys = [(m['timestamp'], m['type'], m['id']) for m in seen]
+    assert keys == sorted(keys, reverse=True)
+    assert seen[-1]['content'] in ('sms 0', 'tie')
+    assert all(m['recipient'] == staff.get_full_name() for m in seen if m['type'] == 'notification')
+
+
+def test_thread_summaries_come_from_one_query(_db, users):
+    staff = users['staff']
+    thread = make_inbox(_db, staff)
+    empty = MessageThread(participant_phone='+15550000002', system_phone='+15550000000', user_id=staff.id)
+    _db.session.add(empty)
+    _db.session.commit()
+
+    summaries = get_thread_summaries(MessageThread.query.filter_by(user_id=staff.id).order_by(MessageThread.id))
+    (first, last_message, unread_count), (second, no_message, no_unread) = summaries
+
+    assert first.id == thread.id
+    assert last_message.content == 'sms 4'
+    assert unread_count == thread.unread_count == 2
+    assert second.id == empty.id and no_message is None and no_unread == 0
+
+
+def test_inbox_api_returns_cursor(client, _db, users):
+    make_inbox(_db, users['staff'])
+    login(client, 'staff@example.com', 'password')
+
+    first = client.get('/messages/api/inbox?limit=4').get_json()
+    assert first['success'] and len(first['messages']) == 4
+    second = client.get(f"/messages/api/inbox?limit=20&before={first['next_cursor']}").get_json()
+    assert len(second['messages']) == 7
+    assert second['next_cursor'] is None
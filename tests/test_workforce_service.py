@@ -0,0 +1,136 @@
+"""
+Tests for the workforce roster service and the maintained worker/property index.
+"""
+from sqlalchemy import event
+from app.models import (Task, TaskAssignment, TaskProperty, TaskStatus, Property,
+                        ServiceType, WorkerPropertyIndex)
+from app.workforce.service import (worker_query, get_worker_roster, get_worker_property_ids,
+                                   is_worker_assigned, get_worker_task_buckets)
+from tests.utils import login
+
+
+def add_task(_db, creator, worker, property, status=TaskStatus.PENDING, title='Clean'):
+    task = Task(title=title, status=status, creator_id=creator.id)
+    _db.session.add(task)
+    _db.session.flush()
+    _db.session.add(TaskProperty(task_id=task.id, property_id=property.id))
+    _db.session.add(TaskAssignment(task_id=task.id, user_id=worker.id, service_type=ServiceType.CLEANING))
+    _db.session.commit()
+    return task
+
+
+def test_index_follows_assignment_changes(_db, users, property_fixture):
+    staff = users['staff']
+    task = add_task(_db, users['owner'], staff, property_fixture)
+
+    assert get_worker_property_ids(staff.id) == {property_fixture.id}
+    assert is_worker_assigned(staff.id, property_fixture.id)
+
+    # Removing the only supporting assignment drops the pair from the index
+    _db.session.delete(task.assignments.first())
+    _db.session.commit()
+    assert get_worker_property_ids(staff.id) == set()
+    assert not is_worker_assigned(staff.id, property_fixture.id)
+
+
+def test_cached_property_set_follows_task_moves(_db, users, property_fixture):
+    staff = users['staff']
+    second = Property(name='Second', address='1 Other St', owner_id=users['owner'].id)
+    _db.session.add(second)
+    _db.session.commit()
+    task = add_task(_db, users['owner'], staff, property_fixture)
+    assert property_fixture.is_visible_to(staff) and not second.is_visible_to(staff)
+
+    # Cached: checking again does not touch the database
+    statements = []
+    record = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(_db.engine, 'before_cursor_execute', record)
+    try:
+        assert all(property_fixture.is_visible_to(staff) for _ in range(5))
+    finally:
+        event.remove(_db.engine, 'before_cursor_execute', record)
+    assert statements == []
+
+    task.task_properties[0].property_id = second.id
+    _db.session.commit()
+    assert get_worker_property_ids(staff.id) == {second.id}
+    assert second.is_visible_to(staff) and not property_fixture.is_visible_to(staff)
+
+
+def test_roster_aggregates_properties_and_open_tasks(_db, users, property_fixture):
+    owner, staff = users['owner'], users['staff']
+    second = Property(name='Second', address='1 Other St', owner_id=owner.id)
+    _db.session.add(second)
+    _db.session.commit()
+
+    add_task(_db, owner, staff, property_fixture)
+    add_task(_db, owner, staff, second, status=TaskStatus.IN_PROGRESS)
+    add_task(_db, owner, staff, second, status=TaskStatus.COMPLETED)
+
+    workers, summaries = get_worker_roster(worker_query(), page=1, per_page=10)
+    assert [w.id for w in workers.items] == [staff.id]
+    assert workers.total == 1
+    assert summaries[staff.id]['property_ids'] == sorted([property_fixture.id, second.id])
+    assert summaries[staff.id]['open_task_count'] == 2
+
+    filtered, _ = get_worker_roster(worker_query(property_id=second.id))
+    assert [w.id for w in filtered.items] == [staff.id]
+    empty, _ = get_worker_roster(worker_query(search='nobody-matches'))
+    assert empty.items == []
+
+
+def test_task_buckets_split_by_status(_db, users, property_fixture):
+    owner, staff = users['owner'], users['staff']
+    add_task(_db, owner, staff, property_fixture, title='Pending')
+    add_task(_db, owner, staff, property_fixture, status=TaskStatus.IN_PROGRESS, title='Doing')
+    for i in range(3):
+        add_task(_db, owner, staff, property_fixture, status=TaskStatus.COMPLETED, title=f'Done {i}')
+
+    buckets = get_worker_task_buckets(staff.id, completed_limit=2)
+    assert [t.title for t in buckets['pending']] == ['Pending']
+    assert [t.title for t in buckets['in_progress']] == ['Doing']
+    assert len(buckets['completed']) == 2
+
+
+def test_task_edit_moves_worker_to_new_property(client, _db, users, property_fixture):
+    staff = users['staff']
+    second = Property(name='Second', address='1 Other St', owner_id=users['owner'].id)
+    _db.session.add(second)
+    _db.session.commit()
+    task = add_task(_db, users['owner'], staff, property_fixture)
+
+    login(client, users['owner'].email, 'password')
+    response = client.post(f'/tasks/{task.id}/edit', data={
+        'title': 'Clean', 'description': 'Turnover clean', 'status': 'pending', 'priority': 'medium',
+        'recurrence_pattern': 'none', 'calendar_id': -1, 'properties': [second.id],
+    })
+    assert response.status_code == 302
+
+    rows = {(row.user_id, row.property_id) for row in WorkerPropertyIndex.query}
+    assert rows == {(staff.id, second.id)}
+    assert get_worker_property_ids(staff.id) == {second.id}
+    assert second.is_visible_to(staff) and not property_fixture.is_visible_to(staff)
+
+
+def test_staff_lose_access_when_their_task_moves(client, _db, users, property_fixture):
+    staff = users['staff']
+    second = Property(name='Second', address='1 Other St', owner_id=users['owner'].id)
+    _db.session.add(second)
+    _db.session.commit()
+    task = add_task(_db, users['owner'], staff, property_fixture)
+
+    login(client, staff.email, 'password')
+    assert client.get(f'/property/{property_fixture.id}/view').status_code == 200
+    assert client.get(f'/property/{second.id}/view').status_code == 302  # Redirected away
+    client.get('/auth/logout')
+
+    login(client, users['owner'].email, 'password')
+    client.post(f'/tasks/{task.id}/edit', data={
+        'title': 'Clean', 'description': 'Turnover clean', 'status': 'pending', 'priority': 'medium',
+        'recurrence_pattern': 'none', 'calendar_id': -1, 'properties': [second.id],
+    })
+    client.get('/auth/logout')
+
+    login(client, staff.email, 'password')
+    assert client.get(f'/property/{property_fixture.id}/view').status_code == 302
+    assert client.get(f'/property/{second.id}/view').status_code == 200
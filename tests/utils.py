@@ -13,4 +13,89 @@ def login(client, email, password):
 
 def logout(client):
     """Helper function to log out a user for testing"""
-    return client.get('/auth/logout', follow_redirects=True) 
\ No newline at end of file
+    return client.get('/auth/logout', follow_redirects=True) 
+
+class FakeRedis:
+    """
+    Minimal in-process stand-in for a redis-py client, covering the commands
+    the application's Redis backends use. Expiry is tracked against an
+    injectable clock so tests can advance time.
+    """
+
+    def __init__(self, clock=None):
+        import time
+        self._clock = clock or time.time
+        self._data = {}
+        self._expiry = {}
+
+    def _alive(self, key):
+        expires = self._expiry.get(key)
+        if expires is not None and self._clock() >= expires:
+            self._data.pop(key, None)
+            self._expiry.pop(key, None)
+        return key in self._data
+
+    def ping(self):
+        return True
+
+    def get(self, key):
+        return self._data.get(key) if self._alive(key) else None
+
+    def mget(self, keys):
+        return [self.get(key) for key in keys]
+
+    def set(self, key, value, ex=None, nx=False):
+        if nx and self._alive(key):
+            return None
+        self._data[key] = value if isinstance(value, bytes) else str(value).encode()
+        self._expiry.pop(key, None)
+        if ex:
+            self.expire(key, ex)
+        return True
+
+    def incr(self, key, amount=1):
+        value = int(self.get(key) or 0) + amount
+        self._data[key] = str(value).encode()
+        return value
+
+    def decr(self, key, amount=1):
+        return self.incr(key, -amount)
+
+    def expire(self, key, seconds):
+        if self._alive(key):
+            self._expiry[key] = self._clock() + seconds
+            return True
+        return False
+
+    def delete(self, *keys):
+        removed = 0
+        for key in keys:
+            if self._alive(key):
+                removed += 1
+            self._data.pop(key, None)
+            self._expiry.pop(key, None)
+        return removed
+
+    def scan_iter(self, match='*'):
+        import fnmatch
+        return [key for key in list(self._data) if self._alive(key) and fnmatch.fnmatch(key, match)]
+
+    def pipeline(self):
+        return _FakePipeline(self)
+
+
+class _FakePipeline:
+    def __init__(self, client):
+        self._client = client
+        self._calls = []
+
+    def __getattr__(self, name):
+        def queue(*args, **kwargs):
+            self._calls.append((name, args, kwargs))
+            return self
+        return queue
+
+    def execute(self):
+        results = [getattr(self._client, name)(*args, **kwargs) for name, args, kwargs in self._calls]
+        self._calls = []
+        return results